@@ -110,14 +110,14 @@ def main():
   • Or-opt                     : O(n² × max_iter_or_opt)  par tournée
   • Recuit simulé (SA)          : O(n² × max_iter_sa)  par tournée
   • ILS (large/xlarge)          : O(restarts × (n² × max_2opt))  par tournée
-  • MST (borne inf., sauf xlarge): O(n_total²)
+  • Held-Karp (borne inf., plafond 1 s): O(n_total²) / itération
   • Nettoyage croisements       : O(n² × max_iter_nettoyage)  par tournée
 
   Total par tournée (ordre de grandeur) :
     - small  : O(n² × K2 + n³ × K3 + n² × Ksa)  avec K bornés
     - medium : idem avec plafonds plus bas
     - large  : O(n² × K2 + n² × Kils + n² × Ksa)  (pas de 3-opt)
-    - xlarge : O(n² × K2 + n² × Kils + n² × Ksa)  (MST skippé, K plus petits)
+    - xlarge : O(n² × K2 + n² × Kils + n² × Ksa)  (K plus petits)
 
   Pour C camions avec n_1, n_2, ... points par tournée :
     Temps total ~ somme sur chaque tournee des couts ci-dessus.
@@ -2,11 +2,19 @@
 """
 Module AffectateurBiparti - Niveau 2 VillePropre
 Affectation optimale zones <-> camions via graphe biparti et algorithme glouton.
+
+Les coûts camion × zone sont précalculés une fois (matrice numpy vectorisée) avec des
+index id → objet / position : chaque requête de coût est en O(1).
 """
 
+import heapq
+import math
 import statistics
 from copy import deepcopy
 
+import numpy as np
+
+from affectation_lagrangienne import LAGRANGE_TEMPS_MAX, resoudre_gap_lagrangien
 from camion import Camion
 from zone import Zone
 
@@ -41,32 +49,90 @@ class AffectateurBiparti:
         self.dechetteries = dechetteries or []
         self.zones_incompatibles = []  # liste de paires [id1, id2]
         self.historique_affectations = []
+        self._signature_couts = None
+        self._matrice = None
+        self.rapport_optimisation = None  # rempli par affectation_optimale
+        self._signature_incompat = None
+        self._incompat = {}
+
+    def _signature(self) -> tuple:
+        return (id(self.camions), len(self.camions), id(self.zones), len(self.zones),
+                id(self.dechetteries), len(self.dechetteries))
+
+    def invalider_couts(self) -> None:
+        """À appeler si camions, zones ou déchetteries sont modifiés en place."""
+        self._signature_couts = None
+
+    def _matrice_couts(self) -> np.ndarray:
+        """Matrice des coûts camion × zone (reconstruite si les listes ont changé)."""
+        signature = self._signature()
+        if self._signature_couts != signature:
+            self._camions_par_id = {c.id: c for c in self.camions}
+            self._zones_par_id = {z.id: z for z in self.zones}
+            self._index_camion = {c.id: i for i, c in enumerate(self.camions)}
+            self._index_zone = {z.id: j for j, z in enumerate(self.zones)}
+            self._matrice = self._calculer_matrice_couts()
+            self._signature_couts = signature
+        return self._matrice
+
+    def _index_incompatibilites(self) -> dict:
+        """
+        Index d'adjacence zone_id -> ensemble des zones incompatibles, construit une fois
+        depuis zones_incompatibles (reconstruit si la liste est remplacée ou allongée).
+        """
+        signature = (id(self.zones_incompatibles), len(self.zones_incompatibles))
+        if self._signature_incompat != signature:
+            adjacence = {}
+            for paire in self.zones_incompatibles:
+                a, b = paire[0], paire[1]
+                if a == b:
+                    continue
+                adjacence.setdefault(a, set()).add(b)
+                adjacence.setdefault(b, set()).add(a)
+            self._incompat = adjacence
+            self._signature_incompat = signature
+        return self._incompat
 
-    def _distance_depot_vers_centre(self, zone: Zone) -> float:
-        """Distance du dépôt (0,0) au centre de la zone (euclidienne)."""
-        return zone.distance_depuis(0.0, 0.0)
-    
-    def _trouver_dechetterie_plus_proche(self, zone: Zone) -> tuple:
+    def zones_incompatibles_avec(self, zone_id: int) -> set:
+        """Zones incompatibles avec zone_id (ensemble vide si aucune)."""
+        return self._index_incompatibilites().get(zone_id, set())
+
+    def _calculer_matrice_couts(self) -> np.ndarray:
         """
-        Trouve la déchetterie la plus proche d'une zone.
-        
-        Returns:
-            Tuple (dechetterie, distance) ou (None, float('inf')) si aucune déchetterie disponible.
+        Coûts de calculer_cout_affectation pour toutes les paires (vectorisé).
+        Accès interdit (zones_accessibles) = np.inf.
         """
-        if not self.dechetteries:
-            return (None, float("inf"))
-        
-        min_distance = float("inf")
-        dechetterie_proche = None
-        
-        for dech in self.dechetteries:
-            # Calculer la distance depuis le centre de la zone vers la déchetterie
-            distance = zone.distance_depuis(dech.x, dech.y)
-            if distance < min_distance:
-                min_distance = distance
-                dechetterie_proche = dech
-        
-        return (dechetterie_proche, min_distance)
+        nb_c, nb_z = len(self.camions), len(self.zones)
+        if nb_c == 0 or nb_z == 0:
+            return np.full((nb_c, nb_z), np.inf)
+        cx = np.array([z.centre[0] for z in self.zones], dtype=float)
+        cy = np.array([z.centre[1] for z in self.zones], dtype=float)
+        volumes = np.array([z.volume_estime for z in self.zones], dtype=float)
+
+        d_depot_zone = np.hypot(cx, cy)
+        if self.dechetteries:
+            dx = np.array([d.x for d in self.dechetteries], dtype=float)
+            dy = np.array([d.y for d in self.dechetteries], dtype=float)
+            d = np.hypot(cx[:, None] - dx[None, :], cy[:, None] - dy[None, :])
+            k = np.argmin(d, axis=1)
+            d_zone_dech = d[np.arange(nb_z), k]
+            d_dech_depot = np.hypot(dx, dy)[k]
+        else:
+            # Pas de déchetterie : retour direct au dépôt depuis la zone
+            d_zone_dech = np.zeros(nb_z)
+            d_dech_depot = d_depot_zone
+
+        cout_zone = (d_depot_zone + d_zone_dech + d_dech_depot) * COUT_KM + volumes * COUT_MANUTENTION_KG
+        couts_fixes = np.array([c.cout_fixe for c in self.camions], dtype=float)
+        matrice = couts_fixes[:, None] + cout_zone[None, :]
+
+        for i, camion in enumerate(self.camions):
+            if camion.zones_accessibles:
+                interdit = np.ones(nb_z, dtype=bool)
+                accessibles = [self._index_zone[zid] for zid in camion.zones_accessibles if zid in self._index_zone]
+                interdit[accessibles] = False
+                matrice[i, interdit] = np.inf
+        return matrice
 
     def calculer_cout_affectation(self, camion_id: int, zone_id: int) -> float:
         """
@@ -80,40 +146,19 @@ class AffectateurBiparti:
         - Distance Déchetterie → Dépôt : distance_dechetterie_depot × COUT_KM
         - Manutention : volume_zone × COUT_MANUTENTION_KG
         - Coût fixe du camion
+        Sans déchetterie, le retour se fait directement de la zone au dépôt.
+
+        Lecture dans la matrice précalculée (_matrice_couts).
 
         Returns:
             Coût en €, ou float('inf') si le camion ne peut pas accéder à la zone.
         """
-        camion = next((c for c in self.camions if c.id == camion_id), None)
-        zone = next((z for z in self.zones if z.id == zone_id), None)
-        if not camion or not zone:
+        matrice = self._matrice_couts()
+        i = self._index_camion.get(camion_id)
+        j = self._index_zone.get(zone_id)
+        if i is None or j is None:
             return float("inf")
-        if not camion.peut_acceder_zone(zone_id):
-            return float("inf")
-
-        # Distance Dépôt → Zone (collecte)
-        distance_depot_zone = self._distance_depot_vers_centre(zone)
-        
-        # Trouver la déchetterie la plus proche
-        dechetterie_proche, distance_zone_dech = self._trouver_dechetterie_plus_proche(zone)
-        
-        # Distance Déchetterie → Dépôt (retour)
-        distance_dech_depot = 0.0
-        if dechetterie_proche:
-            distance_dech_depot = dechetterie_proche.distance_depuis(0.0, 0.0)
-        else:
-            # Si pas de déchetterie, retour direct au dépôt depuis la zone
-            distance_dech_depot = distance_depot_zone
-        
-        # Coût total des distances
-        distance_totale = distance_depot_zone + distance_zone_dech + distance_dech_depot
-        cout_distance = distance_totale * COUT_KM
-        
-        # Coût de manutention
-        cout_manutention = zone.volume_estime * COUT_MANUTENTION_KG
-        
-        # Coût total
-        return cout_distance + cout_manutention + camion.cout_fixe
+        return float(matrice[i, j])
 
     def affectation_gloutonne(self) -> dict:
         """
@@ -137,40 +182,113 @@ class AffectateurBiparti:
 
         affectation = {c.id: [] for c in self.camions}
 
+        # conflits[camion_id][z] = nb de zones du camion incompatibles avec z : test en O(1),
+        # mise à jour en O(degré) à chaque affectation
+        incompat = self._index_incompatibilites()
+        conflits = {c.id: {} for c in self.camions}
+
         def zone_incompatible_avec_camion(zone_id: int, camion_id: int) -> bool:
-            zones_du_camion = affectation.get(camion_id, [])
-            for zi in zones_du_camion:
-                for paire in self.zones_incompatibles:
-                    if set(paire) == {zone_id, zi}:
-                        return True
-            return False
+            return conflits[camion_id].get(zone_id, 0) > 0
+
+        matrice = self._matrice_couts()
+        capacites = np.array([c.capacite for c in self.camions], dtype=float)
+        charges = np.zeros(len(self.camions))
 
         for zone in zones_triees:
             zone_id = zone.id
             volume = zone.volume_estime
 
-            candidats = []
-            for camion in self.camions:
-                if not camion.peut_acceder_zone(zone_id):
-                    continue
-                if not camion.peut_prendre_volume(volume):
-                    continue
+            # Candidats accessibles avec capacité suffisante, par coût croissant
+            couts = matrice[:, self._index_zone[zone_id]]
+            faisables = np.nonzero(np.isfinite(couts) & (charges + volume <= capacites))[0]
+            for i in faisables[np.argsort(couts[faisables], kind="stable")].tolist():
+                camion = self.camions[i]
                 if zone_incompatible_avec_camion(zone_id, camion.id):
                     continue
-                cout = self.calculer_cout_affectation(camion.id, zone_id)
-                if cout != float("inf"):
-                    candidats.append((cout, camion.id))
+                camion.ajouter_charge(volume)
+                charges[i] += volume
+                affectation[camion.id].append(zone_id)
+                zone.camion_affecte = camion.id
+                compteurs = conflits[camion.id]
+                for autre in incompat.get(zone_id, ()):
+                    compteurs[autre] = compteurs.get(autre, 0) + 1
+                break
 
-            if not candidats:
-                continue
+        self.historique_affectations.append(deepcopy(affectation))
+        return affectation
 
-            candidats.sort(key=lambda x: x[0])
-            meilleur_camion_id = candidats[0][1]
-            camion = next(c for c in self.camions if c.id == meilleur_camion_id)
-            camion.ajouter_charge(volume)
-            affectation[meilleur_camion_id].append(zone_id)
-            zone.camion_affecte = meilleur_camion_id
+    def _voisins_incompatibles(self) -> list:
+        """voisins[j] = positions des zones incompatibles avec la zone en position j."""
+        incompat = self._index_incompatibilites()
+        return [
+            [self._index_zone[v] for v in incompat.get(z.id, ()) if v in self._index_zone]
+            for z in self.zones
+        ]
+
+    def affectation_optimale(self, temps_max: float = LAGRANGE_TEMPS_MAX, affectation_initiale: dict = None) -> dict:
+        """
+        Affectation quasi optimale : relaxation lagrangienne du problème d'affectation
+        généralisée (module affectation_lagrangienne), avec capacités, zones accessibles et
+        zones incompatibles. Démarre de affectation_initiale (par défaut : la solution
+        gloutonne) et ne fait jamais moins bien qu'elle.
+
+        Le rapport (coût, borne inférieure, gap d'optimalité) est dans self.rapport_optimisation.
+
+        Args:
+            temps_max: Plafond de temps (s).
+            affectation_initiale: { camion_id: [zone_ids] } de départ.
+
+        Returns:
+            Dict[int, list[int]] : { camion_id: [zone_ids] }
+        """
+        if affectation_initiale is None:
+            affectation_initiale = self.affectation_gloutonne()
+        matrice = self._matrice_couts()
+        initiale = np.full(len(self.zones), -1, dtype=np.int64)
+        for camion_id, zone_ids in affectation_initiale.items():
+            i = self._index_camion.get(camion_id)
+            for zone_id in zone_ids:
+                j = self._index_zone.get(zone_id)
+                if i is not None and j is not None:
+                    initiale[j] = i
+
+        resultat = resoudre_gap_lagrangien(
+            matrice,
+            [z.volume_estime for z in self.zones],
+            [c.capacite for c in self.camions],
+            incompatibles=self._voisins_incompatibles(),
+            affectation_initiale=initiale,
+            temps_max=temps_max,
+        )
+
+        for c in self.camions:
+            c.reinitialiser()
+        affectation = {c.id: [] for c in self.camions}
+        for j, i in enumerate(resultat["affectation"].tolist()):
+            zone = self.zones[j]
+            zone.camion_affecte = None
+            if i < 0:
+                continue
+            camion = self.camions[i]
+            camion.charge_actuelle += zone.volume_estime
+            affectation[camion.id].append(zone.id)
+            zone.camion_affecte = camion.id
 
+        cout_initial = sum(
+            float(matrice[initiale[j], j]) for j in range(len(self.zones)) if initiale[j] >= 0
+        )
+        self.rapport_optimisation = {
+            "methode": "lagrangien",
+            "cout_total": round(resultat["cout"], 2),
+            "cout_initial": round(cout_initial, 2),
+            "objectif": round(resultat["objectif"], 2),
+            "borne_inferieure": round(resultat["borne_inferieure"], 2),
+            "gap_pourcent": resultat["gap_pourcent"],
+            "zones_non_affectees": int((resultat["affectation"] < 0).sum()),
+            "zones_non_affectees_initial": int((initiale < 0).sum()),
+            "iterations": resultat["iterations"],
+            "temps_s": resultat["temps_s"],
+        }
         self.historique_affectations.append(deepcopy(affectation))
         return affectation
 
@@ -198,14 +316,17 @@ class AffectateurBiparti:
                     print(f"  [ECHEC] Camion {camion.id} ne peut pas acceder a la zone {zone_id}")
                     ok = False
 
-        # 3. Zones incompatibles
+        # 3. Zones incompatibles (zone -> camions qui la portent : O(paires))
+        camions_de_zone = {}
+        for camion_id, zone_ids in affectation.items():
+            for zid in zone_ids:
+                camions_de_zone.setdefault(zid, []).append(camion_id)
         for paire in self.zones_incompatibles:
             a, b = paire[0], paire[1]
-            for camion_id, zone_ids in affectation.items():
-                if a in zone_ids and b in zone_ids:
-                    print(f"  [ECHEC] Zones incompatibles {a} et {b} sur le meme camion {camion_id}")
-                    ok = False
-                    break
+            communs = [cid for cid in camions_de_zone.get(a, ()) if cid in camions_de_zone.get(b, ())]
+            if communs:
+                print(f"  [ECHEC] Zones incompatibles {a} et {b} sur le meme camion {communs[0]}")
+                ok = False
 
         return ok
 
@@ -214,64 +335,125 @@ class AffectateurBiparti:
         Rééquilibre les charges : camions surchargés (> moyenne + 15%)
         et sous-chargés (< moyenne - 15%), déplacements de zones si valides.
         Répète jusqu'à écart-type < 20% de la moyenne ou blocage.
+
+        Charges, moyenne et variance (camions non vides) sont tenues à jour à chaque
+        déplacement, sans resommer les zones. Le camion le plus chargé (tas heapq) cède
+        au plus léger capable de la recevoir la zone la mieux ajustée (volume le plus
+        proche de min(charge_lourd - moyenne, moyenne - charge_léger)) ; une passe
+        enchaîne les déplacements jusqu'à ce qu'aucun camion surchargé ne puisse céder.
         """
         affectation = deepcopy(affectation)
         camions_par_id = {c.id: c for c in self.camions}
         zones_par_id = {z.id: z for z in self.zones}
+        incompat = self._index_incompatibilites()
+        accessible = np.isfinite(self._matrice_couts())  # accès camion → zone, sans parcourir les listes
+        camion_de_zone = {zid: cid for cid, zids in affectation.items() for zid in zids}
 
-        def charge_camion(cid: int) -> float:
-            return sum(
-                zones_par_id[zid].volume_estime
-                for zid in affectation.get(cid, [])
-            )
+        charges = {
+            cid: sum(zones_par_id[zid].volume_estime for zid in zids)
+            for cid, zids in affectation.items()
+        }
+        # Agrégats des camions non vides : n, Σ charge, Σ charge²
+        agregats = {"n": 0, "somme": 0.0, "carres": 0.0}
+        for cid, zids in affectation.items():
+            if zids:
+                agregats["n"] += 1
+                agregats["somme"] += charges[cid]
+                agregats["carres"] += charges[cid] ** 2
+
+        def moyenne_ecart_type() -> tuple:
+            n = agregats["n"]
+            if n == 0:
+                return 0.0, 0.0
+            moyenne = agregats["somme"] / n
+            if n < 2:
+                return moyenne, 0.0
+            variance = (agregats["carres"] - n * moyenne * moyenne) / (n - 1)
+            return moyenne, math.sqrt(max(variance, 0.0))
+
+        def retirer_agregat(cid: int) -> None:
+            if affectation[cid]:
+                agregats["n"] -= 1
+                agregats["somme"] -= charges[cid]
+                agregats["carres"] -= charges[cid] ** 2
+
+        def ajouter_agregat(cid: int) -> None:
+            if affectation[cid]:
+                agregats["n"] += 1
+                agregats["somme"] += charges[cid]
+                agregats["carres"] += charges[cid] ** 2
 
         def peut_deplacer(zone_id: int, from_camion_id: int, to_camion_id: int) -> bool:
             zone = zones_par_id[zone_id]
             to_camion = camions_par_id[to_camion_id]
-            if not to_camion.peut_acceder_zone(zone_id):
+            if not accessible[self._index_camion[to_camion_id], self._index_zone[zone_id]]:
                 return False
-            charge_to = charge_camion(to_camion_id)
-            if charge_to + zone.volume_estime > to_camion.capacite:
+            if charges[to_camion_id] + zone.volume_estime > to_camion.capacite:
                 return False
-            zones_to_apres = affectation.get(to_camion_id, []) + [zone_id]
-            for paire in self.zones_incompatibles:
-                if zone_id not in paire:
+            # O(degré) : une zone incompatible déjà sur le camion cible bloque le déplacement
+            return all(camion_de_zone.get(autre) != to_camion_id for autre in incompat.get(zone_id, ()))
+
+        def deplacer(zone_id: int, cid_heavy: int, cid_light: int) -> None:
+            volume = zones_par_id[zone_id].volume_estime
+            retirer_agregat(cid_heavy)
+            retirer_agregat(cid_light)
+            affectation[cid_heavy].remove(zone_id)
+            affectation[cid_light].append(zone_id)
+            charges[cid_heavy] -= volume
+            charges[cid_light] += volume
+            camion_de_zone[zone_id] = cid_light
+            ajouter_agregat(cid_heavy)
+            ajouter_agregat(cid_light)
+
+        def meilleure_zone(cid_heavy: int, cid_light: int, cible: float):
+            """Zone de cid_heavy déplaçable vers cid_light, de volume le plus proche de cible."""
+            ecart_max = charges[cid_heavy] - charges[cid_light]  # au-delà, la variance augmente
+            meilleure, meilleur_ecart = None, float("inf")
+            for zid in affectation[cid_heavy]:
+                volume = zones_par_id[zid].volume_estime
+                if volume >= ecart_max or abs(volume - cible) >= meilleur_ecart:
                     continue
-                autre = paire[1] if paire[0] == zone_id else paire[0]
-                if autre in zones_to_apres:
-                    return False
-            return True
-
-        max_iter = 100
-        for _ in range(max_iter):
-            charges = [charge_camion(cid) for cid in affectation if affectation[cid]]
-            if not charges:
-                break
-            moyenne = statistics.mean(charges)
-            ecart_type = statistics.stdev(charges) if len(charges) > 1 else 0.0
-            if moyenne > 0 and ecart_type < 0.20 * moyenne:
+                if peut_deplacer(zid, cid_heavy, cid_light):
+                    meilleure, meilleur_ecart = zid, abs(volume - cible)
+            return meilleure
+
+        max_deplacements = 10 * max(1, len(camion_de_zone))
+        deplacements = 0
+        while deplacements < max_deplacements:
+            moyenne, ecart_type = moyenne_ecart_type()
+            if agregats["n"] == 0 or (moyenne > 0 and ecart_type < 0.20 * moyenne):
                 break
 
-            surcharges = [cid for cid in affectation if charge_camion(cid) > moyenne * 1.15]
-            sous_charges = [cid for cid in affectation if charge_camion(cid) < moyenne * 0.85]
-
-            deplacement_fait = False
-            for cid_heavy in surcharges:
-                zones_heavy = list(affectation.get(cid_heavy, []))
-                for zid in zones_heavy:
-                    for cid_light in sous_charges:
-                        if cid_light == cid_heavy:
-                            continue
-                        if peut_deplacer(zid, cid_heavy, cid_light):
-                            affectation[cid_heavy].remove(zid)
-                            affectation[cid_light].append(zid)
-                            deplacement_fait = True
-                            break
-                    if deplacement_fait:
-                        break
-                if deplacement_fait:
+            # Une passe : lourds par charge décroissante, légers par charge croissante
+            lourds = [(-charges[cid], cid) for cid in affectation if charges[cid] > moyenne * 1.15]
+            legers = [(charges[cid], cid) for cid in affectation if charges[cid] < moyenne * 0.85]
+            heapq.heapify(lourds)
+            deplacements_passe = 0
+            while lourds and deplacements < max_deplacements:
+                moins_charge, cid_heavy = heapq.heappop(lourds)
+                if -moins_charge != charges[cid_heavy] or charges[cid_heavy] <= moyenne * 1.15:
+                    continue  # entrée périmée ou plus surchargé
+                legers.sort()
+                plus_petite = min(zones_par_id[zid].volume_estime for zid in affectation[cid_heavy])
+                for i, (_, cid_light) in enumerate(legers):
+                    if cid_light == cid_heavy or charges[cid_light] >= moyenne * 0.85:
+                        continue
+                    if charges[cid_light] + plus_petite > camions_par_id[cid_light].capacite:
+                        continue  # aucune zone du camion lourd ne tient
+                    cible = min(charges[cid_heavy] - moyenne, moyenne - charges[cid_light])
+                    zid = meilleure_zone(cid_heavy, cid_light, cible)
+                    if zid is None:
+                        continue
+                    deplacer(zid, cid_heavy, cid_light)
+                    deplacements += 1
+                    deplacements_passe += 1
+                    legers[i] = (charges[cid_light], cid_light)
+                    heapq.heappush(lourds, (-charges[cid_heavy], cid_heavy))
+                    break
+                moyenne, ecart_type = moyenne_ecart_type()
+                if moyenne > 0 and ecart_type < 0.20 * moyenne:
                     break
-            if not deplacement_fait:
+            if deplacements_passe == 0:
                 break
 
         return affectation
@@ -328,18 +510,12 @@ class AffectateurBiparti:
             {"id": z.id, "volume": z.volume_estime, "centre": z.centre}
             for z in self.zones
         ]
-        aretes = []
-        for camion in self.camions:
-            for zone in self.zones:
-                if not camion.peut_acceder_zone(zone.id):
-                    continue
-                cout = self.calculer_cout_affectation(camion.id, zone.id)
-                if cout != float("inf"):
-                    aretes.append({
-                        "camion": camion.id,
-                        "zone": zone.id,
-                        "cout": round(cout, 2),
-                    })
+        matrice = self._matrice_couts()
+        lignes, colonnes = np.nonzero(np.isfinite(matrice))
+        aretes = [
+            {"camion": self.camions[i].id, "zone": self.zones[j].id, "cout": round(cout, 2)}
+            for i, j, cout in zip(lignes.tolist(), colonnes.tolist(), matrice[lignes, colonnes].tolist())
+        ]
         return {
             "noeuds_camions": noeuds_camions,
             "noeuds_zones": noeuds_zones,
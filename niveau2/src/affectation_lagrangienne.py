@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Module AffectationLagrangienne - Niveau 2 VillePropre
+Affectation généralisée (GAP) zones -> camions par relaxation lagrangienne, avec gap prouvé.
+
+Modèle (indices : c = camion, z = zone) :
+    min  Σ coût[c,z] x[c,z] + Σ pénalité[z] (1 - Σ_c x[c,z])
+    s.c. Σ_z volume[z] x[c,z] <= capacité[c]     (relâchée, multiplicateurs λ_c >= 0)
+         Σ_c x[c,z] <= 1 ; accès interdit = coût infini ; zones incompatibles (réparation)
+La pénalité d'une zone non affectée (PENALITE_NON_AFFECTEE × son coût max) fait passer
+la couverture avant le coût.
+
+Relaxation des capacités : chaque zone choisit indépendamment min_c coût[c,z] + λ_c volume[z]
+(O(C × Z) numpy par itération, adapté à des milliers de zones). Le dual L(λ) est une borne
+inférieure valide (les incompatibilités sont aussi relâchées) ; sous-gradient g_c = charge_c - capacité_c,
+pas de Polyak. Solutions primales : construction par regret sur les coûts ajustés (capacité,
+accès et incompatibilités respectés) + recherche locale (insertion, déplacement), en partant
+de la solution gloutonne (démarrage à chaud, majorant initial).
+"""
+
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+LAGRANGE_TEMPS_MAX = 2.0          # plafond (s)
+LAGRANGE_MAX_ITERATIONS = 5000
+LAGRANGE_LAMBDA_INITIAL = 2.0     # pas de Polyak : t = μ (UB - L) / ||g||²
+LAGRANGE_PATIENCE = 30            # itérations sans progrès avant de diviser μ par 2
+LAGRANGE_LAMBDA_MIN = 1e-4
+LAGRANGE_PERIODE_PRIMALE = 20     # une construction primale toutes les k itérations
+LAGRANGE_GAP_CIBLE = 1e-4         # arrêt si gap relatif < 0,01 %
+LAGRANGE_PASSES_LOCALES = 5
+LAGRANGE_PART_FINITION = 0.2      # part du temps réservée à la finition (chaînes d'éjection)
+PENALITE_NON_AFFECTEE = 10.0
+
+
+def _valeur(affect: np.ndarray, couts: np.ndarray, penalites: np.ndarray) -> float:
+    """Objectif : coûts des zones affectées + pénalités des zones non affectées."""
+    m = affect >= 0
+    return float(couts[affect[m], np.nonzero(m)[0]].sum() + penalites[~m].sum())
+
+
+def _en_conflit(z: int, c: int, affect: np.ndarray, voisins: List[Sequence[int]]) -> bool:
+    return any(affect[v] == c for v in voisins[z])
+
+
+def _construire(ajustes: np.ndarray, volumes: np.ndarray, capacites: np.ndarray,
+                voisins: List[Sequence[int]], accessibles: np.ndarray,
+                penalites: np.ndarray) -> np.ndarray:
+    """
+    Construction par regret sur les coûts ajustés : les zones que la relaxation affecte
+    (coût ajusté < pénalité) passent d'abord, par regret décroissant (écart entre le 2e
+    et le 1er choix), puis les autres ; chacune va sur le meilleur camion faisable.
+    """
+    nb_c, nb_z = ajustes.shape
+    affect = np.full(nb_z, -1, dtype=np.int64)
+    charges = np.zeros(nb_c)
+    if nb_c >= 2:
+        deux = np.partition(ajustes, 1, axis=0)[:2]
+        with np.errstate(invalid="ignore"):
+            regret = deux[1] - deux[0]
+        regret = np.nan_to_num(regret, nan=0.0, posinf=np.finfo(float).max)
+        meilleur = deux[0]
+    else:
+        regret = np.zeros(nb_z)
+        meilleur = ajustes[0] if nb_c else np.full(nb_z, np.inf)
+    retenues = accessibles & (meilleur < penalites)
+    ordre = np.lexsort((-regret, ~retenues))
+    for z in ordre[accessibles[ordre]].tolist():
+        col = ajustes[:, z]
+        cand = np.nonzero(np.isfinite(col) & (charges + volumes[z] <= capacites))[0]
+        for c in cand[np.argsort(col[cand], kind="stable")].tolist():
+            if voisins[z] and _en_conflit(z, c, affect, voisins):
+                continue
+            affect[z] = c
+            charges[c] += volumes[z]
+            break
+    return affect
+
+
+def _inserer_par_ejection(z: int, affect: np.ndarray, charges: np.ndarray, couts: np.ndarray,
+                          volumes: np.ndarray, capacites: np.ndarray, voisins: List[Sequence[int]]) -> bool:
+    """
+    Insère la zone non affectée z sur un camion c en déplaçant une zone a de c vers un
+    autre camion c2 (chaîne d'éjection de longueur 2, contre la fragmentation de capacité).
+    Si une seule zone de c est incompatible avec z, c'est elle qui est déplacée.
+    """
+    col = couts[:, z]
+    residuels = capacites - charges
+    for c in np.argsort(col, kind="stable").tolist():
+        if not np.isfinite(col[c]):
+            break
+        manque = volumes[z] - residuels[c]
+        conflits = [v for v in voisins[z] if affect[v] == c]
+        if len(conflits) > 1 or (manque <= 0 and not conflits):
+            continue
+        zones_c = np.array(conflits, dtype=int) if conflits else np.nonzero(affect == c)[0]
+        zones_c = zones_c[volumes[zones_c] >= manque]
+        for a in zones_c[np.argsort(volumes[zones_c], kind="stable")].tolist():
+            col_a = couts[:, a]
+            cand = np.nonzero(np.isfinite(col_a) & (residuels >= volumes[a]))[0]
+            cand = cand[cand != c]
+            for c2 in cand[np.argsort(col_a[cand], kind="stable")].tolist():
+                if voisins[a] and _en_conflit(a, c2, affect, voisins):
+                    continue
+                affect[a] = c2
+                charges[c] -= volumes[a]
+                charges[c2] += volumes[a]
+                affect[z] = c
+                charges[c] += volumes[z]
+                return True
+    return False
+
+
+def _ameliorer(affect: np.ndarray, couts: np.ndarray, volumes: np.ndarray, capacites: np.ndarray,
+               voisins: List[Sequence[int]], accessibles: np.ndarray, echeance: float,
+               ejection: bool = False) -> np.ndarray:
+    """
+    Recherche locale : insertion des zones non affectées (directe, puis par éjection si
+    demandé : plus coûteux, réservé à la finition) et déplacements améliorants.
+    """
+    affect = affect.copy()
+    nb_c = couts.shape[0]
+    m = affect >= 0
+    charges = np.bincount(affect[m], weights=volumes[m], minlength=nb_c).astype(float)
+    for _ in range(LAGRANGE_PASSES_LOCALES):
+        ameliore = False
+        for z in np.nonzero((affect < 0) & accessibles)[0].tolist():
+            col = couts[:, z]
+            cand = np.nonzero(np.isfinite(col) & (charges + volumes[z] <= capacites))[0]
+            for c in cand[np.argsort(col[cand], kind="stable")].tolist():
+                if voisins[z] and _en_conflit(z, c, affect, voisins):
+                    continue
+                affect[z] = c
+                charges[c] += volumes[z]
+                ameliore = True
+                break
+            else:
+                if ejection and time.perf_counter() < echeance:
+                    ameliore |= _inserer_par_ejection(z, affect, charges, couts, volumes, capacites, voisins)
+        if time.perf_counter() >= echeance:
+            break
+        for z in np.nonzero(affect >= 0)[0].tolist():
+            c0 = affect[z]
+            col = couts[:, z]
+            cand = np.nonzero((col < col[c0] - 1e-9) & (charges + volumes[z] <= capacites))[0]
+            for c in cand[np.argsort(col[cand], kind="stable")].tolist():
+                if voisins[z] and _en_conflit(z, c, affect, voisins):
+                    continue
+                affect[z] = c
+                charges[c0] -= volumes[z]
+                charges[c] += volumes[z]
+                ameliore = True
+                break
+        if not ameliore or time.perf_counter() >= echeance:
+            break
+    return affect
+
+
+def resoudre_gap_lagrangien(couts: np.ndarray, volumes: Sequence[float], capacites: Sequence[float],
+                            incompatibles: Optional[List[Sequence[int]]] = None,
+                            affectation_initiale: Optional[Sequence[int]] = None,
+                            temps_max: float = LAGRANGE_TEMPS_MAX,
+                            max_iterations: int = LAGRANGE_MAX_ITERATIONS) -> Dict:
+    """
+    Résout le GAP (indices de positions, pas d'identifiants).
+
+    Args:
+        couts: Matrice C × Z (np.inf = accès interdit).
+        volumes: Volume de chaque zone.
+        capacites: Capacité de chaque camion.
+        incompatibles: voisins[z] = zones incompatibles avec z (mêmes indices).
+        affectation_initiale: camion de chaque zone (-1 = non affectée), démarrage à chaud.
+        temps_max: Plafond de temps (s).
+        max_iterations: Plafond d'itérations du sous-gradient.
+
+    Returns:
+        {"affectation": np.ndarray (camion par zone, -1 = non affectée), "objectif",
+         "cout", "borne_inferieure", "gap_pourcent", "iterations", "temps_s", "objectif_initial"}
+    """
+    debut = time.perf_counter()
+    echeance = debut + temps_max
+    echeance_dual = echeance - LAGRANGE_PART_FINITION * temps_max
+    couts = np.asarray(couts, dtype=float)
+    volumes = np.asarray(volumes, dtype=float)
+    capacites = np.asarray(capacites, dtype=float)
+    nb_c, nb_z = couts.shape
+    voisins = incompatibles if incompatibles is not None else [()] * nb_z
+
+    finis = np.where(np.isfinite(couts), couts, -np.inf)
+    cout_max = finis.max(axis=0) if nb_c else np.full(nb_z, -np.inf)
+    accessibles = np.isfinite(cout_max)
+    # Zones inaccessibles : toujours non affectées, exclues de l'objectif (pénalité nulle)
+    penalites = np.where(accessibles, PENALITE_NON_AFFECTEE * np.maximum(cout_max, 1.0), 0.0)
+
+    if affectation_initiale is not None:
+        meilleure = np.asarray(affectation_initiale, dtype=np.int64).copy()
+    else:
+        meilleure = _construire(couts, volumes, capacites, voisins, accessibles, penalites)
+    objectif_initial = _valeur(meilleure, couts, penalites)
+    meilleure = _ameliorer(meilleure, couts, volumes, capacites, voisins, accessibles, echeance)
+    ub = _valeur(meilleure, couts, penalites)
+
+    lam = np.zeros(nb_c)
+    # Dual à λ = 0 (chaque zone à son coût minimal, capacités ignorées) : borne valide
+    # même si le temps manque pour la moindre itération du sous-gradient
+    lb = float(np.minimum(couts.min(axis=0), penalites).sum()) if nb_c else float(penalites.sum())
+    mu = LAGRANGE_LAMBDA_INITIAL
+    sans_progres = 0
+    iterations = 0
+    colonnes = np.arange(nb_z)
+    while nb_c and iterations < max_iterations and time.perf_counter() < echeance_dual:
+        iterations += 1
+        ajustes = couts + lam[:, None] * volumes[None, :]
+        choix = np.argmin(ajustes, axis=0)
+        meilleurs = ajustes[choix, colonnes]
+        pris = accessibles & (meilleurs < penalites)
+        dual = float(np.where(pris, meilleurs, penalites).sum() - lam @ capacites)
+        if dual > lb + 1e-9:
+            lb = dual
+            sans_progres = 0
+        else:
+            sans_progres += 1
+            if sans_progres >= LAGRANGE_PATIENCE:
+                mu /= 2.0
+                sans_progres = 0
+
+        charges = np.bincount(choix[pris], weights=volumes[pris], minlength=nb_c)
+        g = charges - capacites
+        g[(lam <= 0) & (g < 0)] = 0.0  # projection sur λ >= 0
+        norme = float(g @ g)
+
+        # norme nulle : relaxation faisable en capacité (optimale hors incompatibilités)
+        if norme == 0 or iterations % LAGRANGE_PERIODE_PRIMALE == 1 or iterations == max_iterations:
+            candidate = _construire(ajustes, volumes, capacites, voisins, accessibles, penalites)
+            candidate = _ameliorer(candidate, couts, volumes, capacites, voisins, accessibles, echeance_dual)
+            valeur = _valeur(candidate, couts, penalites)
+            if valeur < ub - 1e-9:
+                ub, meilleure = valeur, candidate
+
+        if norme == 0 or ub - lb <= LAGRANGE_GAP_CIBLE * max(abs(ub), 1.0) or mu < LAGRANGE_LAMBDA_MIN:
+            break
+        lam = np.maximum(0.0, lam + mu * max(ub - dual, 1e-9) / norme * g)
+
+    # Finition : chaînes d'éjection pour les zones restées non affectées
+    if (meilleure < 0).any() and accessibles[meilleure < 0].any():
+        finale = _ameliorer(meilleure, couts, volumes, capacites, voisins, accessibles,
+                            echeance, ejection=True)
+        valeur = _valeur(finale, couts, penalites)
+        if valeur < ub - 1e-9:
+            ub, meilleure = valeur, finale
+
+    lb = min(lb, ub)
+    m = meilleure >= 0
+    return {
+        "affectation": meilleure,
+        "objectif": ub,
+        "cout": float(couts[meilleure[m], np.nonzero(m)[0]].sum()),
+        "borne_inferieure": lb,
+        "gap_pourcent": round(100.0 * (ub - lb) / ub, 4) if ub > 0 else 0.0,
+        "iterations": iterations,
+        "temps_s": round(time.perf_counter() - debut, 4),
+        "objectif_initial": objectif_initial,
+    }
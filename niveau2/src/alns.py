@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+Module ALNS - Niveau 2 VillePropre
+Adaptive Large Neighborhood Search : portefeuille d'opérateurs destroy/repair
+avec sélection par roulette et apprentissage des poids en ligne.
+
+Opérateurs destroy :
+1. aleatoire  - retrait uniforme de q points
+2. pire       - worst removal (points dont le retrait fait gagner le plus de km)
+3. shaw       - retrait de points « liés » (proches et de volume similaire)
+4. route      - retrait d'une route complète (ou d'une portion contiguë)
+5. secteur    - retrait des points d'un secteur angulaire autour du dépôt
+
+Opérateurs repair :
+1. glouton    - cheapest insertion (plus gros volumes d'abord)
+2. regret_k   - insertion par regret (k = ALNS_REGRET_K)
+
+Les routes manipulées sont au format "collectes seulement" du LNS :
+[dépôt, collecte, ..., collecte, dépôt] ; les déchetteries sont réinsérées ensuite.
+
+Poids (Ropke & Pisinger, 2006) : à chaque fin de segment,
+w = (1 - r) × w + r × score_segment / nb_appels_segment.
+
+Complexité par itération : O(n) pour la copie + O(q × (K + C)) pour la réparation
+(K voisins, C routes) au lieu de O(q × n) pour une insertion exhaustive.
+"""
+
+import math
+import random as _random
+from typing import Callable, Dict, List, Optional
+
+# Apprentissage des poids
+ALNS_SEGMENT = 50          # itérations entre deux mises à jour des poids
+ALNS_REACTION = 0.2        # facteur de réaction r
+ALNS_POIDS_MIN = 0.05      # plancher (un opérateur n'est jamais totalement éteint)
+ALNS_SIGMA_BEST = 33.0     # nouvelle meilleure solution globale
+ALNS_SIGMA_BETTER = 9.0    # amélioration de la solution courante
+ALNS_SIGMA_ACCEPTED = 13.0 # solution moins bonne acceptée (diversification)
+
+# Taille de destruction
+ALNS_Q_MIN = 0.05          # au moins 5 % des points
+ALNS_Q_MAX_FRACTION = 0.25 # au plus 25 %
+ALNS_Q_MAX = 60            # plafond absolu (grandes instances)
+
+ALNS_DETERMINISME = 3      # exposant p de randomisation (pire / Shaw)
+ALNS_REGRET_K = 3
+
+
+class OperateurALNS:
+    """Opérateur destroy ou repair avec son poids et ses statistiques."""
+
+    def __init__(self, nom: str, fonction: Callable):
+        self.nom = nom
+        self.fonction = fonction
+        self.poids = 1.0
+        # Segment courant
+        self.score_segment = 0.0
+        self.appels_segment = 0
+        # Cumul sur toute l'optimisation
+        self.appels = 0
+        self.acceptations = 0
+        self.ameliorations = 0
+        self.meilleures = 0
+        self.temps = 0.0
+
+    def to_dict(self) -> Dict:
+        """Statistiques de l'opérateur pour l'API."""
+        return {
+            "poids": round(self.poids, 3),
+            "appels": self.appels,
+            "acceptations": self.acceptations,
+            "ameliorations": self.ameliorations,
+            "nouvelles_meilleures": self.meilleures,
+            "temps_s": round(self.temps, 4),
+        }
+
+
+class MoteurALNS:
+    """
+    Portefeuille d'opérateurs ALNS pour un OptimiseurRoutes.
+
+    Le moteur ne gère que les opérateurs et leurs poids ; la boucle
+    d'acceptation (recuit simulé, garde de couverture) reste dans
+    OptimiseurRoutes._lns_optimize.
+    """
+
+    def __init__(self, optimiseur, rng=None):
+        """
+        Args:
+            optimiseur: OptimiseurRoutes (fournit _distance et le dépôt).
+            rng: Générateur aléatoire (module random par défaut).
+        """
+        self.optimiseur = optimiseur
+        self.rng = rng or _random
+        self.neighbors: Dict[int, List[int]] = {}
+        self._angles: Dict[int, float] = {}
+        self.operateurs_destroy = [
+            OperateurALNS("aleatoire", self._detruire_aleatoire),
+            OperateurALNS("pire", self._detruire_pire),
+            OperateurALNS("shaw", self._detruire_shaw),
+            OperateurALNS("route", self._detruire_route),
+            OperateurALNS("secteur", self._detruire_secteur),
+        ]
+        self.operateurs_repair = [
+            OperateurALNS("glouton", self._reparer_glouton),
+            OperateurALNS(f"regret_{ALNS_REGRET_K}", self._reparer_regret),
+        ]
+
+    def preparer(self, neighbors: Dict[int, List[int]]) -> None:
+        """Définit les K plus proches voisins utilisés par Shaw et les réparations."""
+        self.neighbors = neighbors
+
+    # ------------------------------------------------------------------
+    # Sélection et apprentissage
+    # ------------------------------------------------------------------
+
+    def choisir(self, operateurs: List[OperateurALNS]) -> OperateurALNS:
+        """Sélection par roulette proportionnelle aux poids."""
+        total = sum(op.poids for op in operateurs)
+        tirage = self.rng.random() * total
+        cumul = 0.0
+        for op in operateurs:
+            cumul += op.poids
+            if tirage <= cumul:
+                return op
+        return operateurs[-1]
+
+    def enregistrer(self, op: OperateurALNS, score: float, duree: float,
+                    accepte: bool, ameliore: bool, meilleure: bool) -> None:
+        """Enregistre le résultat d'un appel d'opérateur."""
+        op.appels += 1
+        op.appels_segment += 1
+        op.score_segment += score
+        op.temps += duree
+        if accepte:
+            op.acceptations += 1
+        if ameliore:
+            op.ameliorations += 1
+        if meilleure:
+            op.meilleures += 1
+
+    def fin_segment(self) -> None:
+        """Met à jour les poids à partir des scores du segment écoulé."""
+        for op in self.operateurs_destroy + self.operateurs_repair:
+            if op.appels_segment > 0:
+                moyenne = op.score_segment / op.appels_segment
+                op.poids = (1 - ALNS_REACTION) * op.poids + ALNS_REACTION * moyenne
+                op.poids = max(ALNS_POIDS_MIN, op.poids)
+            op.score_segment = 0.0
+            op.appels_segment = 0
+
+    def taille_destruction(self, n_points: int) -> int:
+        """Nombre de points à retirer (tiré entre ALNS_Q_MIN et ALNS_Q_MAX_FRACTION)."""
+        if n_points <= 1:
+            return n_points
+        q_min = max(1, int(n_points * ALNS_Q_MIN))
+        q_max = max(q_min, min(ALNS_Q_MAX, int(n_points * ALNS_Q_MAX_FRACTION)))
+        return self.rng.randint(q_min, q_max)
+
+    def statistiques(self) -> Dict:
+        """Statistiques par opérateur (appels, acceptation, amélioration, temps)."""
+        return {
+            "destroy": {op.nom: op.to_dict() for op in self.operateurs_destroy},
+            "repair": {op.nom: op.to_dict() for op in self.operateurs_repair},
+        }
+
+    # ------------------------------------------------------------------
+    # Outils
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _collectes(routes: List[Dict]) -> List:
+        return [p for rm in routes for p in rm["route"] if p.type_point == "collecte"]
+
+    @staticmethod
+    def _retirer(routes: List[Dict], ids: set) -> None:
+        """Retire des routes les points de collecte dont l'id est dans ids."""
+        for rm in routes:
+            rm["route"] = [p for p in rm["route"] if p.type_point != "collecte" or p.id not in ids]
+
+    def _tirage_biaise(self, n: int) -> int:
+        """Indice dans [0, n) biaisé vers le début de la liste (y^p)."""
+        return int(n * (self.rng.random() ** ALNS_DETERMINISME))
+
+    def _angle(self, p) -> float:
+        a = self._angles.get(p.id)
+        if a is None:
+            depot = self.optimiseur.depot
+            a = math.atan2(p.y - depot.y, p.x - depot.x)
+            self._angles[p.id] = a
+        return a
+
+    # ------------------------------------------------------------------
+    # Opérateurs destroy : (routes, q) -> points retirés
+    # ------------------------------------------------------------------
+
+    def _detruire_aleatoire(self, routes: List[Dict], q: int) -> List:
+        collectes = self._collectes(routes)
+        retires = self.rng.sample(collectes, min(q, len(collectes)))
+        self._retirer(routes, {p.id for p in retires})
+        return retires
+
+    def _detruire_pire(self, routes: List[Dict], q: int) -> List:
+        d = self.optimiseur._distance
+        gains = []
+        for rm in routes:
+            r = rm["route"]
+            for i in range(1, len(r) - 1):
+                gains.append((d(r[i - 1], r[i]) + d(r[i], r[i + 1]) - d(r[i - 1], r[i + 1]), r[i]))
+        gains.sort(key=lambda g: -g[0])
+        retires = []
+        for _ in range(min(q, len(gains))):
+            retires.append(gains.pop(self._tirage_biaise(len(gains)))[1])
+        self._retirer(routes, {p.id for p in retires})
+        return retires
+
+    def _detruire_shaw(self, routes: List[Dict], q: int) -> List:
+        collectes = self._collectes(routes)
+        if not collectes:
+            return []
+        d = self.optimiseur._distance
+        par_id = {p.id: p for p in collectes}
+        v_max = max((p.volume for p in collectes), default=0.0) or 1.0
+        graine = self.rng.choice(collectes)
+        retires = [graine]
+        ids = {graine.id}
+        while len(retires) < min(q, len(collectes)):
+            ref = self.rng.choice(retires)
+            candidats = [par_id[nid] for nid in self.neighbors.get(ref.id, [])
+                         if nid in par_id and nid not in ids]
+            if not candidats:
+                restants = [p for p in collectes if p.id not in ids]
+                suivant = self.rng.choice(restants)
+            else:
+                d_max = max(d(ref, c) for c in candidats) or 1.0
+                candidats.sort(key=lambda c: d(ref, c) / d_max + abs(ref.volume - c.volume) / v_max)
+                suivant = candidats[self._tirage_biaise(len(candidats))]
+            retires.append(suivant)
+            ids.add(suivant.id)
+        self._retirer(routes, ids)
+        return retires
+
+    def _detruire_route(self, routes: List[Dict], q: int) -> List:
+        non_vides = [rm for rm in routes if len(rm["route"]) > 2]
+        if len(non_vides) < 2:
+            return self._detruire_aleatoire(routes, q)
+        rm = self.rng.choice(non_vides)
+        collectes = rm["route"][1:-1]
+        if len(collectes) > 2 * q:
+            # Route trop longue : retirer une portion contiguë de q points
+            debut = self.rng.randint(0, len(collectes) - q)
+            retires = collectes[debut:debut + q]
+        else:
+            retires = list(collectes)
+        self._retirer(routes, {p.id for p in retires})
+        return retires
+
+    def _detruire_secteur(self, routes: List[Dict], q: int) -> List:
+        collectes = self._collectes(routes)
+        if not collectes:
+            return []
+        theta = self.rng.uniform(-math.pi, math.pi)
+
+        def ecart(p) -> float:
+            delta = abs(self._angle(p) - theta)
+            return min(delta, 2 * math.pi - delta)
+
+        retires = sorted(collectes, key=ecart)[:q]
+        self._retirer(routes, {p.id for p in retires})
+        return retires
+
+    # ------------------------------------------------------------------
+    # Opérateurs repair : (routes, points) -> None (routes modifiées)
+    # ------------------------------------------------------------------
+
+    def _localiser(self, routes: List[Dict]) -> Dict[int, int]:
+        """id de collecte -> indice de route."""
+        return {p.id: ri for ri, rm in enumerate(routes) for p in rm["route"] if p.type_point == "collecte"}
+
+    def _couts_insertion(self, routes: List[Dict], p, loc: Dict[int, int],
+                         routes_cibles: Optional[List[int]] = None) -> Dict[int, tuple]:
+        """
+        Meilleure insertion de p dans chaque route : {ri: (delta, position)}.
+        Positions évaluées : à côté des K voisins de p déjà placés, et aux deux extrémités.
+        """
+        d = self.optimiseur._distance
+        positions: Dict[int, set] = {}
+        cibles = range(len(routes)) if routes_cibles is None else routes_cibles
+        for ri in cibles:
+            positions[ri] = {1, len(routes[ri]["route"]) - 1}
+        par_route_voisins: Dict[int, set] = {}
+        for nid in self.neighbors.get(p.id, []):
+            ri = loc.get(nid)
+            if ri is not None and ri in positions:
+                par_route_voisins.setdefault(ri, set()).add(nid)
+        for ri, nids in par_route_voisins.items():
+            route = routes[ri]["route"]
+            for idx in range(1, len(route) - 1):
+                if route[idx].id in nids:
+                    positions[ri].add(idx)
+                    positions[ri].add(idx + 1)
+        couts = {}
+        for ri, pos_set in positions.items():
+            route = routes[ri]["route"]
+            meilleur = None
+            for pos in pos_set:
+                if pos < 1 or pos > len(route) - 1:
+                    continue
+                avant, apres = route[pos - 1], route[pos]
+                delta = d(avant, p) + d(p, apres) - d(avant, apres)
+                if meilleur is None or delta < meilleur[0]:
+                    meilleur = (delta, pos)
+            if meilleur is not None:
+                couts[ri] = meilleur
+        return couts
+
+    def _reparer_glouton(self, routes: List[Dict], points: List) -> None:
+        if not routes:
+            return
+        loc = self._localiser(routes)
+        for p in sorted(points, key=lambda x: -x.volume):
+            couts = self._couts_insertion(routes, p, loc)
+            if not couts:
+                continue
+            ri, (_, pos) = min(couts.items(), key=lambda c: c[1][0])
+            routes[ri]["route"].insert(pos, p)
+            loc[p.id] = ri
+
+    def _reparer_regret(self, routes: List[Dict], points: List) -> None:
+        if not routes:
+            return
+        loc = self._localiser(routes)
+        restants = list(points)
+        couts = {p.id: self._couts_insertion(routes, p, loc) for p in restants}
+        while restants:
+            choix = None
+            for p in restants:
+                tries = sorted(couts[p.id].items(), key=lambda c: c[1][0])
+                if not tries:
+                    continue
+                c1 = tries[0][1][0]
+                regret = sum(tries[h][1][0] - c1 for h in range(1, min(ALNS_REGRET_K, len(tries))))
+                cle = (regret, -c1)
+                if choix is None or cle > choix[0]:
+                    choix = (cle, p, tries[0][0], tries[0][1][1])
+            if choix is None:
+                break
+            _, p, ri, pos = choix
+            routes[ri]["route"].insert(pos, p)
+            loc[p.id] = ri
+            restants.remove(p)
+            # Seule la route ri a changé : recalculer ses coûts pour les points restants
+            for autre in restants:
+                couts[autre.id].update(self._couts_insertion(routes, autre, loc, routes_cibles=[ri]))
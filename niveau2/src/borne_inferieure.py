@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Module BorneInferieure - Niveau 2 VillePropre
+Borne inférieure de la distance totale des tournées (qualité de la solution : gap).
+
+Méthodes (numpy, matrice dense) :
+1. Arbre couvrant minimal (Prim vectorisé) - O(n²) opérations numpy, O(n) boucles Python
+2. 1-arbre (sommet spécial = dépôt) - MST sur les autres sommets + 2 arêtes les moins chères
+3. Ascension de Held-Karp - sous-gradient sur les pénalités π, sous un plafond de temps
+
+Terme de capacité : chaque voyage se termine par un vidage en déchetterie, donc toute
+solution contient au moins k = ceil(Σ volumes / capacité max) passages en déchetterie.
+On ajoute k sommets « vidage » au graphe ; la distance d'un sommet vidage à un point i
+est la distance de i à sa déchetterie la plus proche (deux vidages ne sont jamais
+consécutifs). En fusionnant les tournées et en court-circuitant les passages au dépôt
+et les vidages en trop (inégalité triangulaire), toute solution devient un cycle
+hamiltonien de ce graphe augmenté : la borne de Held-Karp reste donc valide.
+"""
+
+import math
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+BORNE_TEMPS_MAX = 1.0           # plafond (s) de l'ascension de Held-Karp
+BORNE_MAX_ITERATIONS = 300
+BORNE_LAMBDA_INITIAL = 2.0      # pas de Polyak : t = λ (UB - w) / ||g||²
+BORNE_PATIENCE = 10             # itérations sans progrès avant de diviser λ par 2
+BORNE_LAMBDA_MIN = 1e-4
+
+
+def matrice_euclidienne(xs: Sequence[float], ys: Sequence[float]) -> np.ndarray:
+    """Matrice dense des distances euclidiennes (vectorisée)."""
+    x = np.asarray(xs, dtype=float)
+    y = np.asarray(ys, dtype=float)
+    return np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+
+
+def arbre_couvrant_minimal(W: np.ndarray, penalites: Optional[np.ndarray] = None) -> Tuple[float, np.ndarray]:
+    """
+    Prim vectorisé sur une matrice dense symétrique.
+
+    Args:
+        W: Matrice n×n (np.inf = arête interdite).
+        penalites: π (coût de l'arête ij = W[i,j] + π[i] + π[j]) ou None.
+
+    Returns:
+        (coût de l'arbre, parent) avec parent[0] = -1.
+    """
+    n = W.shape[0]
+    parent = np.full(n, -1, dtype=np.int64)
+    if n < 2:
+        return 0.0, parent
+    pi = np.zeros(n) if penalites is None else penalites
+    dans_arbre = np.zeros(n, dtype=bool)
+    dans_arbre[0] = True
+    meilleur = W[0] + pi[0] + pi
+    meilleur[0] = np.inf
+    parent[:] = 0
+    parent[0] = -1
+    cout = 0.0
+    for _ in range(n - 1):
+        j = int(np.argmin(meilleur))
+        if meilleur[j] == np.inf:
+            break  # graphe non connexe
+        cout += meilleur[j]
+        dans_arbre[j] = True
+        meilleur[j] = np.inf
+        ligne = W[j] + pi[j] + pi
+        maj = (~dans_arbre) & (ligne < meilleur)
+        meilleur[maj] = ligne[maj]
+        parent[maj] = j
+    return float(cout), parent
+
+
+def un_arbre(W: np.ndarray, penalites: np.ndarray) -> Tuple[float, np.ndarray]:
+    """
+    1-arbre avec le sommet 0 comme sommet spécial.
+
+    Returns:
+        (coût pénalisé du 1-arbre, degrés des sommets)
+    """
+    n = W.shape[0]
+    cout_mst, parent = arbre_couvrant_minimal(W[1:, 1:], penalites[1:])
+    aretes_0 = W[0, 1:] + penalites[0] + penalites[1:]
+    deux = np.argpartition(aretes_0, 1)[:2]
+    cout = cout_mst + float(aretes_0[deux].sum())
+    degres = np.zeros(n, dtype=np.int64)
+    enfants = np.nonzero(parent >= 0)[0]
+    np.add.at(degres, enfants + 1, 1)
+    np.add.at(degres, parent[enfants] + 1, 1)
+    degres[0] = 2
+    degres[deux + 1] += 1
+    return cout, degres
+
+
+def borne_held_karp(W: np.ndarray, temps_max: float = BORNE_TEMPS_MAX,
+                    borne_sup: Optional[float] = None,
+                    max_iterations: int = BORNE_MAX_ITERATIONS) -> Dict:
+    """
+    Ascension de sous-gradient de Held-Karp : max_π  L(1-arbre_π) - 2 Σ π.
+
+    Args:
+        W: Matrice dense symétrique (sommet 0 = spécial).
+        temps_max: Plafond de temps (s).
+        borne_sup: Majorant du cycle optimal (pas de Polyak) ; par défaut 2 × MST.
+        max_iterations: Plafond d'itérations.
+
+    Returns:
+        {"borne": float, "un_arbre": float, "mst": float, "iterations": int}
+    """
+    n = W.shape[0]
+    if n < 3:
+        return {"borne": float(2 * W[0, 1]) if n == 2 else 0.0, "un_arbre": 0.0, "mst": 0.0, "iterations": 0}
+    debut = time.perf_counter()
+    pi = np.zeros(n)
+    mst, _ = arbre_couvrant_minimal(W)
+    if borne_sup is None:
+        borne_sup = 2.0 * mst  # arbre doublé : majorant du cycle optimal (inégalité triangulaire)
+    cout, degres = un_arbre(W, pi)
+    un_arbre_initial = cout
+    meilleure = cout
+    lam = BORNE_LAMBDA_INITIAL
+    sans_progres = 0
+    iterations = 0
+    while iterations < max_iterations and time.perf_counter() - debut < temps_max:
+        g = (degres - 2).astype(float)
+        norme = float(g @ g)
+        if norme == 0:
+            break  # le 1-arbre est un cycle : borne optimale
+        pas = lam * max(borne_sup - cout, 1e-9 * max(borne_sup, 1.0)) / norme
+        pi += pas * g
+        iterations += 1
+        cout_penalise, degres = un_arbre(W, pi)
+        cout = cout_penalise - 2.0 * float(pi.sum())
+        if cout > meilleure + 1e-9:
+            meilleure = cout
+            sans_progres = 0
+        else:
+            sans_progres += 1
+            if sans_progres >= BORNE_PATIENCE:
+                lam /= 2.0
+                sans_progres = 0
+                if lam < BORNE_LAMBDA_MIN:
+                    break
+    return {"borne": float(meilleure), "un_arbre": float(un_arbre_initial), "mst": float(mst), "iterations": iterations}
+
+
+def nombre_voyages_min(volumes: Sequence[float], capacite_max: float) -> int:
+    """
+    Nombre minimal de voyages (donc de vidages en déchetterie).
+    Un point plus gros que la capacité occupe un voyage entier (volume plafonné à Q).
+    """
+    if capacite_max <= 0:
+        return 0
+    charge = sum(min(max(v, 0.0), capacite_max) for v in volumes)
+    return int(math.ceil(charge / capacite_max - 1e-9))
+
+
+def graphe_avec_vidages(W: np.ndarray, dist_dechetterie: np.ndarray, k: int) -> np.ndarray:
+    """
+    Ajoute k sommets « vidage » à la matrice W.
+    d(vidage, i) = distance de i à la déchetterie la plus proche ; vidage-vidage interdit.
+    """
+    n = W.shape[0]
+    k = max(0, min(k, n))  # un vidage doit être entouré de deux sommets réels
+    if k == 0:
+        return W
+    W_aug = np.full((n + k, n + k), np.inf)
+    W_aug[:n, :n] = W
+    W_aug[:n, n:] = dist_dechetterie[:, None]
+    W_aug[n:, :n] = dist_dechetterie[None, :]
+    return W_aug
+
+
+def calculer_borne_inferieure(W: np.ndarray, volumes: Sequence[float], capacite_max: float,
+                              dist_dechetterie: Optional[np.ndarray] = None,
+                              temps_max: float = BORNE_TEMPS_MAX) -> Dict:
+    """
+    Borne inférieure de la distance totale (dépôt = sommet 0, puis les points de collecte).
+
+    Args:
+        W: Matrice dense (dépôt + points), symétrisée ici par min(W, Wᵀ).
+        volumes: Volume de chaque point de collecte (ordre de W[1:]).
+        capacite_max: Plus grande capacité de la flotte.
+        dist_dechetterie: Pour chaque sommet de W, distance à la déchetterie la plus proche
+            (None = pas de déchetterie, pas de terme de capacité).
+        temps_max: Plafond de temps de l'ascension.
+
+    Returns:
+        {"borne", "held_karp", "un_arbre", "mst", "voyages_min", "iterations", "temps_s"}
+    """
+    debut = time.perf_counter()
+    W = np.minimum(W, W.T).astype(float, copy=True)
+    np.fill_diagonal(W, np.inf)
+    k = 0
+    if dist_dechetterie is not None and len(dist_dechetterie) == W.shape[0]:
+        k = nombre_voyages_min(volumes, capacite_max)
+        W = graphe_avec_vidages(W, np.asarray(dist_dechetterie, dtype=float), k)
+    resultat = borne_held_karp(W, temps_max=temps_max)
+    return {
+        "borne": resultat["borne"],
+        "held_karp": resultat["borne"],
+        "un_arbre": resultat["un_arbre"],
+        "mst": resultat["mst"],
+        "voyages_min": k,
+        "iterations": resultat["iterations"],
+        "temps_s": round(time.perf_counter() - debut, 4),
+    }
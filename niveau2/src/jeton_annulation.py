@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Module JetonAnnulation - Niveau 2 VillePropre
+Annulation coopérative et échéance stricte pour l'optimisation des routes.
+
+Le jeton est partagé entre le thread qui optimise et celui qui le pilote (API) :
+- expire() est interrogé dans chaque boucle de l'optimiseur (coût : une lecture d'horloge) ;
+  les boucles s'arrêtent proprement et la meilleure solution en cours est conservée.
+- verifier() est appelé entre deux phases : il lève OptimisationAnnulee si le jeton a été
+  annulé, pour libérer le thread au plus vite (pas de thread « zombie » après un timeout).
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class OptimisationAnnulee(Exception):
+    """Levée entre deux phases quand l'optimisation a été annulée."""
+
+
+class JetonAnnulation:
+    """Jeton d'annulation + échéance (horloge monotone), partageable entre threads."""
+
+    def __init__(self, duree_max: Optional[float] = None):
+        """
+        Args:
+            duree_max: Durée maximale (s) à partir de maintenant (None = pas d'échéance).
+        """
+        self._evenement = threading.Event()
+        self.raison: Optional[str] = None
+        self.echeance: Optional[float] = None
+        if duree_max is not None:
+            self.fixer_echeance(duree_max)
+
+    def fixer_echeance(self, duree_s: float) -> None:
+        """Fixe l'échéance à maintenant + duree_s (ne recule jamais une échéance plus proche)."""
+        echeance = time.monotonic() + max(0.0, duree_s)
+        if self.echeance is None or echeance < self.echeance:
+            self.echeance = echeance
+
+    def annuler(self, raison: str = "annulee") -> None:
+        """Demande l'arrêt de l'optimisation (appelable depuis un autre thread)."""
+        if not self._evenement.is_set():
+            self.raison = raison
+            self._evenement.set()
+
+    @property
+    def est_annule(self) -> bool:
+        return self._evenement.is_set()
+
+    def expire(self) -> bool:
+        """Vrai si le jeton est annulé ou l'échéance dépassée (à interroger dans les boucles)."""
+        if self._evenement.is_set():
+            return True
+        return self.echeance is not None and time.monotonic() >= self.echeance
+
+    def temps_restant(self) -> Optional[float]:
+        """Secondes avant l'échéance (0 si annulé ou dépassée, None si pas d'échéance)."""
+        if self._evenement.is_set():
+            return 0.0
+        if self.echeance is None:
+            return None
+        return max(0.0, self.echeance - time.monotonic())
+
+    def verifier(self) -> None:
+        """Lève OptimisationAnnulee si le jeton a été annulé (à appeler entre deux phases)."""
+        if self._evenement.is_set():
+            raise OptimisationAnnulee(self.raison or "annulee")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Module MatriceTrajets - Niveau 2 VillePropre
+Distances (km) et durées de trajet (minutes) entre les mêmes points, en tableaux denses.
+
+Construite depuis OSRM (osrm_client.build_travel_matrix_from_osrm : vraies durées
+routières) ou, à défaut, depuis les distances euclidiennes à vitesse constante.
+Partagée par l'optimiseur de routes (objectif "distance" ou "temps") et par le
+planificateur du niveau 3 (temps de trajet entre zones et dans les zones).
+"""
+
+from typing import Dict, Hashable, Sequence, Tuple
+
+import numpy as np
+
+VITESSE_DEFAUT_KMH = 30.0   # conversion distance ↔ durée quand OSRM ne donne pas l'une des deux
+
+
+class MatriceTrajets:
+    """
+    Matrices N×N distances_km et durees_min, indexées comme ids (ordre des points).
+    Un id répété pointe sur sa première occurrence.
+    """
+
+    def __init__(self, ids: Sequence[Hashable], distances_km: np.ndarray, durees_min: np.ndarray):
+        self.ids = list(ids)
+        self.distances_km = np.asarray(distances_km, dtype=float)
+        self.durees_min = np.asarray(durees_min, dtype=float)
+        n = len(self.ids)
+        if self.distances_km.shape != (n, n) or self.durees_min.shape != (n, n):
+            raise ValueError(f"Matrices {n}×{n} attendues pour {n} ids")
+        self.index: Dict[Hashable, int] = {}
+        for i, ident in enumerate(self.ids):
+            self.index.setdefault(ident, i)
+
+    @classmethod
+    def euclidienne(cls, ids: Sequence[Hashable], xs: Sequence[float], ys: Sequence[float],
+                    vitesse_kmh: float = VITESSE_DEFAUT_KMH) -> "MatriceTrajets":
+        """Distances euclidiennes (unités x, y = km) et durées à vitesse constante."""
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        distances = np.hypot(xs[:, None] - xs[None, :], ys[:, None] - ys[None, :])
+        return cls(ids, distances, distances / vitesse_kmh * 60.0)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def distance(self, id_a: Hashable, id_b: Hashable) -> float:
+        return float(self.distances_km[self.index[id_a], self.index[id_b]])
+
+    def duree(self, id_a: Hashable, id_b: Hashable) -> float:
+        return float(self.durees_min[self.index[id_a], self.index[id_b]])
+
+    def indices(self, ids: Sequence[Hashable]) -> np.ndarray:
+        return np.array([self.index[i] for i in ids], dtype=np.intp)
+
+    def sous_matrices(self, ids: Sequence[Hashable]) -> Tuple[np.ndarray, np.ndarray]:
+        """(distances_km, durees_min) restreintes aux ids, dans leur ordre."""
+        idx = self.indices(ids)
+        bloc = np.ix_(idx, idx)
+        return self.distances_km[bloc], self.durees_min[bloc]
+
+    def distance_parcours(self, ids: Sequence[Hashable]) -> float:
+        """Distance (km) du parcours ids[0] → ids[1] → … dans l'ordre donné."""
+        if len(ids) < 2:
+            return 0.0
+        idx = self.indices(ids)
+        return float(self.distances_km[idx[:-1], idx[1:]].sum())
+
+    def duree_parcours(self, ids: Sequence[Hashable]) -> float:
+        """Durée (minutes) du parcours ids[0] → ids[1] → … dans l'ordre donné."""
+        if len(ids) < 2:
+            return 0.0
+        idx = self.indices(ids)
+        return float(self.durees_min[idx[:-1], idx[1:]].sum())
+
+    def _en_dict(self, matrice: np.ndarray) -> Dict[Tuple[Hashable, Hashable], float]:
+        valeurs = matrice.tolist()
+        return {
+            (id_i, id_j): valeurs[i][j]
+            for i, id_i in enumerate(self.ids)
+            for j, id_j in enumerate(self.ids)
+        }
+
+    def distances_dict(self) -> Dict[Tuple[Hashable, Hashable], float]:
+        """{(id_i, id_j): km}, format de matrice_osrm de l'optimiseur."""
+        return self._en_dict(self.distances_km)
+
+    def durees_dict(self) -> Dict[Tuple[Hashable, Hashable], float]:
+        """{(id_i, id_j): minutes}."""
+        return self._en_dict(self.durees_min)
+
+
+def completer_matrices(distances_m: np.ndarray, durees_s: np.ndarray,
+                       vitesse_kmh: float = VITESSE_DEFAUT_KMH,
+                       valeur_absente_km: float = 999999.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Réponse OSRM (mètres, secondes, NaN si absent) → (km, minutes) complètes.
+
+    Une distance absente est déduite de la durée à vitesse_kmh et inversement ;
+    si les deux manquent, valeur_absente_km (et sa durée). Diagonale nulle.
+    """
+    distances_km = np.asarray(distances_m, dtype=float) / 1000.0
+    durees_min = np.asarray(durees_s, dtype=float) / 60.0
+    distances_km = np.where(np.isnan(distances_km), durees_min / 60.0 * vitesse_kmh, distances_km)
+    distances_km = np.where(np.isnan(distances_km), valeur_absente_km, distances_km)
+    durees_min = np.where(np.isnan(durees_min), distances_km / vitesse_kmh * 60.0, durees_min)
+    np.fill_diagonal(distances_km, 0.0)
+    np.fill_diagonal(durees_min, 0.0)
+    return distances_km, durees_min
@@ -8,6 +8,7 @@ Algorithmes implémentés :
 2. 2-opt Local Search - Amélioration des routes
 3. Insertion Intelligente des Déchetteries - Gestion de la capacité des camions
 4. Clarke-Wright Savings - Pour le regroupement des points
+5. ALNS (Adaptive LNS) - Grandes instances, portefeuille destroy/repair (voir alns.py)
 
 Complexité :
 - Nearest Neighbor : O(n²) où n = nombre de points
@@ -20,7 +21,20 @@ import os
 import time
 import random as _random
 from copy import deepcopy
-from typing import List, Tuple, Dict, Optional
+from typing import Any, Callable, List, Tuple, Dict, Optional
+
+import numpy as np
+
+from alns import (
+    MoteurALNS,
+    ALNS_SEGMENT,
+    ALNS_SIGMA_BEST,
+    ALNS_SIGMA_BETTER,
+    ALNS_SIGMA_ACCEPTED,
+)
+from borne_inferieure import BORNE_TEMPS_MAX, calculer_borne_inferieure, matrice_euclidienne
+from jeton_annulation import JetonAnnulation
+from matrice_trajets import MatriceTrajets
 
 # Debug couverture : COVERAGE_DEBUG=1 (env) ou activé via optimiser_collecte(..., debug_coverage=True)
 _COVERAGE_DEBUG_ENV = os.environ.get("COVERAGE_DEBUG", "").strip().lower() in ("1", "true", "yes")
@@ -39,12 +53,19 @@ N_STRATEGY_LARGE = 400  # grand : LNS + neighbor pruning
 
 # Grandes instances : neighbor pruning et LNS
 K_NEIGHBORS = 15  # nombre de voisins les plus proches par point (O(n²) -> O(n×K))
-LNS_DESTROY_MIN = 0.10  # retirer au moins 10% des points
-LNS_DESTROY_MAX = 0.30  # au plus 30%
 LNS_T_INITIAL = 50.0
 LNS_ALPHA = 0.97
 N_DECOMPOSITION_SECTOR = 70  # ~60-80 points par secteur (xlarge)
 
+# Ré-optimisation incrémentale (warm start) : recherche locale autour des points modifiés
+REOPT_K_VOISINS = 10
+REOPT_MAX_ITER_LOCAL = 20
+REOPT_BORNE_TEMPS = 0.05  # plafond (s) de la borne inférieure en warm start
+
+# Anytime : intervalle minimal (s) entre deux publications de progression d'une même phase
+PROGRESSION_INTERVALLE = 0.5
+OBJECTIFS = ("distance", "temps")  # coût minimisé : km ou minutes de trajet
+
 
 class Point:
     """Représente un point (collecte, déchetterie ou dépôt)."""
@@ -199,7 +220,11 @@ class OptimiseurRoutes:
     def __init__(self, depot: Point, points_collecte: List[Point], 
                  dechetteries: List[Point], camions: List[Dict],
                  matrice_osrm: Optional[Dict[Tuple[int, int], float]] = None,
-                 time_limit_seconds: Optional[float] = None):
+                 time_limit_seconds: Optional[float] = None,
+                 callback_progression: Optional[Callable[[Dict], None]] = None,
+                 jeton: Optional[JetonAnnulation] = None,
+                 matrice_trajets: Optional[MatriceTrajets] = None,
+                 objectif: str = "distance"):
         """
         Initialise l'optimiseur.
         
@@ -211,20 +236,54 @@ class OptimiseurRoutes:
             matrice_osrm: Matrice {(id1, id2): distance_km} OSRM (optionnel)
             time_limit_seconds: Limite de temps globale (optionnel). Au-delà, les
                 améliorations restantes sont raccourcies pour éviter tout blocage.
+            callback_progression: Appelé avec un dict de progression (phase, itération,
+                distance, gap, meilleure solution connue) au fil de l'optimisation (optionnel).
+            jeton: Jeton d'annulation / échéance partagé avec l'appelant (optionnel). Toutes
+                les boucles l'interrogent ; time_limit_seconds y fixe une échéance stricte.
+            matrice_trajets: Distances et durées de trajet (OSRM) indexées par id (optionnel) ;
+                remplace matrice_osrm.
+            objectif: "distance" (km) ou "temps" (minutes de trajet : durées de
+                matrice_trajets, sinon euclidien à vitesse constante).
         """
+        if objectif not in OBJECTIFS:
+            raise ValueError(f"objectif inconnu : {objectif!r} (attendu : {', '.join(OBJECTIFS)})")
         self.depot = depot
         self.points_collecte = points_collecte
         self.dechetteries = dechetteries
         self.camions = camions
-        self.use_osrm = matrice_osrm is not None
+        self.use_osrm = matrice_osrm is not None or matrice_trajets is not None
+        self.objectif = objectif
         self.time_limit_seconds = time_limit_seconds
+        self.jeton = jeton if jeton is not None else JetonAnnulation()
+        if time_limit_seconds:
+            # Échéance stricte dès la construction (la matrice de distances compte dans le budget)
+            self.jeton.fixer_echeance(time_limit_seconds)
         
-        # Matrice de distances: OSRM si fourni, sinon euclidienne
+        # Matrice de coût : distances OSRM si fournies, sinon euclidiennes ; durées si objectif "temps"
         self.tous_points = [depot] + points_collecte + dechetteries
-        self.matrice_distances = matrice_osrm if matrice_osrm else self._calculer_matrice_distances()
+        if matrice_trajets is None and objectif == "temps":
+            matrice_trajets = MatriceTrajets.euclidienne(
+                [p.id for p in self.tous_points], [p.x for p in self.tous_points], [p.y for p in self.tous_points]
+            )
+        self.matrice_trajets = matrice_trajets
+        if objectif == "temps":
+            self.matrice_distances = matrice_trajets.durees_dict()
+        elif matrice_trajets is not None:
+            self.matrice_distances = matrice_trajets.distances_dict()
+        else:
+            self.matrice_distances = matrice_osrm if matrice_osrm else self._calculer_matrice_distances()
+        self._cout_matriciel = self.use_osrm or objectif == "temps"
         
         # Résultats
         self.routes_optimisees: List[RouteOptimisee] = []
+        
+        # Anytime : meilleure solution connue (routes_meta) et suivi des publications
+        self.callback_progression = callback_progression
+        self._instantane: Optional[List[Dict]] = None
+        self._routes_fixes: List[Dict] = []  # routes des autres secteurs pendant un LNS
+        self._phase: Optional[str] = None
+        self._derniere_publication = 0.0
+        self._debut_progression = time.time()
     
     def _calculer_matrice_distances(self) -> Dict[Tuple[int, int], float]:
         """Précalcule toutes les distances entre les points."""
@@ -235,12 +294,19 @@ class OptimiseurRoutes:
         return matrice
     
     def _distance(self, p1: Point, p2: Point) -> float:
-        """Retourne la distance entre deux points (utilise le cache si disponible)."""
+        """
+        Retourne le coût du trajet entre deux points (utilise le cache si disponible) :
+        km, ou minutes si l'objectif est "temps".
+        """
         key = (p1.id, p2.id)
         if key in self.matrice_distances:
             return self.matrice_distances[key]
         return p1.distance_vers(p2)
     
+    def _arret(self) -> bool:
+        """Échéance dépassée ou annulation demandée : les boucles s'arrêtent (solution en cours gardée)."""
+        return self.jeton.expire()
+    
     def _precompute_neighbor_pruning(self, points: List[Point], k: int = K_NEIGHBORS) -> Dict[int, List[int]]:
         """
         Précalcule les K plus proches voisins de chaque point (par id).
@@ -254,6 +320,18 @@ class OptimiseurRoutes:
             result[p.id] = [pid for _, pid in dists[:k]]
         return result
     
+    def _camion_accepte_point(self, camion: Dict, point: Point) -> bool:
+        """
+        Vrai si le camion peut desservir le point.
+        zones_accessibles = liste d'IDs de ZONES (pas d'IDs de points) ; un point
+        sans zone_id n'est pas filtré (tous les points assignables).
+        """
+        zones_accessibles = camion.get('zones_accessibles', [])
+        if not zones_accessibles:
+            return True
+        point_zone_id = getattr(point, 'zone_id', None)
+        return point_zone_id is None or point_zone_id in zones_accessibles
+    
     def _trouver_dechetterie_plus_proche(self, point: Point) -> Tuple[Optional[Point], float]:
         """
         Trouve la déchetterie la plus proche d'un point donné.
@@ -370,44 +448,58 @@ class OptimiseurRoutes:
         
         return distance
     
-    def _calculer_borne_inferieure_mst(self, points: List[Point]) -> float:
+    def _matrice_dense(self, points: List[Point]) -> np.ndarray:
         """
-        Calcule une borne inférieure via l'arbre couvrant minimal (MST).
-        
-        Pour un TSP, la borne MST garantit: optimal >= MST_cost.
-        Complexité: O(n²) avec l'algorithme de Prim.
-        
+        Matrice dense des distances entre `points` (ordre de la liste).
+        Euclidienne vectorisée sans OSRM ; sinon lue dans la matrice OSRM / MatriceTrajets.
+        """
+        if self.matrice_trajets is not None:
+            distances, durees = self.matrice_trajets.sous_matrices([p.id for p in points])
+            return durees if self.objectif == "temps" else distances
+        if not self.use_osrm:
+            return matrice_euclidienne([p.x for p in points], [p.y for p in points])
+        return np.array([[self._distance(p, q) for q in points] for p in points], dtype=float)
+
+    def _calculer_borne_inferieure(self, temps_max: Optional[float] = None) -> float:
+        """
+        Borne inférieure de la distance totale : Held-Karp (1-arbre + sous-gradient)
+        sur dépôt + points, avec terme de capacité (vidages minimaux en déchetterie).
+        Voir borne_inferieure.py. Durée plafonnée par temps_max (défaut BORNE_TEMPS_MAX,
+        et 10 % du time_limit s'il est fourni).
+
         Returns:
-            Borne inférieure en km (toujours <= solution optimale)
+            Borne inférieure en km, en minutes si l'objectif est "temps" (toujours <= solution optimale)
         """
+        points = [self.depot] + self.points_collecte
         if len(points) < 2:
+            self._borne_details = None
             return 0.0
-        
-        n = len(points)
-        in_mst = [False] * n
-        min_cost = [float('inf')] * n
-        min_cost[0] = 0.0
-        mst_cost = 0.0
-        
-        for _ in range(n):
-            u = -1
-            for i in range(n):
-                if not in_mst[i] and (u == -1 or min_cost[i] < min_cost[u]):
-                    u = i
-            
-            if u == -1 or min_cost[u] == float('inf'):
-                break
-            
-            in_mst[u] = True
-            mst_cost += min_cost[u]
-            
-            for v in range(n):
-                if not in_mst[v]:
-                    d = self._distance(points[u], points[v])
-                    if d < min_cost[v]:
-                        min_cost[v] = d
-        
-        return mst_cost
+        if temps_max is None:
+            temps_max = BORNE_TEMPS_MAX
+        if self.time_limit_seconds:
+            temps_max = min(temps_max, 0.1 * self.time_limit_seconds)
+        restant = self.jeton.temps_restant()
+        if restant is not None:
+            temps_max = min(temps_max, restant)
+        W = self._matrice_dense(points)
+        dist_dech = None
+        if self.dechetteries:
+            if self._cout_matriciel:
+                dist_dech = np.array([
+                    min(min(self._distance(p, d), self._distance(d, p)) for d in self.dechetteries)
+                    for p in points
+                ])
+            else:
+                dist_dech = np.hypot(
+                    np.array([p.x for p in points])[:, None] - np.array([d.x for d in self.dechetteries])[None, :],
+                    np.array([p.y for p in points])[:, None] - np.array([d.y for d in self.dechetteries])[None, :],
+                ).min(axis=1)
+        capacite_max = max((c.get("capacite", 0) for c in self.camions), default=0)
+        self._borne_details = calculer_borne_inferieure(
+            W, [p.volume for p in self.points_collecte], capacite_max,
+            dist_dechetterie=dist_dech, temps_max=temps_max
+        )
+        return self._borne_details["borne"]
     
     def _trois_opt(self, route: List[Point], max_iterations: int = 15) -> List[Point]:
         """
@@ -429,6 +521,8 @@ class OptimiseurRoutes:
             n = len(route_opt)
             
             for i in range(1, min(n - 4, 15)):  # Limiter pour performance
+                if self._arret():
+                    return route_opt
                 for j in range(i + 2, min(n - 2, i + 12)):
                     for k in range(j + 2, min(n - 1, j + 12)):
                         a, b, c, d = (route_opt[:i+1], route_opt[i+1:j+1], 
@@ -477,15 +571,15 @@ class OptimiseurRoutes:
         meilleur_cout = cout_actuel
         t = t_initial
         n = len(route_sa)
+        # Dernier indice inversable : le dépôt de retour reste en fin de route
+        fin = n - 2 if route_sa[-1].type_point == "depot" else n - 1
         
         for _ in range(max_iter):
-            if t < t_min:
+            if t < t_min or self._arret():
                 break
-            # i < j avec segment [i..j] de taille >= 2 (évite boucle infinie)
-            i = random.randint(1, n - 2)
-            j = random.randint(i + 1, n - 1) if i + 1 <= n - 1 else i + 1
-            if j > n - 1:
-                continue
+            # i < j <= fin avec segment [i..j] de taille >= 2
+            i = random.randint(1, fin - 1)
+            j = random.randint(i + 1, fin)
             
             # Voisin 2-opt
             route_voisin = route_sa[:i] + route_sa[i:j+1][::-1] + route_sa[j+1:]
@@ -537,6 +631,8 @@ class OptimiseurRoutes:
             
             # 2-opt classique : essayer toutes les paires (i, j)
             for i in range(1, len(route_opt) - 2):
+                if self._arret():
+                    return route_opt
                 for j in range(i + 1, len(route_opt) - 1):
                     # Calculer le gain du swap 2-opt
                     # Avant: ... -> route[i-1] -> route[i] -> ... -> route[j] -> route[j+1] -> ...
@@ -592,7 +688,7 @@ class OptimiseurRoutes:
         improved = True
         total_iterations = 0
         
-        while improved and total_iterations < max_iterations:
+        while improved and total_iterations < max_iterations and not self._arret():
             improved = False
             total_iterations += 1
             
@@ -601,6 +697,8 @@ class OptimiseurRoutes:
             
             # Trouver le meilleur swap possible
             for i in range(1, len(route_opt) - 2):
+                if self._arret():
+                    break  # applique le meilleur swap déjà trouvé puis s'arrête
                 for j in range(i + 2, len(route_opt) - 1):
                     # Distance actuelle des arêtes (i-1,i) et (j,j+1)
                     d1 = self._distance(route_opt[i-1], route_opt[i])
@@ -637,7 +735,7 @@ class OptimiseurRoutes:
         id_to_idx = {route_opt[i].id: i for i in range(len(route_opt)) if route_opt[i].type_point == "collecte"}
         improved = True
         it = 0
-        while improved and it < max_iterations:
+        while improved and it < max_iterations and not self._arret():
             improved = False
             it += 1
             best_gain = 0.0
@@ -675,7 +773,7 @@ class OptimiseurRoutes:
         id_to_idx = {route_opt[i].id: i for i in range(len(route_opt)) if route_opt[i].type_point == "collecte"}
         amelioration = True
         it = 0
-        while amelioration and it < max_iterations:
+        while amelioration and it < max_iterations and not self._arret():
             amelioration = False
             it += 1
             for seg_size in [1, 2]:
@@ -725,65 +823,6 @@ class OptimiseurRoutes:
     def _volume_route(self, route: List[Point]) -> float:
         return sum(p.volume for p in route if p.type_point == "collecte")
     
-    def _lns_destroy_reconstruct(self, routes_meta: List[Dict], neighbors: Dict[int, List[int]],
-                                 unassigned: List[Point]) -> List[Dict]:
-        """Réinsère les points unassigned dans les routes (meilleure position avec neighbor pruning).
-        Ne laisse jamais un point non réinséré si une route a de la capacité : fallback sur toutes
-        les positions pour éviter de perdre des points (couverture 100 %)."""
-        pts_avant = self._count_points_in_routes([{"route": r["route"], "capacite": r["capacite"], "camion_id": r["camion_id"]} for r in routes_meta])
-        routes_meta = [{"route": list(r["route"]), "capacite": r["capacite"], "camion_id": r["camion_id"]} for r in routes_meta]
-        nb_unassigned = len(unassigned)
-        _debug("_lns_destroy_reconstruct: unassigned=", nb_unassigned, "points à réinsérer, pts_avant=", pts_avant)
-        reinserted = 0
-        for p in sorted(unassigned, key=lambda x: -x.volume):
-            best_delta = float("inf")
-            best_ri, best_pos = -1, -1
-            for ri, rm in enumerate(routes_meta):
-                route = rm["route"]
-                # Routes LNS sont "collectes seulement" (sans déchetteries) : le volume total peut
-                # dépasser la capacité car les déchetteries sont réinsérées plus tard. On n'exclut
-                # pas une route pour capacité ici, pour ne jamais perdre de points.
-                collecte_ids_in_route = [route[i].id for i in range(1, len(route) - 1)]
-                positions_to_try = set()
-                for nid in neighbors.get(p.id, []):
-                    if nid not in collecte_ids_in_route:
-                        continue
-                    idx = next((i for i in range(1, len(route) - 1) if route[i].id == nid), -1)
-                    if idx >= 0:
-                        positions_to_try.add(idx + 1)
-                positions_to_try.add(1)
-                positions_to_try.add(len(route) - 1)
-                for pos in positions_to_try:
-                    if pos < 1 or pos > len(route):
-                        continue
-                    before = route[pos - 1]
-                    after = route[pos] if pos < len(route) else self.depot
-                    delta = (self._distance(before, p) + self._distance(p, after) -
-                             self._distance(before, after))
-                    if delta < best_delta:
-                        best_delta = delta
-                        best_ri, best_pos = ri, pos
-            # Fallback : si aucune position via voisins, essayer toutes les routes et toutes les positions
-            if best_ri < 0:
-                for ri, rm in enumerate(routes_meta):
-                    route = rm["route"]
-                    for pos in range(1, len(route)):
-                        before = route[pos - 1]
-                        after = route[pos] if pos < len(route) else self.depot
-                        delta = (self._distance(before, p) + self._distance(p, after) -
-                                 self._distance(before, after))
-                        if delta < best_delta:
-                            best_delta = delta
-                            best_ri, best_pos = ri, pos
-            if best_ri >= 0:
-                routes_meta[best_ri]["route"].insert(best_pos, p)
-                reinserted += 1
-            else:
-                _debug("  POINT PERDU (non réinséré): id=", p.id, "vol=", p.volume)
-        pts_apres = self._count_points_in_routes(routes_meta)
-        _debug("_lns_destroy_reconstruct: réinsérés=", reinserted, "/", nb_unassigned, "pts_apres=", pts_apres)
-        return routes_meta
-    
     def _count_points_in_routes(self, routes_meta: List[Dict]) -> int:
         """Nombre total de points de collecte dans les routes (pour préserver la couverture)."""
         return sum(
@@ -794,14 +833,21 @@ class OptimiseurRoutes:
     def _lns_optimize(self, routes_meta: List[Dict], neighbors: Dict[int, List[int]],
                       time_start: float, time_limit: Optional[float]) -> Tuple[List[Dict], int, float]:
         """
-        Large Neighborhood Search : destroy (10-30%) puis reconstruct avec neighbor pruning.
+        Adaptive Large Neighborhood Search : à chaque itération, un opérateur destroy et un
+        opérateur repair sont tirés à la roulette (poids appris en ligne, voir alns.py).
+        Acceptation par recuit simulé sur la solution courante ; la meilleure est conservée à part.
         N'accepte jamais une solution qui couvre moins de points que la meilleure courante
         (évite la chute de couverture type 21 % au lieu de 100 %).
         Retourne (routes_améliorées, nb_iterations, cout_final).
         """
-        best = [{"route": list(r["route"]), "capacite": r["capacite"], "camion_id": r["camion_id"]} for r in routes_meta]
-        best_cost = self._cout_routes(best)
+        moteur = self._get_moteur_alns()
+        moteur.preparer(neighbors)
+        current = [{"route": list(r["route"]), "capacite": r["capacite"], "camion_id": r["camion_id"]} for r in routes_meta]
+        current_cost = self._cout_routes(current)
+        best = current
+        best_cost = current_cost
         best_count = self._count_points_in_routes(best)
+        self._publier_progression("lns", best, 0)
         _debug("_lns_optimize: initial best_count=", best_count, "nb_routes=", len(best))
         T = LNS_T_INITIAL
         nb_iter = 0
@@ -810,37 +856,53 @@ class OptimiseurRoutes:
         while nb_iter < max_iter:
             if time_limit and (time.time() - time_start) >= time_limit * 0.98:
                 break
+            if self._arret():
+                break
             nb_iter += 1
-            current = [{"route": list(r["route"]), "capacite": r["capacite"], "camion_id": r["camion_id"]} for r in best]
-            unassigned = []
-            for rm in current:
-                route = rm["route"]
-                collectes = [i for i in range(1, len(route) - 1) if route[i].type_point == "collecte"]
-                if not collectes:
-                    continue
-                n_remove = max(1, int(len(collectes) * (LNS_DESTROY_MIN + _random.random() * (LNS_DESTROY_MAX - LNS_DESTROY_MIN))))
-                to_remove = _random.sample(collectes, min(n_remove, len(collectes)))
-                to_remove.sort(reverse=True)
-                for idx in to_remove:
-                    unassigned.append(route[idx])
-                    del route[idx]
-            current = self._lns_destroy_reconstruct(current, neighbors, unassigned)
-            cost = self._cout_routes(current)
-            current_count = self._count_points_in_routes(current)
+            op_destroy = moteur.choisir(moteur.operateurs_destroy)
+            op_repair = moteur.choisir(moteur.operateurs_repair)
+            candidate = [{"route": list(r["route"]), "capacite": r["capacite"], "camion_id": r["camion_id"]} for r in current]
+            t0 = time.perf_counter()
+            unassigned = op_destroy.fonction(candidate, moteur.taille_destruction(best_count))
+            t1 = time.perf_counter()
+            op_repair.fonction(candidate, unassigned)
+            t2 = time.perf_counter()
+            cost = self._cout_routes(candidate)
+            candidate_count = self._count_points_in_routes(candidate)
+            score, accepte, ameliore, meilleure = 0.0, False, False, False
             # Ne jamais accepter une solution qui couvre moins de points (préserve 100 % couverture)
-            if current_count < best_count:
+            if candidate_count < best_count:
                 rejections_lost += 1
                 if (_COVERAGE_DEBUG_ENV or _DEBUG_COVERAGE_THIS_RUN) and rejections_lost <= 5:
-                    _debug("_lns_optimize: rejet (perte points) iter=", nb_iter, "current_count=", current_count, "best_count=", best_count)
-                continue
-            delta = cost - best_cost
-            if delta <= 0 or (T > 0.01 and _random.random() < math.exp(-delta / T)):
-                best = current
-                best_cost = cost
-                best_count = current_count
+                    _debug("_lns_optimize: rejet (perte points) iter=", nb_iter, "candidate_count=", candidate_count, "best_count=", best_count)
+            else:
+                delta = cost - current_cost
+                if cost < best_cost - 1e-9:
+                    score, accepte, ameliore, meilleure = ALNS_SIGMA_BEST, True, True, True
+                elif delta < -1e-9:
+                    score, accepte, ameliore = ALNS_SIGMA_BETTER, True, True
+                elif T > 0.01 and _random.random() < math.exp(-max(delta, 0.0) / T):
+                    score, accepte = ALNS_SIGMA_ACCEPTED, True
+                if accepte:
+                    current, current_cost = candidate, cost
+                if meilleure:
+                    best, best_cost, best_count = candidate, cost, candidate_count
+                    self._publier_progression("lns", best, nb_iter)
+            if not meilleure:
+                self._publier_progression("lns", None, nb_iter)  # battement : itération en cours
+            moteur.enregistrer(op_destroy, score, t1 - t0, accepte, ameliore, meilleure)
+            moteur.enregistrer(op_repair, score, t2 - t1, accepte, ameliore, meilleure)
+            if nb_iter % ALNS_SEGMENT == 0:
+                moteur.fin_segment()
             T *= LNS_ALPHA
         _debug("_lns_optimize: fin nb_iter=", nb_iter, "best_count=", best_count, "rejections_lost=", rejections_lost)
-        return best, nb_iter, self._cout_routes(best)
+        return best, nb_iter, best_cost
+
+    def _get_moteur_alns(self) -> MoteurALNS:
+        """Moteur ALNS partagé par tous les appels LNS (les poids appris sont conservés entre secteurs)."""
+        if getattr(self, "_moteur_alns", None) is None:
+            self._moteur_alns = MoteurALNS(self)
+        return self._moteur_alns
     
     def _decomposition_geographique(self, points: List[Point]) -> List[List[Point]]:
         """
@@ -886,22 +948,11 @@ class OptimiseurRoutes:
             for i, cid in enumerate(camion_ids):
                 sector_camions[i % len(sectors)].append(cid)
             _debug("sector_camions: camions par secteur=", [len(sc) for sc in sector_camions])
-            all_routes_meta = []
-            total_lns_iter = 0
+            routes_par_secteur = {}
             for si, sector_points in enumerate(sectors):
                 if not sector_points:
                     _debug("secteur", si, ": vide, ignoré")
                     continue
-                time_remaining = None
-                if time_limit and time_start:
-                    elapsed = time.time() - time_start
-                    remaining = time_limit - elapsed
-                    per_sector = max(2.0, (time_limit * 0.9) / len(sectors))
-                    time_remaining = min(remaining, per_sector)
-                    if time_remaining <= 0:
-                        time_remaining = 0
-                # Ne jamais sauter un secteur : on traite tous les secteurs pour garantir
-                # 100 % de couverture ; si le temps est dépassé, LNS fera peu d'itérations.
                 camions_s = [c for c in self.camions if c["id"] in sector_camions[si]]
                 if not camions_s:
                     _debug("secteur", si, ": AUCUN CAMION assigné ->", len(sector_points), "points PERDUS")
@@ -927,8 +978,31 @@ class OptimiseurRoutes:
                 if not routes_meta:
                     _debug("secteur", si, ": routes_meta vide ->", len(sector_points), "points PERDUS")
                     continue
+                routes_par_secteur[si] = routes_meta
+            self._publier_progression(
+                "construction", [rm for rms in routes_par_secteur.values() for rm in rms]
+            )
+            all_routes_meta = []
+            total_lns_iter = 0
+            for si, routes_meta in routes_par_secteur.items():
+                sector_points = sectors[si]
+                time_remaining = None
+                if time_limit and time_start:
+                    elapsed = time.time() - time_start
+                    remaining = time_limit - elapsed
+                    per_sector = max(2.0, (time_limit * 0.9) / len(sectors))
+                    time_remaining = min(remaining, per_sector)
+                    if time_remaining <= 0:
+                        time_remaining = 0
+                # Ne jamais sauter un secteur : on traite tous les secteurs pour garantir
+                # 100 % de couverture ; si le temps est dépassé, LNS fera peu d'itérations.
+                # Instantané anytime : secteurs déjà optimisés + routes initiales des suivants
+                self._routes_fixes = all_routes_meta + [
+                    rm for sj, rms in routes_par_secteur.items() if sj > si for rm in rms
+                ]
+                self.jeton.verifier()
                 neighbors = self._precompute_neighbor_pruning(sector_points)
-                ts = time_start if time_remaining else None
+                ts = time.time() if time_remaining else None  # budget propre au secteur
                 routes_meta, n_iter, _ = self._lns_optimize(routes_meta, neighbors, ts, time_remaining)
                 total_lns_iter += n_iter
                 pts_dans_routes = sum(sum(1 for p in rm["route"] if p.type_point == "collecte") for rm in routes_meta)
@@ -950,9 +1024,13 @@ class OptimiseurRoutes:
             for pts in points_par_camion.values():
                 all_points.extend(pts)
             neighbors = self._precompute_neighbor_pruning(all_points)
+            self._publier_progression("construction", routes_meta)
             routes_meta, total_lns_iter, _ = self._lns_optimize(routes_meta, neighbors, time_start, time_limit)
             technique = "LNS+neighbor_pruning"
             all_routes_meta = routes_meta
+        self._routes_fixes = []
+        self._publier_progression("finalisation", all_routes_meta)
+        self.jeton.verifier()
         pts_avant_2opt = sum(sum(1 for p in rm["route"] if p.type_point == "collecte") for rm in all_routes_meta)
         _debug("avant 2-opt final: pts dans all_routes_meta=", pts_avant_2opt)
         for rm in all_routes_meta:
@@ -1103,11 +1181,13 @@ class OptimiseurRoutes:
         improved = True
         iterations = 0
         
-        while improved and iterations < max_iterations:
+        while improved and iterations < max_iterations and not self._arret():
             improved = False
             iterations += 1
             
             for i in range(1, len(route) - 2):
+                if self._arret():
+                    break
                 for j in range(i + 2, len(route) - 1):
                     # Vérifier si les segments se croisent
                     if self._segments_se_croisent(route[i-1], route[i], route[j], route[j+1]):
@@ -1163,7 +1243,7 @@ class OptimiseurRoutes:
         improved = True
         iterations = 0
         
-        while improved and iterations < max_iterations and croisements_restants > 0:
+        while improved and iterations < max_iterations and croisements_restants > 0 and not self._arret():
             improved = False
             iterations += 1
             
@@ -1182,6 +1262,8 @@ class OptimiseurRoutes:
             
             # Essayer de résoudre chaque croisement
             for (i, j) in croisements:
+                if self._arret():
+                    break
                 # Essayer l'inversion 2-opt standard
                 route_test = route[:i+1] + route[i+1:j+1][::-1] + route[j+1:]
                 
@@ -1205,7 +1287,7 @@ class OptimiseurRoutes:
                             break
         
         # Stratégie 2: Si des croisements persistent, essayer de réorganiser localement
-        if croisements_restants > 0:
+        if croisements_restants > 0 and not self._arret():
             # Identifier les points impliqués dans les croisements
             points_impliques = set()
             n = len(route)
@@ -1223,6 +1305,8 @@ class OptimiseurRoutes:
             if len(points_impliques) >= 2:
                 points_list = sorted(points_impliques)
                 for pi in range(len(points_list)):
+                    if self._arret():
+                        break
                     for pj in range(pi + 1, len(points_list)):
                         idx_i, idx_j = points_list[pi], points_list[pj]
                         
@@ -1271,6 +1355,8 @@ class OptimiseurRoutes:
             
             for segment_size in [1, 2, 3]:
                 for i in range(1, len(route) - segment_size - 1):
+                    if self._arret():
+                        return route
                     # Ne pas déplacer le dépôt (premier et dernier élément)
                     if route[i].type_point == "depot":
                         continue
@@ -1352,6 +1438,8 @@ class OptimiseurRoutes:
             
             for segment_size in [1, 2, 3]:  # Taille du segment à déplacer
                 for i in range(1, len(route) - segment_size - 1):
+                    if self._arret():
+                        return route
                     # Ne pas déplacer le dépôt
                     if any(route[i+k].type_point == "depot" for k in range(segment_size)):
                         continue
@@ -1473,6 +1561,8 @@ class OptimiseurRoutes:
         best_route = list(points)
         best_cout = self._calculer_distance_route(best_route)
         for _ in range(max_restarts):
+            if self._arret():
+                break
             # Perturbation : 2-opt aléatoire (un seul swap)
             i = _random.randint(1, n - 2)
             j = _random.randint(i + 1, n - 1) if i + 1 < n else i + 1
@@ -1525,13 +1615,8 @@ class OptimiseurRoutes:
             meilleure_charge = float('inf')
             
             for camion in self.camions:
-                # zones_accessibles = liste d'IDs de ZONES (pas d'IDs de points)
-                zones_accessibles = camion.get('zones_accessibles', [])
-                if zones_accessibles:
-                    point_zone_id = getattr(point, 'zone_id', None)
-                    if point_zone_id is not None and point_zone_id not in zones_accessibles:
-                        continue
-                    # pas de zone_id sur le point : on ne filtre pas (tous les points assignables)
+                if not self._camion_accepte_point(camion, point):
+                    continue
                 
                 charge_actuelle = sum(p.volume for p in points_par_camion[camion['id']])
                 # Capacité : on autorise les déchetteries donc pas de rejet ici
@@ -1555,15 +1640,18 @@ class OptimiseurRoutes:
         else:
             print("[Optimiseur] points assignés:", n_assignes, "/", n_points_total)
         
-        # Borne inférieure (MST) pour évaluation de la qualité (sautée en xlarge pour éviter lenteur)
-        strat_global = self._get_optimisation_strategy(n_points_total, n_points_total)
-        if strat_global["profile"] == "xlarge":
-            self._borne_inferieure = 0.0
-            print("[Optimiseur] MST skippé (profil xlarge)")
-        else:
-            points_pour_mst = [self.depot] + self.points_collecte
-            self._borne_inferieure = self._calculer_borne_inferieure_mst(points_pour_mst)
-            print("[Optimiseur] après MST")
+        # Borne inférieure (Held-Karp + capacité) pour évaluation de la qualité (gap), tous profils
+        self._borne_inferieure = self._calculer_borne_inferieure()
+        print("[Optimiseur] borne inférieure:", round(self._borne_inferieure, 2), "km")
+        
+        # Anytime : première solution (répartition brute) publiée avant toute amélioration
+        instantane_par_camion = {
+            c['id']: {"route": [self.depot] + points_par_camion[c['id']] + [self.depot],
+                      "capacite": c['capacite'], "camion_id": c['id']}
+            for c in self.camions if points_par_camion[c['id']]
+        }
+        self._publier_progression("construction", list(instantane_par_camion.values()))
+        self.jeton.verifier()
         
         # Statistiques des croisements
         total_croisements_avant = 0
@@ -1594,6 +1682,7 @@ class OptimiseurRoutes:
                     (1 - total_croisements_apres / total_croisements_avant) * 100, 1
                 )
             }
+            self._publier_solution_finale()
             return self.routes_optimisees
         
         # Construire et optimiser la route pour chaque camion (small / medium)
@@ -1602,6 +1691,7 @@ class OptimiseurRoutes:
             
             if not points_camion:
                 continue
+            self.jeton.verifier()
             
             # 1. Construction initiale avec Nearest Neighbor (inclut déchetteries)
             route_initiale = self._nearest_neighbor_avec_dechetteries(
@@ -1688,6 +1778,10 @@ class OptimiseurRoutes:
                 route_obj.ajouter_waypoint(point)
             
             self.routes_optimisees.append(route_obj)
+            instantane_par_camion[camion['id']] = {
+                "route": route_finale, "capacite": camion['capacite'], "camion_id": camion['id']
+            }
+            self._publier_progression("amelioration", list(instantane_par_camion.values()))
         
         # Stocker les statistiques de croisements globales
         self._croisements_stats = {
@@ -1697,9 +1791,397 @@ class OptimiseurRoutes:
                 (1 - total_croisements_apres / max(total_croisements_avant, 1)) * 100, 1
             ) if total_croisements_avant > 0 else 100.0
         }
+        self._publier_solution_finale()
         
         return self.routes_optimisees
     
+    def _charges_trajets(self, route: List[Point]) -> List[float]:
+        """
+        Pour chaque arête (i-1, i) de la route, charge du trajet (entre deux vidages)
+        qui la contient. Sert à l'insertion au moindre coût sous contrainte de capacité.
+        """
+        charges = [0.0] * len(route)
+        debut, charge = 1, 0.0
+        for i in range(1, len(route)):
+            if route[i].type_point == "collecte":
+                charge += route[i].volume
+                continue
+            for j in range(debut, i + 1):
+                charges[j] = charge
+            debut, charge = i + 1, 0.0
+        return charges
+
+    def _reparer_capacite(self, route: List[Point], capacite: float) -> List[Point]:
+        """
+        Rétablit la capacité sur une route qui conserve ses vidages précédents :
+        ajoute une déchetterie avant le point qui ferait déborder le trajet,
+        retire les vidages devenus inutiles (trajet vide) et vide le camion avant le retour.
+        """
+        nouvelle = [route[0]]
+        charge = 0.0
+        for point in route[1:-1]:
+            if point.type_point == "dechetterie":
+                if charge > 0:
+                    nouvelle.append(point)
+                    charge = 0.0
+                continue
+            if point.type_point != "collecte":
+                continue
+            if charge + point.volume > capacite and charge > 0:
+                dech, _ = self._trouver_dechetterie_plus_proche(nouvelle[-1])
+                if dech:
+                    nouvelle.append(dech)
+                    charge = 0.0
+            nouvelle.append(point)
+            charge += point.volume
+        if charge > 0 and self.dechetteries:
+            dech, _ = self._trouver_dechetterie_plus_proche(nouvelle[-1])
+            if dech:
+                nouvelle.append(dech)
+        nouvelle.append(route[-1])
+        return nouvelle
+
+    def _recherche_locale_germes(self, route: List[Point], capacite: float, germes: set,
+                                 max_iterations: int = REOPT_MAX_ITER_LOCAL) -> List[Point]:
+        """
+        Relocate + 2-opt autour des points modifiés (germes), déchetteries comprises.
+        Seuls les mouvements entre un germe et ses REOPT_K_VOISINS plus proches voisins
+        sont évalués ; chaque mouvement améliorant est validé en capacité.
+        """
+        route = list(route)
+        collectes = [p for p in route if p.type_point == "collecte"]
+        voisins = {}
+        for g in collectes:
+            if g.id in germes:
+                voisins[g.id] = sorted(
+                    (q for q in collectes if q.id != g.id), key=lambda q: self._distance(g, q)
+                )[:REOPT_K_VOISINS]
+        if not voisins:
+            return route
+        d = self._distance
+        for _ in range(max_iterations):
+            if self._arret():
+                break
+            meilleur_gain, meilleure_route = 1e-6, None
+            idx = {p.id: i for i, p in enumerate(route) if p.type_point == "collecte"}
+            for gid, proches in voisins.items():
+                i = idx[gid]
+                g = route[i]
+                gain_retrait = d(route[i - 1], g) + d(g, route[i + 1]) - d(route[i - 1], route[i + 1])
+                sans_g = route[:i] + route[i + 1:]
+                for q in proches:
+                    j = idx[q.id]
+                    # Relocate : g juste avant ou juste après q
+                    jj = j if j < i else j - 1
+                    for pos in (jj, jj + 1):
+                        if pos < 1 or pos > len(sans_g) - 1 or pos == i:
+                            continue
+                        delta = d(sans_g[pos - 1], g) + d(g, sans_g[pos]) - d(sans_g[pos - 1], sans_g[pos])
+                        if gain_retrait - delta > meilleur_gain:
+                            candidate = sans_g[:pos] + [g] + sans_g[pos:]
+                            if self._valider_route_capacite(candidate, capacite):
+                                meilleur_gain, meilleure_route = gain_retrait - delta, candidate
+                    # 2-opt : arêtes (a-1, a) et (b, b+1) -> (a-1, b) et (a, b+1)
+                    a, b = min(i, j), max(i, j)
+                    if b - a < 1:
+                        continue
+                    gain = (d(route[a - 1], route[a]) + d(route[b], route[b + 1])
+                            - d(route[a - 1], route[b]) - d(route[a], route[b + 1]))
+                    if gain > meilleur_gain:
+                        candidate = route[:a] + route[a:b + 1][::-1] + route[b + 1:]
+                        if self._valider_route_capacite(candidate, capacite):
+                            meilleur_gain, meilleure_route = gain, candidate
+            if meilleure_route is None:
+                break
+            route = meilleure_route
+        return route
+
+    def reoptimiser_routes(self, routes_precedentes: List[Dict],
+                           modifications: Optional[Dict] = None) -> List[RouteOptimisee]:
+        """
+        Ré-optimisation incrémentale (warm start) à partir d'une solution précédente.
+
+        Les routes non touchées sont conservées telles quelles. Sur les routes affectées,
+        les visites en déchetterie existantes sont gardées et seuls les changements sont réparés :
+        1. Retrait des points supprimés (et des points déplacés, réinsérés ensuite)
+        2. Insertion au moindre coût des points ajoutés / déplacés / non couverts
+           (positions respectant la capacité du trajet en priorité)
+        3. Réparation de la capacité (vidage ajouté ou retiré localement)
+        4. Relocate et 2-opt restreints aux voisins des points modifiés
+
+        Complexité : O(m × n) pour m points modifiés, au lieu de la chaîne complète.
+
+        Args:
+            routes_precedentes: Routes au format RouteOptimisee.to_dict()
+            modifications: {"ajoutes": [...], "supprimes": [ids], "modifies": [...]} (optionnel ;
+                les écarts avec points_collecte sont de toute façon détectés)
+
+        Returns:
+            Liste des routes optimisées
+        """
+        time_start = time.time()
+        self.routes_optimisees = []
+        modifications = modifications or {}
+        points_par_id = {p.id: p for p in self.points_collecte}
+        dech_par_id = {d.id: d for d in self.dechetteries}
+        camions_par_id = {c['id']: c for c in self.camions}
+        ids_modifies = {m['id'] if isinstance(m, dict) else m for m in modifications.get('modifies', [])}
+
+        routes_meta = []
+        germes = set()  # ids autour desquels relancer la recherche locale
+        places = set()
+        nb_retires = 0
+        for r in routes_precedentes:
+            camion = camions_par_id.get(r.get('camion_id'))
+            waypoints = r.get('waypoints', [])
+            if camion is None:
+                # Camion retiré de la flotte : ses points sont réinsérés ailleurs
+                nb_retires += sum(
+                    1 for wp in waypoints if wp.get('type') == "collecte" and wp['id'] not in points_par_id
+                )
+                continue
+            route = [self.depot]
+            touchee = r.get('capacite', camion['capacite']) != camion['capacite']
+            for wp in waypoints[1:-1]:
+                if wp.get('type') == "dechetterie":
+                    if wp['id'] in dech_par_id:
+                        route.append(dech_par_id[wp['id']])
+                    else:
+                        touchee = True
+                    continue
+                if wp.get('type') != "collecte":
+                    continue
+                point = points_par_id.get(wp['id'])
+                if (point is None or point.id in places or not self._camion_accepte_point(camion, point)
+                        or (point.x, point.y) != (wp.get('x'), wp.get('y'))):
+                    # Supprimé, en double, hors zone ou déplacé : retiré (réinséré s'il existe encore)
+                    touchee = True
+                    if point is None:
+                        nb_retires += 1
+                    if route[-1].type_point == "collecte":
+                        germes.add(route[-1].id)
+                    continue
+                if point.volume != wp.get('volume') or point.id in ids_modifies:
+                    touchee = True
+                    germes.add(point.id)
+                route.append(point)
+                places.add(point.id)
+            route.append(self.depot)
+            routes_meta.append({
+                "route": route,
+                "capacite": camion['capacite'],
+                "camion_id": camion['id'],
+                "touchee": touchee,
+                "precedente": r,
+            })
+
+        # Camions sans route précédente : route vide, activable par insertion
+        ids_avec_route = {rm["camion_id"] for rm in routes_meta}
+        for camion in self.camions:
+            if camion['id'] not in ids_avec_route:
+                routes_meta.append({
+                    "route": [self.depot, self.depot],
+                    "capacite": camion['capacite'],
+                    "camion_id": camion['id'],
+                    "touchee": False,
+                    "precedente": None,
+                })
+
+        # Points ajoutés, déplacés ou absents de la solution précédente
+        a_inserer = sorted(
+            (p for p in self.points_collecte if p.id not in places),
+            key=lambda p: (-p.volume, p.id)
+        )
+        nb_inseres = 0
+        for point in a_inserer:
+            meilleur = None
+            for rm in routes_meta:
+                camion = camions_par_id[rm["camion_id"]]
+                if not self._camion_accepte_point(camion, point):
+                    continue
+                route = rm["route"]
+                charges = self._charges_trajets(route)
+                for pos in range(1, len(route)):
+                    delta = (self._distance(route[pos - 1], point) + self._distance(point, route[pos])
+                             - self._distance(route[pos - 1], route[pos]))
+                    if len(route) == 2:
+                        delta += camion.get('cout_fixe', 0)  # activation d'un camion inutilisé
+                    deborde = charges[pos] + point.volume > rm["capacite"]
+                    if meilleur is None or (deborde, delta) < (meilleur[0], meilleur[1]):
+                        meilleur = (deborde, delta, rm, pos)
+            if meilleur is None:
+                print("[Optimiseur] ATTENTION: point", point.id, "non assignable (vérifier zones_accessibles)")
+                continue
+            _, _, rm, pos = meilleur
+            rm["route"].insert(pos, point)
+            rm["touchee"] = True
+            germes.add(point.id)
+            nb_inseres += 1
+
+        total_croisements_avant = 0
+        total_croisements_apres = 0
+        nb_reoptimisees = 0
+        for rm in routes_meta:
+            precedente = rm["precedente"]
+            if len(rm["route"]) == 2 and precedente is None:
+                continue
+            route_obj = RouteOptimisee(rm["camion_id"], rm["capacite"])
+            stats_2opt = (precedente or {}).get('optimisation_2opt', {})
+            if not rm["touchee"]:
+                # Route inchangée : reprise telle quelle
+                route_obj.croisements_avant = stats_2opt.get('croisements_avant', 0)
+                route_obj.croisements_apres = stats_2opt.get('croisements_apres', 0)
+                route_finale = rm["route"]
+            else:
+                nb_reoptimisees += 1
+                route_finale = self._reparer_capacite(rm["route"], rm["capacite"])
+                route_finale = self._recherche_locale_germes(route_finale, rm["capacite"], germes)
+                route_obj.croisements_avant = stats_2opt.get('croisements_apres', 0)
+                route_obj.croisements_apres = self._compter_croisements(route_finale)
+            for point in route_finale:
+                route_obj.ajouter_waypoint(point)
+            total_croisements_avant += route_obj.croisements_avant
+            total_croisements_apres += route_obj.croisements_apres
+            self.routes_optimisees.append(route_obj)
+
+        self._croisements_stats = {
+            "total_avant": total_croisements_avant,
+            "total_apres": total_croisements_apres,
+            "elimination_pct": round(
+                (1 - total_croisements_apres / max(total_croisements_avant, 1)) * 100, 1
+            ) if total_croisements_avant > 0 else 100.0
+        }
+        self._strategie_profile = "warm_start"
+        self._borne_inferieure = self._calculer_borne_inferieure(temps_max=REOPT_BORNE_TEMPS)
+        self._reoptimisation = {
+            "routes_reoptimisees": nb_reoptimisees,
+            "routes_conservees": len(self.routes_optimisees) - nb_reoptimisees,
+            "points_inseres": nb_inseres,
+            "points_retires": nb_retires,
+            "duree_s": round(time.time() - time_start, 4),
+        }
+        print("[Optimiseur] warm start:", self._reoptimisation)
+        self._publier_solution_finale()
+        return self.routes_optimisees
+    
+    def _publier_solution_finale(self) -> None:
+        """Publie les routes finales (phase « termine »)."""
+        self._routes_fixes = []
+        self._publier_progression("termine", [
+            {"route": r.waypoints, "capacite": r.capacite, "camion_id": r.camion_id}
+            for r in self.routes_optimisees
+        ])
+
+    def _publier_progression(self, phase: str, routes_meta: Optional[List[Dict]] = None,
+                             iteration: Optional[int] = None) -> None:
+        """
+        Anytime : mémorise la meilleure solution connue et notifie callback_progression.
+
+        routes_meta n'est pas copié : une solution publiée n'est plus modifiée en place
+        (LNS : candidates recopiées à chaque itération). Les routes des autres secteurs
+        (_routes_fixes) complètent l'instantané. Une publication au plus toutes les
+        PROGRESSION_INTERVALLE s, sauf au changement de phase.
+
+        L'événement ne porte que les métriques ; la solution au format de l'API n'est
+        construite que si l'appelant appelle evenement["solution_courante"]() (instantané
+        de cette publication, to_dict() en phase « termine »).
+        """
+        if routes_meta is not None:
+            self._instantane = list(self._routes_fixes) + list(routes_meta)
+        if self.callback_progression is None:
+            return
+        maintenant = time.time()
+        if phase == self._phase and maintenant - self._derniere_publication < PROGRESSION_INTERVALLE:
+            return
+        self._phase = phase
+        self._derniere_publication = maintenant
+        if phase == "termine":
+            statistiques = self.calculer_statistiques_globales()
+            solution_courante = self.to_dict
+        elif self._instantane is not None:
+            routes = self._routes_instantane(self._instantane)
+            statistiques = self._statistiques_instantane(routes)
+            solution_courante = lambda: self._solution_instantane(routes, statistiques)
+        else:
+            statistiques = {}
+            solution_courante = lambda: None
+        self.callback_progression({
+            "phase": phase,
+            "iteration": iteration,
+            "temps_s": round(maintenant - self._debut_progression, 3),
+            "distance_totale": statistiques.get("distance_totale"),
+            "gap_pourcent": statistiques.get("gap_pourcent"),
+            "nb_points_couverts": statistiques.get("nb_points_couverts", statistiques.get("nb_points_collecte")),
+            "solution_courante": solution_courante,
+        })
+
+    def _routes_instantane(self, instantane: List[Dict]) -> List[RouteOptimisee]:
+        """Routes d'un instantané, déchetteries réinsérées en O(n) par _reparer_capacite."""
+        routes = []
+        for rm in instantane:
+            route_obj = RouteOptimisee(rm["camion_id"], rm["capacite"])
+            for point in self._reparer_capacite(rm["route"], rm["capacite"]):
+                route_obj.ajouter_waypoint(point)
+            routes.append(route_obj)
+        return routes
+
+    def _statistiques_instantane(self, routes: List[RouteOptimisee]) -> Dict:
+        distance_totale = sum(r.calculer_distance_totale() for r in routes)
+        borne = getattr(self, '_borne_inferieure', 0)
+        cout = self._cout_solution(routes)
+        gap_pct = round((cout - borne) / max(borne, 0.001) * 100, 1) if borne > 0 else 0
+        return {
+            "distance_totale": round(distance_totale, 2),
+            "duree_trajet_totale_minutes": self._duree_trajet_totale(routes),
+            "nb_camions_utilises": len(routes),
+            "nb_points_collecte": len(self.points_collecte),
+            "nb_points_couverts": sum(
+                1 for r in routes for p in r.waypoints if p.type_point == "collecte"
+            ),
+            **self._borne_dict(borne),
+            "gap_pourcent": gap_pct,
+            "phase": self._phase,
+            "partiel": True,
+        }
+
+    def _solution_instantane(self, routes: List[RouteOptimisee], statistiques: Dict) -> Dict:
+        return {
+            "routes": [self._route_dict(r) for r in routes],
+            "statistiques": statistiques,
+            **self._depot_et_dechetteries_dict(),
+        }
+
+    def solution_courante(self) -> Optional[Dict]:
+        """
+        Meilleure solution connue à cet instant (anytime), au format de to_dict().
+        Retourne None avant la première publication. Appelable depuis un autre thread.
+        """
+        instantane = self._instantane
+        if instantane is None:
+            return None
+        routes = self._routes_instantane(instantane)
+        return self._solution_instantane(routes, self._statistiques_instantane(routes))
+
+    def _depot_et_dechetteries_dict(self) -> Dict:
+        """Dépôt et déchetteries au format de l'API."""
+        return {
+            "depot": {
+                "id": self.depot.id,
+                "x": self.depot.x,
+                "y": self.depot.y,
+                "nom": self.depot.nom
+            },
+            "dechetteries": [
+                {
+                    "id": d.id,
+                    "x": d.x,
+                    "y": d.y,
+                    "nom": d.nom
+                }
+                for d in self.dechetteries
+            ]
+        }
+    
     def calculer_statistiques_globales(self) -> Dict:
         """Calcule les statistiques globales de l'optimisation."""
         if not self.routes_optimisees:
@@ -1737,12 +2219,15 @@ class OptimiseurRoutes:
             "elimination_pct": 100.0
         })
         
-        # Gap avec borne inférieure (qualité de la solution)
+        # Gap avec borne inférieure (qualité de la solution, dans l'unité de l'objectif)
         borne = getattr(self, '_borne_inferieure', 0)
-        gap_pct = round((distance_totale - borne) / max(borne, 0.001) * 100, 1) if borne > 0 else 0
+        cout = self._cout_solution(self.routes_optimisees)
+        gap_pct = round((cout - borne) / max(borne, 0.001) * 100, 1) if borne > 0 else 0
         
         return {
+            "objectif": self.objectif,
             "distance_totale": round(distance_totale, 2),
+            "duree_trajet_totale_minutes": self._duree_trajet_totale(self.routes_optimisees),
             "volume_total_collecte": round(volume_total, 2),
             "nb_camions_utilises": len(self.routes_optimisees),
             "nb_total_visites_dechetteries": nb_dechetteries_visites,
@@ -1752,12 +2237,18 @@ class OptimiseurRoutes:
             "moyenne_tonnage_par_km": round(moyenne_tonnage_par_km, 4),
             "nb_points_collecte": len(self.points_collecte),
             "nb_dechetteries_disponibles": len(self.dechetteries),
-            "borne_inferieure_km": round(borne, 2),
+            **self._borne_dict(borne),
+            "borne_inferieure_details": getattr(self, "_borne_details", None),
             "gap_pourcent": gap_pct,
             "use_osrm": getattr(self, 'use_osrm', False),
+            "osrm_cache": getattr(self, "_statistiques_osrm", None),
             "strategie_optimisation": getattr(self, "_strategie_profile", "hybride"),
             "technique_grande_instance": getattr(self, "_technique_grande_instance", None),
             "nb_iterations_lns": getattr(self, "_nb_iterations_lns", None),
+            "reoptimisation": getattr(self, "_reoptimisation", None),
+            "alns_operateurs": (
+                self._moteur_alns.statistiques() if getattr(self, "_moteur_alns", None) else None
+            ),
             "optimisation_2opt": {
                 "croisements_avant": croisements_stats.get("total_avant", 0),
                 "croisements_apres": croisements_stats.get("total_apres", 0),
@@ -1769,33 +2260,72 @@ class OptimiseurRoutes:
             }
         }
     
+    def _duree_route(self, route: RouteOptimisee) -> Optional[float]:
+        """Durée de trajet (minutes) d'une route, si les durées sont connues."""
+        if self.matrice_trajets is None:
+            return None
+        return self.matrice_trajets.duree_parcours([p.id for p in route.waypoints])
+
+    def _duree_trajet_totale(self, routes: List[RouteOptimisee]) -> Optional[float]:
+        if self.matrice_trajets is None:
+            return None
+        return round(sum(self._duree_route(r) for r in routes), 1)
+
+    def _cout_solution(self, routes: List[RouteOptimisee]) -> float:
+        """Coût total dans l'unité de l'objectif (comparable à la borne inférieure)."""
+        if self.objectif == "temps":
+            return sum(self._duree_route(r) for r in routes)
+        if self.matrice_trajets is not None:
+            return sum(self.matrice_trajets.distance_parcours([p.id for p in r.waypoints]) for r in routes)
+        return sum(r.calculer_distance_totale() for r in routes)
+
+    def _borne_dict(self, borne: float) -> Dict:
+        if self.objectif == "temps":
+            return {"borne_inferieure_km": None, "borne_inferieure_minutes": round(borne, 2)}
+        return {"borne_inferieure_km": round(borne, 2)}
+
+    def _route_dict(self, route: RouteOptimisee) -> Dict:
+        """RouteOptimisee.to_dict() complété par la durée de trajet (OSRM ou vitesse constante)."""
+        resultat = route.to_dict()
+        duree = self._duree_route(route)
+        if duree is not None:
+            resultat["duree_trajet_minutes"] = round(duree, 1)
+        return resultat
+
     def to_dict(self) -> Dict:
         """Convertit les résultats en dictionnaire pour l'API."""
         return {
-            "routes": [r.to_dict() for r in self.routes_optimisees],
+            "routes": [self._route_dict(r) for r in self.routes_optimisees],
             "statistiques": self.calculer_statistiques_globales(),
-            "depot": {
-                "id": self.depot.id,
-                "x": self.depot.x,
-                "y": self.depot.y,
-                "nom": self.depot.nom
-            },
-            "dechetteries": [
-                {
-                    "id": d.id,
-                    "x": d.x,
-                    "y": d.y,
-                    "nom": d.nom
-                }
-                for d in self.dechetteries
-            ]
+            **self._depot_et_dechetteries_dict(),
         }
 
 
+def appliquer_modifications(points_data: List[Dict], modifications: Dict) -> List[Dict]:
+    """
+    Applique un diff {"ajoutes", "supprimes", "modifies"} à une liste de points.
+    Idempotent : un point déjà ajouté est remplacé, un point absent n'est pas supprimé.
+    """
+    supprimes = set(modifications.get('supprimes', []))
+    par_id = {p['id']: dict(p) for p in points_data if p['id'] not in supprimes}
+    for m in modifications.get('modifies', []):
+        if isinstance(m, dict) and m.get('id') in par_id:
+            par_id[m['id']].update(m)
+    for p in modifications.get('ajoutes', []):
+        if p['id'] not in supprimes:
+            par_id[p['id']] = dict(p)
+    return list(par_id.values())
+
+
 def optimiser_collecte(depot_data: Dict, points_data: List[Dict],
                        dechetteries_data: List[Dict], camions_data: List[Dict],
                        use_osrm: bool = False, time_limit_seconds: Optional[float] = None,
-                       debug_coverage: bool = False) -> Dict:
+                       debug_coverage: bool = False,
+                       solution_precedente: Optional[Any] = None,
+                       modifications: Optional[Dict] = None,
+                       callback_progression: Optional[Callable[[Dict], None]] = None,
+                       jeton: Optional[JetonAnnulation] = None,
+                       objectif: str = "distance") -> Dict:
     """
     Fonction principale d'optimisation de la collecte.
 
@@ -1810,8 +2340,23 @@ def optimiser_collecte(depot_data: Dict, points_data: List[Dict],
         dechetteries_data: [{id, x, y, nom, capacite_max}, ...]
         camions_data: [{id, capacite, cout_fixe, zones_accessibles}, ...]
         use_osrm: Si True, récupère les distances routières via OSRM Table API
+                  (tuiles parallèles au-delà de 100 points, couples déjà connus lus
+                  dans le cache persistant, cf. osrm_client ; taux de succès dans
+                  statistiques["osrm_cache"])
         time_limit_seconds: Limite de temps (secondes). Au-delà, optimisation raccourcie.
         debug_coverage: Si True, affiche des logs [COVERAGE_DEBUG] pour tracer les pertes de points.
+        solution_precedente: Résultat précédent ({"routes": [...]}) ou liste de routes
+            (RouteOptimisee.to_dict). Si fourni : ré-optimisation incrémentale (warm start)
+            au lieu de la résolution complète.
+        modifications: Diff depuis la solution précédente
+            {"ajoutes": [points], "supprimes": [ids], "modifies": [{id, volume, x, y}]},
+            appliqué à points_data (idempotent si points_data est déjà à jour).
+        callback_progression: Reçoit la progression et la meilleure solution connue
+            (anytime, voir OptimiseurRoutes._publier_progression).
+        jeton: Jeton d'annulation partagé avec l'appelant : jeton.annuler() arrête les boucles
+            puis lève OptimisationAnnulee à la phase suivante.
+        objectif: "distance" (km) ou "temps" (minutes de trajet OSRM, euclidien à 30 km/h
+            sans OSRM). Avec OSRM, chaque route porte duree_trajet_minutes.
 
     Returns:
         Dictionnaire avec les routes optimisées et statistiques
@@ -1820,6 +2365,8 @@ def optimiser_collecte(depot_data: Dict, points_data: List[Dict],
     _DEBUG_COVERAGE_THIS_RUN = bool(debug_coverage)
     print("[Optimiseur] optimiser_collecte() début, use_osrm=", use_osrm, "points=", len(points_data))
     _debug("ENTRÉE optimiser_collecte: points_data=", len(points_data), "camions=", len(camions_data))
+    if modifications:
+        points_data = appliquer_modifications(points_data, modifications)
     # Créer les objets Point
     depot = Point(
         id=depot_data.get('id', 0),
@@ -1856,16 +2403,19 @@ def optimiser_collecte(depot_data: Dict, points_data: List[Dict],
     ]
     
     # Matrice OSRM (optionnel) - même approche que web_app/frontend
-    matrice_osrm = None
-    if use_osrm and len(points_collecte) + len(dechetteries_data) + 1 <= 100:
+    matrice_trajets = None
+    statistiques_osrm = None
+    if use_osrm:
         try:
             print("[Optimiseur] Appel OSRM Table API (matrice distances)...")
-            from osrm_client import build_distance_matrix_from_osrm
-            matrice_osrm = build_distance_matrix_from_osrm(
-                depot_data, points_data, dechetteries_data if dechetteries_data else []
+            from osrm_client import build_travel_matrix_from_osrm
+            statistiques_osrm = {}
+            matrice_trajets = build_travel_matrix_from_osrm(
+                depot_data, points_data, dechetteries_data if dechetteries_data else [],
+                statistiques=statistiques_osrm
             )
-            if matrice_osrm:
-                print(f"[Optimiseur] OSRM OK: matrice {len(matrice_osrm)} entrées")
+            if matrice_trajets:
+                print(f"[Optimiseur] OSRM OK: matrice {len(matrice_trajets)}² distances + durées")
             else:
                 print("[Optimiseur] OSRM retourne None, utilisation distances euclidiennes")
         except Exception as e:
@@ -1877,9 +2427,21 @@ def optimiser_collecte(depot_data: Dict, points_data: List[Dict],
     # Créer l'optimiseur et lancer l'optimisation (stratégie hybride + optionnel time_limit)
     optimiseur = OptimiseurRoutes(
         depot, points_collecte, dechetteries, camions_data,
-        matrice_osrm=matrice_osrm,
-        time_limit_seconds=time_limit_seconds
+        time_limit_seconds=time_limit_seconds,
+        callback_progression=callback_progression,
+        jeton=jeton,
+        matrice_trajets=matrice_trajets,
+        objectif=objectif
     )
-    optimiseur.optimiser_routes()
+    optimiseur._statistiques_osrm = statistiques_osrm
+    optimiseur.jeton.verifier()  # annulé pendant l'appel OSRM
+    if solution_precedente:
+        routes_precedentes = (
+            solution_precedente.get('routes', []) if isinstance(solution_precedente, dict)
+            else solution_precedente
+        )
+        optimiseur.reoptimiser_routes(routes_precedentes, modifications)
+    else:
+        optimiseur.optimiser_routes()
     
     return optimiseur.to_dict()
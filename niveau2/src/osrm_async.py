@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Client HTTP asynchrone (asyncio) pour OSRM - Niveau 2 VillePropre
+
+- Pool de connexions HTTP/1.1 keep-alive par hôte, au plus max_connexions simultanées
+  (les requêtes suivantes attendent une connexion libre).
+- Mutualisation : des demandes identiques en cours (même clé) partagent un seul appel,
+  même si elles viennent de threads différents (optimisations concurrentes).
+- Métriques structurées : requêtes, statuts, réessais, demandes mutualisées, connexions
+  ouvertes / réutilisées, latences (moyenne, p50, p95, max).
+- BoucleArrierePlan : boucle asyncio dans un thread démon, pour appeler le client depuis
+  du code synchrone (executer).
+- apres_fork() : à appeler dans un processus fils créé par fork (seul le thread appelant
+  y survit) pour repartir d'une boucle et d'un pool neufs.
+
+Bibliothèque standard uniquement (asyncio.open_connection).
+"""
+
+import asyncio
+import ssl
+import threading
+import time
+import urllib.parse
+from collections import deque
+from typing import Awaitable, Callable, Dict, Hashable, NamedTuple, Optional
+
+LATENCES_CONSERVEES = 1000        # dernières latences gardées pour p50 / p95
+
+
+class ReponseHttp(NamedTuple):
+    statut: int
+    corps: bytes
+
+
+class MetriquesOsrm:
+    """Compteurs et latences du client, lisibles depuis n'importe quel thread."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.reinitialiser()
+
+    def reinitialiser(self) -> None:
+        with self._verrou:
+            self.compteurs: Dict[str, int] = {
+                "requetes": 0,
+                "erreurs_reseau": 0,
+                "reessais": 0,
+                "mutualisees": 0,
+                "connexions_ouvertes": 0,
+                "connexions_reutilisees": 0,
+            }
+            self.statuts: Dict[int, int] = {}
+            self.latences = deque(maxlen=LATENCES_CONSERVEES)
+            self.duree_totale_s = 0.0
+
+    def incrementer(self, nom: str, n: int = 1) -> None:
+        with self._verrou:
+            self.compteurs[nom] = self.compteurs.get(nom, 0) + n
+
+    def enregistrer_reponse(self, statut: int, duree_s: float) -> None:
+        with self._verrou:
+            self.compteurs["requetes"] += 1
+            self.statuts[statut] = self.statuts.get(statut, 0) + 1
+            self.latences.append(duree_s)
+            self.duree_totale_s += duree_s
+
+    def etat(self) -> dict:
+        with self._verrou:
+            latences = sorted(self.latences)
+            compteurs = dict(self.compteurs)
+            statuts = {str(s): n for s, n in sorted(self.statuts.items())}
+            duree_totale = self.duree_totale_s
+
+        def quantile(q: float) -> Optional[float]:
+            if not latences:
+                return None
+            return round(1000 * latences[min(len(latences) - 1, int(q * len(latences)))], 1)
+
+        return {
+            **compteurs,
+            "statuts": statuts,
+            "duree_totale_s": round(duree_totale, 3),
+            "latence_ms": {
+                "moyenne": round(1000 * sum(latences) / len(latences), 1) if latences else None,
+                "p50": quantile(0.5),
+                "p95": quantile(0.95),
+                "max": round(1000 * latences[-1], 1) if latences else None,
+            },
+        }
+
+
+class _Connexion:
+    def __init__(self, lecteur: asyncio.StreamReader, ecrivain: asyncio.StreamWriter):
+        self.lecteur = lecteur
+        self.ecrivain = ecrivain
+
+    def fermer(self) -> None:
+        self.ecrivain.close()
+
+
+class _PoolHote:
+    """Connexions inactives vers un hôte + sémaphore du nombre de connexions actives."""
+
+    def __init__(self, max_connexions: int):
+        self.semaphore = asyncio.Semaphore(max_connexions)
+        self.inactives: deque = deque()
+
+
+class ClientHttpAsync:
+    """
+    Client GET HTTP/1.1 keep-alive à utiliser depuis une seule boucle asyncio.
+
+    Args:
+        max_connexions: Connexions simultanées par hôte (concurrence maximale).
+        timeout: Délai (s) d'un échange requête / réponse complet.
+    """
+
+    def __init__(self, max_connexions: int = 4, timeout: float = 30.0):
+        self.max_connexions = max(1, int(max_connexions))
+        self.timeout = timeout
+        self.metriques = MetriquesOsrm()
+        self._pools: Dict[tuple, _PoolHote] = {}
+        self._en_vol: Dict[Hashable, asyncio.Future] = {}
+
+    def _pool(self, cle: tuple) -> _PoolHote:
+        pool = self._pools.get(cle)
+        if pool is None:
+            pool = self._pools[cle] = _PoolHote(self.max_connexions)
+        return pool
+
+    async def _ouvrir(self, schema: str, hote: str, port: int) -> _Connexion:
+        contexte = ssl.create_default_context() if schema == "https" else None
+        lecteur, ecrivain = await asyncio.open_connection(
+            hote, port, ssl=contexte, server_hostname=hote if contexte else None
+        )
+        self.metriques.incrementer("connexions_ouvertes")
+        return _Connexion(lecteur, ecrivain)
+
+    async def get(self, base_url: str, chemin: str, entetes: Optional[Dict[str, str]] = None,
+                  timeout: Optional[float] = None) -> ReponseHttp:
+        """
+        GET base_url + chemin sur une connexion du pool.
+
+        Raises:
+            OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError
+            (réponse HTTP illisible) : la connexion est alors fermée.
+        """
+        url = urllib.parse.urlsplit(base_url)
+        port = url.port or (443 if url.scheme == "https" else 80)
+        pool = self._pool((url.scheme, url.hostname, port))
+        requete = (
+            f"GET {chemin} HTTP/1.1\r\nHost: {url.netloc}\r\nAccept: application/json\r\n"
+            + "".join(f"{k}: {v}\r\n" for k, v in (entetes or {}).items() if k.lower() != "connection")
+            + "Connection: keep-alive\r\n\r\n"
+        ).encode()
+
+        async with pool.semaphore:
+            t0 = time.perf_counter()
+            while True:
+                reutilisee = bool(pool.inactives)
+                conn = pool.inactives.pop() if reutilisee else await self._ouvrir(url.scheme, url.hostname, port)
+                try:
+                    statut, corps, garder = await asyncio.wait_for(
+                        self._echanger(conn, requete), timeout or self.timeout
+                    )
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    conn.fermer()
+                    if reutilisee and not isinstance(e, asyncio.TimeoutError):
+                        continue  # keep-alive fermé par le serveur entre deux requêtes : nouvelle connexion
+                    self.metriques.incrementer("erreurs_reseau")
+                    raise
+                except BaseException:
+                    conn.fermer()
+                    self.metriques.incrementer("erreurs_reseau")
+                    raise
+                break
+            if reutilisee:
+                self.metriques.incrementer("connexions_reutilisees")
+            if garder:
+                pool.inactives.append(conn)
+            else:
+                conn.fermer()
+            self.metriques.enregistrer_reponse(statut, time.perf_counter() - t0)
+            return ReponseHttp(statut, corps)
+
+    @staticmethod
+    async def _echanger(conn: _Connexion, requete: bytes):
+        conn.ecrivain.write(requete)
+        await conn.ecrivain.drain()
+        ligne = await conn.lecteur.readline()
+        if not ligne:
+            raise asyncio.IncompleteReadError(b"", None)
+        morceaux = ligne.decode("latin-1").split(None, 2)
+        if len(morceaux) < 2 or not morceaux[0].startswith("HTTP/"):
+            raise ValueError(f"Ligne de statut HTTP invalide : {ligne[:100]!r}")
+        statut = int(morceaux[1])
+        entetes: Dict[str, str] = {}
+        while True:
+            ligne = await conn.lecteur.readline()
+            if ligne in (b"\r\n", b"\n", b""):
+                break
+            nom, _, valeur = ligne.decode("latin-1").partition(":")
+            entetes[nom.strip().lower()] = valeur.strip()
+
+        if entetes.get("transfer-encoding", "").lower() == "chunked":
+            morceaux_corps = []
+            while True:
+                taille = int((await conn.lecteur.readline()).split(b";")[0].strip() or b"0", 16)
+                if taille == 0:
+                    while (await conn.lecteur.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                morceaux_corps.append(await conn.lecteur.readexactly(taille))
+                await conn.lecteur.readexactly(2)
+            corps = b"".join(morceaux_corps)
+        elif "content-length" in entetes:
+            corps = await conn.lecteur.readexactly(int(entetes["content-length"]))
+        else:
+            corps = await conn.lecteur.read()
+            return statut, corps, False
+        garder = entetes.get("connection", "").lower() != "close"
+        return statut, corps, garder
+
+    def en_cours(self, cle: Hashable) -> bool:
+        """Vrai si une demande de cette clé est en cours (un nouvel appel la partagera)."""
+        return cle in self._en_vol
+
+    async def mutualiser(self, cle: Hashable, fabrique: Callable[[], Awaitable]):
+        """
+        Résultat de fabrique(), partagé par toutes les demandes de même clé en cours.
+        Annuler un demandeur n'annule pas l'appel partagé.
+        """
+        tache = self._en_vol.get(cle)
+        if tache is None:
+            tache = self._en_vol[cle] = asyncio.ensure_future(fabrique())
+            tache.add_done_callback(lambda _: self._en_vol.pop(cle, None))
+        else:
+            self.metriques.incrementer("mutualisees")
+        return await asyncio.shield(tache)
+
+    def apres_fork(self) -> None:
+        """
+        Dans un processus fils créé par fork : oublie les connexions et demandes en vol
+        héritées (elles appartiennent à la boucle du parent) et repart de métriques vides.
+        """
+        self._pools = {}
+        self._en_vol = {}
+        self.metriques = MetriquesOsrm()
+
+    async def fermer(self) -> None:
+        for pool in self._pools.values():
+            while pool.inactives:
+                pool.inactives.pop().fermer()
+
+
+class BoucleArrierePlan:
+    """Boucle asyncio dans un thread démon, démarrée au premier appel."""
+
+    def __init__(self, nom: str = "boucle-asyncio"):
+        self.nom = nom
+        self._boucle: Optional[asyncio.AbstractEventLoop] = None
+        self._verrou = threading.Lock()
+
+    def boucle(self) -> asyncio.AbstractEventLoop:
+        with self._verrou:
+            if self._boucle is None:
+                boucle = asyncio.new_event_loop()
+                threading.Thread(target=boucle.run_forever, name=self.nom, daemon=True).start()
+                self._boucle = boucle
+            return self._boucle
+
+    def apres_fork(self) -> None:
+        """Dans un processus fils créé par fork : la boucle héritée n'a plus de thread, elle sera recréée."""
+        self._boucle = None
+        self._verrou = threading.Lock()
+
+    def executer(self, coroutine: Awaitable, timeout: Optional[float] = None):
+        """
+        Exécute la coroutine dans la boucle et attend son résultat (appel synchrone).
+
+        Raises:
+            RuntimeError: appelé depuis le thread de la boucle (interblocage).
+            concurrent.futures.TimeoutError: au-delà de timeout (la coroutine est annulée).
+        """
+        boucle = self.boucle()
+        try:
+            courante = asyncio.get_running_loop()
+        except RuntimeError:
+            courante = None
+        if courante is boucle:
+            raise RuntimeError("executer() appelé depuis la boucle : utiliser await")
+        futur = asyncio.run_coroutine_threadsafe(coroutine, boucle)
+        try:
+            return futur.result(timeout)
+        except BaseException:
+            futur.cancel()
+            raise
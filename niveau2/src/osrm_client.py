@@ -5,175 +5,576 @@ Client OSRM - Récupération des distances routières réelles via l'API OSRM Ta
 Utilisé pour optimiser les routes avec les vraies distances routières.
 Même API que l'ancienne version web_app/frontend (route/v1 pour display côté client).
 
-OSRM Table Service: 1 requête = matrice n×n complète
+OSRM Table Service: 1 requête = matrice n×n complète jusqu'à OSRM_TABLE_MAX points ;
+au-delà, tuiles sources × destinations récupérées en parallèle puis assemblées.
+Les requêtes passent par un client asyncio (osrm_async) : pool de connexions keep-alive,
+concurrence bornée, tuiles identiques en cours partagées entre optimisations concurrentes,
+métriques (client_osrm.metriques). fetch_osrm_table en est l'enveloppe synchrone.
+Les couples de points déjà connus sont gardés dans un cache SQLite (CacheOsrm) :
+seuls les lignes / colonnes manquantes sont redemandées.
 https://project-osrm.org/docs/v5.24.0/api/#table-service
 """
 
-import math
-import urllib.request
-import urllib.error
+import asyncio
+import concurrent.futures
 import json
+import math
+import os
+import sqlite3
+import threading
 import time
-from typing import List, Dict, Tuple, Optional
+import urllib.parse
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional, Sequence
+
+import numpy as np
+
+from matrice_trajets import MatriceTrajets, completer_matrices
+from osrm_async import BoucleArrierePlan, ClientHttpAsync
+from projection import xy_vers_latlng
 
-# Debug: activer pour tracer précisément les appels OSRM
-OSRM_DEBUG = True
+# Debug : VILLEPROPRE_OSRM_DEBUG=1 pour tracer précisément les appels OSRM
+OSRM_DEBUG = os.environ.get("VILLEPROPRE_OSRM_DEBUG", "").strip().lower() in ("1", "true", "yes")
 def _debug(msg: str, *args):
     if OSRM_DEBUG:
-        print(f"[OSRM] {msg}", *args)
+        print(f"[OSRM] {msg % args if args else msg}")
 
 
-# Centre Casablanca pour conversion x,y <-> lat,lng (identique au frontend api.js)
-CASABLANCA_LAT = 33.5731
-CASABLANCA_LNG = -7.5898
-DEG_TO_KM = 111.0
-COS_LAT = math.cos(CASABLANCA_LAT * math.pi / 180)
+OSRM_BASE_URL = "https://router.project-osrm.org"
+OSRM_TABLE_MAX = 100              # coordonnées par requête Table (limite du serveur public)
+OSRM_TUILE = OSRM_TABLE_MAX // 2  # tuile sources × destinations : <= OSRM_TABLE_MAX coordonnées
+OSRM_MAX_CONNEXIONS = int(os.environ.get("VILLEPROPRE_OSRM_CONNEXIONS", 4))  # requêtes simultanées par hôte
+OSRM_TENTATIVES = 3               # par tuile
+OSRM_ATTENTE_RETRY = 0.5          # s avant la 2e tentative, doublée ensuite
+OSRM_TIMEOUT = 30                 # s par requête
+OSRM_DELAI_TABLE = 60             # s au plus pour une matrice complète (appel synchrone)
+OSRM_CACHE_TTL = float(os.environ.get("VILLEPROPRE_OSRM_CACHE_TTL", 30 * 24 * 3600))  # s
+OSRM_CACHE_PRECISION = 5          # décimales lat/lng de la clé d'un point (~1 m)
+OSRM_CACHE_LOT_SQL = 500          # clés par requête SQL (limite de variables SQLite)
+OSRM_HEADERS = {"User-Agent": "VillePropre/1.0 (https://github.com)"}
+
+# Client partagé par tout le processus : pool keep-alive, mutualisation des tuiles en cours,
+# métriques (client_osrm.metriques.etat()). Les appels synchrones passent par _boucle_osrm.
+# Tous deux sont réinitialisés dans un processus fils créé par fork (_apres_fork).
+client_osrm = ClientHttpAsync(max_connexions=OSRM_MAX_CONNEXIONS, timeout=OSRM_TIMEOUT)
+_boucle_osrm = BoucleArrierePlan("osrm")
 
 
 def xy_to_latlng(x: float, y: float) -> Tuple[float, float]:
-    """Convertit coordonnées projetées (x,y) en (lat, lng) pour OSRM."""
-    lat = CASABLANCA_LAT + (y / DEG_TO_KM)
-    lng = CASABLANCA_LNG + (x / (DEG_TO_KM * COS_LAT))
-    return (lat, lng)
+    """Convertit coordonnées projetées (x,y) en (lat, lng) pour OSRM (un point ; lots : projection)."""
+    lat, lng = xy_vers_latlng(x, y)
+    return (float(lat), float(lng))
 
 
-def fetch_osrm_table(points: List[Tuple[float, float]],
-                     base_url: str = "https://router.project-osrm.org") -> Optional[Dict]:
+def _url_tuile(points: List[Tuple[float, float]], sources: Sequence[int],
+               destinations: Sequence[int], base_url: str) -> str:
+    """URL Table API d'un bloc sources × destinations (coordonnées : union des deux)."""
+    deja = set(sources)
+    coords = list(sources) + [j for j in destinations if j not in deja]
+    position = {idx: k for k, idx in enumerate(coords)}
+    coords_str = ";".join(f"{points[idx][1]},{points[idx][0]}" for idx in coords)
+    chemin = urllib.parse.urlsplit(base_url).path.rstrip("/")
+    url = f"{chemin}/table/v1/driving/{coords_str}?annotations=distance,duration"
+    if len(coords) != len(sources) or list(sources) != list(destinations):
+        url += "&sources=" + ";".join(str(position[i]) for i in sources)
+        url += "&destinations=" + ";".join(str(position[j]) for j in destinations)
+    return url
+
+
+def _compter(mesures: Optional[Dict], nom: str, n: int = 1) -> None:
+    if mesures is not None:
+        mesures[nom] = mesures.get(nom, 0) + n
+
+
+async def _telecharger_tuile(chemin: str, forme: Tuple[int, int], base_url: str, tentatives: int,
+                             timeout_sec: float, client: ClientHttpAsync,
+                             mesures: Optional[Dict]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    attente = OSRM_ATTENTE_RETRY
+    for attempt in range(tentatives):
+        if attempt:
+            client.metriques.incrementer("reessais")
+            _compter(mesures, "reessais")
+        t0 = time.perf_counter()
+        try:
+            _compter(mesures, "requetes")
+            reponse = await client.get(base_url, chemin, OSRM_HEADERS, timeout_sec)
+            elapsed = time.perf_counter() - t0
+            if reponse.statut == 429 or reponse.statut >= 500:
+                _debug("HTTP %s après %.2fs (tuile %dx%d), tentative %d/%d",
+                       reponse.statut, elapsed, forme[0], forme[1], attempt + 1, tentatives)
+                await asyncio.sleep(attente)
+                attente *= 2
+                continue
+            if reponse.statut != 200:
+                _debug("HTTP %s après %.2fs: %s", reponse.statut, elapsed, reponse.corps[:500])
+                return None
+            data = json.loads(reponse.corps.decode())
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            # Connexion coupée, timeout, réponse HTTP ou JSON illisible
+            _debug("%s après %.2fs (tentative %d/%d): %s",
+                   type(e).__name__, time.perf_counter() - t0, attempt + 1, tentatives, e)
+            if attempt + 1 < tentatives:
+                await asyncio.sleep(attente)
+                attente *= 2
+            continue
+
+        if data.get("code") != "Ok":
+            _debug("OSRM code != Ok: %s", data.get("code"))
+            return None
+        dist = np.array(data.get("distances") or np.full(forme, np.nan), dtype=float)
+        dur = np.array(data.get("durations") or np.full(forme, np.nan), dtype=float)
+        if dist.shape != forme or dur.shape != forme:
+            _debug("Tuile de forme inattendue: %s / %s au lieu de %s", dist.shape, dur.shape, forme)
+            return None
+        return dist, dur
+
+    _debug("Échec tuile %dx%d après %d tentatives", forme[0], forme[1], tentatives)
+    return None
+
+
+async def fetch_osrm_tuile_async(points: List[Tuple[float, float]], sources: Sequence[int],
+                                 destinations: Sequence[int], base_url: str = OSRM_BASE_URL,
+                                 tentatives: int = OSRM_TENTATIVES,
+                                 timeout_sec: float = OSRM_TIMEOUT,
+                                 client: Optional[ClientHttpAsync] = None,
+                                 mesures: Optional[Dict] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Récupère un bloc sources × destinations de la matrice (mètres, secondes ; NaN si absent).
+
+    Réessaie (attente doublée à chaque fois) sur erreur réseau, timeout, 429, 5xx ou réponse
+    illisible ; abandonne directement sur une autre erreur HTTP ou un code OSRM != Ok.
+    Une tuile identique déjà en cours (autre optimisation) est attendue au lieu d'être redemandée.
+    """
+    client = client or client_osrm
+    chemin = _url_tuile(points, sources, destinations, base_url)
+    forme = (len(sources), len(destinations))
+    cle = (base_url, chemin)
+    if client.en_cours(cle):
+        _compter(mesures, "mutualisees")
+    return await client.mutualiser(
+        cle, lambda: _telecharger_tuile(chemin, forme, base_url, tentatives, timeout_sec, client, mesures)
+    )
+
+
+def fetch_osrm_tuile(points: List[Tuple[float, float]], sources: Sequence[int],
+                     destinations: Sequence[int], base_url: str = OSRM_BASE_URL,
+                     tentatives: int = OSRM_TENTATIVES,
+                     timeout_sec: float = OSRM_TIMEOUT) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Version synchrone de fetch_osrm_tuile_async."""
+    return _boucle_osrm.executer(
+        fetch_osrm_tuile_async(points, sources, destinations, base_url, tentatives, timeout_sec)
+    )
+
+
+async def fetch_osrm_table_async(points: List[Tuple[float, float]],
+                                 base_url: str = OSRM_BASE_URL,
+                                 taille_tuile: int = OSRM_TUILE,
+                                 max_connexions: int = OSRM_MAX_CONNEXIONS,
+                                 sources: Optional[Sequence[int]] = None,
+                                 destinations: Optional[Sequence[int]] = None,
+                                 client: Optional[ClientHttpAsync] = None,
+                                 mesures: Optional[Dict] = None) -> Optional[Dict]:
     """
     Récupère la matrice de distances et durées via OSRM Table API.
     Format identique à l'ancienne version: lng,lat dans l'URL.
+
+    Jusqu'à OSRM_TABLE_MAX coordonnées : une seule requête. Au-delà, la matrice est découpée
+    en tuiles sources × destinations de taille_tuile (au plus 2 × taille_tuile coordonnées
+    par requête), au plus max_connexions en cours pour cet appel (et au plus
+    OSRM_MAX_CONNEXIONS par hôte pour tout le processus), chacune avec ses propres
+    tentatives, puis assemblées.
+
+    Args:
+        sources, destinations: Indices dans points des lignes / colonnes voulues (tous par défaut).
+        mesures: Dict complété par requetes, reessais, mutualisees, tuiles, duree_s.
+
+    Returns:
+        {"distances": S×D mètres, "durations": S×D secondes} (np.ndarray, NaN si OSRM
+        ne donne pas de valeur), ou None si une tuile échoue.
     """
     if not points:
         _debug("fetch_osrm_table: points vides")
         return None
 
-    if len(points) > 100:
-        _debug("fetch_osrm_table: trop de points (%d > 100)", len(points))
+    sources = list(range(len(points))) if sources is None else [int(i) for i in sources]
+    destinations = list(range(len(points))) if destinations is None else [int(j) for j in destinations]
+    if len(set(sources) | set(destinations)) <= OSRM_TABLE_MAX:
+        taille_s, taille_d = max(1, len(sources)), max(1, len(destinations))
+    else:
+        taille_s = taille_d = max(1, min(taille_tuile, OSRM_TABLE_MAX // 2))
+    tuiles = [
+        (debut_s, debut_d)
+        for debut_s in range(0, len(sources), taille_s)
+        for debut_d in range(0, len(destinations), taille_d)
+    ]
+    _debug("APPEL Table API: %d×%d, %d tuile(s)", len(sources), len(destinations), len(tuiles))
+    _compter(mesures, "tuiles", len(tuiles))
+
+    distances = np.full((len(sources), len(destinations)), np.nan)
+    durations = np.full((len(sources), len(destinations)), np.nan)
+    limite = asyncio.Semaphore(max(1, max_connexions))
+    t0 = time.perf_counter()
+
+    async def tuile(debut_s: int, debut_d: int):
+        async with limite:
+            bloc = await fetch_osrm_tuile_async(
+                points, sources[debut_s:debut_s + taille_s], destinations[debut_d:debut_d + taille_d],
+                base_url, client=client, mesures=mesures,
+            )
+        return debut_s, debut_d, bloc
+
+    taches = [asyncio.ensure_future(tuile(debut_s, debut_d)) for debut_s, debut_d in tuiles]
+    try:
+        for prochaine in asyncio.as_completed(taches):
+            debut_s, debut_d, bloc = await prochaine
+            if bloc is None:
+                _debug("fetch_osrm_table: tuile en échec, abandon")
+                return None
+            lignes = slice(debut_s, debut_s + bloc[0].shape[0])
+            colonnes = slice(debut_d, debut_d + bloc[0].shape[1])
+            distances[lignes, colonnes], durations[lignes, colonnes] = bloc
+    finally:
+        for tache in taches:
+            tache.cancel()
+        if mesures is not None:
+            mesures["duree_s"] = round(mesures.get("duree_s", 0.0) + time.perf_counter() - t0, 3)
+    _debug("Succès: matrice %dx%d en %.2fs", len(sources), len(destinations), time.perf_counter() - t0)
+    return {"distances": distances, "durations": durations}
+
+
+def fetch_osrm_table(points: List[Tuple[float, float]],
+                     base_url: str = OSRM_BASE_URL,
+                     taille_tuile: int = OSRM_TUILE,
+                     max_connexions: int = OSRM_MAX_CONNEXIONS,
+                     sources: Optional[Sequence[int]] = None,
+                     destinations: Optional[Sequence[int]] = None,
+                     delai_s: Optional[float] = OSRM_DELAI_TABLE,
+                     mesures: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Version synchrone de fetch_osrm_table_async pour les appelants existants : la
+    requête s'exécute dans la boucle asyncio partagée (thread démon) et le thread
+    appelant attend au plus delai_s secondes (None au-delà).
+    """
+    try:
+        return _boucle_osrm.executer(
+            fetch_osrm_table_async(points, base_url, taille_tuile, max_connexions,
+                                   sources, destinations, mesures=mesures),
+            timeout=delai_s,
+        )
+    except concurrent.futures.TimeoutError:
+        _debug("fetch_osrm_table: délai de %.0fs dépassé", delai_s)
         return None
 
-    # Format OSRM: lng1,lat1;lng2,lat2;... (identique à l'ancienne version map.js)
-    coords_str = ";".join(f"{lng},{lat}" for lat, lng in points)
-    url = f"{base_url}/table/v1/driving/{coords_str}?annotations=distance,duration"
-    _debug("APPEL Table API: %d points, URL len=%d", len(points), len(url))
 
-    timeout_sec = 30
-    headers = {"User-Agent": "VillePropre/1.0 (https://github.com)"}
+class CacheOsrm:
+    """
+    Cache persistant (SQLite) des distances / durées OSRM par couple de coordonnées.
 
-    for attempt in range(2):
-        t0 = time.time()
-        try:
-            _debug("Tentative %d/2 - requête HTTP...", attempt + 1)
-            req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, timeout=timeout_sec) as resp:
-                elapsed = time.time() - t0
-                raw = resp.read().decode()
-                _debug("Réponse HTTP 200 en %.2fs, body len=%d", elapsed, len(raw))
-                data = json.loads(raw)
-        except urllib.error.HTTPError as e:
-            elapsed = time.time() - t0
-            _debug("HTTPError %s après %.2fs: %s", e.code, elapsed, e.reason)
-            try:
-                body = e.read().decode()[:500] if e.fp else ""
-                _debug("Body: %s", body)
-            except Exception:
-                pass
-            return None
-        except urllib.error.URLError as e:
-            elapsed = time.time() - t0
-            err_msg = str(e.reason) if e.reason else str(e)
-            _debug("URLError après %.2fs: %s", elapsed, err_msg)
-            if ("timed out" in err_msg.lower() or "timeout" in err_msg.lower()) and attempt == 0:
-                _debug("Retry après timeout...")
-                continue
-            return None
-        except (TimeoutError, OSError) as e:
-            elapsed = time.time() - t0
-            _debug("TimeoutError/OSError après %.2fs: %s", elapsed, e)
-            if attempt == 0:
-                _debug("Retry...")
-                continue
-            return None
-        except json.JSONDecodeError as e:
-            _debug("JSONDecodeError: %s", e)
-            return None
+    Clé d'un point : "lat,lng" arrondis à OSRM_CACHE_PRECISION décimales (~1 m). Les couples
+    plus anciens que ttl_s sont ignorés à la lecture (purger_expires() les supprime).
+    Connexion SQLite ouverte au premier usage, une par processus (un fils créé par fork
+    rouvre la base au lieu de partager la connexion du parent). Sans chemin, base en
+    mémoire : propre au processus, perdue au redémarrage.
+    """
 
-        if data.get("code") != "Ok":
-            _debug("OSRM code != Ok: %s", data.get("code"))
-            return None
+    def __init__(self, chemin: Optional[str] = None, ttl_s: float = OSRM_CACHE_TTL):
+        self.chemin = chemin or ":memory:"
+        self.ttl_s = ttl_s
+        self._verrou = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self.lectures = 0
+        self.succes = 0
+
+    def _connexion(self) -> sqlite3.Connection:
+        """Connexion du processus courant (appelée sous self._verrou)."""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.chemin, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS paires ("
+                " source TEXT NOT NULL, destination TEXT NOT NULL,"
+                " distance REAL, duree REAL, horodatage REAL NOT NULL,"
+                " PRIMARY KEY (source, destination)) WITHOUT ROWID"
+            )
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def apres_fork(self) -> None:
+        """Dans le processus fils : verrou neuf (il pouvait être pris au moment du fork)."""
+        self._verrou = threading.Lock()
+        self.lectures = 0
+        self.succes = 0
+
+    @staticmethod
+    def cle(lat: float, lng: float) -> str:
+        return f"{lat:.{OSRM_CACHE_PRECISION}f},{lng:.{OSRM_CACHE_PRECISION}f}"
 
-        dist = data.get("distances", [])
-        dur = data.get("durations", [])
-        _debug("Succès: distances=%s, durations=%s", type(dist).__name__, type(dur).__name__)
-        return {"distances": dist, "durations": dur}
+    def lire(self, cles: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Couples connus (et non expirés) entre les points donnés.
 
-    _debug("Échec après 2 tentatives")
+        Returns:
+            (distances N×N, durées N×N, connus N×N booléen) ; NaN là où rien n'est connu.
+        """
+        n = len(cles)
+        distances = np.full((n, n), np.nan)
+        durees = np.full((n, n), np.nan)
+        connus = np.zeros((n, n), dtype=bool)
+        positions: Dict[str, List[int]] = {}
+        for i, cle in enumerate(cles):
+            positions.setdefault(cle, []).append(i)
+        distinctes = list(positions)
+        limite = time.time() - self.ttl_s
+        with self._verrou:
+            for debut in range(0, len(distinctes), OSRM_CACHE_LOT_SQL):
+                lot = distinctes[debut:debut + OSRM_CACHE_LOT_SQL]
+                lignes = self._connexion().execute(
+                    f"SELECT source, destination, distance, duree FROM paires"
+                    f" WHERE horodatage >= ? AND source IN ({','.join('?' * len(lot))})",
+                    [limite, *lot],
+                )
+                for source, destination, distance, duree in lignes:
+                    colonnes = positions.get(destination)
+                    if colonnes is None:
+                        continue
+                    for i in positions[source]:
+                        distances[i, colonnes] = np.nan if distance is None else distance
+                        durees[i, colonnes] = np.nan if duree is None else duree
+                        connus[i, colonnes] = True
+        return distances, durees, connus
+
+    def ecrire(self, cles_sources: Sequence[str], cles_destinations: Sequence[str],
+               distances: np.ndarray, durees: np.ndarray) -> None:
+        """Enregistre un bloc sources × destinations (NaN → valeur absente)."""
+        maintenant = time.time()
+        lignes = [
+            (s, d,
+             None if math.isnan(distances[i, j]) else float(distances[i, j]),
+             None if math.isnan(durees[i, j]) else float(durees[i, j]),
+             maintenant)
+            for i, s in enumerate(cles_sources)
+            for j, d in enumerate(cles_destinations)
+            if s != d
+        ]
+        with self._verrou:
+            self._connexion().executemany("INSERT OR REPLACE INTO paires VALUES (?, ?, ?, ?, ?)", lignes)
+            self._connexion().commit()
+
+    def invalider(self, cles: Optional[Sequence[str]] = None) -> int:
+        """Oublie tous les couples, ou ceux qui touchent les points donnés. Retourne le nombre supprimé."""
+        with self._verrou:
+            if cles is None:
+                supprimes = self._connexion().execute("DELETE FROM paires").rowcount
+            else:
+                supprimes = 0
+                cles = list(cles)
+                for debut in range(0, len(cles), OSRM_CACHE_LOT_SQL):
+                    lot = cles[debut:debut + OSRM_CACHE_LOT_SQL]
+                    marques = ",".join("?" * len(lot))
+                    supprimes += self._connexion().execute(
+                        f"DELETE FROM paires WHERE source IN ({marques}) OR destination IN ({marques})",
+                        [*lot, *lot],
+                    ).rowcount
+            self._connexion().commit()
+        return supprimes
+
+    def purger_expires(self) -> int:
+        """Supprime les couples plus anciens que le TTL."""
+        with self._verrou:
+            supprimes = self._connexion().execute(
+                "DELETE FROM paires WHERE horodatage < ?", (time.time() - self.ttl_s,)
+            ).rowcount
+            self._connexion().commit()
+        return supprimes
+
+    def compter(self, lectures: int, succes: int) -> None:
+        with self._verrou:
+            self.lectures += lectures
+            self.succes += succes
+
+    def etat(self) -> dict:
+        with self._verrou:
+            nb = self._connexion().execute("SELECT COUNT(*) FROM paires").fetchone()[0]
+            return {
+                "chemin": self.chemin,
+                "ttl_s": self.ttl_s,
+                "nb_paires": nb,
+                "paires_lues": self.lectures,
+                "paires_en_cache": self.succes,
+                "taux_succes": round(100.0 * self.succes / self.lectures, 1) if self.lectures else 0.0,
+            }
+
+
+def _chemin_cache_defaut() -> Optional[str]:
+    if os.environ.get("VILLEPROPRE_OSRM_CACHE"):
+        return os.environ["VILLEPROPRE_OSRM_CACHE"]
+    if os.environ.get("VILLEPROPRE_CACHE_DIR"):
+        repertoire = Path(os.environ["VILLEPROPRE_CACHE_DIR"])
+        repertoire.mkdir(parents=True, exist_ok=True)
+        return str(repertoire / "osrm_paires.sqlite")
     return None
 
 
-def build_distance_matrix_from_osrm(
-    depot_data: Dict,
-    points_data: List[Dict],
-    dechetteries_data: List[Dict]
-) -> Optional[Dict[Tuple[int, int], float]]:
+cache_osrm = CacheOsrm(_chemin_cache_defaut())
+
+
+def _apres_fork() -> None:
     """
-    Construit la matrice de distances routières à partir d'OSRM Table API.
-    Même ordre que l'ancienne version: depot + points + dechetteries.
+    Processus fils créé par fork (ex. pool de processus des jobs) : le thread de la
+    boucle héritée n'existe plus, fetch_osrm_table y attendrait delai_s pour rien.
     """
-    depot_id = depot_data.get("id", 0)
-    depot_x = float(depot_data.get("x", 0))
-    depot_y = float(depot_data.get("y", 0))
+    _boucle_osrm.apres_fork()
+    client_osrm.apres_fork()
+    cache_osrm.apres_fork()
 
-    xy_list = [(depot_x, depot_y)]
-    id_list = [depot_id]
 
-    for p in points_data:
-        xy_list.append((float(p.get("x", 0)), float(p.get("y", 0))))
-        id_list.append(p["id"])
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_apres_fork)
 
-    for d in dechetteries_data:
-        xy_list.append((float(d.get("x", 0)), float(d.get("y", 0))))
-        id_list.append(d["id"])
 
-    latlng_list = [xy_to_latlng(x, y) for x, y in xy_list]
-    _debug("build_distance_matrix: %d points (depot + %d collecte + %d dechetteries)",
-           len(latlng_list), len(points_data), len(dechetteries_data))
-
-    result = fetch_osrm_table(latlng_list)
-    if result is None:
-        _debug("build_distance_matrix: fetch_osrm_table retourne None")
-        return None
+def _completer_depuis_osrm(latlng_list: List[Tuple[float, float]], cles: List[str],
+                           distances: np.ndarray, durees: np.ndarray, manquants: np.ndarray,
+                           base_url: str, cache: CacheOsrm, mesures: Optional[Dict] = None) -> Optional[int]:
+    """
+    Récupère les couples manquants : d'abord lignes et colonnes des points dont la plupart
+    des couples manquent (nouveaux points), puis le bloc des couples encore absents.
 
-    dist_raw = result.get("distances")  # OSRM: mètres (2D ou flat)
-    durations_s = result.get("durations")  # OSRM: secondes (fallback)
-    n = len(id_list)
+    Returns:
+        Nombre de couples demandés à OSRM, ou None si une requête échoue.
+    """
+    n = len(cles)
+    demandes = 0
+    nouveaux = np.flatnonzero(manquants.sum(axis=0) + manquants.sum(axis=1) > n - 1)
+    blocs = []
+    if nouveaux.size:
+        anciens = np.setdiff1d(np.arange(n), nouveaux)
+        blocs.append((nouveaux, np.arange(n)))
+        if anciens.size:
+            blocs.append((anciens, nouveaux))
+    for sources, destinations in blocs:
+        resultat = fetch_osrm_table(latlng_list, base_url, sources=sources, destinations=destinations,
+                                    mesures=mesures)
+        if resultat is None:
+            return None
+        distances[np.ix_(sources, destinations)] = resultat["distances"]
+        durees[np.ix_(sources, destinations)] = resultat["durations"]
+        manquants[np.ix_(sources, destinations)] = False
+        cache.ecrire([cles[i] for i in sources], [cles[j] for j in destinations],
+                     resultat["distances"], resultat["durations"])
+        demandes += sources.size * destinations.size
 
-    def _get_cell(data, i, j):
-        """Lit data[i][j] (2D) ou data[i*n+j] (flat)."""
-        if not data or not isinstance(data, (list, tuple)):
+    sources = np.flatnonzero(manquants.any(axis=1))
+    if sources.size:
+        destinations = np.flatnonzero(manquants.any(axis=0))
+        resultat = fetch_osrm_table(latlng_list, base_url, sources=sources, destinations=destinations,
+                                    mesures=mesures)
+        if resultat is None:
             return None
-        try:
-            row = data[i] if i < len(data) else None
-            if row is not None and isinstance(row, (list, tuple)):
-                return row[j] if j < len(row) else None
-            idx = i * n + j
-            return data[idx] if 0 <= idx < len(data) else None
-        except (IndexError, TypeError, KeyError):
+        distances[np.ix_(sources, destinations)] = resultat["distances"]
+        durees[np.ix_(sources, destinations)] = resultat["durations"]
+        cache.ecrire([cles[i] for i in sources], [cles[j] for j in destinations],
+                     resultat["distances"], resultat["durations"])
+        demandes += sources.size * destinations.size
+    return demandes
+
+
+def matrice_trajets_osrm(
+    xy_list: Sequence[Tuple[float, float]],
+    ids: Sequence,
+    base_url: str = OSRM_BASE_URL,
+    cache: Optional[CacheOsrm] = None,
+    statistiques: Optional[Dict] = None,
+) -> Optional[MatriceTrajets]:
+    """
+    Distances et durées routières entre des points (x, y), indexées comme ids.
+
+    Les couples déjà connus sont lus dans le cache (cache_osrm par défaut) ; seuls les
+    lignes / colonnes manquantes sont demandées à OSRM puis enregistrées.
+
+    Args:
+        statistiques: Dict complété par paires, paires_en_cache, paires_demandees,
+            taux_succes_cache (%), duree_s, et reseau (requetes, reessais, mutualisees,
+            tuiles, duree_s des appels OSRM).
+
+    Returns:
+        MatriceTrajets (km, minutes), ou None si OSRM est injoignable.
+    """
+    cache = cache if cache is not None else cache_osrm
+    xy = np.asarray(xy_list, dtype=float).reshape(-1, 2)
+    lats, lngs = xy_vers_latlng(xy[:, 0], xy[:, 1])
+    latlng_list = list(zip(lats.tolist(), lngs.tolist()))
+
+    t0 = time.time()
+    n = len(latlng_list)
+    cles = [CacheOsrm.cle(lat, lng) for lat, lng in latlng_list]
+    distances, durees, connus = cache.lire(cles)
+    manquants = ~connus
+    np.fill_diagonal(manquants, False)
+    paires = n * (n - 1)
+    en_cache = paires - int(manquants.sum())
+    cache.compter(paires, en_cache)
+
+    demandes = 0
+    mesures: Dict = {}
+    if manquants.any():
+        demandes = _completer_depuis_osrm(
+            latlng_list, cles, distances, durees, manquants, base_url, cache, mesures
+        )
+        if demandes is None:
+            _debug("matrice_trajets_osrm: fetch_osrm_table retourne None")
             return None
+    if statistiques is not None:
+        statistiques.update({
+            "paires": paires,
+            "paires_en_cache": en_cache,
+            "paires_demandees": demandes,
+            "taux_succes_cache": round(100.0 * en_cache / paires, 1) if paires else 100.0,
+            "duree_s": round(time.time() - t0, 3),
+            "reseau": mesures,
+        })
+    return MatriceTrajets(ids, *completer_matrices(distances, durees))
 
-    matrice = {}
-    for i in range(n):
-        for j in range(n):
-            if i == j:
-                matrice[(id_list[i], id_list[j])] = 0.0
-            else:
-                val = _get_cell(dist_raw, i, j)
-                if val is not None:
-                    matrice[(id_list[i], id_list[j])] = float(val) / 1000.0
-                else:
-                    val_dur = _get_cell(durations_s, i, j)
-                    if val_dur is not None:
-                        matrice[(id_list[i], id_list[j])] = (float(val_dur) / 3600.0) * 30.0
-                    else:
-                        matrice[(id_list[i], id_list[j])] = 999999.0
-
-    return matrice
+
+def build_travel_matrix_from_osrm(
+    depot_data: Dict,
+    points_data: List[Dict],
+    dechetteries_data: List[Dict],
+    base_url: str = OSRM_BASE_URL,
+    cache: Optional[CacheOsrm] = None,
+    statistiques: Optional[Dict] = None,
+) -> Optional[MatriceTrajets]:
+    """
+    Distances (km) et durées (minutes) routières OSRM, ordre depot + points + dechetteries.
+    Cf. matrice_trajets_osrm pour le cache et les statistiques.
+    """
+    xy_list = [(float(depot_data.get("x", 0)), float(depot_data.get("y", 0)))]
+    id_list = [depot_data.get("id", 0)]
+    for p in list(points_data) + list(dechetteries_data):
+        xy_list.append((float(p.get("x", 0)), float(p.get("y", 0))))
+        id_list.append(p["id"])
+
+    _debug("build_travel_matrix: %d points (depot + %d collecte + %d dechetteries)",
+           len(xy_list), len(points_data), len(dechetteries_data))
+    return matrice_trajets_osrm(xy_list, id_list, base_url, cache, statistiques)
+
+
+def build_distance_matrix_from_osrm(
+    depot_data: Dict,
+    points_data: List[Dict],
+    dechetteries_data: List[Dict],
+    base_url: str = OSRM_BASE_URL,
+    cache: Optional[CacheOsrm] = None,
+    statistiques: Optional[Dict] = None,
+) -> Optional[Dict[Tuple[int, int], float]]:
+    """
+    Construit la matrice de distances routières à partir d'OSRM Table API.
+    Même ordre que l'ancienne version: depot + points + dechetteries.
+
+    Seulement les distances {(id_i, id_j): km} ; build_travel_matrix_from_osrm garde
+    aussi les durées.
+    """
+    matrice = build_travel_matrix_from_osrm(
+        depot_data, points_data, dechetteries_data, base_url, cache, statistiques
+    )
+    return matrice.distances_dict() if matrice is not None else None
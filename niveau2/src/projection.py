@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Module Projection - Niveau 2 VillePropre
+Conversions lat/lng ↔ x/y (km) et distances haversine, vectorisées avec numpy.
+
+Projection équirectangulaire centrée sur Casablanca : x vers l'est, y vers le nord,
+en km depuis le centre. C'est le plan des niveaux 1 et 2 et celui d'osrm_client
+(xy_to_latlng). Toutes les fonctions acceptent scalaires, listes ou tableaux
+(broadcasting numpy) : un lot de N points se convertit en une seule opération.
+"""
+
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+
+CENTRE_LAT = 33.5731
+CENTRE_LNG = -7.5898
+DEG_TO_KM = 111.0                                  # km par degré de latitude
+COS_LAT = math.cos(math.radians(CENTRE_LAT))       # contraction des degrés de longitude
+RAYON_TERRE_KM = 6371.0088                         # rayon moyen (haversine)
+
+
+def latlng_vers_xy(lat, lng) -> Tuple[np.ndarray, np.ndarray]:
+    """(lat, lng) en degrés → (x, y) en km depuis le centre."""
+    lat = np.asarray(lat, dtype=float)
+    lng = np.asarray(lng, dtype=float)
+    return (lng - CENTRE_LNG) * (DEG_TO_KM * COS_LAT), (lat - CENTRE_LAT) * DEG_TO_KM
+
+
+def xy_vers_latlng(x, y) -> Tuple[np.ndarray, np.ndarray]:
+    """(x, y) en km → (lat, lng) en degrés (inverse de latlng_vers_xy)."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return CENTRE_LAT + y / DEG_TO_KM, CENTRE_LNG + x / (DEG_TO_KM * COS_LAT)
+
+
+def haversine_km(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Distance orthodromique (km) élément par élément, avec broadcasting."""
+    phi1 = np.radians(np.asarray(lat1, dtype=float))
+    phi2 = np.radians(np.asarray(lat2, dtype=float))
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.asarray(lng2, dtype=float) - np.asarray(lng1, dtype=float))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * RAYON_TERRE_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def matrice_haversine_km(lat, lng, lat_dest: Optional[np.ndarray] = None,
+                         lng_dest: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Matrice N×M des distances haversine (km) entre les points (lat, lng) et les
+    destinations (par défaut les mêmes points : N×N, diagonale nulle).
+    """
+    lat = np.asarray(lat, dtype=float).ravel()
+    lng = np.asarray(lng, dtype=float).ravel()
+    if lat_dest is None:
+        lat_dest, lng_dest = lat, lng
+    lat_dest = np.asarray(lat_dest, dtype=float).ravel()
+    lng_dest = np.asarray(lng_dest, dtype=float).ravel()
+    return haversine_km(lat[:, None], lng[:, None], lat_dest[None, :], lng_dest[None, :])
+
+
+def distances_cumulees_km(lat, lng) -> np.ndarray:
+    """Trace GPS ordonnée → distance parcourue (km) depuis le premier point, à chaque point."""
+    lat = np.asarray(lat, dtype=float).ravel()
+    lng = np.asarray(lng, dtype=float).ravel()
+    if len(lat) == 0:
+        return np.zeros(0)
+    segments = haversine_km(lat[:-1], lng[:-1], lat[1:], lng[1:])
+    return np.concatenate(([0.0], np.cumsum(segments)))
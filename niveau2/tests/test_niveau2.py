@@ -4,12 +4,22 @@ Tests unitaires Niveau 2 - VillePropre
 Valide l'affectation gloutonne, les contraintes et l'équilibrage.
 """
 
+import contextlib
+import http.server
+import io
 import json
+import os
+import random
 import statistics
 import sys
+import tempfile
+import threading
+import time
 import unittest
 from pathlib import Path
 
+import numpy as np
+
 # Chemins pour importer les modules
 TESTS_DIR = Path(__file__).resolve().parent
 NIVEAU2_SRC = TESTS_DIR.parent / "src"
@@ -22,7 +32,15 @@ sys.path.insert(0, str(NIVEAU1_SRC))
 from graphe_routier import GrapheRoutier
 from affectateur_biparti import AffectateurBiparti
 from camion import Camion
+from dechetterie import Dechetterie
 from zone import Zone
+from alns import MoteurALNS
+from borne_inferieure import calculer_borne_inferieure, matrice_euclidienne, nombre_voyages_min
+from jeton_annulation import JetonAnnulation, OptimisationAnnulee
+from matrice_trajets import MatriceTrajets, completer_matrices
+from optimiseur_routes import OptimiseurRoutes, Point, optimiser_collecte
+import osrm_client
+import projection
 
 
 def charger_graphe_et_donnees():
@@ -59,6 +77,25 @@ def charger_graphe_et_donnees():
     return graphe, camions, zones, zones_incompatibles
 
 
+def dans_processus_fils(fonction):
+    """Exécute fonction() dans un processus fils créé par fork ; retourne son résultat (JSON)."""
+    lecture, ecriture = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(lecture)
+        try:
+            resultat = fonction()
+        except BaseException as e:
+            resultat = repr(e)
+        os.write(ecriture, json.dumps(resultat).encode())
+        os._exit(0)
+    os.close(ecriture)
+    with os.fdopen(lecture) as f:
+        donnees = f.read()
+    os.waitpid(pid, 0)
+    return json.loads(donnees)
+
+
 class TestNiveau2(unittest.TestCase):
     """Tests de validation du Niveau 2."""
 
@@ -157,5 +194,629 @@ class TestNiveau2(unittest.TestCase):
         )
 
 
+def generer_instance_routes(nb_camions: int, nb_points: int, seed: int = 42) -> tuple:
+    """Instance aléatoire (dépôt, points, déchetteries, camions) pour l'optimiseur de routes."""
+    rng = random.Random(seed)
+    depot = {"id": 0, "x": 50.0, "y": 50.0, "nom": "Dépôt"}
+    points = [
+        {"id": i, "x": rng.uniform(10, 90), "y": rng.uniform(10, 90), "volume": rng.uniform(150, 600)}
+        for i in range(1, nb_points + 1)
+    ]
+    dechetteries = [
+        {"id": nb_points + 1, "x": 20.0, "y": 20.0},
+        {"id": nb_points + 2, "x": 80.0, "y": 80.0},
+    ]
+    camions = [
+        {"id": c, "capacite": 5000, "cout_fixe": 100, "zones_accessibles": []}
+        for c in range(1, nb_camions + 1)
+    ]
+    return depot, points, dechetteries, camions
+
+
+def optimiser_silencieux(*args, **kwargs) -> dict:
+    """optimiser_collecte sans les traces console."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return optimiser_collecte(*args, **kwargs)
+
+
+def generer_instance_affectation(nb_camions: int, nb_zones: int, seed: int = 0) -> tuple:
+    """Camions (un sur quatre à accès restreint) et zones aléatoires."""
+    rng = random.Random(seed)
+    camions = [
+        Camion(c, rng.uniform(3000, 8000), rng.uniform(100, 300),
+               rng.sample(range(nb_zones), nb_zones // 3) if c % 4 == 0 else [])
+        for c in range(nb_camions)
+    ]
+    zones = [
+        Zone(z, [], rng.uniform(100, 900), rng.uniform(-50, 50), rng.uniform(-50, 50))
+        for z in range(nb_zones)
+    ]
+    return camions, zones
+
+
+class TestMatriceCouts(unittest.TestCase):
+    """Tests de la matrice de coûts précalculée de l'affectateur."""
+
+    def test_matrice_egale_formule(self):
+        """Chaque coût de la matrice suit la formule dépôt → zone → déchetterie → dépôt."""
+        camions, zones = generer_instance_affectation(8, 40)
+        dechetteries = [Dechetterie(1000, 10.0, 10.0), Dechetterie(1001, -20.0, 30.0)]
+        affectateur = AffectateurBiparti(camions, zones, None, dechetteries)
+        for camion in camions:
+            for zone in zones:
+                cout = affectateur.calculer_cout_affectation(camion.id, zone.id)
+                if not camion.peut_acceder_zone(zone.id):
+                    self.assertEqual(cout, float("inf"))
+                    continue
+                dech = min(dechetteries, key=lambda d: zone.distance_depuis(d.x, d.y))
+                distance = (zone.distance_depuis(0.0, 0.0) + zone.distance_depuis(dech.x, dech.y)
+                            + dech.distance_depuis(0.0, 0.0))
+                attendu = distance * 0.5 + zone.volume_estime * 0.1 + camion.cout_fixe
+                self.assertAlmostEqual(cout, attendu, places=6)
+        self.assertEqual(affectateur.calculer_cout_affectation(999, 0), float("inf"))
+
+    def test_sans_dechetterie_cout_fini(self):
+        """Sans déchetterie, retour direct au dépôt : coûts finis, zones affectées."""
+        camions, zones = generer_instance_affectation(4, 20)
+        affectateur = AffectateurBiparti(camions, zones, None)
+        zone = zones[0]
+        attendu = 2 * zone.distance_depuis(0.0, 0.0) * 0.5 + zone.volume_estime * 0.1 + camions[1].cout_fixe
+        self.assertAlmostEqual(affectateur.calculer_cout_affectation(1, 0), attendu, places=6)
+        affectation = affectateur.affectation_gloutonne()
+        self.assertGreater(sum(len(z) for z in affectation.values()), 0)
+
+    def test_grande_instance_rapide(self):
+        """200 camions × 5000 zones : matrice + glouton + statistiques en quelques dixièmes de seconde."""
+        camions, zones = generer_instance_affectation(200, 5000)
+        debut = time.perf_counter()
+        affectateur = AffectateurBiparti(camions, zones, None, [Dechetterie(1000, 10.0, 10.0)])
+        affectation = affectateur.affectation_gloutonne()
+        stats = affectateur.calculer_statistiques(affectation)
+        self.assertLess(time.perf_counter() - debut, 2.0)
+        self.assertTrue(affectateur.verifier_contraintes(affectation))
+        self.assertEqual(stats["nombre_camions_utilises"], 200)
+
+
+class TestIncompatibilites(unittest.TestCase):
+    """Tests de l'index d'adjacence des zones incompatibles."""
+
+    def test_index_et_milliers_de_contraintes(self):
+        """5000 paires : glouton + équilibrage rapides, aucune paire sur un même camion."""
+        camions, zones = generer_instance_affectation(50, 1000)
+        affectateur = AffectateurBiparti(camions, zones, None, [Dechetterie(1000, 10.0, 10.0)])
+        rng = random.Random(3)
+        affectateur.zones_incompatibles = [
+            p for p in ([rng.randrange(1000), rng.randrange(1000)] for _ in range(5000)) if p[0] != p[1]
+        ]
+        debut = time.perf_counter()
+        affectation = affectateur.equilibrage_charges(affectateur.affectation_gloutonne())
+        self.assertLess(time.perf_counter() - debut, 1.0)
+        self.assertTrue(affectateur.verifier_contraintes(affectation))
+
+        # Une paire ajoutée après coup est prise en compte
+        camion_id = next(cid for cid, zids in affectation.items() if len(zids) >= 2)
+        a, b = affectation[camion_id][:2]
+        affectateur.zones_incompatibles.append([a, b])
+        self.assertIn(b, affectateur.zones_incompatibles_avec(a))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertFalse(affectateur.verifier_contraintes(affectation))
+
+
+class TestEquilibrage(unittest.TestCase):
+    """Tests de l'équilibrage incrémental des charges."""
+
+    def test_500_camions(self):
+        """500 camions / 5000 zones : convergence rapide, contraintes respectées."""
+        camions, zones = generer_instance_affectation(500, 5000, seed=1)
+        affectateur = AffectateurBiparti(camions, zones, None, [Dechetterie(1000, 10.0, 10.0)])
+        glouton = affectateur.affectation_gloutonne()
+        volumes = {z.id: z.volume_estime for z in zones}
+
+        def dispersion(affectation):
+            charges = [sum(volumes[z] for z in zids) for zids in affectation.values() if zids]
+            return statistics.stdev(charges) / statistics.mean(charges)
+
+        debut = time.perf_counter()
+        equilibree = affectateur.equilibrage_charges(glouton)
+        self.assertLess(time.perf_counter() - debut, 0.5)
+        self.assertTrue(affectateur.verifier_contraintes(equilibree))
+        self.assertLessEqual(dispersion(equilibree), dispersion(glouton))
+        self.assertEqual(sorted(z for zids in equilibree.values() for z in zids),
+                         sorted(z for zids in glouton.values() for z in zids))
+
+
+class TestAffectationOptimale(unittest.TestCase):
+    """Tests du solveur lagrangien (affectation généralisée)."""
+
+    def test_capacite_fragmentee(self):
+        """Le glouton laisse une zone faute de place ; l'optimal place tout."""
+        camions = [Camion(1, 10, 100), Camion(2, 10, 200)]
+        zones = [Zone(z, [], v, float(z), 1.0) for z, v in ((1, 4), (2, 4), (3, 6), (4, 6))]
+        zones[0].priorite = zones[1].priorite = "haute"
+        affectateur = AffectateurBiparti(camions, zones, None)
+        glouton = affectateur.affectation_gloutonne()
+        self.assertEqual(len(affectateur.calculer_statistiques(glouton)["zones_non_affectees"]), 1)
+
+        optimale = affectateur.affectation_optimale(affectation_initiale=glouton)
+        self.assertEqual(affectateur.calculer_statistiques(optimale)["zones_non_affectees"], [])
+        self.assertTrue(affectateur.verifier_contraintes(optimale))
+        rapport = affectateur.rapport_optimisation
+        self.assertEqual(rapport["zones_non_affectees_initial"], 1)
+        self.assertLessEqual(rapport["borne_inferieure"], rapport["objectif"] + 1e-6)
+        self.assertLess(rapport["gap_pourcent"], 10.0)  # écart dû à la relaxation continue
+
+    def test_jamais_pire_que_le_glouton(self):
+        """Contraintes respectées (accès, capacité, incompatibilités) et objectif <= glouton."""
+        camions, zones = generer_instance_affectation(30, 400)
+        affectateur = AffectateurBiparti(camions, zones, None, [Dechetterie(1000, 10.0, 10.0)])
+        rng = random.Random(5)
+        affectateur.zones_incompatibles = [
+            p for p in ([rng.randrange(400), rng.randrange(400)] for _ in range(200)) if p[0] != p[1]
+        ]
+        glouton = affectateur.affectation_gloutonne()
+        nb_glouton = len(affectateur.calculer_statistiques(glouton)["zones_non_affectees"])
+        optimale = affectateur.affectation_optimale(temps_max=1.0, affectation_initiale=glouton)
+        rapport = affectateur.rapport_optimisation
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(affectateur.verifier_contraintes(optimale))
+        self.assertLessEqual(rapport["zones_non_affectees"], nb_glouton)
+        self.assertGreaterEqual(rapport["gap_pourcent"], 0.0)
+        self.assertLessEqual(rapport["borne_inferieure"], rapport["objectif"] + 1e-6)
+        self.assertLess(rapport["temps_s"], 1.5)
+
+    def test_sans_temps_borne_valide(self):
+        """temps_max=0 : aucune itération duale, borne du dual à λ=0 et gap non nul."""
+        camions, zones = generer_instance_affectation(30, 400)
+        affectateur = AffectateurBiparti(camions, zones, None, [Dechetterie(1000, 10.0, 10.0)])
+        optimale = affectateur.affectation_optimale(temps_max=0)
+        rapport = affectateur.rapport_optimisation
+        self.assertTrue(affectateur.verifier_contraintes(optimale))
+        self.assertGreater(rapport["borne_inferieure"], 0)
+        self.assertLess(rapport["borne_inferieure"], rapport["objectif"])
+        self.assertGreater(rapport["gap_pourcent"], 0.0)
+
+    def test_ejection_zone_incompatible(self):
+        """Seule zone incompatible sur le meilleur camion : elle est déplacée pour insérer z."""
+        from affectation_lagrangienne import _inserer_par_ejection
+        affect = np.array([-1, 0])
+        charges = np.array([3.0, 0.0])
+        couts = np.array([[1.0, 1.0], [5.0, 2.0]])
+        volumes = np.array([5.0, 3.0])
+        capacites = np.array([10.0, 10.0])
+        voisins = [[1], [0]]
+        self.assertTrue(_inserer_par_ejection(0, affect, charges, couts, volumes, capacites, voisins))
+        self.assertEqual(affect.tolist(), [0, 1])
+        self.assertEqual(charges.tolist(), [5.0, 3.0])
+
+
+class TestALNS(unittest.TestCase):
+    """Tests du portefeuille ALNS (grandes instances, n > 50)."""
+
+    def test_poids_suivent_les_scores(self):
+        """Un opérateur qui produit de bonnes solutions voit son poids augmenter."""
+        moteur = MoteurALNS(optimiseur=None, rng=random.Random(0))
+        bon, mauvais = moteur.operateurs_destroy[0], moteur.operateurs_destroy[1]
+        for _ in range(10):
+            moteur.enregistrer(bon, 33.0, 0.0, True, True, True)
+            moteur.enregistrer(mauvais, 0.0, 0.0, False, False, False)
+        moteur.fin_segment()
+        self.assertGreater(bon.poids, 1.0)
+        self.assertLess(mauvais.poids, 1.0)
+        self.assertEqual(bon.appels, 10)
+        self.assertEqual(bon.appels_segment, 0, "Compteurs de segment remis à zéro")
+
+    def test_couverture_et_statistiques_operateurs(self):
+        """Instance medium : tous les points sont servis et les stats ALNS sont exposées."""
+        random.seed(1)
+        depot, points, dechetteries, camions = generer_instance_routes(4, 80)
+        resultat = optimiser_silencieux(depot, points, dechetteries, camions, time_limit_seconds=1)
+        servis = [w["id"] for r in resultat["routes"] for w in r["waypoints"] if w["type"] == "collecte"]
+        self.assertEqual(sorted(servis), [p["id"] for p in points])
+
+        stats = resultat["statistiques"]
+        alns = stats["alns_operateurs"]
+        self.assertEqual(set(alns["destroy"]), {"aleatoire", "pire", "shaw", "route", "secteur"})
+        self.assertIn("glouton", alns["repair"])
+        appels = sum(op["appels"] for op in alns["destroy"].values())
+        self.assertEqual(appels, stats["nb_iterations_lns"])
+
+
+class TestBorneInferieure(unittest.TestCase):
+    """Tests de la borne inférieure Held-Karp + capacité."""
+
+    def test_carre_borne_exacte(self):
+        """Carré unité : la tournée optimale (périmètre 4) est atteinte par Held-Karp."""
+        W = matrice_euclidienne([0, 1, 1, 0], [0, 0, 1, 1])
+        borne = calculer_borne_inferieure(W, [1, 1, 1], 10)
+        self.assertAlmostEqual(borne["borne"], 4.0, places=6)
+        self.assertLess(borne["mst"], borne["borne"])
+
+    def test_voyages_min(self):
+        """Nombre minimal de vidages : volumes plafonnés à la capacité."""
+        self.assertEqual(nombre_voyages_min([400, 400, 400], 1000), 2)
+        self.assertEqual(nombre_voyages_min([5000], 1000), 1)
+        self.assertEqual(nombre_voyages_min([], 1000), 0)
+
+    def test_borne_valide_et_gap(self):
+        """La borne (avec terme de capacité) reste inférieure à la distance trouvée."""
+        random.seed(3)
+        depot, points, dechetteries, camions = generer_instance_routes(3, 60)
+        stats = optimiser_silencieux(depot, points, dechetteries, camions, time_limit_seconds=1)["statistiques"]
+        self.assertGreater(stats["borne_inferieure_km"], 0)
+        self.assertLessEqual(stats["borne_inferieure_km"], stats["distance_totale"])
+        self.assertGreater(stats["borne_inferieure_details"]["voyages_min"], 0)
+        self.assertGreaterEqual(stats["gap_pourcent"], 0)
+
+
+
+class TestReoptimisation(unittest.TestCase):
+    """Tests de la ré-optimisation incrémentale (warm start)."""
+
+    @classmethod
+    def setUpClass(cls):
+        random.seed(5)
+        cls.depot, cls.points, cls.dechetteries, cls.camions = generer_instance_routes(3, 40)
+        cls.resultat = optimiser_silencieux(
+            cls.depot, cls.points, cls.dechetteries, cls.camions, time_limit_seconds=1
+        )
+
+    def reoptimiser(self, modifications):
+        return optimiser_silencieux(
+            self.depot, self.points, self.dechetteries, self.camions,
+            solution_precedente=self.resultat, modifications=modifications
+        )
+
+    def test_diff_applique_et_capacite(self):
+        """Ajout, suppression et hausse de volume : couverture exacte, capacité respectée."""
+        modifications = {
+            "ajoutes": [{"id": 500, "x": 50.0, "y": 50.0, "volume": 300}],
+            "supprimes": [self.points[0]["id"]],
+            "modifies": [{"id": self.points[1]["id"], "volume": 4000}],
+        }
+        resultat = self.reoptimiser(modifications)
+        servis = [w["id"] for r in resultat["routes"] for w in r["waypoints"] if w["type"] == "collecte"]
+        attendus = [p["id"] for p in self.points[1:]] + [500]
+        self.assertEqual(sorted(servis), sorted(attendus))
+        for route in resultat["routes"]:
+            charges = [e["charge_apres"] for e in route["details_etapes"]]
+            self.assertLessEqual(max(charges), route["capacite"])
+        reopt = resultat["statistiques"]["reoptimisation"]
+        self.assertEqual(reopt["points_inseres"], 1)
+        self.assertEqual(reopt["points_retires"], 1)
+        self.assertEqual(resultat["statistiques"]["strategie_optimisation"], "warm_start")
+
+    def test_routes_non_touchees_conservees(self):
+        """Sans modification, chaque route précédente est reprise à l'identique."""
+        resultat = self.reoptimiser(None)
+        avant = [[w["id"] for w in r["waypoints"]] for r in self.resultat["routes"]]
+        apres = [[w["id"] for w in r["waypoints"]] for r in resultat["routes"]]
+        self.assertEqual(apres, avant)
+        self.assertEqual(resultat["statistiques"]["reoptimisation"]["routes_reoptimisees"], 0)
+
+
+
+class TestAnytime(unittest.TestCase):
+    """Tests de la publication de progression (optimisation anytime)."""
+
+    def test_progression_et_solution_finale(self):
+        """Phases publiées dans l'ordre ; chaque instantané couvre tous les points."""
+        random.seed(2)
+        depot, points, dechetteries, camions = generer_instance_routes(3, 70)
+        evenements = []
+        resultat = optimiser_silencieux(
+            depot, points, dechetteries, camions, time_limit_seconds=1,
+            callback_progression=evenements.append
+        )
+        phases = [e["phase"] for e in evenements]
+        self.assertEqual(phases[0], "construction")
+        self.assertIn("lns", phases)
+        self.assertEqual(phases[-1], "termine")
+        for evenement in evenements:
+            self.assertEqual(evenement["nb_points_couverts"], len(points))
+        self.assertTrue(evenements[-2]["solution_courante"]()["statistiques"]["partiel"])
+        self.assertEqual(evenements[-1]["distance_totale"], resultat["statistiques"]["distance_totale"])
+        self.assertEqual(evenements[-1]["solution_courante"](), resultat)
+
+
+
+class TestJetonAnnulation(unittest.TestCase):
+    """Tests de l'échéance stricte et de l'annulation coopérative."""
+
+    def test_echeance_respectee(self):
+        """time_limit_seconds est une échéance stricte, phases de finalisation comprises."""
+        depot, points, dechetteries, camions = generer_instance_routes(4, 200)
+        debut = time.perf_counter()
+        resultat = optimiser_silencieux(depot, points, dechetteries, camions, time_limit_seconds=1)
+        self.assertLess(time.perf_counter() - debut, 2.0)
+        servis = [w["id"] for r in resultat["routes"] for w in r["waypoints"] if w["type"] == "collecte"]
+        self.assertEqual(len(servis), len(points))
+
+    def test_annulation_depuis_un_autre_thread(self):
+        """Un jeton annulé arrête l'optimisation par OptimisationAnnulee."""
+        depot, points, dechetteries, camions = generer_instance_routes(4, 200)
+        jeton = JetonAnnulation()
+        threading.Timer(0.3, jeton.annuler).start()
+        debut = time.perf_counter()
+        with self.assertRaises(OptimisationAnnulee):
+            optimiser_silencieux(depot, points, dechetteries, camions, jeton=jeton)
+        self.assertLess(time.perf_counter() - debut, 1.5)
+        self.assertTrue(jeton.expire())
+
+
+class ServeurOsrmFactice(http.server.ThreadingHTTPServer):
+    """Table API locale : distances synthétiques (Manhattan en mètres), limite de 100 coordonnées."""
+
+    daemon_threads = True
+
+    def __init__(self, echecs_initiaux: int = 0, delai: float = 0.0):
+        super().__init__(("127.0.0.1", 0), GestionnaireOsrmFactice)
+        self.echecs_restants = echecs_initiaux
+        self.delai = delai
+        self.requetes = []
+        self.clients = set()
+        self.verrou = threading.Lock()
+
+    @staticmethod
+    def distance(a, b):
+        return 111000.0 * (abs(a[0] - b[0]) + abs(a[1] - b[1]))
+
+
+class GestionnaireOsrmFactice(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _repondre(self, code, corps):
+        raw = json.dumps(corps).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        chemin, _, requete = self.path.partition("?")
+        coords = [tuple(map(float, c.split(","))) for c in chemin.rsplit("/", 1)[1].split(";")]
+        params = dict(p.split("=", 1) for p in requete.split("&") if "=" in p)
+        serveur = self.server
+        with serveur.verrou:
+            serveur.requetes.append(len(coords))
+            serveur.clients.add(self.client_address)
+            echec = serveur.echecs_restants > 0
+            serveur.echecs_restants -= 1
+        if echec:
+            return self._repondre(503, {"code": "Unavailable"})
+        if len(coords) > 100:
+            return self._repondre(400, {"code": "TooBig"})
+        time.sleep(serveur.delai)
+        sources = [int(i) for i in params["sources"].split(";")] if "sources" in params else range(len(coords))
+        destinations = (
+            [int(j) for j in params["destinations"].split(";")] if "destinations" in params else range(len(coords))
+        )
+        distances = [[serveur.distance(coords[i], coords[j]) for j in destinations] for i in sources]
+        self._repondre(200, {
+            "code": "Ok",
+            "distances": distances,
+            "durations": [[d / 10.0 for d in ligne] for ligne in distances],
+        })
+
+
+class TestOsrmTuiles(unittest.TestCase):
+    """Tests de la récupération OSRM en tuiles contre un serveur Table local."""
+
+    def setUp(self):
+        self.attente = osrm_client.OSRM_ATTENTE_RETRY
+        osrm_client.OSRM_ATTENTE_RETRY = 0.01
+        self.serveur = ServeurOsrmFactice(echecs_initiaux=2)
+        threading.Thread(target=self.serveur.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.serveur.server_address[1]}"
+
+    def tearDown(self):
+        osrm_client.OSRM_ATTENTE_RETRY = self.attente
+        self.serveur.shutdown()
+        self.serveur.server_close()
+
+    def test_matrice_assemblee_au_dela_de_100_points(self):
+        """230 points : 25 tuiles <= 100 coordonnées, réessais par tuile, matrice exacte."""
+        rng = random.Random(4)
+        points = [(33.5 + rng.random() / 10, -7.6 + rng.random() / 10) for _ in range(230)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultat = osrm_client.fetch_osrm_table(points, self.base_url)
+        self.assertIsNotNone(resultat)
+        attendu = [[ServeurOsrmFactice.distance(a[::-1], b[::-1]) for b in points] for a in points]
+        for i in range(0, 230, 17):
+            for j in range(0, 230, 13):
+                self.assertAlmostEqual(resultat["distances"][i, j], attendu[i][j], places=3)
+                self.assertAlmostEqual(resultat["durations"][i, j], attendu[i][j] / 10, places=3)
+        self.assertEqual(len(self.serveur.requetes), 25 + 2)
+        self.assertLessEqual(max(self.serveur.requetes), 100)
+        self.assertLess(len(self.serveur.clients), len(self.serveur.requetes), "connexions réutilisées")
+
+    def test_build_distance_matrix(self):
+        """Matrice {(id, id): km} de l'optimiseur construite depuis les tuiles."""
+        depot = {"id": 0, "x": 0, "y": 0}
+        points = [{"id": i, "x": i % 15, "y": i // 15} for i in range(1, 120)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            matrice = osrm_client.build_distance_matrix_from_osrm(depot, points, [], base_url=self.base_url)
+        self.assertEqual(len(matrice), 120 * 120)
+        self.assertEqual(matrice[(5, 5)], 0.0)
+        self.assertAlmostEqual(matrice[(0, 16)], matrice[(16, 0)], places=6)
+        self.assertGreater(matrice[(0, 119)], matrice[(0, 1)])
+
+    def test_tuiles_mutualisees_entre_appels_concurrents(self):
+        """Deux optimisations demandent la même matrice en même temps : une seule série de requêtes."""
+        self.serveur.echecs_restants = 0
+        self.serveur.delai = 0.2
+        rng = random.Random(7)
+        points = [(33.5 + rng.random() / 10, -7.6 + rng.random() / 10) for _ in range(150)]
+        mutualisees = osrm_client.client_osrm.metriques.etat()["mutualisees"]
+        resultats, mesures = [None, None], [{}, {}]
+
+        def appel(k):
+            resultats[k] = osrm_client.fetch_osrm_table(points, self.base_url, mesures=mesures[k])
+
+        threads = [threading.Thread(target=appel, args=(k,)) for k in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.serveur.requetes), 9)  # 3 × 3 tuiles de 50, pas 18
+        np.testing.assert_array_equal(resultats[0]["distances"], resultats[1]["distances"])
+        self.assertEqual(sum(m.get("mutualisees", 0) for m in mesures), 9)
+        etat = osrm_client.client_osrm.metriques.etat()
+        self.assertEqual(etat["mutualisees"] - mutualisees, 9)
+        self.assertGreaterEqual(etat["latence_ms"]["p95"], 200)
+        self.assertLessEqual(len(self.serveur.clients), osrm_client.OSRM_MAX_CONNEXIONS)
+
+    def test_cache_paires_persistant(self):
+        """Second appel servi par le cache ; nouveaux points : seules leurs lignes / colonnes."""
+        depot = {"id": 0, "x": 0, "y": 0}
+        points = [{"id": i, "x": i % 8, "y": i // 8} for i in range(1, 60)]
+        with tempfile.TemporaryDirectory() as repertoire:
+            chemin = os.path.join(repertoire, "osrm.sqlite")
+
+            def construire(pts, cache):
+                stats = {}
+                with contextlib.redirect_stdout(io.StringIO()):
+                    matrice = osrm_client.build_distance_matrix_from_osrm(
+                        depot, pts, [], base_url=self.base_url, cache=cache, statistiques=stats)
+                return matrice, stats
+
+            reference, stats = construire(points, osrm_client.CacheOsrm(chemin))
+            self.assertEqual(stats["paires_en_cache"], 0)
+            self.assertEqual(stats["paires_demandees"], 60 * 60)
+
+            cache = osrm_client.CacheOsrm(chemin)  # relu depuis le disque
+            nb_requetes = len(self.serveur.requetes)
+            matrice, stats = construire(points, cache)
+            self.assertEqual(len(self.serveur.requetes), nb_requetes)
+            self.assertEqual(stats["taux_succes_cache"], 100.0)
+            self.assertEqual(matrice, reference)
+
+            ajouts = points + [{"id": i, "x": 20 + i, "y": 3} for i in range(60, 65)]
+            matrice, stats = construire(ajouts, cache)
+            self.assertEqual(stats["paires_en_cache"], 60 * 59)
+            self.assertEqual(stats["paires_demandees"], 5 * 65 + 60 * 5)
+            self.assertAlmostEqual(matrice[(64, 3)], ServeurOsrmFactice.distance(
+                osrm_client.xy_to_latlng(84, 3)[::-1], osrm_client.xy_to_latlng(3, 0)[::-1]) / 1000, places=3)
+
+            self.assertEqual(cache.invalider([osrm_client.CacheOsrm.cle(*osrm_client.xy_to_latlng(84, 3))]), 2 * 64)
+            _, stats = construire(ajouts, cache)
+            self.assertEqual(stats["paires_demandees"], 65 + 64)
+
+            cache.ttl_s = -1.0  # tout est expiré
+            _, stats = construire(points, cache)
+            self.assertEqual(stats["paires_en_cache"], 0)
+            self.assertGreater(cache.purger_expires(), 0)
+            self.assertEqual(cache.etat()["nb_paires"], 0)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "fork indisponible")
+    def test_processus_fils_boucle_neuve(self):
+        """Processus fils (fork) après un appel : boucle et pool neufs, requête servie sans attendre."""
+        points = [(33.5 + k / 100, -7.6) for k in range(5)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNotNone(osrm_client.fetch_osrm_table(points, self.base_url))
+
+        def fils():
+            debut = time.perf_counter()
+            resultat = osrm_client.fetch_osrm_table(points, self.base_url, delai_s=5)
+            return [resultat is not None, time.perf_counter() - debut < 5,
+                    osrm_client.client_osrm.metriques.etat()["connexions_reutilisees"]]
+
+        self.assertEqual(dans_processus_fils(fils), [True, True, 0])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "fork indisponible")
+    def test_cache_processus_fils(self):
+        """Processus fils (fork) : le cache rouvre sa propre connexion SQLite."""
+        with tempfile.TemporaryDirectory() as repertoire:
+            cache = osrm_client.CacheOsrm(os.path.join(repertoire, "osrm.sqlite"))
+            a, b = osrm_client.CacheOsrm.cle(33.5, -7.6), osrm_client.CacheOsrm.cle(33.6, -7.5)
+            cache.ecrire([a], [b], np.array([[1.0]]), np.array([[2.0]]))
+            connexion_parent = cache._conn
+
+            def fils():
+                cache.ecrire([b], [a], np.array([[3.0]]), np.array([[4.0]]))
+                return [cache.etat()["nb_paires"], cache._conn is not connexion_parent]
+
+            self.assertEqual(dans_processus_fils(fils), [2, True])
+            self.assertIs(cache._conn, connexion_parent)
+            self.assertEqual(cache.etat()["nb_paires"], 2)
+
+
+
+class TestMatriceTrajets(unittest.TestCase):
+    """Distances et durées conservées ensemble ; optimisation sur le temps de trajet."""
+
+    def test_completer_matrices(self):
+        """Mètres / secondes → km / minutes ; valeur manquante déduite de l'autre matrice."""
+        distances = np.array([[0.0, 3000.0, np.nan], [3000.0, 0.0, np.nan], [np.nan, np.nan, 0.0]])
+        durees = np.array([[0.0, 600.0, 720.0], [600.0, 0.0, np.nan], [720.0, np.nan, 0.0]])
+        km, minutes = completer_matrices(distances, durees)
+        self.assertEqual(km[0, 1], 3.0)
+        self.assertEqual(minutes[0, 1], 10.0)  # durée OSRM gardée, pas 3 km à 30 km/h
+        self.assertAlmostEqual(km[0, 2], 6.0)   # 12 min à 30 km/h
+        self.assertEqual(km[1, 2], 999999.0)
+        matrice = MatriceTrajets(["d", "a", "b"], km, minutes)
+        self.assertEqual(matrice.duree_parcours(["d", "a", "d"]), 20.0)
+        self.assertEqual(matrice.distances_dict()[("a", "d")], 3.0)
+
+    def test_objectif_temps(self):
+        """Route lente entre 1 et 2 : l'objectif "temps" l'évite, durées dans le résultat."""
+        depot = Point(0, 0, 0, type_point="depot")
+        points = [Point(i, i, 0, volume=10) for i in (1, 2, 3)]
+        matrice = MatriceTrajets.euclidienne([0, 1, 2, 3], [0, 1, 2, 3], [0, 0, 0, 0])
+        matrice.durees_min[1, 2] = matrice.durees_min[2, 1] = 100.0
+        camions = [{"id": 1, "capacite": 1000, "cout_fixe": 0, "zones_accessibles": []}]
+        for graine in (13, 25, 55, 56):  # graines qui déplaçaient le dépôt de retour (recuit)
+            random.seed(graine)
+            optimiseur = OptimiseurRoutes(depot, points, [], camions, matrice_trajets=matrice, objectif="temps")
+            with contextlib.redirect_stdout(io.StringIO()):
+                optimiseur.optimiser_routes()
+            resultat = optimiseur.to_dict()
+            self.assertEqual(resultat["routes"][0]["duree_trajet_minutes"], 12.0, f"graine {graine}")
+        random.seed(0)
+        for objectif in ("distance", "temps"):
+            optimiseur = OptimiseurRoutes(depot, points, [], camions, matrice_trajets=matrice, objectif=objectif)
+            with contextlib.redirect_stdout(io.StringIO()):
+                optimiseur.optimiser_routes()
+            resultat = optimiseur.to_dict()
+            route = resultat["routes"][0]
+            self.assertEqual(resultat["statistiques"]["objectif"], objectif)
+            self.assertIn("duree_trajet_minutes", route)
+        ordre = [w["id"] for w in route["waypoints"]]
+        self.assertNotIn((1, 2), list(zip(ordre, ordre[1:])) + list(zip(ordre[1:], ordre)))
+        self.assertEqual(route["duree_trajet_minutes"], 12.0)
+        self.assertEqual(resultat["statistiques"]["borne_inferieure_minutes"], 12.0)
+        with self.assertRaises(ValueError):
+            OptimiseurRoutes(depot, points, [], camions, objectif="cout")
+
+class TestProjection(unittest.TestCase):
+    """Conversions lat/lng ↔ x/y et haversine en lot."""
+
+    def test_projection_et_haversine_vectorisees(self):
+        rng = np.random.default_rng(0)
+        xs, ys = rng.uniform(-20, 20, 50), rng.uniform(-20, 20, 50)
+        lat, lng = projection.xy_vers_latlng(xs, ys)
+        self.assertEqual(osrm_client.xy_to_latlng(xs[7], ys[7]), (lat[7], lng[7]))
+        x2, y2 = projection.latlng_vers_xy(lat, lng)
+        np.testing.assert_allclose(x2, xs, atol=1e-9)
+        np.testing.assert_allclose(y2, ys, atol=1e-9)
+
+        self.assertAlmostEqual(float(projection.haversine_km(33.0, -7.0, 34.0, -7.0)), 111.195, places=2)
+        matrice = projection.matrice_haversine_km(lat, lng)
+        self.assertEqual(matrice.shape, (50, 50))
+        np.testing.assert_allclose(matrice, matrice.T)
+        self.assertEqual(float(np.abs(np.diag(matrice)).max()), 0.0)
+        self.assertAlmostEqual(matrice[3, 9], float(projection.haversine_km(lat[3], lng[3], lat[9], lng[9])))
+        # Près du centre, la projection plane et la haversine concordent (< 0,5 %)
+        np.testing.assert_allclose(matrice, np.hypot(xs[:, None] - xs, ys[:, None] - ys), rtol=5e-3, atol=1e-9)
+
+        cumul = projection.distances_cumulees_km(lat[:4], lng[:4])
+        self.assertEqual(cumul[0], 0.0)
+        self.assertAlmostEqual(cumul[-1], matrice[0, 1] + matrice[1, 2] + matrice[2, 3])
+        self.assertEqual(len(projection.distances_cumulees_km([], [])), 0)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
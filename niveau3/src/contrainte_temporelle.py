@@ -2,11 +2,33 @@
 """
 Module ContrainteTemporelle - Niveau 3 VillePropre
 Gestion des règles temporelles : fenêtres, pauses, zones interdites, congestion.
+
+Heures manipulées en minutes depuis minuit (chaque chaîne "HH:MM" n'est parsée
+qu'une fois) ; masques_realisabilite() évalue tous les (camion, zone, créneau)
+d'un coup avec numpy.
 """
 
-from datetime import datetime, time, timedelta
+from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, List, Tuple, Optional
 
+import numpy as np
+
+NUIT_DEBUT_MINUTES = 22 * 60  # 22h00
+NUIT_FIN_MINUTES = 6 * 60     # 06h00
+
+
+@lru_cache(maxsize=4096)
+def en_minutes(heure: str) -> int:
+    """Convertit "HH:MM" en minutes depuis minuit (parsing mémorisé)."""
+    t = datetime.strptime(heure, "%H:%M")
+    return t.hour * 60 + t.minute
+
+
+def _dans_nuit(minutes):
+    """Heure (ou tableau numpy d'heures) en minutes dans la plage 22h-6h."""
+    return (minutes >= NUIT_DEBUT_MINUTES) | (minutes < NUIT_FIN_MINUTES)
+
 
 class ContrainteTemporelle:
     """
@@ -91,15 +113,12 @@ class ContrainteTemporelle:
         # 1. Vérifier fenêtre zone
         if zone_id in self.fenetres_zone:
             debut_zone, fin_zone = self.fenetres_zone[zone_id]
-            debut_zone_time = datetime.strptime(debut_zone, "%H:%M").time()
-            fin_zone_time = datetime.strptime(fin_zone, "%H:%M").time()
-
-            if creneau.debut_datetime < debut_zone_time:
+            if creneau.debut_minutes < en_minutes(debut_zone):
                 return (
                     False,
                     f"Zone {zone_id} pas encore ouverte à {creneau.debut_str}",
                 )
-            if creneau.fin_datetime > fin_zone_time:
+            if creneau.fin_minutes > en_minutes(fin_zone):
                 return (
                     False,
                     f"Zone {zone_id} fermée à {creneau.fin_str}",
@@ -108,32 +127,16 @@ class ContrainteTemporelle:
         # 2. Vérifier pauses camion
         if camion_id in self.pauses_camion:
             for pause_debut, pause_fin in self.pauses_camion[camion_id]:
-                pause_debut_time = datetime.strptime(
-                    pause_debut, "%H:%M"
-                ).time()
-                pause_fin_time = datetime.strptime(pause_fin, "%H:%M").time()
-
                 # Chevauchement pause/créneau ?
-                if creneau.debut_datetime < pause_fin_time and pause_debut_time < creneau.fin_datetime:
+                if creneau.debut_minutes < en_minutes(pause_fin) and en_minutes(pause_debut) < creneau.fin_minutes:
                     return (
                         False,
                         f"Camion {camion_id} en pause {pause_debut}-{pause_fin}",
                     )
 
-        # 3. Vérifier interdiction nocturne
+        # 3. Vérifier interdiction nocturne (créneau commençant ou finissant entre 22h et 6h)
         if zone_id in self.zones_interdites_nuit:
-            nuit_debut = time(22, 0)  # 22h00
-            nuit_fin = time(6, 0)  # 06h00
-
-            # Si créneau chevauche la nuit (22h-6h)
-            def heure_dans_nuit(t: time) -> bool:
-                if nuit_debut > nuit_fin:  # Nuit traverse minuit
-                    return t >= nuit_debut or t < nuit_fin
-                return nuit_debut <= t < nuit_fin
-
-            if heure_dans_nuit(creneau.debut_datetime) or heure_dans_nuit(
-                creneau.fin_datetime
-            ):
+            if _dans_nuit(creneau.debut_minutes) or _dans_nuit(creneau.fin_minutes):
                 return False, f"Zone {zone_id} interdite la nuit"
 
         # 4. Vérifier durée suffisante
@@ -174,7 +177,7 @@ class ContrainteTemporelle:
             penalite += (creneau.cout_congestion - 1.0) * 100
 
         # Pénalité horaire (préférer milieu de journée)
-        heure_debut = creneau.debut_datetime.hour
+        heure_debut = creneau.debut_minutes // 60
         if heure_debut < 7:
             penalite += 50
         elif heure_debut < 8:
@@ -184,6 +187,95 @@ class ContrainteTemporelle:
 
         return penalite
 
+    def masques_realisabilite(
+        self,
+        camion_ids: List[int],
+        zone_ids: List[int],
+        creneaux: list,
+        durees_minutes: List[int],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Réalisabilité et pénalités de tous les (camion, zone, créneau) en une passe numpy.
+
+        Les règles se factorisent : fenêtre, nuit et durée ne dépendent que de
+        (zone, créneau), les pauses que de (camion, créneau), la pénalité que de
+        (zone, créneau). est_realisable(c, z, k) == masque_zones[z, k] & masque_camions[c, k].
+
+        Args:
+            camion_ids: Camions (lignes de masque_camions).
+            zone_ids: Zones (lignes de masque_zones et penalites).
+            creneaux: Créneaux (colonnes).
+            durees_minutes: Durée estimée de chaque zone (même ordre que zone_ids).
+
+        Returns:
+            (masque_zones bool[Z, K], masque_camions bool[C, K], penalites float[Z, K])
+        """
+        debuts = np.array([c.debut_minutes for c in creneaux], dtype=np.int64)
+        fins = np.array([c.fin_minutes for c in creneaux], dtype=np.int64)
+        durees_creneaux = np.array([c.duree_minutes for c in creneaux], dtype=np.int64)
+        facteurs = np.array([c.cout_congestion for c in creneaux], dtype=float)
+        nb_zones, nb_creneaux = len(zone_ids), len(creneaux)
+
+        # (zone, créneau) : fenêtre horaire
+        ouverture = np.zeros(nb_zones, dtype=np.int64)
+        fermeture = np.full(nb_zones, 24 * 60, dtype=np.int64)
+        for i, zid in enumerate(zone_ids):
+            if int(zid) in self.fenetres_zone:
+                debut_zone, fin_zone = self.fenetres_zone[int(zid)]
+                ouverture[i] = en_minutes(debut_zone)
+                fermeture[i] = en_minutes(fin_zone)
+        masque_zones = (debuts[None, :] >= ouverture[:, None]) & (fins[None, :] <= fermeture[:, None])
+
+        # Interdiction nocturne
+        interdites = set(self.zones_interdites_nuit)
+        nuit = np.array([int(zid) in interdites for zid in zone_ids], dtype=bool)
+        creneaux_nuit = _dans_nuit(debuts) | _dans_nuit(fins)
+        masque_zones &= ~(nuit[:, None] & creneaux_nuit[None, :])
+
+        # Durée avec congestion (troncature comme ajuster_duree_avec_congestion)
+        durees = np.maximum(0, np.asarray(durees_minutes, dtype=np.int64)).reshape(-1, 1)
+        besoin = np.floor(np.maximum(0.0, durees * facteurs[None, :]))
+        masque_zones &= besoin <= durees_creneaux[None, :]
+
+        # (camion, créneau) : pauses
+        masque_camions = np.ones((len(camion_ids), nb_creneaux), dtype=bool)
+        for i, cid in enumerate(camion_ids):
+            for pause_debut, pause_fin in self.pauses_camion.get(int(cid), []):
+                masque_camions[i] &= ~((debuts < en_minutes(pause_fin)) & (en_minutes(pause_debut) < fins))
+
+        # Pénalités (même formule que calculer_penalite)
+        penalites = np.repeat(((facteurs - 1.0) * 100)[None, :], nb_zones, axis=0)
+        if self.congestion:
+            index_zone = {int(zid): i for i, zid in enumerate(zone_ids)}
+            index_creneau = {c.id: k for k, c in enumerate(creneaux)}
+            for (zid, creneau_id), niveau in self.congestion.items():
+                i, k = index_zone.get(zid), index_creneau.get(creneau_id)
+                if i is not None and k is not None:
+                    penalites[i, k] = (niveau - 1.0) * 100
+        heures = debuts // 60
+        penalites += np.select([heures < 7, heures < 8, heures >= 18], [50.0, 20.0, 30.0], 0.0)[None, :]
+
+        return masque_zones, masque_camions, penalites
+
+    def matrice_realisabilite(
+        self,
+        camion_ids: List[int],
+        zone_ids: List[int],
+        creneaux: list,
+        durees_minutes: List[int],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Matrices complètes (réalisable bool[C, Z, K], pénalité float[C, Z, K]).
+
+        Diffusion de masques_realisabilite() ; préférer les masques factorisés
+        quand C × Z × K est grand.
+        """
+        masque_zones, masque_camions, penalites = self.masques_realisabilite(
+            camion_ids, zone_ids, creneaux, durees_minutes
+        )
+        realisable = masque_camions[:, None, :] & masque_zones[None, :, :]
+        return realisable, np.broadcast_to(penalites, realisable.shape)
+
     def charger_depuis_dict(self, data: dict) -> None:
         """
         Charge les contraintes depuis un dictionnaire.
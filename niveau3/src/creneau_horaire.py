@@ -43,16 +43,16 @@ class CreneauHoraire:
         # Parser les heures
         self.debut_datetime = datetime.strptime(debut, "%H:%M").time()
         self.fin_datetime = datetime.strptime(fin, "%H:%M").time()
+        # Minutes depuis minuit (comparaisons entières, calculs vectorisés)
+        self.debut_minutes = self.debut_datetime.hour * 60 + self.debut_datetime.minute
+        self.fin_minutes = self.fin_datetime.hour * 60 + self.fin_datetime.minute
 
         # Calculer durée
         self._calculer_duree()
 
     def _calculer_duree(self) -> None:
         """Calcule la durée en minutes entre debut et fin."""
-        d1 = datetime.combine(datetime.today(), self.debut_datetime)
-        d2 = datetime.combine(datetime.today(), self.fin_datetime)
-        delta = d2 - d1
-        self.duree_minutes = max(0, int(delta.total_seconds() / 60))
+        self.duree_minutes = max(0, self.fin_minutes - self.debut_minutes)
 
     def duree(self) -> float:
         """Retourne la durée en heures (float)."""
@@ -76,8 +76,8 @@ class CreneauHoraire:
 
         # Chevauchement si : self.debut < autre.fin ET autre.debut < self.fin
         return (
-            self.debut_datetime < autre_creneau.fin_datetime
-            and autre_creneau.debut_datetime < self.fin_datetime
+            self.debut_minutes < autre_creneau.fin_minutes
+            and autre_creneau.debut_minutes < self.fin_minutes
         )
 
     def contient_heure(self, heure_str: str) -> bool:
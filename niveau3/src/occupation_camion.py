@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Module OccupationCamion - Niveau 3 VillePropre
+Index des intervalles occupés d'un camion, par jour, en minutes depuis minuit.
+
+Par jour : listes triées des débuts et des fins d'intervalles disjoints [debut, fin[.
+Les intervalles étant disjoints, les fins sont triées dans le même ordre que les
+débuts : un chevauchement se teste par une seule recherche dichotomique (bisect).
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional, Tuple
+
+MINUTES_JOUR = 24 * 60
+
+
+class OccupationCamion:
+    """
+    Intervalles occupés d'un camion, indexés par jour.
+
+    - chevauche / est_libre : O(log n)
+    - ajouter / retirer : O(log n) recherche + insertion / suppression dans la liste
+    - premier_creneau_libre : O(log n + intervalles parcourus)
+    """
+
+    def __init__(self):
+        # {jour: ([debuts triés], [fins triées])}
+        self._jours: Dict[str, Tuple[List[int], List[int]]] = {}
+
+    def _listes(self, jour: str) -> Tuple[List[int], List[int]]:
+        return self._jours.get(jour, ([], []))
+
+    def chevauche(self, jour: str, debut: int, fin: int) -> bool:
+        """
+        Vérifie si [debut, fin[ chevauche un intervalle occupé du jour.
+
+        Bout à bout (fin occupée == debut) ne chevauche pas, comme
+        CreneauHoraire.chevauche.
+        """
+        debuts, fins = self._listes(jour)
+        # Premier intervalle occupé qui se termine après debut
+        i = bisect_right(fins, debut)
+        return i < len(debuts) and debuts[i] < fin
+
+    def est_libre(self, jour: str, debut: int, fin: int) -> bool:
+        """True si [debut, fin[ ne touche aucun intervalle occupé."""
+        return not self.chevauche(jour, debut, fin)
+
+    def ajouter(self, jour: str, debut: int, fin: int) -> None:
+        """
+        Marque [debut, fin[ comme occupé.
+
+        Raises:
+            ValueError: si l'intervalle chevauche un intervalle déjà occupé.
+        """
+        if fin <= debut:
+            return
+        if self.chevauche(jour, debut, fin):
+            raise ValueError(f"Intervalle {debut}-{fin} déjà occupé le {jour}")
+        debuts, fins = self._jours.setdefault(jour, ([], []))
+        insort(debuts, debut)
+        insort(fins, fin)
+
+    def retirer(self, jour: str, debut: int, fin: int) -> None:
+        """
+        Libère l'intervalle [debut, fin[ précédemment ajouté.
+
+        Raises:
+            ValueError: si cet intervalle n'est pas occupé.
+        """
+        if fin <= debut:
+            return
+        debuts, fins = self._listes(jour)
+        i = bisect_left(debuts, debut)
+        if i >= len(debuts) or debuts[i] != debut or fins[i] != fin:
+            raise ValueError(f"Intervalle {debut}-{fin} non occupé le {jour}")
+        del debuts[i]
+        del fins[i]
+
+    def ajouter_creneau(self, creneau) -> None:
+        """Marque un CreneauHoraire comme occupé."""
+        self.ajouter(creneau.jour, creneau.debut_minutes, creneau.fin_minutes)
+
+    def retirer_creneau(self, creneau) -> None:
+        """Libère un CreneauHoraire précédemment ajouté."""
+        self.retirer(creneau.jour, creneau.debut_minutes, creneau.fin_minutes)
+
+    def chevauche_creneau(self, creneau) -> bool:
+        """Vérifie si un CreneauHoraire chevauche un intervalle occupé."""
+        return self.chevauche(creneau.jour, creneau.debut_minutes, creneau.fin_minutes)
+
+    def premier_creneau_libre(
+        self,
+        jour: str,
+        duree: int,
+        debut_min: int = 0,
+        fin_max: int = MINUTES_JOUR,
+    ) -> Optional[int]:
+        """
+        Début du premier trou libre d'au moins duree minutes dans [debut_min, fin_max[.
+
+        Returns:
+            Minute de début, ou None si aucun trou ne convient.
+        """
+        debuts, fins = self._listes(jour)
+        t = debut_min
+        i = bisect_right(fins, t)
+        while t + duree <= fin_max:
+            if i >= len(debuts) or t + duree <= debuts[i]:
+                return t
+            t = max(t, fins[i])
+            i += 1
+        return None
+
+    def intervalles(self, jour: str) -> List[Tuple[int, int]]:
+        """Intervalles occupés du jour, triés."""
+        debuts, fins = self._listes(jour)
+        return list(zip(debuts, fins))
+
+    def __len__(self) -> int:
+        return sum(len(debuts) for debuts, _ in self._jours.values())
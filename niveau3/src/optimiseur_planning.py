@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Module OptimiseurPlanning - Niveau 3 VillePropre
+Optimisation globale de l'affectation zone → créneau de chaque camion.
+
+Les pénalités (calculer_penalite) ne dépendent que de (zone, créneau) et les créneaux
+ne sont pas partagés entre camions : le problème camion × zone × créneau se
+décompose en un problème par camion, résolu sur toutes ses zones à la fois
+(au lieu de servir les zones une à une dans l'ordre de priorité) :
+
+- créneaux candidats deux à deux disjoints → affectation de coût minimal exacte
+  (algorithme hongrois, colonnes fictives « non planifiée ») ;
+- créneaux qui se chevauchent → recherche locale depuis le plan glouton
+  (déplacement, échange, éjection pour insérer une zone non planifiée).
+
+Coût d'une zone non planifiée : PENALITE_ZONE_NON_PLANIFIEE (+ BONUS_PRIORITE par
+niveau de priorité) ; la couverture prime toujours sur la congestion.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from occupation_camion import OccupationCamion
+
+PENALITE_ZONE_NON_PLANIFIEE = 10000.0
+BONUS_PRIORITE = 1000.0             # haute > normale > basse à couverture égale
+RECHERCHE_LOCALE_MAX_PASSES = 50
+_COUT_INTERDIT = 1e9                # cellule irréalisable dans la matrice hongroise
+_EPSILON = 1e-9
+
+
+def cout_non_planifiee(ordre_priorite: int) -> float:
+    """Coût d'une zone laissée sans créneau (ordre_priorite : 0 = haute, 2 = basse)."""
+    return PENALITE_ZONE_NON_PLANIFIEE + BONUS_PRIORITE * (2 - ordre_priorite)
+
+
+def affectation_min_cout(couts: np.ndarray) -> List[int]:
+    """
+    Algorithme hongrois (potentiels, O(n² m)) : une colonne distincte par ligne, coût minimal.
+
+    Args:
+        couts: Matrice n × m avec n <= m (valeurs finies).
+
+    Returns:
+        Colonne affectée à chaque ligne.
+    """
+    n, m = couts.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)    # p[j] = ligne (1..n) affectée à la colonne j
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            cur = couts[i0 - 1] - u[i0] - v[1:]
+            libres = ~used[1:]
+            maj = libres & (cur < minv[1:])
+            minv[1:][maj] = cur[maj]
+            way[1:][maj] = j0
+            candidats = np.where(libres, minv[1:], np.inf)
+            j1 = int(np.argmin(candidats)) + 1
+            delta = candidats[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    resultat = [-1] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            resultat[p[j] - 1] = j - 1
+    return resultat
+
+
+def creneaux_disjoints(creneaux: Sequence) -> bool:
+    """True si aucun couple de créneaux ne se chevauche (même jour, intervalles croisés)."""
+    # Créneaux vides ou inversés : jamais occupés (cf. OccupationCamion.ajouter)
+    tries = sorted(
+        (c for c in creneaux if c.fin_minutes > c.debut_minutes),
+        key=lambda c: (c.jour, c.debut_minutes),
+    )
+    for a, b in zip(tries, tries[1:]):
+        if a.jour == b.jour and b.debut_minutes < a.fin_minutes:
+            return False
+    return True
+
+
+def cout_plan(penalites: np.ndarray, couts_absence: np.ndarray, affectation: Sequence[Optional[int]]) -> float:
+    """Pénalités des zones planifiées + coût des zones sans créneau."""
+    return float(sum(
+        couts_absence[i] if k is None else penalites[i, k]
+        for i, k in enumerate(affectation)
+    ))
+
+
+def _affectation_exacte(
+    penalites: np.ndarray, couts_absence: np.ndarray, colonnes: np.ndarray
+) -> List[Optional[int]]:
+    """Affectation hongroise sur les créneaux candidats (disjoints) + n colonnes fictives."""
+    n = penalites.shape[0]
+    sous = penalites[:, colonnes]
+    couts = np.hstack([
+        np.where(np.isfinite(sous), sous, _COUT_INTERDIT),
+        np.repeat(couts_absence[:, None], n, axis=1),
+    ])
+    return [
+        int(colonnes[j]) if j < len(colonnes) else None
+        for j in affectation_min_cout(couts)
+    ]
+
+
+def _recherche_locale(
+    penalites: np.ndarray,
+    couts_absence: np.ndarray,
+    creneaux: Sequence,
+    affectation: List[Optional[int]],
+) -> List[Optional[int]]:
+    """Déplacements, échanges et éjections tant que le coût baisse."""
+    n = len(affectation)
+    affectation = list(affectation)
+    occupation = OccupationCamion()
+    for k in affectation:
+        if k is not None:
+            occupation.ajouter_creneau(creneaux[k])
+    ordres = [
+        [int(k) for k in np.argsort(penalites[i], kind="stable") if np.isfinite(penalites[i, k])]
+        for i in range(n)
+    ]
+
+    def cout(i: int, k: Optional[int]) -> float:
+        return couts_absence[i] if k is None else penalites[i, k]
+
+    def meilleur_libre(i: int) -> Optional[int]:
+        for k in ordres[i]:
+            if not occupation.chevauche_creneau(creneaux[k]):
+                return k
+        return None
+
+    def prendre(i: int, k: Optional[int]) -> None:
+        if affectation[i] is not None:
+            occupation.retirer_creneau(creneaux[affectation[i]])
+        affectation[i] = k
+        if k is not None:
+            occupation.ajouter_creneau(creneaux[k])
+
+    for _ in range(RECHERCHE_LOCALE_MAX_PASSES):
+        ameliore = False
+
+        # 1. Déplacement vers le meilleur créneau libre
+        for i in range(n):
+            actuel = affectation[i]
+            prendre(i, None)
+            k = meilleur_libre(i)
+            if k is not None and cout(i, k) < cout(i, actuel) - _EPSILON:
+                prendre(i, k)
+                ameliore = True
+            else:
+                prendre(i, actuel)
+
+        # 2. Échange des créneaux de deux zones planifiées (même ensemble de créneaux)
+        for i in range(n):
+            for j in range(i + 1, n):
+                ki, kj = affectation[i], affectation[j]
+                if ki is None or kj is None:
+                    continue
+                avant = penalites[i, ki] + penalites[j, kj]
+                apres = penalites[i, kj] + penalites[j, ki]
+                if apres < avant - _EPSILON:
+                    affectation[i], affectation[j] = kj, ki
+                    ameliore = True
+
+        # 3. Éjection : une zone non planifiée prend le créneau d'une zone replacée ailleurs
+        for i in range(n):
+            if affectation[i] is not None:
+                continue
+            for k in ordres[i]:
+                cible = creneaux[k]
+                bloquantes = [
+                    j for j in range(n)
+                    if affectation[j] is not None and cible.chevauche(creneaux[affectation[j]])
+                ]
+                if len(bloquantes) != 1:
+                    continue
+                j = bloquantes[0]
+                ancien = affectation[j]
+                prendre(j, None)
+                prendre(i, k)
+                nouveau = meilleur_libre(j)
+                if cout(i, k) + cout(j, nouveau) < cout(i, None) + cout(j, ancien) - _EPSILON:
+                    prendre(j, nouveau)
+                    ameliore = True
+                    break
+                prendre(i, None)
+                prendre(j, ancien)
+
+        if not ameliore:
+            break
+    return affectation
+
+
+def optimiser_camion(
+    penalites: np.ndarray,
+    couts_absence: np.ndarray,
+    creneaux: Sequence,
+    affectation_initiale: Sequence[Optional[int]],
+) -> Tuple[List[Optional[int]], bool]:
+    """
+    Affectation zone → créneau d'un camion minimisant pénalités + coûts d'absence.
+
+    Args:
+        penalites: n zones × K créneaux, np.inf si irréalisable (contraintes, horizon).
+        couts_absence: Coût de chaque zone laissée sans créneau.
+        creneaux: Les K créneaux (CreneauHoraire).
+        affectation_initiale: Plan de départ (glouton), indice de créneau ou None.
+
+    Returns:
+        (affectation, exacte) ; jamais plus coûteuse que affectation_initiale.
+    """
+    initiale = list(affectation_initiale)
+    if not initiale:
+        return initiale, True
+    colonnes = np.flatnonzero(np.isfinite(penalites).any(axis=0))
+    if colonnes.size == 0:
+        return initiale, True
+
+    exacte = creneaux_disjoints([creneaux[k] for k in colonnes])
+    if exacte:
+        affectation = _affectation_exacte(penalites, couts_absence, colonnes)
+    else:
+        affectation = _recherche_locale(penalites, couts_absence, creneaux, initiale)
+
+    if cout_plan(penalites, couts_absence, affectation) < cout_plan(penalites, couts_absence, initiale) - _EPSILON:
+        return affectation, exacte
+    return initiale, exacte
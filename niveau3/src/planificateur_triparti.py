@@ -6,9 +6,13 @@ Transforme l'affectation Camion↔Zone du Niveau 2 en planning Camion↔Zone↔C
 
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
+import math
 import sys
+import time
 from pathlib import Path
 
+import numpy as np
+
 # Import du niveau 2
 script_dir = Path(__file__).resolve().parent
 niveau2_src = script_dir.parent.parent / "niveau2" / "src"
@@ -17,8 +21,21 @@ sys.path.insert(0, str(niveau2_src))
 from affectateur_biparti import AffectateurBiparti, ORDRE_PRIORITE
 
 # Imports locaux (niveau3)
-from contrainte_temporelle import ContrainteTemporelle
+from contrainte_temporelle import ContrainteTemporelle, en_minutes
 from creneau_horaire import CreneauHoraire
+from occupation_camion import MINUTES_JOUR, OccupationCamion
+from optimiseur_planning import cout_non_planifiee, optimiser_camion
+from planification_chronologique import minutes_en_heure, planifier_camion, temps_trajet_minutes
+from robustesse_planning import (
+    CV_CONGESTION,
+    CV_VOLUME_POINT,
+    construire_modele,
+    evaluer_robustesse,
+    rejouer,
+    retards,
+)
+
+METHODES_PLANNING = ("glouton", "optimal", "chronologique")
 
 
 class PlanificateurTriparti:
@@ -32,6 +49,12 @@ class PlanificateurTriparti:
          Trouver le meilleur créneau disponible
          Vérifier contraintes temporelles
          Affecter au planning (sans chevauchement pour un même camion)
+
+    Réalisabilité et pénalités de tous les (camion, zone, créneau) sont précalculées
+    en masques numpy (ContrainteTemporelle.masques_realisabilite) au début de
+    generer_plan_optimal ; la recherche du créneau ne fait plus que les consulter.
+    Les créneaux déjà pris par un camion sont indexés par jour (OccupationCamion,
+    bisect) : test de chevauchement en O(log n).
     """
 
     def __init__(self, affectateur: AffectateurBiparti, contraintes: ContrainteTemporelle):
@@ -39,13 +62,38 @@ class PlanificateurTriparti:
         self.contraintes = contraintes
         self.creneaux: List[CreneauHoraire] = []
         self.planning: Dict[str, List] = {}
+        self._masques: Optional[dict] = None
+        self.rapport_optimisation: Optional[dict] = None
 
     def ajouter_creneaux(self, creneaux: List[CreneauHoraire]) -> None:
         """Définit la liste des créneaux disponibles."""
         self.creneaux = list(creneaux)
+        self._masques = None
+
+    def _preparer_masques(self) -> dict:
+        """
+        Précalcule, pour tous les camions, zones et créneaux :
+        masques de réalisabilité et pénalités.
+        """
+        camions = self.affectateur.camions
+        zones = self.affectateur.zones
+        masque_zones, masque_camions, penalites = self.contraintes.masques_realisabilite(
+            [c.id for c in camions],
+            [z.id for z in zones],
+            self.creneaux,
+            [self._estimer_duree_zone(z) for z in zones],
+        )
+        self._masques = {
+            "index_camion": {c.id: i for i, c in enumerate(camions)},
+            "index_zone": {z.id: j for j, z in enumerate(zones)},
+            "zones": masque_zones,
+            "camions": masque_camions,
+            "penalites": penalites,
+        }
+        return self._masques
 
     def generer_plan_optimal(
-        self, affectation_n2: dict, horizon_jours: int = 7
+        self, affectation_n2: dict, horizon_jours: int = 7, methode: str = "glouton", jeton=None
     ) -> dict:
         """
         Génère un planning hebdomadaire optimal.
@@ -53,6 +101,12 @@ class PlanificateurTriparti:
         Args:
             affectation_n2: Résultat du Niveau 2 {camion_id: [zone_ids]}.
             horizon_jours: Nombre de jours à planifier.
+            methode: "glouton" (meilleur créneau restant, zone par zone), "optimal"
+                (plan glouton puis optimisation globale par camion, cf. optimiseur_planning)
+                ou "chronologique" (plusieurs zones enchaînées à la minute dans un même
+                créneau, cf. planification_chronologique).
+            jeton: Échéance (objet avec expire(), cf. niveau2 JetonAnnulation) : avec
+                "optimal", les camions restants après l'échéance gardent le plan glouton.
 
         Returns:
             Planning : {
@@ -69,7 +123,14 @@ class PlanificateurTriparti:
               ],
               ...
             }
+
+        Raises:
+            ValueError: méthode inconnue.
         """
+        if methode not in METHODES_PLANNING:
+            raise ValueError(
+                f"Méthode de planification inconnue : {methode} (attendu : {', '.join(METHODES_PLANNING)})"
+            )
         jours = [
             "lundi",
             "mardi",
@@ -82,15 +143,73 @@ class PlanificateurTriparti:
         self.planning = {jour: [] for jour in jours[:horizon_jours]}
         # Zones qu’on tente de planifier (pour calcul couverture en evaluer_plan)
         self._zones_a_planifier: set = set()
+        self.rapport_optimisation = None
+        self._preparer_masques()
+
+        ordre = self._zones_ordonnees(affectation_n2)
+        if methode == "chronologique":
+            self._planifier_chronologique(ordre)
+            return self.planning
 
         # Créneaux occupés par camion (évite chevauchement)
-        creneaux_occupes: Dict[int, List[CreneauHoraire]] = {
-            c.id: [] for c in self.affectateur.camions
+        occupations: Dict[int, OccupationCamion] = {
+            c.id: OccupationCamion() for c in self.affectateur.camions
         }
+        camions_par_id = {c.id: c for c in self.affectateur.camions}
+
+        # Plan glouton : {camion_id: [(zone, créneau ou None), ...]} dans l'ordre de traitement
+        choix: Dict[int, List[Tuple]] = {}
+        for camion_id, zones_triees in ordre.items():
+            camion = camions_par_id[camion_id]
+            choix[camion_id] = []
+            for zone in zones_triees:
+                meilleur_creneau = self._trouver_meilleur_creneau(
+                    camion, zone, occupations[camion_id]
+                )
+                choix[camion_id].append((zone, meilleur_creneau))
+                if meilleur_creneau is not None:
+                    occupations[camion_id].ajouter_creneau(meilleur_creneau)
+
+        if methode == "optimal":
+            choix = self._optimiser_choix(choix, jeton)
+
+        for camion_id, zones_creneaux in choix.items():
+            for zone, creneau in zones_creneaux:
+                if creneau is None:
+                    print(
+                        f"[WARN] Impossible de planifier Zone {zone.id} "
+                        f"pour Camion {camion_id}"
+                    )
+                    continue
 
+                entree = {
+                    "camion_id": camion_id,
+                    "zone_id": zone.id,
+                    "creneau": {
+                        "debut": creneau.debut_str,
+                        "fin": creneau.fin_str,
+                        "jour": creneau.jour,
+                    },
+                    "creneau_id": creneau.id,
+                    "taches": self._generer_taches_zone(zone, creneau),
+                    "duree_totale": self._estimer_duree_zone(zone),
+                    "retard_estime": 0,
+                }
+
+                jour = creneau.jour
+                if jour in self.planning:
+                    self.planning[jour].append(entree)
+
+        return self.planning
+
+    def _zones_ordonnees(self, affectation_n2: dict) -> Dict[int, list]:
+        """
+        Zones de chaque camion dans l'ordre de traitement : priorité puis volume
+        (comme Niveau 2). Renseigne self._zones_a_planifier.
+        """
         camions_par_id = {c.id: c for c in self.affectateur.camions}
         zones_par_id = {z.id: z for z in self.affectateur.zones}
-
+        ordre = {}
         for camion_id, zone_ids in affectation_n2.items():
             if not zone_ids:
                 continue
@@ -103,57 +222,184 @@ class PlanificateurTriparti:
             if not zones:
                 continue
 
-            # Trier zones par priorité puis volume (comme Niveau 2)
-            zones_triees = sorted(
+            ordre[camion_id] = sorted(
                 zones,
                 key=lambda z: (
                     ORDRE_PRIORITE.get(getattr(z, "priorite", "normale"), 1),
                     -z.volume_estime,
                 ),
             )
+            self._zones_a_planifier.update(z.id for z in zones)
+        return ordre
 
-            for zone in zones_triees:
-                self._zones_a_planifier.add(zone.id)
-                meilleur_creneau = self._trouver_meilleur_creneau(
-                    camion, zone, creneaux_occupes[camion_id]
+    def definir_matrice_distances(self, distances_km) -> None:
+        """
+        Distances utilisées par le mode chronologique, (Z + 1) × (Z + 1) en km :
+        indice 0 = dépôt, indice j + 1 = affectateur.zones[j]. Par défaut :
+        distances euclidiennes entre centres de zones, dépôt en (0, 0).
+        """
+        self._matrice_distances = np.asarray(distances_km, dtype=float)
+
+    def definir_durees_trajet(self, durees_min, trajets_internes: Optional[Dict[int, float]] = None) -> None:
+        """
+        Temps de trajet réels (OSRM), prioritaires sur les distances à vitesse constante.
+
+        Args:
+            durees_min: (Z + 1) × (Z + 1) minutes, mêmes indices que definir_matrice_distances.
+            trajets_internes: {zone_id: minutes de trajet entre les points de la zone},
+                remplace les 10 min forfaitaires de _estimer_duree_zone.
+        """
+        self._matrice_durees = np.asarray(durees_min, dtype=float)
+        self._trajets_internes = dict(trajets_internes or {})
+
+    def _trajets_zones(self) -> np.ndarray:
+        """Temps de trajet (minutes, sans congestion) dépôt / zones."""
+        durees = getattr(self, "_matrice_durees", None)
+        if durees is not None:
+            return durees
+        return temps_trajet_minutes(self._distances_zones())
+
+    def _distances_zones(self) -> np.ndarray:
+        matrice = getattr(self, "_matrice_distances", None)
+        if matrice is not None:
+            return matrice
+        centres = np.array([(0.0, 0.0)] + [z.centre for z in self.affectateur.zones], dtype=float)
+        return np.hypot(
+            centres[:, None, 0] - centres[None, :, 0], centres[:, None, 1] - centres[None, :, 1]
+        )
+
+    def _planifier_chronologique(self, ordre: Dict[int, list]) -> None:
+        """
+        Mode chronologique : zones enchaînées à la minute dans les créneaux de l'horizon
+        (cf. planification_chronologique). Chaque entrée porte les heures réelles de
+        collecte dans "creneau" et le créneau d'origine dans "creneau_horaire".
+        """
+        masques = self._masques
+        index_horizon = [k for k, c in enumerate(self.creneaux) if c.jour in self.planning]
+        creneaux = [self.creneaux[k] for k in index_horizon]
+        trajets_zones = self._trajets_zones()
+        interdites = set(self.contraintes.zones_interdites_nuit)
+        ordre_jours = {jour: n for n, jour in enumerate(self.planning)}
+
+        for camion_id, zones in ordre.items():
+            lignes = [masques["index_zone"][z.id] for z in zones]
+            noeuds = [0] + [ligne + 1 for ligne in lignes]
+            fenetres = []
+            for zone in zones:
+                fenetre = self.contraintes.fenetres_zone.get(zone.id)
+                fenetres.append(
+                    (en_minutes(fenetre[0]), en_minutes(fenetre[1])) if fenetre else (0, MINUTES_JOUR)
                 )
+            pauses = [
+                (en_minutes(debut), en_minutes(fin))
+                for debut, fin in self.contraintes.pauses_camion.get(camion_id, [])
+            ]
+            visites = planifier_camion(
+                [self._estimer_duree_zone(z) for z in zones],
+                trajets_zones[np.ix_(noeuds, noeuds)],
+                fenetres,
+                [z.id in interdites for z in zones],
+                masques["penalites"][np.ix_(lignes, index_horizon)],
+                creneaux,
+                pauses,
+            )
 
-                if meilleur_creneau is None:
+            planifiees = []
+            for zone, visite in zip(zones, visites):
+                if visite is None:
                     print(
                         f"[WARN] Impossible de planifier Zone {zone.id} "
                         f"pour Camion {camion_id}"
                     )
                     continue
+                planifiees.append((zone, visite, creneaux[visite["creneau"]]))
+            planifiees.sort(key=lambda p: (ordre_jours[p[2].jour], p[1]["debut"]))
 
-                duree_estimee = self._estimer_duree_zone(zone)
-
-                entree = {
+            for zone, visite, creneau in planifiees:
+                debut = minutes_en_heure(visite["debut"])
+                self.planning[creneau.jour].append({
                     "camion_id": camion_id,
                     "zone_id": zone.id,
                     "creneau": {
-                        "debut": meilleur_creneau.debut_str,
-                        "fin": meilleur_creneau.fin_str,
-                        "jour": meilleur_creneau.jour,
+                        "debut": debut,
+                        "fin": minutes_en_heure(visite["fin"]),
+                        "jour": creneau.jour,
                     },
-                    "creneau_id": meilleur_creneau.id,
-                    "taches": self._generer_taches_zone(zone, meilleur_creneau),
-                    "duree_totale": duree_estimee,
+                    "creneau_id": creneau.id,
+                    "creneau_horaire": {"debut": creneau.debut_str, "fin": creneau.fin_str},
+                    "ordre": visite["ordre"],
+                    "trajet_minutes": visite["trajet"],
+                    "taches": self._generer_taches_zone(zone, creneau, debut, 5 * creneau.cout_congestion),
+                    "duree_totale": visite["fin"] - visite["debut"],
                     "retard_estime": 0,
-                }
+                })
 
-                jour = meilleur_creneau.jour
-                if jour in self.planning:
-                    self.planning[jour].append(entree)
+    def _optimiser_choix(self, choix: Dict[int, List[Tuple]], jeton=None) -> Dict[int, List[Tuple]]:
+        """
+        Réaffecte globalement les créneaux de chaque camion (plan glouton en départ).
+        Après l'échéance du jeton, les camions restants gardent leur plan glouton.
 
-                creneaux_occupes[camion_id].append(meilleur_creneau)
+        Seuls les créneaux des jours de l'horizon sont candidats (un créneau hors
+        horizon n'apparaît pas dans le planning). Renseigne self.rapport_optimisation.
+        """
+        debut = time.perf_counter()
+        masques = self._masques
+        dans_horizon = np.array([c.jour in self.planning for c in self.creneaux], dtype=bool)
+        index_creneau = {id(c): k for k, c in enumerate(self.creneaux)}
+        rapport = {
+            "methode": "optimal",
+            "penalite_initiale": 0.0,
+            "penalite_finale": 0.0,
+            "zones_planifiees_initiales": 0,
+            "zones_planifiees_finales": 0,
+            "camions_exacts": 0,
+            "camions_recherche_locale": 0,
+            "camions_non_optimises": 0,
+        }
 
-        return self.planning
+        resultat = {}
+        for camion_id, zones_creneaux in choix.items():
+            i = masques["index_camion"][camion_id]
+            lignes = [masques["index_zone"][zone.id] for zone, _ in zones_creneaux]
+            realisable = masques["zones"][lignes] & masques["camions"][i] & dans_horizon
+            penalites = np.where(realisable, masques["penalites"][lignes], np.inf)
+            couts_absence = np.array([
+                cout_non_planifiee(ORDRE_PRIORITE.get(getattr(zone, "priorite", "normale"), 1))
+                for zone, _ in zones_creneaux
+            ])
+            initiale = [
+                index_creneau[id(c)] if c is not None and dans_horizon[index_creneau[id(c)]] else None
+                for _, c in zones_creneaux
+            ]
+
+            if jeton is not None and jeton.expire():
+                affectation = initiale
+                rapport["camions_non_optimises"] += 1
+            else:
+                affectation, exacte = optimiser_camion(penalites, couts_absence, self.creneaux, initiale)
+                rapport["camions_exacts" if exacte else "camions_recherche_locale"] += 1
+            planifiees_initiales = [(r, k) for r, k in enumerate(initiale) if k is not None]
+            planifiees_finales = [(r, k) for r, k in enumerate(affectation) if k is not None]
+            rapport["penalite_initiale"] += float(sum(penalites[r, k] for r, k in planifiees_initiales))
+            rapport["penalite_finale"] += float(sum(penalites[r, k] for r, k in planifiees_finales))
+            rapport["zones_planifiees_initiales"] += len(planifiees_initiales)
+            rapport["zones_planifiees_finales"] += len(planifiees_finales)
+            resultat[camion_id] = [
+                (zone, self.creneaux[k] if k is not None else None)
+                for (zone, _), k in zip(zones_creneaux, affectation)
+            ]
+
+        rapport["penalite_initiale"] = round(rapport["penalite_initiale"], 2)
+        rapport["penalite_finale"] = round(rapport["penalite_finale"], 2)
+        rapport["duree_s"] = round(time.perf_counter() - debut, 3)
+        self.rapport_optimisation = rapport
+        return resultat
 
     def _trouver_meilleur_creneau(
         self,
         camion,
         zone,
-        creneaux_occupes: List[CreneauHoraire],
+        occupation: OccupationCamion,
     ) -> Optional[CreneauHoraire]:
         """
         Trouve le meilleur créneau disponible pour (camion, zone).
@@ -163,58 +409,56 @@ class PlanificateurTriparti:
         2. Ne chevauche pas les créneaux déjà occupés par ce camion
         3. Pénalité minimale
         """
-        duree_estimee = self._estimer_duree_zone(zone)
-
-        candidats = []
-        for creneau in self.creneaux:
-            # Ne pas chevaucher les créneaux déjà occupés
-            if any(creneau.chevauche(occ) for occ in creneaux_occupes):
-                continue
-
-            realisable, _ = self.contraintes.est_realisable(
-                camion.id, zone.id, creneau, duree_estimee
-            )
-            if not realisable:
-                continue
-
-            penalite = self.contraintes.calculer_penalite(
-                camion.id, zone.id, creneau
-            )
-            candidats.append((penalite, creneau))
+        masques = self._masques or self._preparer_masques()
+        i = masques["index_camion"].get(camion.id)
+        j = masques["index_zone"].get(zone.id)
+        if i is None or j is None or not self.creneaux:
+            return None
 
-        if not candidats:
+        candidats = np.flatnonzero(masques["zones"][j] & masques["camions"][i])
+        if candidats.size == 0:
             return None
 
-        candidats.sort(key=lambda x: x[0])
-        return candidats[0][1]
+        # Pénalité croissante ; à égalité, le premier créneau dans l'ordre de la liste.
+        # Le premier candidat libre pour ce camion est le meilleur.
+        ordre = candidats[np.argsort(masques["penalites"][j][candidats], kind="stable")]
+        for k in ordre:
+            creneau = self.creneaux[int(k)]
+            if not occupation.chevauche_creneau(creneau):
+                return creneau
+        return None
 
     def _estimer_duree_zone(self, zone) -> int:
         """
         Estime la durée de collecte d'une zone (en minutes).
 
-        Formule : 5 min/point + 10 min déplacement interne.
+        Formule : 5 min/point + déplacement interne (temps de trajet réel entre les
+        points si definir_durees_trajet l'a fourni, sinon 10 min).
         """
         if zone.id in self.contraintes.durees_zones:
             return self.contraintes.durees_zones[zone.id]
 
         nb_points = len(getattr(zone, "points", []))
-        return (nb_points * 5) + 10
+        interne = getattr(self, "_trajets_internes", {}).get(zone.id)
+        return (nb_points * 5) + (10 if interne is None else int(math.ceil(interne)))
 
     def _generer_taches_zone(
-        self, zone, creneau: CreneauHoraire
+        self, zone, creneau: CreneauHoraire, debut: Optional[str] = None, pas_minutes: float = 5
     ) -> List[dict]:
         """
         Génère la liste des tâches (points) avec heures estimées.
+
+        debut : heure de début de collecte (par défaut, début du créneau).
         """
         points = getattr(zone, "points", [])
         if not points:
             return []
 
         taches = []
-        heure_actuelle = datetime.strptime(creneau.debut_str, "%H:%M")
+        heure_actuelle = datetime.strptime(debut or creneau.debut_str, "%H:%M")
 
         for ordre, point_id in enumerate(points, start=1):
-            heure_actuelle = heure_actuelle + timedelta(minutes=5)
+            heure_actuelle = heure_actuelle + timedelta(minutes=pas_minutes)
             taches.append(
                 {
                     "point_id": point_id,
@@ -225,14 +469,94 @@ class PlanificateurTriparti:
 
         return taches
 
+    def _modele_robustesse(
+        self,
+        plan: dict,
+        routes: Optional[List[dict]] = None,
+        cv_congestion: float = CV_CONGESTION,
+        cv_volume_point: float = CV_VOLUME_POINT,
+    ) -> dict:
+        """
+        Visites du plan pour robustesse_planning : départ, trajet et collecte nominaux
+        (congestion du créneau comprise), échéance = fin du créneau d'origine ou fin
+        prévue si plus tardive (mode chronologique), volume et capacité du camion.
+        """
+        index_creneau = {c.id: k for k, c in enumerate(self.creneaux)}
+        zones_par_id = {z.id: z for z in self.affectateur.zones}
+        camions_par_id = {c.id: c for c in self.affectateur.camions}
+        visites = []
+        for j, (jour, entrees) in enumerate(plan.items()):
+            for entree in entrees:
+                k = index_creneau.get(entree.get("creneau_id"))
+                zone = zones_par_id.get(entree.get("zone_id"))
+                camion = camions_par_id.get(entree.get("camion_id"))
+                if k is None or zone is None or camion is None:
+                    continue
+                creneau = self.creneaux[k]
+                if "trajet_minutes" in entree:
+                    trajet = float(entree["trajet_minutes"])
+                    debut_collecte = en_minutes(entree["creneau"]["debut"])
+                    collecte = float(en_minutes(entree["creneau"]["fin"]) - debut_collecte)
+                    depart = debut_collecte - trajet
+                else:
+                    trajet = 0.0
+                    collecte = float(creneau.ajuster_duree_avec_congestion(self._estimer_duree_zone(zone)))
+                    depart = creneau.debut_minutes
+                visites.append({
+                    "camion_id": camion.id,
+                    "zone_id": zone.id,
+                    "jour": j,
+                    "creneau": k,
+                    "depart": j * MINUTES_JOUR + depart,
+                    "trajet": trajet,
+                    "collecte": collecte,
+                    "echeance": j * MINUTES_JOUR + max(depart + trajet + collecte, creneau.fin_minutes),
+                    "volume": zone.volume_estime,
+                    "nb_points": len(getattr(zone, "points", [])),
+                    "capacite": camion.capacite,
+                    "enchainee": (entree.get("ordre") or 1) > 1,
+                })
+        return construire_modele(visites, len(self.creneaux), routes, cv_congestion, cv_volume_point)
+
+    def evaluer_robustesse(
+        self,
+        plan: dict,
+        nb_scenarios: int = 10000,
+        routes: Optional[List[dict]] = None,
+        nb_processus: int = 1,
+        graine: Optional[int] = None,
+        cv_congestion: float = CV_CONGESTION,
+        cv_volume_point: float = CV_VOLUME_POINT,
+        jeton=None,
+    ) -> dict:
+        """
+        Évaluation Monte-Carlo du planning (cf. robustesse_planning) : congestion tirée
+        par créneau, volumes par point, plan (et routes du niveau 2) rejoués nb_scenarios fois.
+
+        Returns:
+            respect_horaires et retard_moyen espérés, quantiles des retards, probabilités
+            de débordement (tournées du plan, segments des routes), heures de fin
+            P50 / P95 de chaque camion par jour. Avec jeton (échéance), seuls les
+            scénarios rejoués avant l'échéance sont comptés.
+        """
+        modele = self._modele_robustesse(plan, routes, cv_congestion, cv_volume_point)
+        return evaluer_robustesse(modele, nb_scenarios, nb_processus, graine, jours=list(plan), jeton=jeton)
+
     def evaluer_plan(self, plan: dict) -> dict:
         """
         Évalue la qualité du planning généré.
 
         Returns:
             Indicateurs : taux_occupation, taux_utilisation_parc, couverture_collecte,
-                         respect_horaires (toutes les affectations respectent les contraintes),
-                         congestion_moyenne, retard_moyen.
+                         respect_horaires (% de visites finies avant la fin de leur
+                         créneau, plan rejoué en conditions nominales), congestion_moyenne,
+                         retard_moyen (minutes, même rejeu), penalite_totale
+                         (somme de calculer_penalite) ; avec la méthode "optimal",
+                         bloc "optimisation" (pénalité et couverture avant / après) ;
+                         à la minute : temps_travail_minutes (collecte + trajets),
+                         taux_utilisation_temps (part du temps des créneaux de l'horizon
+                         effectivement travaillée par les camions utilisés) et
+                         camions_necessaires (borne : temps de travail / temps d'un camion).
         """
         nb_camions = len(self.affectateur.camions)
         nb_creneaux = len(self.creneaux)
@@ -264,25 +588,75 @@ class PlanificateurTriparti:
             couverture_collecte = 100.0 if not plan else 100.0
 
         congestions = []
+        penalite_totale = 0.0
         creneaux_par_id = {c.id: c for c in self.creneaux}
         for jour_entries in plan.values():
             for entry in jour_entries:
                 creneau_id = entry.get("creneau_id")
                 if creneau_id in creneaux_par_id:
-                    congestions.append(creneaux_par_id[creneau_id].cout_congestion)
+                    creneau = creneaux_par_id[creneau_id]
+                    congestions.append(creneau.cout_congestion)
+                    penalite_totale += self.contraintes.calculer_penalite(
+                        entry.get("camion_id"), entry.get("zone_id"), creneau
+                    )
         congestion_moyenne = (
             sum(congestions) / len(congestions) if congestions else 1.0
         )
 
-        # Toutes les affectations planifiées respectent les contraintes (créneau réalisable).
-        respect_horaires = 100.0
-        retard_moyen = 0.0
+        # Utilisation à la minute : collecte + trajets rapportés au temps des créneaux
+        temps_travail = sum(
+            entry.get("duree_totale", 0) + entry.get("trajet_minutes", 0)
+            for jour_entries in plan.values() for entry in jour_entries
+        )
+        temps_camion = sum(c.duree_minutes for c in self.creneaux if c.jour in plan)
+        temps_disponible = temps_camion * len(camions_utilises)
+        taux_utilisation_temps = (
+            min(100.0, temps_travail / temps_disponible * 100) if temps_disponible > 0 else 0.0
+        )
+        camions_necessaires = math.ceil(temps_travail / temps_camion) if temps_camion > 0 else 0
+
+        # Plan rejoué à congestion et volumes nominaux : visites d'un même camion qui se
+        # recouvrent (plan modifié à la main, trajets) → retards propagés
+        modele = self._modele_robustesse(plan)
+        nb_visites = len(modele["zones"])
+        if nb_visites:
+            retard = retards(modele, rejouer(
+                modele, np.ones((1, len(self.creneaux))), np.ones((1, nb_visites))
+            ))[0]
+            respect_horaires = float((retard <= 0).mean() * 100)
+            retard_moyen = float(retard.mean())
+        else:
+            respect_horaires = 100.0
+            retard_moyen = 0.0
 
-        return {
+        indicateurs = {
             "taux_occupation": round(taux_occupation, 1),
             "taux_utilisation_parc": round(taux_utilisation_parc, 1),
             "couverture_collecte": round(couverture_collecte, 1),
             "respect_horaires": round(respect_horaires, 1),
             "congestion_moyenne": round(congestion_moyenne, 2),
             "retard_moyen": round(retard_moyen, 1),
+            "penalite_totale": round(penalite_totale, 2),
+            "temps_travail_minutes": int(temps_travail),
+            "taux_utilisation_temps": round(taux_utilisation_temps, 1),
+            "camions_necessaires": camions_necessaires,
         }
+
+        rapport = self.rapport_optimisation
+        if rapport is not None:
+            nb_zones = len(zones_a_planifier) or 1
+            couverture_initiale = rapport["zones_planifiees_initiales"] / nb_zones * 100
+            couverture_finale = rapport["zones_planifiees_finales"] / nb_zones * 100
+            indicateurs["optimisation"] = {
+                "penalite_glouton": rapport["penalite_initiale"],
+                "penalite_optimisee": rapport["penalite_finale"],
+                "gain_penalite": round(rapport["penalite_initiale"] - rapport["penalite_finale"], 2),
+                "couverture_glouton": round(couverture_initiale, 1),
+                "couverture_optimisee": round(couverture_finale, 1),
+                "gain_couverture": round(couverture_finale - couverture_initiale, 1),
+                "camions_exacts": rapport["camions_exacts"],
+                "camions_recherche_locale": rapport["camions_recherche_locale"],
+                "camions_non_optimises": rapport["camions_non_optimises"],
+                "duree_s": rapport["duree_s"],
+            }
+        return indicateurs
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Module PlanificationChronologique - Niveau 3 VillePropre
+Ordonnancement à la minute : plusieurs zones enchaînées dans un même créneau.
+
+Les créneaux contigus ou chevauchants d'un même jour forment une période de
+travail. Pour un camion, chaque zone (ordre priorité / volume) est ajoutée en fin
+de tournée d'une période : trajet depuis la zone précédente (ou le dépôt),
+collecte commençant dans l'un des créneaux de la période, puis retour possible au
+dépôt avant la fin de la période. Le facteur de congestion du créneau de début
+multiplie trajet et durée de collecte. Fenêtres horaires des zones,
+pauses du camion et interdiction nocturne sont vérifiées à la minute ; les
+intervalles déjà pris (trajets, collectes, pauses) sont tenus dans OccupationCamion.
+"""
+
+import math
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from contrainte_temporelle import NUIT_DEBUT_MINUTES, NUIT_FIN_MINUTES
+from occupation_camion import MINUTES_JOUR, OccupationCamion
+
+VITESSE_MOYENNE_KMH = 30.0           # conversion distance → temps de trajet
+
+
+def temps_trajet_minutes(distances_km: np.ndarray) -> np.ndarray:
+    """Matrice de distances (km) → temps de trajet (minutes, sans congestion)."""
+    return np.asarray(distances_km, dtype=float) / VITESSE_MOYENNE_KMH * 60.0
+
+
+def duree_parcours_zone(durees_min: np.ndarray) -> float:
+    """
+    Temps de trajet (minutes) pour visiter tous les points d'une zone : plus proche
+    voisin depuis le premier point, sur la matrice n × n des durées entre ses points.
+    """
+    durees_min = np.asarray(durees_min, dtype=float)
+    n = len(durees_min)
+    if n < 2:
+        return 0.0
+    visite = np.zeros(n, dtype=bool)
+    courant, total = 0, 0.0
+    visite[0] = True
+    for _ in range(n - 1):
+        suivant = int(np.argmin(np.where(visite, np.inf, durees_min[courant])))
+        total += durees_min[courant, suivant]
+        visite[suivant] = True
+        courant = suivant
+    return float(total)
+
+
+def fusionner_intervalles(intervalles: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Fusionne des intervalles [debut, fin[ qui se recouvrent (pauses d'un camion)."""
+    resultat: List[Tuple[int, int]] = []
+    for debut, fin in sorted(i for i in intervalles if i[1] > i[0]):
+        if resultat and debut <= resultat[-1][1]:
+            resultat[-1] = (resultat[-1][0], max(resultat[-1][1], fin))
+        else:
+            resultat.append((debut, fin))
+    return resultat
+
+
+def periodes_travail(creneaux: Sequence) -> List[List[int]]:
+    """Indices des créneaux regroupés en périodes (même jour, contigus ou chevauchants)."""
+    ordre = sorted(
+        (k for k, c in enumerate(creneaux) if c.fin_minutes > c.debut_minutes),
+        key=lambda k: (creneaux[k].jour, creneaux[k].debut_minutes),
+    )
+    periodes: List[List[int]] = []
+    fin_periode = None
+    for k in ordre:
+        c = creneaux[k]
+        if periodes and c.jour == creneaux[periodes[-1][0]].jour and c.debut_minutes <= fin_periode:
+            periodes[-1].append(k)
+            fin_periode = max(fin_periode, c.fin_minutes)
+        else:
+            periodes.append([k])
+            fin_periode = c.fin_minutes
+    return periodes
+
+
+def planifier_camion(
+    durees_base: Sequence[int],
+    trajets: np.ndarray,
+    fenetres: Sequence[Tuple[int, int]],
+    interdites_nuit: Sequence[bool],
+    penalites: np.ndarray,
+    creneaux: Sequence,
+    pauses: Sequence[Tuple[int, int]] = (),
+) -> List[Optional[dict]]:
+    """
+    Enchaîne les zones d'un camion dans ses périodes de travail, à la minute près.
+
+    Args:
+        durees_base: Durée de collecte de chaque zone (minutes, sans congestion).
+        trajets: Temps de trajet (n + 1) × (n + 1) en minutes, indice 0 = dépôt,
+            indice i + 1 = zone i.
+        fenetres: (ouverture, fermeture) de chaque zone en minutes.
+        interdites_nuit: Zone interdite entre 22h et 6h.
+        penalites: n × K, pénalité de chaque zone dans chaque créneau (préférence).
+        creneaux: Les K créneaux (CreneauHoraire) utilisables.
+        pauses: Pauses quotidiennes du camion (minutes).
+
+    Returns:
+        Pour chaque zone, None (impossible) ou {"creneau": k (créneau de début),
+        "debut": min, "fin": min, "trajet": min, "ordre": rang dans la période}.
+    """
+    occupation = OccupationCamion()
+    for jour in {c.jour for c in creneaux}:
+        for debut, fin in fusionner_intervalles(pauses):
+            occupation.ajouter(jour, debut, fin)
+
+    periodes = periodes_travail(creneaux)
+    fins_periodes = [max(creneaux[k].fin_minutes for k in periode) for periode in periodes]
+    # Fin de tournée de chaque période : (minute, nœud courant, nombre de zones)
+    tournees = [(creneaux[periode[0]].debut_minutes, 0, 0) for periode in periodes]
+    resultat: List[Optional[dict]] = [None] * len(durees_base)
+
+    for i in range(len(durees_base)):
+        ouverture, fermeture = fenetres[i]
+        meilleur = None
+        for p, periode in enumerate(periodes):
+            fin_tournee, noeud, rang = tournees[p]
+            for k in periode:
+                creneau = creneaux[k]
+                facteur = creneau.cout_congestion
+                trajet = math.ceil(trajets[noeud, i + 1] * facteur)
+                retour = math.ceil(trajets[i + 1, 0] * facteur)
+                duree = creneau.ajuster_duree_avec_congestion(durees_base[i])
+
+                # Bloc [départ, départ + trajet + durée[ ; collecte commencée dans le créneau
+                # et contenue dans la fenêtre de la zone ; retour au dépôt avant la fin de période
+                debut_min = max(fin_tournee, creneau.debut_minutes - trajet, ouverture - trajet)
+                fin_max = min(fermeture, fins_periodes[p] - retour)
+                if interdites_nuit[i]:
+                    debut_min = max(debut_min, NUIT_FIN_MINUTES - trajet)
+                    fin_max = min(fin_max, NUIT_DEBUT_MINUTES)
+                depart = occupation.premier_creneau_libre(creneau.jour, trajet + duree, debut_min, fin_max)
+                if depart is None or depart + trajet >= creneau.fin_minutes:
+                    continue
+
+                fin_collecte = depart + trajet + duree
+                cle = (penalites[i, k], fin_collecte - fin_tournee, k)
+                if meilleur is None or cle < meilleur[0]:
+                    meilleur = (cle, p, k, depart, trajet, fin_collecte, rang)
+
+        if meilleur is None:
+            continue
+        _, p, k, depart, trajet, fin_collecte, rang = meilleur
+        occupation.ajouter(creneaux[k].jour, depart, fin_collecte)
+        tournees[p] = (fin_collecte, i + 1, rang + 1)
+        resultat[i] = {
+            "creneau": k,
+            "debut": depart + trajet,
+            "fin": fin_collecte,
+            "trajet": trajet,
+            "ordre": rang + 1,
+        }
+    return resultat
+
+
+def minutes_en_heure(minutes: int) -> str:
+    """Minutes depuis minuit → "HH:MM"."""
+    minutes = int(minutes) % MINUTES_JOUR
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Module RobustessePlanning - Niveau 3 VillePropre
+Évaluation Monte-Carlo d'un planning sous congestion et volumes aléatoires.
+
+Chaque scénario tire :
+- un facteur de congestion par créneau (lognormal de moyenne 1, coefficient de
+  variation CV_CONGESTION) : trajets et collectes des visites du créneau s'allongent d'autant ;
+- le volume de chaque point (lognormal de moyenne 1, CV_VOLUME_POINT). Pour une visite de
+  zone, la somme de ses n points est tirée directement (CV / √n) ; pour les routes du
+  niveau 2, point par point. La durée de collecte est proportionnelle au volume.
+
+Le planning est rejoué camion par camion : une visite commence à son départ prévu ou à la
+fin de la précédente si elle déborde (retards propagés). Tous les scénarios d'un lot sont
+rejoués ensemble (tableaux numpy scénarios × visites) ; les lots (LOT_SCENARIOS, graines
+dérivées d'une SeedSequence : résultat indépendant du nombre de processus) peuvent être
+répartis sur un pool de processus.
+"""
+
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+CV_CONGESTION = 0.2           # coefficient de variation du facteur de congestion d'un créneau
+CV_VOLUME_POINT = 0.3         # coefficient de variation du volume d'un point
+LOT_SCENARIOS = 1000          # scénarios rejoués ensemble (mémoire : lot × visites)
+TOURNEES_A_RISQUE_MAX = 10    # tournées listées dans le rapport
+
+
+def facteurs_lognormaux(rng: np.random.Generator, cv, taille) -> np.ndarray:
+    """Facteurs lognormaux de moyenne 1 et de coefficient de variation cv (scalaire ou tableau)."""
+    sigma = np.sqrt(np.log1p(np.square(cv)))
+    return np.exp(sigma * rng.standard_normal(taille) - sigma * sigma / 2.0)
+
+
+def construire_modele(
+    visites: Sequence[dict],
+    nb_creneaux: int,
+    routes: Optional[Sequence[dict]] = None,
+    cv_congestion: float = CV_CONGESTION,
+    cv_volume_point: float = CV_VOLUME_POINT,
+) -> dict:
+    """
+    Tableaux numpy du planning (et des routes) à rejouer.
+
+    Args:
+        visites: Une entrée par visite planifiée : camion_id, jour (indice), creneau (indice),
+            depart (minutes depuis lundi 00:00), trajet et collecte (minutes nominales),
+            echeance (fin au plus tard), volume, nb_points, capacite du camion,
+            enchainee (True : même tournée que la visite précédente du camion).
+        nb_creneaux: Nombre de créneaux (facteurs de congestion tirés).
+        routes: Routes du niveau 2 (camion_id, capacite, waypoints avec type et volume).
+    """
+    rang_camion: Dict = {}
+    for visite in visites:
+        rang_camion.setdefault(visite["camion_id"], len(rang_camion))
+    ordre = sorted(range(len(visites)), key=lambda e: (rang_camion[visites[e]["camion_id"]], visites[e]["depart"]))
+    v = [visites[e] for e in ordre]
+    n = len(v)
+
+    camions: List = []
+    camion = np.zeros(n, dtype=np.int64)
+    rang = np.zeros(n, dtype=np.int64)
+    tournee = np.zeros(n, dtype=np.int64)
+    capacites: List[float] = []
+    tournees: List[dict] = []
+    for e, visite in enumerate(v):
+        nouveau_camion = e == 0 or visite["camion_id"] != v[e - 1]["camion_id"]
+        if nouveau_camion:
+            camions.append(visite["camion_id"])
+        camion[e] = len(camions) - 1
+        rang[e] = 0 if nouveau_camion else rang[e - 1] + 1
+        meme_tournee = (
+            not nouveau_camion and visite.get("enchainee") and visite["jour"] == v[e - 1]["jour"]
+        )
+        if not meme_tournee:
+            capacites.append(float(visite["capacite"]))
+            tournees.append({"camion_id": visite["camion_id"], "jour": visite["jour"], "zones": []})
+        tournee[e] = len(tournees) - 1
+        tournees[-1]["zones"].append(visite.get("zone_id"))
+
+    # Dernière visite de chaque (camion, jour) : heure de fin de journée du camion
+    groupes = [
+        e for e in range(n)
+        if e == n - 1 or camion[e + 1] != camion[e] or v[e + 1]["jour"] != v[e]["jour"]
+    ]
+
+    nb_points = np.array([max(1, int(x.get("nb_points", 1))) for x in v], dtype=float)
+    modele = {
+        "nb_creneaux": int(nb_creneaux),
+        "cv_congestion": float(cv_congestion),
+        "cv_volume_point": float(cv_volume_point),
+        "camions": camions,
+        "zones": [x.get("zone_id") for x in v],
+        "camion": camion,
+        "rang": rang,
+        "debuts_camions": np.flatnonzero(np.r_[True, camion[1:] != camion[:-1]]) if n else camion,
+        "creneau": np.array([x["creneau"] for x in v], dtype=np.int64),
+        "depart": np.array([x["depart"] for x in v], dtype=float),
+        "trajet": np.array([x.get("trajet", 0.0) for x in v], dtype=float),
+        "collecte": np.array([x["collecte"] for x in v], dtype=float),
+        "echeance": np.array([x["echeance"] for x in v], dtype=float),
+        "volume": np.array([x.get("volume", 0.0) for x in v], dtype=float),
+        "cv_volume": cv_volume_point / np.sqrt(nb_points),
+        "debuts_tournees": np.flatnonzero(np.r_[True, tournee[1:] != tournee[:-1]]) if n else tournee,
+        "capacite_tournee": np.array(capacites, dtype=float),
+        "tournees": tournees,
+        "groupes": np.array(groupes, dtype=np.int64),
+        "groupes_jour": [v[e]["jour"] for e in groupes],
+    }
+    modele.update(_modele_routes(routes or []))
+    return modele
+
+
+def _modele_routes(routes: Sequence[dict]) -> dict:
+    """Segments de collecte des routes (entre dépôt / déchetteries) : volumes et capacités."""
+    volumes: List[float] = []
+    debuts_segments: List[int] = []
+    capacites: List[float] = []
+    segments_route: List[int] = []
+    route_ids: List = []
+    for route in routes:
+        capacite = float(route.get("capacite") or 0)
+        if capacite <= 0:
+            continue
+        premier_segment = len(debuts_segments)
+        segment_ouvert = False
+        for wp in route.get("waypoints", []):
+            if wp.get("type") != "collecte":
+                segment_ouvert = False
+                continue
+            if not segment_ouvert:
+                debuts_segments.append(len(volumes))
+                capacites.append(capacite)
+                segment_ouvert = True
+            volumes.append(float(wp.get("volume") or 0))
+        if len(debuts_segments) > premier_segment:
+            segments_route.append(premier_segment)
+            route_ids.append(route.get("camion_id"))
+    return {
+        "routes": route_ids,
+        "volumes_points": np.array(volumes, dtype=float),
+        "debuts_segments": np.array(debuts_segments, dtype=np.int64),
+        "capacite_segment": np.array(capacites, dtype=float),
+        "debuts_routes": np.array(segments_route, dtype=np.int64),
+    }
+
+
+def rejouer(modele: dict, congestion: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """
+    Fin de chaque visite dans chaque scénario.
+
+    Args:
+        congestion: S × K facteurs de congestion (1 = nominal).
+        volume: S × E facteurs de volume des visites (1 = nominal).
+
+    Returns:
+        S × E instants de fin (minutes depuis lundi 00:00).
+    """
+    duree = congestion[:, modele["creneau"]] * (modele["trajet"] + modele["collecte"] * volume)
+    fins = np.empty_like(duree)
+    depart = modele["depart"]
+    rang = modele["rang"]
+    for r in range(int(rang.max()) + 1 if rang.size else 0):
+        visites = np.flatnonzero(rang == r)
+        debut = np.broadcast_to(depart[visites], (duree.shape[0], visites.size))
+        if r:
+            # La visite précédente du même camion est la précédente dans l'ordre trié
+            debut = np.maximum(debut, fins[:, visites - 1])
+        fins[:, visites] = debut + duree[:, visites]
+    return fins
+
+
+def retards(modele: dict, fins: np.ndarray) -> np.ndarray:
+    """Retard (minutes, >= 0) de chaque visite par rapport à son échéance."""
+    return np.maximum(fins - modele["echeance"], 0.0)
+
+
+def _simuler_lot(modele: dict, nb_scenarios: int, graine) -> dict:
+    """Rejoue un lot de scénarios (fonction de module : exécutable dans un processus du pool)."""
+    rng = np.random.default_rng(graine)
+    congestion = facteurs_lognormaux(rng, modele["cv_congestion"], (nb_scenarios, modele["nb_creneaux"]))
+    volume = facteurs_lognormaux(rng, modele["cv_volume"], (nb_scenarios, modele["cv_volume"].size))
+    fins = rejouer(modele, congestion, volume)
+    retard = retards(modele, fins)
+    en_retard = retard > 0
+
+    # Charge de chaque tournée (visites contiguës dans l'ordre trié) : somme des volumes
+    charges = (
+        np.add.reduceat(volume * modele["volume"], modele["debuts_tournees"], axis=1)
+        if volume.shape[1] else np.zeros((nb_scenarios, 0))
+    )
+    resultat = {
+        "fins_groupes": fins[:, modele["groupes"]].astype(np.float32),
+        "retard_camion": (
+            np.maximum.reduceat(retard, modele["debuts_camions"], axis=1).astype(np.float32)
+            if retard.shape[1] else np.zeros((nb_scenarios, 0), dtype=np.float32)
+        ),
+        "retard_moyen": retard.mean(axis=1) if retard.shape[1] else np.zeros(nb_scenarios),
+        "retard_max": retard.max(axis=1, initial=0.0),
+        "nb_retards_visite": en_retard.sum(axis=0),
+        "nb_debordements_tournee": (charges > modele["capacite_tournee"]).sum(axis=0),
+        "nb_debordements_route": np.zeros(len(modele["routes"]), dtype=np.int64),
+    }
+
+    if modele["volumes_points"].size:
+        facteurs = facteurs_lognormaux(rng, modele["cv_volume_point"], (nb_scenarios, modele["volumes_points"].size))
+        charges_segments = np.add.reduceat(facteurs * modele["volumes_points"], modele["debuts_segments"], axis=1)
+        deborde = (charges_segments > modele["capacite_segment"]).astype(np.int8)
+        resultat["nb_debordements_route"] = (
+            np.maximum.reduceat(deborde, modele["debuts_routes"], axis=1).sum(axis=0)
+        )
+    return resultat
+
+
+def _fusionner(lots: List[dict]) -> dict:
+    par_scenario = ("fins_groupes", "retard_camion", "retard_moyen", "retard_max")
+    return {
+        cle: (np.concatenate([lot[cle] for lot in lots]) if cle in par_scenario
+              else np.sum([lot[cle] for lot in lots], axis=0))
+        for cle in lots[0]
+    }
+
+
+def simuler(modele: dict, nb_scenarios: int, nb_processus: int = 1, graine: Optional[int] = None,
+            jeton=None) -> dict:
+    """
+    Rejoue nb_scenarios scénarios par lots de LOT_SCENARIOS, sur nb_processus processus.
+
+    Args:
+        jeton: Échéance (objet avec expire(), cf. niveau2 JetonAnnulation) vérifiée entre
+            deux vagues de lots : une fois expirée, les lots restants ne sont pas rejoués
+            (au moins une vague l'est).
+
+    Returns:
+        Résultats bruts fusionnés (tableaux par scénario et compteurs).
+    """
+    nb_scenarios = max(1, int(nb_scenarios))
+    tailles = [min(LOT_SCENARIOS, nb_scenarios - d) for d in range(0, nb_scenarios, LOT_SCENARIOS)]
+    graines = np.random.SeedSequence(graine).spawn(len(tailles))
+    vague = max(1, min(nb_processus, len(tailles)))
+    lots = []
+    if vague > 1:
+        with ProcessPoolExecutor(max_workers=vague) as pool:
+            for d in range(0, len(tailles), vague):
+                if lots and jeton is not None and jeton.expire():
+                    break
+                lots += pool.map(_simuler_lot, [modele] * len(tailles[d:d + vague]),
+                                 tailles[d:d + vague], graines[d:d + vague])
+    else:
+        for taille, g in zip(tailles, graines):
+            if lots and jeton is not None and jeton.expire():
+                break
+            lots.append(_simuler_lot(modele, taille, g))
+    return _fusionner(lots)
+
+
+def evaluer_robustesse(
+    modele: dict,
+    nb_scenarios: int = 10000,
+    nb_processus: int = 1,
+    graine: Optional[int] = None,
+    jours: Sequence[str] = (),
+    jeton=None,
+) -> dict:
+    """
+    Distribution des retards, probabilités de débordement et heure de fin P95 par camion.
+
+    Args:
+        modele: Résultat de construire_modele.
+        jours: Noms des jours (indices « jour » des visites) pour le rapport.
+        jeton: Échéance (cf. simuler) ; le rapport porte alors sur les scénarios rejoués
+            à temps (nb_scenarios < nb_scenarios_demandes, interrompue).
+
+    Returns:
+        Rapport : respect_horaires et retard_moyen espérés, bloc retards (quantiles),
+        bloc debordements (tournées et routes), camions (fins P50 / P95 par jour).
+    """
+    debut = time.time()
+    brut = simuler(modele, nb_scenarios, nb_processus, graine, jeton)
+    nb = brut["retard_moyen"].size
+    nb_visites = len(modele["zones"])
+
+    def nom_jour(j: int):
+        return jours[j] if 0 <= j < len(jours) else j
+
+    def heure(minutes: float) -> str:
+        minutes = int(math.ceil(minutes)) % (24 * 60)
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    p_retard_visite = brut["nb_retards_visite"] / nb
+    p_tournee = brut["nb_debordements_tournee"] / nb
+    a_risque = [t for t in np.argsort(-p_tournee, kind="stable") if p_tournee[t] > 0][:TOURNEES_A_RISQUE_MAX]
+
+    fins_prevues = rejouer(
+        modele, np.ones((1, modele["nb_creneaux"])), np.ones((1, nb_visites))
+    )[0, modele["groupes"]] if nb_visites else np.zeros(0)
+    quantiles_fins = np.percentile(brut["fins_groupes"], [50, 95], axis=0) if nb_visites else np.zeros((2, 0))
+    camions = []
+    for c, camion_id in enumerate(modele["camions"]):
+        groupes = np.flatnonzero(modele["camion"][modele["groupes"]] == c)
+        retard_camion = brut["retard_camion"][:, c]
+        camions.append({
+            "camion_id": camion_id,
+            "probabilite_retard": round(float((retard_camion > 0).mean()), 4),
+            "retard_p95": round(float(np.percentile(retard_camion, 95)), 1),
+            "fins": [
+                {
+                    "jour": nom_jour(modele["groupes_jour"][g]),
+                    "fin_prevue": heure(fins_prevues[g]),
+                    "fin_p50": heure(quantiles_fins[0, g]),
+                    "fin_p95": heure(quantiles_fins[1, g]),
+                }
+                for g in groupes
+            ],
+        })
+
+    rapport = {
+        "nb_scenarios": nb,
+        "nb_scenarios_demandes": int(nb_scenarios),
+        "interrompue": nb < int(nb_scenarios),
+        "nb_processus": nb_processus,
+        "cv_congestion": modele["cv_congestion"],
+        "cv_volume_point": modele["cv_volume_point"],
+        "respect_horaires": round(100.0 * (1.0 - float(p_retard_visite.mean())) if nb_visites else 100.0, 1),
+        "retard_moyen": round(float(brut["retard_moyen"].mean()), 1),
+        "retards": {
+            "probabilite_visite": round(float(p_retard_visite.mean()) if nb_visites else 0.0, 4),
+            "probabilite_scenario": round(float((brut["retard_max"] > 0).mean()), 4),
+            "moyen_p50": round(float(np.percentile(brut["retard_moyen"], 50)), 1),
+            "moyen_p95": round(float(np.percentile(brut["retard_moyen"], 95)), 1),
+            "max_p50": round(float(np.percentile(brut["retard_max"], 50)), 1),
+            "max_p95": round(float(np.percentile(brut["retard_max"], 95)), 1),
+        },
+        "debordements": {
+            "probabilite_tournee_moyenne": round(float(p_tournee.mean()) if p_tournee.size else 0.0, 4),
+            "probabilite_tournee_max": round(float(p_tournee.max(initial=0.0)), 4),
+            "tournees_a_risque": [
+                {
+                    "camion_id": modele["tournees"][t]["camion_id"],
+                    "jour": nom_jour(modele["tournees"][t]["jour"]),
+                    "zones": modele["tournees"][t]["zones"],
+                    "probabilite": round(float(p_tournee[t]), 4),
+                }
+                for t in a_risque
+            ],
+            "routes": [
+                {"camion_id": camion_id, "probabilite": round(float(brut["nb_debordements_route"][r] / nb), 4)}
+                for r, camion_id in enumerate(modele["routes"])
+            ],
+        },
+        "camions": camions,
+        "duree_s": round(time.time() - debut, 3),
+    }
+    return rapport
@@ -4,10 +4,14 @@ Tests Niveau 3 - VillePropre
 Validation des modules CreneauHoraire, ContrainteTemporelle et PlanificateurTriparti.
 """
 
+import contextlib
+import io
 import unittest
 import sys
 from pathlib import Path
 
+import numpy as np
+
 script_dir = Path(__file__).resolve().parent
 niveau3_src = script_dir.parent / "src"
 niveau2_src = script_dir.parent.parent / "niveau2" / "src"
@@ -18,11 +22,14 @@ sys.path.insert(0, str(niveau2_src))
 sys.path.insert(0, str(niveau1_src))
 
 from creneau_horaire import CreneauHoraire
-from contrainte_temporelle import ContrainteTemporelle
+from contrainte_temporelle import ContrainteTemporelle, en_minutes
 from planificateur_triparti import PlanificateurTriparti
+from occupation_camion import OccupationCamion
+from robustesse_planning import construire_modele, simuler
 from affectateur_biparti import AffectateurBiparti
 from camion import Camion
 from zone import Zone
+from jeton_annulation import JetonAnnulation
 
 
 class TestCreneauHoraire(unittest.TestCase):
@@ -117,6 +124,60 @@ class TestContrainteTemporelle(unittest.TestCase):
         self.assertEqual(len(c.pauses_camion), 1)
         self.assertEqual(c.zones_interdites_nuit, [1, 2])
 
+    def test_masques_egaux_verification_unitaire(self):
+        """Le calcul numpy en lot coïncide avec est_realisable et calculer_penalite."""
+        contraintes = ContrainteTemporelle()
+        contraintes.ajouter_fenetre_zone(1, "08:00", "18:00")
+        contraintes.ajouter_fenetre_zone(3, "05:00", "23:00")
+        contraintes.ajouter_pause_camion(1, "12:00", 1.0)
+        contraintes.ajouter_pause_camion(2, "06:30", 0.5)
+        contraintes.zones_interdites_nuit = [2, 3]
+        contraintes.congestion[(1, 4)] = 1.8
+        creneaux = [
+            CreneauHoraire(k, debut, fin, "lundi", congestion)
+            for k, (debut, fin, congestion) in enumerate([
+                ("05:00", "07:00", 1.0), ("06:00", "08:00", 1.2), ("08:00", "10:00", 1.5),
+                ("11:30", "12:30", 1.0), ("12:00", "14:00", 1.3), ("17:00", "19:00", 1.0),
+                ("21:00", "23:00", 2.0), ("07:00", "07:40", 1.1),
+            ])
+        ]
+        camions, zones, durees = [1, 2, 3], [1, 2, 3, 4], [30, 60, 100, 40]
+        realisable, penalites = contraintes.matrice_realisabilite(camions, zones, creneaux, durees)
+        self.assertEqual(realisable.shape, (3, 4, len(creneaux)))
+        for i, camion_id in enumerate(camions):
+            for j, zone_id in enumerate(zones):
+                for k, creneau in enumerate(creneaux):
+                    ok, _ = contraintes.est_realisable(camion_id, zone_id, creneau, durees[j])
+                    self.assertEqual(bool(realisable[i, j, k]), ok, (camion_id, zone_id, creneau))
+                    self.assertAlmostEqual(
+                        penalites[i, j, k], contraintes.calculer_penalite(camion_id, zone_id, creneau)
+                    )
+
+
+class TestOccupationCamion(unittest.TestCase):
+    """Tests de l'index d'intervalles occupés par camion."""
+
+    def test_chevauchement_et_trous(self):
+        """Chevauchement par jour, bout à bout autorisé, premier trou libre."""
+        occupation = OccupationCamion()
+        occupation.ajouter_creneau(CreneauHoraire(1, "08:00", "10:00", "lundi"))
+        occupation.ajouter("lundi", 12 * 60, 13 * 60)
+        occupation.ajouter("lundi", 10 * 60 + 30, 11 * 60 + 30)
+
+        self.assertTrue(occupation.chevauche_creneau(CreneauHoraire(2, "09:00", "11:00", "lundi")))
+        self.assertFalse(occupation.chevauche_creneau(CreneauHoraire(3, "10:00", "10:30", "lundi")))
+        self.assertFalse(occupation.chevauche_creneau(CreneauHoraire(4, "09:00", "11:00", "mardi")))
+        self.assertTrue(occupation.chevauche("lundi", 11 * 60, 12 * 60 + 1))
+        with self.assertRaises(ValueError):
+            occupation.ajouter("lundi", 9 * 60, 9 * 60 + 30)
+
+        self.assertEqual(occupation.premier_creneau_libre("lundi", 30, debut_min=8 * 60), 10 * 60)
+        self.assertEqual(occupation.premier_creneau_libre("lundi", 45, debut_min=8 * 60), 13 * 60)
+        self.assertEqual(occupation.premier_creneau_libre("lundi", 60, 8 * 60, 14 * 60), 13 * 60)
+        self.assertIsNone(occupation.premier_creneau_libre("lundi", 90, 8 * 60, 14 * 60))
+        self.assertEqual(occupation.premier_creneau_libre("mardi", 90, 8 * 60), 8 * 60)
+        self.assertEqual(len(occupation), 3)
+
 
 class TestPlanificateurTriparti(unittest.TestCase):
     """Tests du planificateur avec données minimales."""
@@ -207,5 +268,169 @@ class TestPlanificateurTriparti(unittest.TestCase):
         self.assertIn("congestion_moyenne", indicateurs)
 
 
+class TestPlanificationOptimale(unittest.TestCase):
+    """Tests du mode de planification "optimal" (réaffectation globale par camion)."""
+
+    def _planifier(self, creneaux, methode, jeton=None):
+        camions = [Camion(1, 5000, 200, [1, 2])]
+        zones = [Zone(1, [1, 2], 1200, 3.5, 3.5), Zone(2, [3, 4], 800, 1.5, 5.5)]
+        zones[0].priorite = "haute"
+        contraintes = ContrainteTemporelle()
+        contraintes.ajouter_fenetre_zone(1, "08:00", "12:00")
+        contraintes.ajouter_fenetre_zone(2, "08:00", "10:00")
+        planificateur = PlanificateurTriparti(AffectateurBiparti(camions, zones, None), contraintes)
+        planificateur.ajouter_creneaux(creneaux)
+        with contextlib.redirect_stdout(io.StringIO()):
+            planning = planificateur.generer_plan_optimal({1: [1, 2]}, methode=methode, jeton=jeton)
+        return planning, planificateur.evaluer_plan(planning)
+
+    def test_couverture_amelioree(self):
+        """Le glouton donne 08-10 à la zone prioritaire ; l'optimal la décale pour placer l'autre."""
+        for creneaux, exacte in (
+            ([CreneauHoraire(1, "08:00", "10:00", "lundi", 1.0),
+              CreneauHoraire(2, "10:00", "12:00", "lundi", 1.5)], True),
+            ([CreneauHoraire(1, "08:00", "10:00", "lundi", 1.0),
+              CreneauHoraire(2, "10:00", "12:00", "lundi", 1.5),
+              CreneauHoraire(3, "09:00", "11:00", "lundi", 1.0)], False),
+        ):
+            _, glouton = self._planifier(creneaux, "glouton")
+            self.assertEqual(glouton["couverture_collecte"], 50.0)
+
+            planning, indicateurs = self._planifier(creneaux, "optimal")
+            self.assertEqual(indicateurs["couverture_collecte"], 100.0)
+            self.assertEqual({(e["zone_id"], e["creneau_id"]) for e in planning["lundi"]}, {(1, 2), (2, 1)})
+            optimisation = indicateurs["optimisation"]
+            self.assertEqual(optimisation["gain_couverture"], 50.0)
+            self.assertEqual(optimisation["penalite_optimisee"], indicateurs["penalite_totale"])
+            self.assertEqual(optimisation["camions_exacts"], 1 if exacte else 0)
+
+    def test_echeance_garde_le_glouton(self):
+        """Échéance dépassée avant l'optimisation : le camion garde son plan glouton."""
+        creneaux = [CreneauHoraire(1, "08:00", "10:00", "lundi", 1.0),
+                    CreneauHoraire(2, "10:00", "12:00", "lundi", 1.5)]
+        _, indicateurs = self._planifier(creneaux, "optimal", jeton=JetonAnnulation(0))
+        self.assertEqual(indicateurs["couverture_collecte"], 50.0)
+        self.assertEqual(indicateurs["optimisation"]["couverture_optimisee"], 50.0)
+        self.assertEqual(indicateurs["optimisation"]["camions_non_optimises"], 1)
+
+    def test_methode_inconnue(self):
+        """Méthode non reconnue → ValueError."""
+        with self.assertRaises(ValueError):
+            self._planifier([CreneauHoraire(1, "08:00", "10:00", "lundi")], "aleatoire")
+
+
+class TestPlanificationChronologique(unittest.TestCase):
+    """Tests du mode chronologique (zones enchaînées à la minute dans un créneau)."""
+
+    def test_plusieurs_zones_par_creneau(self):
+        """Trois zones de 20 min dans un créneau de 2 h, pause et fenêtre respectées."""
+        camions = [Camion(1, 5000, 200)]
+        zones = [Zone(z, [10 * z, 10 * z + 1], 500, 0.5 * z, 0.5) for z in (1, 2, 3)]
+        contraintes = ContrainteTemporelle()
+        contraintes.ajouter_pause_camion(1, "08:40", 0.5)
+        contraintes.ajouter_fenetre_zone(3, "09:30", "18:00")
+        planificateur = PlanificateurTriparti(AffectateurBiparti(camions, zones, None), contraintes)
+        planificateur.ajouter_creneaux([CreneauHoraire(1, "08:00", "10:00", "lundi", 1.0)])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            glouton = planificateur.generer_plan_optimal({1: [1, 2, 3]})
+        self.assertEqual(glouton["lundi"], [], "créneau entier bloqué par la pause en mode glouton")
+
+        planning = planificateur.generer_plan_optimal({1: [1, 2, 3]}, methode="chronologique")
+        entrees = planning["lundi"]
+        self.assertEqual([e["zone_id"] for e in entrees], [1, 2, 3])
+        intervalles = [
+            (en_minutes(e["creneau"]["debut"]) - e["trajet_minutes"], en_minutes(e["creneau"]["fin"]))
+            for e in entrees
+        ]
+        for (_, fin), (debut_suivant, _) in zip(intervalles, intervalles[1:]):
+            self.assertLessEqual(fin, debut_suivant)
+        for debut, fin in intervalles:
+            self.assertTrue(fin <= 8 * 60 + 40 or debut >= 9 * 60 + 10, "pause 08:40-09:10")
+            self.assertGreaterEqual(debut, 8 * 60)
+            self.assertLessEqual(fin, 10 * 60)
+        self.assertGreaterEqual(en_minutes(entrees[2]["creneau"]["debut"]), 9 * 60 + 30)
+        self.assertEqual({e["creneau_horaire"]["debut"] for e in entrees}, {"08:00"})
+
+        indicateurs = planificateur.evaluer_plan(planning)
+        self.assertEqual(indicateurs["couverture_collecte"], 100.0)
+        self.assertGreater(indicateurs["taux_utilisation_temps"],
+                           planificateur.evaluer_plan(glouton)["taux_utilisation_temps"])
+
+    def test_durees_trajet_reelles(self):
+        """Temps de trajet OSRM : trajets entre zones et déplacement interne remplacent 30 km/h et 10 min."""
+        camions = [Camion(1, 5000, 200)]
+        zones = [Zone(z, [10 * z, 10 * z + 1], 500, 0.5 * z, 0.5) for z in (1, 2)]
+        planificateur = PlanificateurTriparti(AffectateurBiparti(camions, zones, None), ContrainteTemporelle())
+        planificateur.ajouter_creneaux([CreneauHoraire(1, "08:00", "12:00", "lundi", 1.0)])
+        durees = np.array([[0.0, 7.0, 9.0], [7.0, 0.0, 25.0], [9.0, 25.0, 0.0]])
+        planificateur.definir_durees_trajet(durees, {1: 3.2})
+
+        planning = planificateur.generer_plan_optimal({1: [1, 2]}, methode="chronologique")
+        entrees = planning["lundi"]
+        self.assertEqual([e["trajet_minutes"] for e in entrees], [7, 25])
+        self.assertEqual(entrees[0]["creneau"], {"debut": "08:07", "fin": "08:21", "jour": "lundi"})  # 2 × 5 + 4
+        self.assertEqual(entrees[1]["duree_totale"], 20)  # sans déplacement interne connu : 10 min
+        self.assertEqual(entrees[1]["creneau"]["debut"], "08:46")
+
+
+class TestRobustessePlanning(unittest.TestCase):
+    """Tests de l'évaluation Monte-Carlo (congestion et volumes aléatoires)."""
+
+    def _planificateur(self, capacite=5000):
+        camions = [Camion(1, capacite, 200)]
+        zones = [Zone(z, [10 * z], 1000, z, 1.0) for z in (1, 2)]
+        planificateur = PlanificateurTriparti(AffectateurBiparti(camions, zones, None), ContrainteTemporelle())
+        planificateur.ajouter_creneaux([
+            CreneauHoraire(1, "08:00", "10:00", "lundi", 1.0),
+            CreneauHoraire(2, "10:00", "12:00", "lundi", 1.0),
+        ])
+        return planificateur
+
+    def test_plan_nominal_et_retard_propage(self):
+        """Plan nominal : aucun retard ; visites qui se recouvrent : retard propagé."""
+        planificateur = self._planificateur()
+        with contextlib.redirect_stdout(io.StringIO()):
+            planning = planificateur.generer_plan_optimal({1: [1, 2]}, horizon_jours=1)
+        indicateurs = planificateur.evaluer_plan(planning)
+        self.assertEqual(indicateurs["respect_horaires"], 100.0)
+        self.assertEqual(indicateurs["retard_moyen"], 0.0)
+
+        # Deux visites de 150 min à la suite dans des créneaux de 2 h
+        visites = [
+            {"camion_id": 1, "zone_id": z, "jour": 0, "creneau": 0, "depart": 480.0 + 120 * i,
+             "collecte": 150.0, "echeance": 600.0 + 120 * i, "volume": 10.0, "capacite": 100.0}
+            for i, z in enumerate((1, 2))
+        ]
+        brut = simuler(construire_modele(visites, 1, cv_congestion=0.0, cv_volume_point=0.0), 10)
+        self.assertTrue(all(abs(r - (30 + 60) / 2) < 1e-6 for r in brut["retard_moyen"]))
+
+    def test_debordement_et_reproductibilite(self):
+        """P(volume > capacité) proche de la valeur lognormale ; même graine → même rapport."""
+        planificateur = self._planificateur(capacite=1000)
+        with contextlib.redirect_stdout(io.StringIO()):
+            planning = planificateur.generer_plan_optimal({1: [1]}, horizon_jours=1)
+        rapport = planificateur.evaluer_robustesse(planning, 20000, graine=7)
+        # Volume lognormal de moyenne 1, CV 0.3 : P(> 1) = 1 - Φ(σ / 2), σ² = ln(1.09)
+        self.assertAlmostEqual(rapport["debordements"]["probabilite_tournee_max"], 0.442, delta=0.015)
+        self.assertEqual(rapport["camions"][0]["fins"][0]["fin_prevue"], "08:15")
+        autre = planificateur.evaluer_robustesse(planning, 20000, graine=7)
+        self.assertEqual(
+            {k: v for k, v in autre.items() if k != "duree_s"},
+            {k: v for k, v in rapport.items() if k != "duree_s"},
+        )
+
+    def test_echeance_depassee(self):
+        """Échéance dépassée : un seul lot de scénarios rejoué, rapport marqué interrompu."""
+        planificateur = self._planificateur()
+        with contextlib.redirect_stdout(io.StringIO()):
+            planning = planificateur.generer_plan_optimal({1: [1, 2]}, horizon_jours=1)
+        rapport = planificateur.evaluer_robustesse(planning, 20000, graine=7, jeton=JetonAnnulation(0))
+        self.assertEqual(rapport["nb_scenarios"], 1000)
+        self.assertEqual(rapport["nb_scenarios_demandes"], 20000)
+        self.assertTrue(rapport["interrompue"])
+        self.assertFalse(planificateur.evaluer_robustesse(planning, 2000, graine=7)["interrompue"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Cache HTTP des endpoints d'optimisation (routes, niveau 2, niveau 3)
+
+@avec_cache_resultat("routes") sur une vue POST :
+- body identique déjà calculé → réponse servie depuis services.cache_service (X-Cache: HIT)
+- If-None-Match égal à l'ETag du résultat → 304 sans corps (pas de re-téléchargement des routes)
+- "cache": false dans le body ou Cache-Control: no-store → cache ignoré ;
+  Cache-Control: no-cache → recalcul et remplacement de l'entrée
+Seules les réponses 200 complètes sont mises en cache (pas d'erreur, pas de solution partielle).
+sur_hit(data, resultat) est appelé à chaque HIT (304 compris) pour rétablir l'état propre au
+processus que la vue aurait créé (ex. affectation_id du niveau 2 après un redémarrage).
+"""
+
+import json
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from services.cache_service import cache_resultats, cle_canonique
+
+
+def _resultat_cachable(corps) -> bool:
+    if not isinstance(corps, dict) or corps.get("error"):
+        return False
+    stats = corps.get("statistiques")
+    return not (isinstance(stats, dict) and stats.get("partiel"))
+
+
+def _reponse_cache(corps: bytes, etag: str, statut_cache: str) -> Response:
+    if request.if_none_match.contains(etag):
+        reponse = Response(status=304)
+    else:
+        reponse = Response(corps, status=200, mimetype="application/json")
+    reponse.set_etag(etag)
+    reponse.headers["X-Cache"] = statut_cache
+    return reponse
+
+
+def avec_cache_resultat(espace: str, sur_hit=None):
+    """Décorateur : cache adressé par le contenu du body JSON de la requête."""
+    def decorateur(vue):
+        @wraps(vue)
+        def enveloppe(*args, **kwargs):
+            data = request.get_json(silent=True)
+            cache_control = request.headers.get("Cache-Control", "").lower()
+            if (request.method != "POST" or not isinstance(data, dict)
+                    or data.get("cache") is False or "no-store" in cache_control):
+                return vue(*args, **kwargs)
+
+            cle = cle_canonique(espace, data)
+            if "no-cache" not in cache_control:
+                entree = cache_resultats.lire(cle)
+                if entree is not None:
+                    if sur_hit is not None:
+                        sur_hit(data, json.loads(entree[0]))
+                    return _reponse_cache(entree[0], entree[1], "HIT")
+
+            reponse = make_response(vue(*args, **kwargs))
+            if reponse.status_code != 200 or not reponse.is_json:
+                return reponse
+            if not _resultat_cachable(reponse.get_json(silent=True)):
+                return reponse
+            etag = cache_resultats.ecrire(cle, reponse.get_data())
+            return _reponse_cache(reponse.get_data(), etag, "MISS")
+        return enveloppe
+    return decorateur
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from flask import Blueprint, request, jsonify
-from models_eco import db, PointCollecte, User
+from models_eco import db, PointCollecte, Depot, Dechetterie, User
+from services.donnees_eco_service import donnees_optimiseur
 
 points_bp = Blueprint('eco_points', __name__, url_prefix='/api/points')
 
@@ -25,6 +26,21 @@ def list_points():
         q = q.filter_by(zone_id=int(zone))
     return jsonify([p.to_dict() for p in q.all()])
 
+@points_bp.route('/optimiseur', methods=['GET'])
+def optimiseur_input():
+    user, err = _auth()
+    if err:
+        return err
+    depot = Depot.query.first()
+    if not depot:
+        return jsonify({'error': 'Aucun dépôt configuré'}), 404
+    q = PointCollecte.query.filter_by(type='collecte')
+    zone = request.args.get('zone_id')
+    if zone is not None:
+        q = q.filter_by(zone_id=int(zone))
+    matrice = request.args.get('matrice', '').lower() in ('1', 'true', 'haversine')
+    return jsonify(donnees_optimiseur(depot, q.all(), Dechetterie.query.all(), matrice=matrice))
+
 @points_bp.route('/<point_id>', methods=['GET'])
 def get_point(point_id):
     user, err = _auth()
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
-from datetime import datetime
 from flask import Blueprint, request, jsonify
-from models_eco import db, GpsPosition, GpsPointComplete, User, Planning
+from models_eco import db, GpsPosition, GpsLastPosition, GpsPointComplete, User, Planning
+from services.donnees_eco_service import trace_gps
+from services_eco.gps_service import GPS_LOT_MAX, lignes_positions, tampon_gps
 
 tracking_bp = Blueprint('eco_tracking', __name__, url_prefix='/api/tracking')
+tracking_bp.record_once(lambda etat: tampon_gps.demarrer(etat.app))
 
 def _auth():
     auth = request.headers.get('Authorization')
@@ -28,11 +30,34 @@ def save_position():
     pl = Planning.query.get(planning_id)
     if not pl or pl.chauffeur_id != user.id:
         return jsonify({'error': 'Mission introuvable ou non assignée'}), 403
-    pos = GpsPosition(planning_id=planning_id, chauffeur_id=user.id, lat=float(lat), lng=float(lng), vitesse=data.get('vitesse'), timestamp=datetime.utcnow())
-    db.session.add(pos)
-    db.session.commit()
+    try:
+        lignes = lignes_positions(planning_id, user.id, [{'lat': lat, 'lng': lng, 'vitesse': data.get('vitesse')}])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    tampon_gps.ajouter(lignes)
     return jsonify({'ok': True})
 
+@tracking_bp.route('/positions', methods=['POST'])
+def save_positions():
+    user, err = _auth()
+    if err:
+        return err
+    data = request.get_json() or {}
+    planning_id, fixes = data.get('planning_id'), data.get('positions')
+    if not planning_id or not isinstance(fixes, list) or not fixes:
+        return jsonify({'error': 'planning_id et positions (liste non vide) requis'}), 400
+    if len(fixes) > GPS_LOT_MAX:
+        return jsonify({'error': f'{GPS_LOT_MAX} positions au plus par lot'}), 400
+    pl = Planning.query.get(planning_id)
+    if not pl or pl.chauffeur_id != user.id:
+        return jsonify({'error': 'Mission introuvable ou non assignée'}), 403
+    try:
+        lignes = lignes_positions(planning_id, user.id, fixes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    tampon_gps.ajouter(lignes)
+    return jsonify({'ok': True, 'recues': len(lignes)})
+
 @tracking_bp.route('/positions/<planning_id>', methods=['GET'])
 def get_positions(planning_id):
     user, err = _auth()
@@ -43,8 +68,9 @@ def get_positions(planning_id):
         return jsonify({'error': 'Planning introuvable'}), 404
     if user.role != 'admin' and pl.chauffeur_id != user.id:
         return jsonify({'error': 'Accès refusé'}), 403
+    tampon_gps.vider()
     positions = GpsPosition.query.filter_by(planning_id=planning_id).order_by(GpsPosition.timestamp).all()
-    return jsonify([p.to_dict() for p in positions])
+    return jsonify(trace_gps(positions))
 
 @tracking_bp.route('/live', methods=['GET'])
 def live_positions():
@@ -53,14 +79,17 @@ def live_positions():
         return err
     if user.role != 'admin':
         return jsonify({'error': 'Accès réservé à l\'admin'}), 403
-    from sqlalchemy import func
-    subq = db.session.query(GpsPosition.planning_id, func.max(GpsPosition.id).label('max_id')).group_by(GpsPosition.planning_id).subquery()
-    latest = db.session.query(GpsPosition).join(subq, (GpsPosition.planning_id == subq.c.planning_id) & (GpsPosition.id == subq.c.max_id)).all()
-    plannings_en_cours = Planning.query.filter_by(status='en_cours').all()
-    result = []
-    for pl in plannings_en_cours:
-        pos = next((p for p in latest if p.planning_id == pl.id), None)
-        result.append({'planning_id': pl.id, 'chauffeur_id': pl.chauffeur_id, 'camion_id': pl.camion_id, 'last_position': pos.to_dict() if pos else None})
+    # Pas de vidage du tampon ici : gps_last_position a au plus GPS_TAMPON_DELAI_S de retard
+    lignes = (
+        db.session.query(Planning.id, Planning.chauffeur_id, Planning.camion_id, GpsLastPosition)
+        .outerjoin(GpsLastPosition, GpsLastPosition.planning_id == Planning.id)
+        .filter(Planning.status == 'en_cours')
+        .all()
+    )
+    result = [
+        {'planning_id': pid, 'chauffeur_id': chauffeur_id, 'camion_id': camion_id, 'last_position': pos.to_dict() if pos else None}
+        for pid, chauffeur_id, camion_id, pos in lignes
+    ]
     return jsonify(result)
 
 @tracking_bp.route('/point-complete', methods=['POST'])
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+API Jobs - Optimisations asynchrones (routes, niveau 2, niveau 3)
+
+POST /api/jobs/<type>   body identique à l'endpoint synchrone (+ time_limit_seconds optionnel)
+                        → 202 {"job_id", "statut", "url_statut"} ; 429 + Retry-After si file pleine
+GET  /api/jobs/<id>     → statut (en_attente, en_cours, termine, erreur, expire, annule)
+                          + "resultat" et "code_http" une fois terminé
+DELETE /api/jobs/<id>   → annule un job encore en file
+GET  /api/jobs          → charge de la file et liste des jobs
+"""
+
+from flask import Blueprint, jsonify, request
+
+from services.jobs_service import FileJobsPleine, gestionnaire_jobs
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/api/jobs")
+
+
+@jobs_bp.route("", methods=["GET"])
+def lister_jobs():
+    return jsonify({"file": gestionnaire_jobs.etat(), "jobs": gestionnaire_jobs.lister()}), 200
+
+
+@jobs_bp.route("/<type_job>", methods=["POST"])
+def soumettre_job(type_job):
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Corps de requête vide"}), 400
+    try:
+        job = gestionnaire_jobs.soumettre(type_job, data, data.get("time_limit_seconds"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except FileJobsPleine as e:
+        reponse = jsonify({"error": str(e), "retry_after": e.retry_after})
+        reponse.headers["Retry-After"] = str(e.retry_after)
+        return reponse, 429
+    url_statut = f"{jobs_bp.url_prefix}/{job['id']}"
+    reponse = jsonify({"job_id": job["id"], "statut": job["statut"], "url_statut": url_statut})
+    reponse.headers["Location"] = url_statut
+    return reponse, 202
+
+
+@jobs_bp.route("/<job_id>", methods=["GET"])
+def statut_job(job_id):
+    job = gestionnaire_jobs.statut(job_id)
+    if job is None:
+        return jsonify({"error": "Job introuvable (inconnu ou expiré de la mémoire)"}), 404
+    return jsonify(job), 200
+
+
+@jobs_bp.route("/<job_id>", methods=["DELETE"])
+def annuler_job(job_id):
+    annule = gestionnaire_jobs.annuler(job_id)
+    if annule is None:
+        return jsonify({"error": "Job introuvable"}), 404
+    if not annule:
+        return jsonify({"error": "Job déjà démarré ou terminé : annulation impossible"}), 409
+    return jsonify({"job_id": job_id, "statut": "annule"}), 200
@@ -92,6 +92,8 @@ def optimiser_affectation(
     zones_data: list,
     zones_incompatibles: list,
     graphe,
+    methode: str = "glouton",
+    temps_max: float = None,
 ) -> dict:
     """
     Lance l'optimisation d'affectation niveau 2.
@@ -104,9 +106,13 @@ def optimiser_affectation(
         zones_data: Liste des zones
         zones_incompatibles: Liste de paires incompatibles
         graphe: GrapheRoutier du niveau 1 (contient les déchetteries)
+        methode: "glouton" (glouton + équilibrage des charges) ou "optimal"
+            (relaxation lagrangienne démarrée du glouton, avec gap d'optimalité)
+        temps_max: Plafond de temps (s) de la méthode "optimal"
 
     Returns:
         Dict avec affectation, statistiques et graphe_biparti
+        (+ statistiques["optimisation"] pour la méthode "optimal")
     """
     camions = creer_camions_depuis_data(camions_data)
     zones = creer_zones_depuis_data(zones_data)
@@ -117,8 +123,14 @@ def optimiser_affectation(
     affectateur = AffectateurBiparti(camions, zones, graphe, dechetteries)
     affectateur.zones_incompatibles = zones_incompatibles
 
-    affectation = affectateur.affectation_gloutonne()
-    affectation_eq = affectateur.equilibrage_charges(affectation)
+    if methode == "optimal":
+        options = {"temps_max": float(temps_max)} if temps_max else {}
+        affectation_eq = affectateur.affectation_optimale(**options)
+    elif methode == "glouton":
+        affectation = affectateur.affectation_gloutonne()
+        affectation_eq = affectateur.equilibrage_charges(affectation)
+    else:
+        raise ValueError(f"Méthode d'affectation inconnue : {methode} (glouton ou optimal)")
 
     zones_par_id = {z.id: z for z in zones}
     camions_par_id = {c.id: c for c in camions}
@@ -142,6 +154,8 @@ def optimiser_affectation(
         })
 
     stats = affectateur.calculer_statistiques(affectation_eq)
+    if affectateur.rapport_optimisation is not None:
+        stats["optimisation"] = affectateur.rapport_optimisation
     graphe_biparti = affectateur.generer_graphe_biparti()
 
     return {
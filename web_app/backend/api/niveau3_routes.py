@@ -3,9 +3,17 @@
 Routes API Niveau 3 - Planification temporelle hebdomadaire
 """
 
+import numpy as np
 from flask import request, jsonify
 
-from services.planning_service import generer_planning
+from services.planning_service import AffectationInconnue, generer_planning
+from services.simulation_service import (
+    PLAGE_MAX_VALEURS,
+    creer_simulation,
+    instant_en_jour_heure,
+    jour_heure_en_instant,
+    trouver_simulation,
+)
 
 
 def configure_creneaux():
@@ -52,39 +60,71 @@ def generer_planning_route():
         "connexions": [...],
         "dechetteries": [...],
         "horizon_jours": 7,
-        "use_osrm": false
+        "use_osrm": false,
+        "affectation_id": "...",   (optionnel : renvoyé par /api/niveau2/optimiser)
+        "affectation": {...},      (optionnel : {camion_id: [zone_ids]} ou liste du niveau 2)
+        "methode": "glouton",      (optionnel : "optimal" = réaffectation globale des créneaux,
+                                    "chronologique" = zones enchaînées à la minute)
+        "robustesse": {            (optionnel : évaluation Monte-Carlo du planning)
+            "nb_scenarios": 10000, "routes": [...], "nb_processus": 1, "graine": 42
+        }
     }
     """
     try:
-        data = request.json
-        if not data:
-            return jsonify({"error": "Corps de requête vide"}), 400
+        corps, code = executer_generer_planning(request.json)
+        return jsonify(corps), code
 
-        creneaux = data.get("creneaux", [])
-        if not creneaux:
-            return jsonify({
-                "error": "Veuillez d'abord configurer les créneaux horaires",
-                "code": "NO_CRENEAUX",
-            }), 400
+    except Exception as e:
+        import traceback
+        print(f"Erreur niveau3/generer_planning: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
 
-        camions = data.get("camions", [])
-        zones = data.get("zones", [])
-        points = data.get("points", [])
-        connexions = data.get("connexions", [])
-        dechetteries = data.get("dechetteries", [])
 
-        if not camions or not zones:
-            return jsonify({
-                "error": "Exécutez d'abord le Niveau 2 (Affecter Zones)",
-                "code": "NO_NIVEAU2",
-            }), 400
+def executer_generer_planning(data: dict, jeton=None):
+    """
+    Valide le body de /api/niveau3/generer_planning et génère le planning.
+    Sans dépendance à la requête Flask : réutilisé par la file de jobs (processus worker),
+    qui passe un jeton d'échéance (limite de temps du job).
 
-        if not points or not connexions:
-            return jsonify({
-                "error": "Exécutez d'abord le Niveau 1 (Calculer Distances)",
-                "code": "NO_NIVEAU1",
-            }), 400
+    Returns:
+        (corps de la réponse, code HTTP)
+    """
+    if not data:
+        return {"error": "Corps de requête vide"}, 400
+
+    creneaux = data.get("creneaux", [])
+    if not creneaux:
+        return {
+            "error": "Veuillez d'abord configurer les créneaux horaires",
+            "code": "NO_CRENEAUX",
+        }, 400
+
+    camions = data.get("camions", [])
+    zones = data.get("zones", [])
+    points = data.get("points", [])
+    connexions = data.get("connexions", [])
+    dechetteries = data.get("dechetteries", [])
+
+    if not camions or not zones:
+        return {
+            "error": "Exécutez d'abord le Niveau 2 (Affecter Zones)",
+            "code": "NO_NIVEAU2",
+        }, 400
 
+    if not points or not connexions:
+        return {
+            "error": "Exécutez d'abord le Niveau 1 (Calculer Distances)",
+            "code": "NO_NIVEAU1",
+        }, 400
+
+    affectation = data.get("affectation")
+    if affectation is not None and not isinstance(affectation, (dict, list)):
+        return {
+            "error": "affectation : dict {camion_id: [zone_ids]} ou liste du niveau 2 attendue",
+        }, 400
+
+    try:
         resultat = generer_planning(
             creneaux=creneaux,
             contraintes=data.get("contraintes", {}),
@@ -96,36 +136,142 @@ def generer_planning_route():
             zones_incompatibles=data.get("zones_incompatibles"),
             horizon_jours=data.get("horizon_jours", 7),
             use_osrm=data.get("use_osrm", False),
+            affectation=affectation,
+            affectation_id=data.get("affectation_id"),
+            methode=data.get("methode", "glouton"),
+            robustesse=data.get("robustesse"),
+            jeton=jeton,
         )
+    except AffectationInconnue as e:
+        return {"error": str(e), "code": "AFFECTATION_INCONNUE"}, 404
+    except (TypeError, ValueError) as e:
+        return {"error": str(e)}, 400
 
-        if "error" in resultat and resultat["error"]:
-            return jsonify({
-                "error": resultat["error"],
-                "planification_hebdomadaire": resultat.get("planification_hebdomadaire", {}),
-                "indicateurs": resultat.get("indicateurs", {}),
-            }), 200
+    if "error" in resultat and resultat["error"]:
+        return {
+            "error": resultat["error"],
+            "planification_hebdomadaire": resultat.get("planification_hebdomadaire", {}),
+            "indicateurs": resultat.get("indicateurs", {}),
+        }, 200
+
+    return resultat, 200
 
-        return jsonify(resultat), 200
 
+def creer_simulation_route():
+    """
+    POST /api/niveau3/simulation_temps_reel
+    Construit la simulation à événements discrets d'un planning et renvoie son identifiant.
+
+    Body:
+    {
+        "planification_hebdomadaire": {...},  (réponse de /api/niveau3/generer_planning)
+        "routes": [...],                      (réponse de /api/routes/optimiser ou sa liste "routes")
+        "zones": [...],
+        "creneaux": [...],                    (congestion par creneau_id)
+        "points": [...],                      (optionnel : zones absentes des routes)
+        "depot": {"x": 0, "y": 0},            (optionnel)
+        "vitesse_kmh": 30                     (optionnel)
+    }
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"error": "Corps de requête vide"}), 400
+        if not (data.get("planification_hebdomadaire") or data.get("planning")):
+            return jsonify({
+                "error": "Générez d'abord le planning (Niveau 3)",
+                "code": "NO_PLANNING",
+            }), 400
+        try:
+            simulation_id, simulation = creer_simulation(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"simulation_id": simulation_id, **simulation.resume}), 200
     except Exception as e:
-        import traceback
-        print(f"Erreur niveau3/generer_planning: {e}")
-        print(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
 
+def _instant_demande(simulation):
+    """Instant de la requête : ?timestamp= (minutes depuis lundi 00:00) ou ?jour=&heure=."""
+    timestamp = request.args.get("timestamp", type=float)
+    if timestamp is not None:
+        return timestamp
+    instant = jour_heure_en_instant(request.args.get("jour"), request.args.get("heure", "00:00"))
+    if instant is not None:
+        return instant
+    return simulation.resume.get("debut", 0.0)
+
+
+def _camions_demandes():
+    """?camion_id=1&camion_id=2 ou ?camion_ids=1,2 ; None = tous les camions."""
+    ids = request.args.getlist("camion_id")
+    if request.args.get("camion_ids"):
+        ids += [i for i in request.args["camion_ids"].split(",") if i]
+    return ids or None
+
+
 def simulation_temps_reel():
     """
-    GET /api/niveau3/simulation_temps_reel?timestamp=...
+    GET /api/niveau3/simulation_temps_reel?simulation_id=...&timestamp=...
     Retourne les positions des camions à un instant donné (pour l'animation).
-    Pour l'instant, retourne des données factices basées sur le planning.
+
+    timestamp en minutes depuis lundi 00:00 (ou jour=mardi&heure=08:30) ; sans
+    simulation_id, la dernière simulation construite. Lecture seule des trajectoires
+    précalculées : O(log n) par camion.
     """
     try:
-        timestamp = request.args.get("timestamp", type=float)
-        # TODO: Implémenter la logique de simulation à partir du planning
+        trouvee = trouver_simulation(request.args.get("simulation_id"))
+        if trouvee is None:
+            if request.args.get("simulation_id"):
+                return jsonify({"error": "Simulation inconnue ou expirée", "code": "NO_SIMULATION"}), 404
+            return jsonify({
+                "camions": [],
+                "timestamp": request.args.get("timestamp", type=float),
+            }), 200
+        simulation_id, simulation = trouvee
+        instant = _instant_demande(simulation)
+        return jsonify({
+            "simulation_id": simulation_id,
+            "timestamp": instant,
+            **instant_en_jour_heure(max(0.0, instant)),
+            "camions": simulation.positions(instant, _camions_demandes()),
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def simulation_plage():
+    """
+    GET /api/niveau3/simulation_temps_reel/plage?simulation_id=...&debut=...&fin=...&pas=1
+    Positions de tous les camions à chaque instant de [debut, fin] (pas en minutes),
+    en tableaux instants × camions : x, y, etats (indices dans etats_libelles).
+    """
+    try:
+        trouvee = trouver_simulation(request.args.get("simulation_id"))
+        if trouvee is None:
+            return jsonify({"error": "Simulation inconnue ou expirée", "code": "NO_SIMULATION"}), 404
+        simulation_id, simulation = trouvee
+        debut = request.args.get("debut", default=simulation.resume.get("debut", 0.0), type=float)
+        fin = request.args.get("fin", default=simulation.fin, type=float)
+        pas = request.args.get("pas", default=1.0, type=float)
+        if pas <= 0 or fin < debut:
+            return jsonify({"error": "Plage invalide : debut <= fin et pas > 0 attendus"}), 400
+
+        camions = _camions_demandes()
+        nb_instants = int((fin - debut) // pas) + 1
+        nb_camions = len(simulation.indices(camions))
+        if nb_instants * max(1, nb_camions) > PLAGE_MAX_VALEURS:
+            return jsonify({
+                "error": f"Plage trop grande ({nb_instants} instants × {nb_camions} camions, "
+                         f"max {PLAGE_MAX_VALEURS}) : augmentez le pas ou réduisez la plage",
+            }), 400
+        instants = debut + pas * np.arange(nb_instants)
         return jsonify({
-            "camions": [],
-            "timestamp": timestamp,
+            "simulation_id": simulation_id,
+            "debut": debut,
+            "fin": fin,
+            "pas": pas,
+            **simulation.positions_plage(instants, camions),
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
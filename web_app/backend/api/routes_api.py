@@ -4,20 +4,27 @@ API Routes - Optimisation des routes de collecte avec déchetteries
 Utilise l'optimiseur de routes du niveau 2 pour planifier les trajets optimaux.
 """
 
+import queue
 import sys
+import threading
+import time
 from pathlib import Path
 
 # Ajouter le chemin vers les modules niveau 2
 NIVEAU2_SRC = Path(__file__).resolve().parent.parent.parent.parent / "niveau2" / "src"
 sys.path.insert(0, str(NIVEAU2_SRC))
 
-from optimiseur_routes import optimiser_collecte
+from jeton_annulation import JetonAnnulation
+from optimiseur_routes import OBJECTIFS, optimiser_collecte
 
 
 def optimiser_routes_collecte(depot_data: dict, points_data: list,
                                dechetteries_data: list, camions_data: list,
                                use_osrm: bool = False, time_limit_seconds: float = None,
-                               debug_coverage: bool = False) -> dict:
+                               debug_coverage: bool = False,
+                               solution_precedente=None, modifications: dict = None,
+                               callback_progression=None, jeton: JetonAnnulation = None,
+                               objectif: str = "distance") -> dict:
     """
     Optimise les routes de collecte avec stratégie hybride (adaptation automatique
     au nombre de points) et méta-heuristiques pour les grandes instances.
@@ -33,6 +40,12 @@ def optimiser_routes_collecte(depot_data: dict, points_data: list,
         camions_data: Liste des camions [{id, capacite, cout_fixe, zones_accessibles}, ...]
         use_osrm: Si True, utilise les distances routières OSRM
         time_limit_seconds: Limite de temps (s). Au-delà, améliorations raccourcies (évite blocage).
+        solution_precedente: Résultat précédent (ou sa liste "routes") pour une ré-optimisation
+            incrémentale (warm start) au lieu d'une résolution complète.
+        modifications: Diff {"ajoutes": [...], "supprimes": [ids], "modifies": [...]} (optionnel)
+        callback_progression: Reçoit la progression et la meilleure solution connue (optionnel)
+        jeton: Jeton d'annulation ; l'appelant l'annule quand il abandonne (optionnel)
+        objectif: "distance" (km) ou "temps" (minutes de trajet, durées OSRM si use_osrm)
     
     Returns:
         Dictionnaire : routes, statistiques (dont strategie_optimisation), depot, dechetteries
@@ -62,6 +75,76 @@ def optimiser_routes_collecte(depot_data: dict, points_data: list,
         camions_data=camions_data,
         use_osrm=use_osrm,
         time_limit_seconds=time_limit_seconds,
-        debug_coverage=debug_coverage
+        debug_coverage=debug_coverage,
+        solution_precedente=solution_precedente,
+        modifications=modifications,
+        callback_progression=callback_progression,
+        jeton=jeton,
+        objectif=objectif
     )
     return resultat
+
+
+def flux_optimisation_routes(depot_data: dict, points_data: list,
+                             dechetteries_data: list, camions_data: list,
+                             timeout_s: float = 50.0, **options):
+    """
+    Optimisation anytime en flux : lance l'optimiseur dans un thread et produit des événements.
+
+    - {"type": "progression", "phase", "iteration", "temps_s", "distance_totale",
+       "gap_pourcent", "nb_points_couverts", "solution"} à chaque publication
+    - {"type": "resultat", "partiel": bool, "resultat": {...}} en fin de flux ; au-delà de
+      timeout_s, la meilleure solution connue est renvoyée avec partiel=True
+      et l'optimisation est annulée (jeton), comme si le client se déconnecte
+    - {"type": "erreur", "error": str} si l'optimisation échoue (ou aucun résultat à temps)
+
+    Args:
+        timeout_s: Durée maximale du flux (s)
+        **options: use_osrm, time_limit_seconds, debug_coverage, solution_precedente, modifications,
+            objectif
+    """
+    evenements = queue.Queue()
+    jeton = JetonAnnulation()
+
+    def run_optim():
+        try:
+            resultat = optimiser_routes_collecte(
+                depot_data, points_data, dechetteries_data, camions_data,
+                callback_progression=lambda ev: evenements.put({"type": "progression", **ev}),
+                jeton=jeton,
+                **options
+            )
+            evenements.put({"type": "resultat", "partiel": False, "resultat": resultat})
+        except Exception as e:
+            evenements.put({"type": "erreur", "error": str(e)})
+
+    thread = threading.Thread(target=run_optim, daemon=True)
+    thread.start()
+    echeance = time.time() + timeout_s
+    derniere_solution = None
+    try:
+        while True:
+            restant = echeance - time.time()
+            if restant <= 0:
+                if derniere_solution is not None:
+                    print("[Routes] Flux: timeout", timeout_s, "s - meilleure solution connue renvoyée")
+                    yield {"type": "resultat", "partiel": True, "resultat": derniere_solution}
+                else:
+                    yield {"type": "erreur", "error": f"Optimisation trop longue (timeout {timeout_s:.0f}s), aucune solution disponible."}
+                return
+            try:
+                evenement = evenements.get(timeout=restant)
+            except queue.Empty:
+                continue
+            if evenement["type"] == "progression":
+                # Instantané construit ici seulement : l'optimiseur ne publie que les métriques
+                evenement["solution"] = evenement.pop("solution_courante")()
+                if evenement["solution"]:
+                    derniere_solution = evenement["solution"]
+            yield evenement
+            if evenement["type"] != "progression":
+                return
+    finally:
+        # Timeout ou client déconnecté (GeneratorExit) : libérer le thread d'optimisation
+        if thread.is_alive():
+            jeton.annuler("flux interrompu")
@@ -5,10 +5,11 @@ Serveur Flask principal - VillePropre + EcoAgadir
 - API EcoAgadir (auth, users, camions, planning, tracking, stats) + MySQL
 """
 
+import json
 import sys
 import threading
 from pathlib import Path
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 
 # Configuration
@@ -35,6 +36,7 @@ try:
     from api.eco_planning import planning_bp
     from api.eco_tracking import tracking_bp
     from api.eco_stats import stats_bp
+    from services_eco.gps_service import tampon_gps
     for bp in (auth_bp, users_bp, camions_bp, depot_bp, points_bp, dechetteries_bp, planning_bp, tracking_bp, stats_bp):
         app.register_blueprint(bp)
     ECOAGADIR_LOADED = True
@@ -65,13 +67,23 @@ CORS(app, origins=["http://localhost:5173", "http://127.0.0.1:5173", "http://loc
 # Importer les modules API VillePropre (optimisation)
 from api.niveau1_api import calculer_matrice_distances, creer_graphe_depuis_points
 from api.niveau2_api import optimiser_affectation
-from api.routes_api import optimiser_routes_collecte
+from api.routes_api import OBJECTIFS, JetonAnnulation, flux_optimisation_routes, optimiser_routes_collecte
 from api.niveau3_routes import (
     configure_creneaux,
     configure_contraintes,
+    creer_simulation_route,
     generer_planning_route,
+    simulation_plage,
     simulation_temps_reel,
 )
+from api.jobs_api import jobs_bp
+from api.cache_http import avec_cache_resultat
+from services.cache_service import cache_resultats
+from osrm_client import cache_osrm, client_osrm
+from services.planning_service import enregistrer_resultat_niveau2
+
+# File de jobs asynchrones (pool de processus) : /api/jobs/<type>
+app.register_blueprint(jobs_bp)
 
 
 @app.route("/")
@@ -145,6 +157,7 @@ def api_calculer_distances():
 # ==================== API NIVEAU 2 ====================
 
 @app.route("/api/niveau2/optimiser", methods=["POST"])
+@avec_cache_resultat("niveau2", sur_hit=enregistrer_resultat_niveau2)
 def api_optimiser_affectation():
     """
     Endpoint pour optimiser l'affectation zones ↔ camions (Niveau 2).
@@ -158,9 +171,13 @@ def api_optimiser_affectation():
             {"id": 1, "points": [1,2], "volume_moyen": 1200, "centre": {"x": 3.5, "y": 3.5}, "priorite": "haute"}
         ],
         "zones_incompatibles": [[1, 2]],
+        "methode": "glouton",  # ou "optimal" (relaxation lagrangienne, gap rapporté)
+        "temps_max": 2.0,  # optionnel, méthode "optimal"
         "points": [...],  # Points du niveau 1 pour créer le graphe
         "connexions": [...]  # Connexions du niveau 1
     }
+
+    La réponse contient un affectation_id à passer à /api/niveau3/generer_planning.
     """
     try:
         data = request.json
@@ -182,9 +199,15 @@ def api_optimiser_affectation():
             zones_data,
             zones_incompatibles,
             graphe,
+            methode=data.get("methode", "glouton"),
+            temps_max=data.get("temps_max"),
         )
+        # affectation_id : réutilisable par /api/niveau3/generer_planning (pas de recalcul)
+        enregistrer_resultat_niveau2(data, resultat)
         return jsonify(resultat), 200
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -192,6 +215,7 @@ def api_optimiser_affectation():
 # ==================== API ROUTES OPTIMISÉES ====================
 
 @app.route("/api/routes/optimiser", methods=["GET", "POST"])
+@avec_cache_resultat("routes")
 def api_optimiser_routes():
     """GET → 405 (il faut utiliser POST). POST → optimisation des routes."""
     if request.method == "GET":
@@ -218,9 +242,15 @@ def api_optimiser_routes():
         ],
         "camions": [
             {"id": 1, "capacite": 5000, "cout_fixe": 200, "zones_accessibles": []}
-        ]
+        ],
+        "solution_precedente": {"routes": [...]},
+        "modifications": {"ajoutes": [...], "supprimes": [3], "modifies": [{"id": 1, "volume": 200}]},
+        "objectif": "distance"   (optionnel : "temps" = minimiser les minutes de trajet)
     }
 
+    Avec solution_precedente, seules les routes touchées par les modifications sont
+    réparées (insertion au moindre coût + recherche locale) : réponse en millisecondes.
+
     Retourne:
     {
         "routes": [
@@ -228,6 +258,7 @@ def api_optimiser_routes():
                 "camion_id": 1,
                 "waypoints": [...],
                 "distance_totale": 12.5,
+                "duree_trajet_minutes": 31.0,   (avec use_osrm ou objectif "temps")
                 "volume_total_collecte": 1200,
                 "nb_visites_dechetterie": 2,
                 "details_etapes": [...]
@@ -247,6 +278,9 @@ def api_optimiser_routes():
         use_osrm = data.get("use_osrm", False)
         time_limit_seconds = data.get("time_limit_seconds")  # optionnel : évite blocage
         debug_coverage = data.get("debug_coverage", False)  # trace [COVERAGE_DEBUG] dans la console backend
+        solution_precedente = data.get("solution_precedente")  # optionnel : warm start
+        modifications = data.get("modifications")
+        objectif = data.get("objectif", "distance")
 
         print("[Routes] POST /api/routes/optimiser points=", len(points_data), "camions=", len(camions_data), "debug_coverage=", debug_coverage)
         if not depot_data:
@@ -255,10 +289,16 @@ def api_optimiser_routes():
             return jsonify({"error": "Points de collecte requis"}), 400
         if not camions_data:
             return jsonify({"error": "Camions requis"}), 400
+        if objectif not in OBJECTIFS:
+            return jsonify({"error": f"objectif : {' ou '.join(OBJECTIFS)} attendu"}), 400
 
-        # Lancer l'optimisation dans un thread avec timeout (évite blocage > 60s)
+        # Lancer l'optimisation dans un thread avec timeout (évite blocage > 60s).
+        # L'optimiseur est anytime : au timeout, on renvoie la meilleure solution connue
+        # et on annule le thread (jeton) pour qu'il ne continue pas à consommer du CPU.
         result_container = {}
         exc_container = {}
+        progression = {}
+        jeton = JetonAnnulation()
         def run_optim():
             try:
                 result_container["result"] = optimiser_routes_collecte(
@@ -268,7 +308,12 @@ def api_optimiser_routes():
                     camions_data,
                     use_osrm=use_osrm,
                     time_limit_seconds=time_limit_seconds,
-                    debug_coverage=debug_coverage
+                    debug_coverage=debug_coverage,
+                    solution_precedente=solution_precedente,
+                    modifications=modifications,
+                    callback_progression=lambda ev: progression.update(derniere=ev),
+                    jeton=jeton,
+                    objectif=objectif
                 )
             except Exception as e:
                 exc_container["exc"] = e
@@ -277,6 +322,12 @@ def api_optimiser_routes():
         thread.start()
         thread.join(timeout=50)
         if thread.is_alive():
+            jeton.annuler("timeout 50s")
+            derniere = progression.get("derniere")
+            solution = derniere["solution_courante"]() if derniere else None
+            if solution:
+                print("[Routes] Optimisation timeout 50s - meilleure solution connue (phase", derniere["phase"], ")")
+                return jsonify(solution), 200
             print("[Routes] Optimisation timeout 50s - abandon")
             return jsonify({
                 "error": "Optimisation trop longue (timeout 50s). Réduisez le nombre de points ou réessayez."
@@ -293,7 +344,10 @@ def api_optimiser_routes():
                         camions_data,
                         use_osrm=False,
                         time_limit_seconds=time_limit_seconds,
-                        debug_coverage=debug_coverage
+                        debug_coverage=debug_coverage,
+                        solution_precedente=solution_precedente,
+                        modifications=modifications,
+                        objectif=objectif
                     )
                     return jsonify(resultat), 200
                 except Exception as e2:
@@ -313,6 +367,56 @@ def api_optimiser_routes():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/routes/optimiser/stream", methods=["POST"])
+def api_optimiser_routes_stream():
+    """
+    Optimisation des routes en flux (NDJSON, un objet JSON par ligne) pour un affichage live.
+
+    Body JSON : identique à /api/routes/optimiser (+ "timeout_s" optionnel, défaut 50).
+
+    Lignes produites :
+    - {"type": "progression", "phase", "iteration", "temps_s", "distance_totale",
+       "gap_pourcent", "nb_points_couverts", "solution": {routes, statistiques, ...}}
+    - {"type": "resultat", "partiel": false|true, "resultat": {...}} (partiel = timeout,
+      meilleure solution connue)
+    - {"type": "erreur", "error": "..."}
+    """
+    data = request.json or {}
+    depot_data = data.get("depot", {})
+    points_data = data.get("points", [])
+    camions_data = data.get("camions", [])
+    if not depot_data:
+        return jsonify({"error": "Dépôt requis"}), 400
+    if not points_data:
+        return jsonify({"error": "Points de collecte requis"}), 400
+    if not camions_data:
+        return jsonify({"error": "Camions requis"}), 400
+    if data.get("objectif", "distance") not in OBJECTIFS:
+        return jsonify({"error": f"objectif : {' ou '.join(OBJECTIFS)} attendu"}), 400
+    print("[Routes] POST /api/routes/optimiser/stream points=", len(points_data), "camions=", len(camions_data))
+
+    evenements = flux_optimisation_routes(
+        depot_data,
+        points_data,
+        data.get("dechetteries", []),
+        camions_data,
+        timeout_s=float(data.get("timeout_s", 50)),
+        use_osrm=data.get("use_osrm", False),
+        time_limit_seconds=data.get("time_limit_seconds"),
+        debug_coverage=data.get("debug_coverage", False),
+        solution_precedente=data.get("solution_precedente"),
+        modifications=data.get("modifications"),
+        objectif=data.get("objectif", "distance"),
+    )
+
+    def generer():
+        for evenement in evenements:
+            yield json.dumps(evenement, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generer()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # ==================== API NIVEAU 3 ====================
 
 @app.route("/api/niveau3/configure_creneaux", methods=["POST"])
@@ -328,6 +432,7 @@ def api_niveau3_configure_contraintes():
 
 
 @app.route("/api/niveau3/generer_planning", methods=["POST"])
+@avec_cache_resultat("niveau3")
 def api_niveau3_generer_planning():
     """Génère le planning hebdomadaire."""
     return generer_planning_route()
@@ -339,12 +444,46 @@ def api_niveau3_simulation():
     return simulation_temps_reel()
 
 
+@app.route("/api/niveau3/simulation_temps_reel", methods=["POST"])
+def api_niveau3_creer_simulation():
+    """Construit la simulation (trajectoires précalculées) d'un planning."""
+    return creer_simulation_route()
+
+
+@app.route("/api/niveau3/simulation_temps_reel/plage", methods=["GET"])
+def api_niveau3_simulation_plage():
+    """Positions de tous les camions sur une plage de temps (lot)."""
+    return simulation_plage()
+
+
+# ==================== CACHE OSRM ====================
+
+@app.route("/api/osrm/cache", methods=["DELETE"])
+def api_osrm_cache_invalider():
+    """
+    Invalide le cache des couples OSRM (après mise à jour du réseau routier).
+    ?expires=1 : supprime seulement les couples plus anciens que le TTL.
+    """
+    if request.args.get("expires") in ("1", "true"):
+        supprimes = cache_osrm.purger_expires()
+    else:
+        supprimes = cache_osrm.invalider()
+    return jsonify({"status": "ok", "paires_supprimees": supprimes, "cache_osrm": cache_osrm.etat()}), 200
+
+
 # ==================== HEALTH CHECK ====================
 
 @app.route("/api/health", methods=["GET"])
 def health():
     """Vérification de l'état du serveur"""
-    return jsonify({"status": "ok", "message": "API VillePropre opérationnelle"}), 200
+    return jsonify({
+        "status": "ok",
+        "message": "API VillePropre opérationnelle",
+        "cache": cache_resultats.etat(),
+        "cache_osrm": cache_osrm.etat(),
+        "osrm": client_osrm.metriques.etat(),
+        **({"tampon_gps": tampon_gps.etat()} if ECOAGADIR_LOADED else {}),
+    }), 200
 
 
 if __name__ == "__main__":
@@ -354,6 +493,8 @@ if __name__ == "__main__":
             db.create_all()
             from services_eco.auth_service import ensure_demo_users
             ensure_demo_users()
+            from services_eco.gps_service import initialiser_dernieres_positions
+            initialiser_dernieres_positions()
     import os
     print("=" * 60)
     print("[WEB] VillePropre + EcoAgadir sur http://localhost:5000")
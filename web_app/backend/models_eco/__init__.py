@@ -6,10 +6,10 @@ from .depot import Depot
 from .point_collecte import PointCollecte
 from .dechetterie import Dechetterie
 from .planning import Planning, PlanningPoint
-from .gps import GpsPosition, GpsPointComplete
+from .gps import GpsPosition, GpsLastPosition, GpsPointComplete
 from .stats import StatsJournaliere
 
 __all__ = [
     'db', 'User', 'Camion', 'Depot', 'PointCollecte', 'Dechetterie',
-    'Planning', 'PlanningPoint', 'GpsPosition', 'GpsPointComplete', 'StatsJournaliere',
+    'Planning', 'PlanningPoint', 'GpsPosition', 'GpsLastPosition', 'GpsPointComplete', 'StatsJournaliere',
 ]
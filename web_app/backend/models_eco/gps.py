@@ -1,8 +1,19 @@
 # -*- coding: utf-8 -*-
 from .db import db
 
+
+def _position_dict(position):
+    """Champs communs de GpsPosition et GpsLastPosition (vitesse 0 conservée)."""
+    return {
+        'lat': float(position.lat), 'lng': float(position.lng),
+        'vitesse': float(position.vitesse) if position.vitesse is not None else None,
+        'timestamp': position.timestamp.isoformat() if position.timestamp else None,
+    }
+
+
 class GpsPosition(db.Model):
     __tablename__ = 'gps_positions'
+    __table_args__ = (db.Index('ix_gps_positions_planning_timestamp', 'planning_id', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     planning_id = db.Column(db.String(36), nullable=False)
     chauffeur_id = db.Column(db.String(36), nullable=False)
@@ -12,11 +23,20 @@ class GpsPosition(db.Model):
     timestamp = db.Column(db.DateTime, nullable=False)
 
     def to_dict(self):
-        return {
-            'lat': float(self.lat), 'lng': float(self.lng),
-            'vitesse': float(self.vitesse) if self.vitesse else None,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
-        }
+        return _position_dict(self)
+
+class GpsLastPosition(db.Model):
+    """Dernière position de chaque planning, tenue à jour à l'ingestion (services_eco/gps_service.py)."""
+    __tablename__ = 'gps_last_position'
+    planning_id = db.Column(db.String(36), primary_key=True)
+    chauffeur_id = db.Column(db.String(36), nullable=False)
+    lat = db.Column(db.Numeric(10, 6), nullable=False)
+    lng = db.Column(db.Numeric(10, 6), nullable=False)
+    vitesse = db.Column(db.Numeric(6, 2))
+    timestamp = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return _position_dict(self)
 
 class GpsPointComplete(db.Model):
     __tablename__ = 'gps_points_completes'
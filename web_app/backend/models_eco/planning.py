@@ -12,7 +12,7 @@ class Planning(db.Model):
     depot_id = db.Column(db.String(36), nullable=False)
     dechetterie_id = db.Column(db.String(36))
     trajet_calcule = db.Column(db.JSON)
-    status = db.Column(db.Enum('planifie', 'en_cours', 'termine', 'annule'), default='planifie')
+    status = db.Column(db.Enum('planifie', 'en_cours', 'termine', 'annule'), default='planifie', index=True)
     heure_debut_reel = db.Column(db.DateTime)
     heure_fin_reel = db.Column(db.DateTime)
     collecte_reelle = db.Column(db.Integer, default=0)
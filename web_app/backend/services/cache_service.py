@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Service Cache - VillePropre
+Cache des résultats d'optimisation adressé par le contenu de la requête.
+
+- Clé = SHA-256 du body JSON canonique (clés triées, sans espaces) + espace (routes,
+  niveau2, niveau3) + CACHE_VERSION : deux payloads identiques (rechargement de page,
+  changement d'onglet) partagent le même résultat, paramètres du solveur compris
+  (time_limit_seconds, seed, use_osrm... font partie du body)
+- Niveau 1 : LRU en mémoire (CACHE_CAPACITE entrées)
+- Niveau 2 (optionnel) : répertoire disque (variable d'environnement VILLEPROPRE_CACHE_DIR),
+  survit au redémarrage du serveur ; une entrée lue sur disque remonte dans la LRU
+- Chaque entrée conserve le corps JSON sérialisé et son ETag (hash du corps)
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+CACHE_VERSION = 1                 # à incrémenter si le format des résultats change
+CACHE_CAPACITE = 128              # entrées en mémoire
+CACHE_DISQUE_MAX = 1000           # fichiers sur disque (les plus anciens sont supprimés)
+CLES_IGNOREES = ("cache",)        # options du body qui n'influencent pas le résultat
+
+
+def serialiser_canonique(donnees) -> bytes:
+    """JSON canonique (clés triées, séparateurs compacts) d'un body de requête."""
+    return json.dumps(donnees, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def cle_canonique(espace: str, donnees) -> str:
+    """Clé de cache d'une requête : SHA-256 de (version, espace, body canonique)."""
+    if isinstance(donnees, dict):
+        donnees = {k: v for k, v in donnees.items() if k not in CLES_IGNOREES}
+    h = hashlib.sha256(f"v{CACHE_VERSION}:{espace}:".encode("utf-8"))
+    h.update(serialiser_canonique(donnees))
+    return h.hexdigest()
+
+
+def calculer_etag(corps: bytes) -> str:
+    """ETag fort (valeur sans guillemets) d'un corps de réponse."""
+    return hashlib.sha256(corps).hexdigest()[:32]
+
+
+class CacheResultats:
+    """LRU en mémoire + tier disque optionnel ; entrées = (corps JSON, ETag)."""
+
+    def __init__(self, capacite: int = CACHE_CAPACITE, repertoire: Optional[str] = None):
+        self.capacite = capacite
+        self.repertoire = Path(repertoire) if repertoire else None
+        if self.repertoire is not None:
+            self.repertoire.mkdir(parents=True, exist_ok=True)
+        self._entrees: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._verrou = threading.Lock()
+        self.stats = {"hits_memoire": 0, "hits_disque": 0, "miss": 0}
+
+    def _chemin(self, cle: str) -> Path:
+        return self.repertoire / f"{cle}.json"
+
+    def _inserer(self, cle: str, entree: Tuple[bytes, str]) -> None:
+        self._entrees[cle] = entree
+        self._entrees.move_to_end(cle)
+        while len(self._entrees) > self.capacite:
+            self._entrees.popitem(last=False)
+
+    def lire(self, cle: str) -> Optional[Tuple[bytes, str]]:
+        """(corps, etag) ou None."""
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is not None:
+                self._entrees.move_to_end(cle)
+                self.stats["hits_memoire"] += 1
+                return entree
+        if self.repertoire is not None:
+            try:
+                corps = self._chemin(cle).read_bytes()
+            except OSError:
+                corps = None
+            if corps is not None:
+                entree = (corps, calculer_etag(corps))
+                with self._verrou:
+                    self._inserer(cle, entree)
+                    self.stats["hits_disque"] += 1
+                return entree
+        with self._verrou:
+            self.stats["miss"] += 1
+        return None
+
+    def ecrire(self, cle: str, corps: bytes) -> str:
+        """Enregistre un corps JSON sérialisé ; renvoie son ETag."""
+        etag = calculer_etag(corps)
+        with self._verrou:
+            self._inserer(cle, (corps, etag))
+        if self.repertoire is not None:
+            try:
+                tmp = self._chemin(cle).with_suffix(".tmp")
+                tmp.write_bytes(corps)
+                os.replace(tmp, self._chemin(cle))  # écriture atomique
+                self._elaguer_disque()
+            except OSError as e:
+                print(f"[Cache] Écriture disque impossible : {e}")
+        return etag
+
+    def _elaguer_disque(self) -> None:
+        fichiers = list(self.repertoire.glob("*.json"))
+        if len(fichiers) <= CACHE_DISQUE_MAX:
+            return
+        fichiers.sort(key=lambda f: f.stat().st_mtime)
+        for f in fichiers[: len(fichiers) - CACHE_DISQUE_MAX]:
+            try:
+                f.unlink()
+            except OSError:
+                pass
+
+    def vider(self) -> None:
+        with self._verrou:
+            self._entrees.clear()
+        if self.repertoire is not None:
+            for f in self.repertoire.glob("*.json"):
+                try:
+                    f.unlink()
+                except OSError:
+                    pass
+
+    def etat(self) -> dict:
+        with self._verrou:
+            return {
+                "entrees_memoire": len(self._entrees),
+                "capacite": self.capacite,
+                "disque": str(self.repertoire) if self.repertoire else None,
+                **self.stats,
+            }
+
+
+cache_resultats = CacheResultats(repertoire=os.environ.get("VILLEPROPRE_CACHE_DIR") or None)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Service Données EcoAgadir → optimiseur - VillePropre
+Conversion en lot des coordonnées de la base (lat/lng Numeric) vers le plan x/y (km)
+des niveaux 1-2, matrices haversine et traces GPS, via niveau2/src/projection.py.
+
+Les lat/lng sont extraites une fois en tableaux numpy : projection, matrice N×N et
+distances cumulées sont calculées sans boucle Python par point ou par paire.
+"""
+
+import sys
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+NIVEAU2_SRC = PROJECT_ROOT / "niveau2" / "src"
+if str(NIVEAU2_SRC) not in sys.path:
+    sys.path.insert(0, str(NIVEAU2_SRC))
+
+from projection import distances_cumulees_km, latlng_vers_xy, matrice_haversine_km
+
+
+def tableaux_latlng(lignes: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """Lignes (modèles ou tuples nommés avec .lat, .lng, Decimal acceptés) → (lat, lng)."""
+    coords = np.array([(l.lat, l.lng) for l in lignes], dtype=float).reshape(-1, 2)
+    return coords[:, 0], coords[:, 1]
+
+
+def _avec_xy(dicts: List[Dict], lignes: Sequence) -> List[Dict]:
+    lat, lng = tableaux_latlng(lignes)
+    xs, ys = latlng_vers_xy(lat, lng)
+    for d, x, y in zip(dicts, np.round(xs, 4).tolist(), np.round(ys, 4).tolist()):
+        d["x"], d["y"] = x, y
+    return dicts
+
+
+def donnees_optimiseur(depot, points: Sequence, dechetteries: Sequence = (),
+                       matrice: bool = False) -> Dict:
+    """
+    Depot, points de collecte et déchetteries de la base → entrées de l'optimiseur
+    (depot / points / dechetteries en x, y km, mêmes clés que /api/routes/optimiser).
+
+    Args:
+        matrice: Ajoute "matrice_haversine_km" : {"ids": [...], "distances": N×N},
+            ordre depot + points + dechetteries (même ordre que build_travel_matrix_from_osrm).
+    """
+    depot_dict = _avec_xy([{
+        "id": 0, "depot_id": depot.id, "nom": depot.nom, "lat": float(depot.lat), "lng": float(depot.lng),
+    }], [depot])[0]
+    points_dicts = _avec_xy([{
+        "id": p.id, "nom": p.nom, "lat": float(p.lat), "lng": float(p.lng),
+        "volume": p.volume_moyen or 0, "priorite": p.priorite, "zone_id": p.zone_id,
+    } for p in points], points)
+    dechetteries_dicts = _avec_xy([{
+        "id": d.id, "nom": d.nom, "lat": float(d.lat), "lng": float(d.lng),
+        "capacite_max": d.capacite_max or 0,
+    } for d in dechetteries], dechetteries)
+
+    resultat = {"depot": depot_dict, "points": points_dicts, "dechetteries": dechetteries_dicts}
+    if matrice:
+        lat, lng = tableaux_latlng([depot, *points, *dechetteries])
+        resultat["matrice_haversine_km"] = {
+            "ids": [0] + [p["id"] for p in points_dicts] + [d["id"] for d in dechetteries_dicts],
+            "distances": np.round(matrice_haversine_km(lat, lng), 4).tolist(),
+        }
+    return resultat
+
+
+def trace_gps(positions: Sequence) -> List[Dict]:
+    """Positions GPS ordonnées (GpsPosition) → to_dict() + distance_cumulee_km."""
+    lat, lng = tableaux_latlng(positions)
+    cumul = np.round(distances_cumulees_km(lat, lng), 4).tolist()
+    return [{**p.to_dict(), "distance_cumulee_km": c} for p, c in zip(positions, cumul)]
+
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Service Jobs - VillePropre
+File de jobs d'optimisation asynchrones, exécutés dans un pool borné de processus.
+
+- soumettre() rend la main immédiatement (identifiant du job) ; le client interroge statut()
+- Les calculs (routes, affectation niveau 2, planning niveau 3) tournent hors du processus
+  Flask : le GIL n'est plus monopolisé, les endpoints légers (tracking EcoAgadir) restent réactifs
+- Contre-pression : au-delà de JOBS_MAX_EN_FILE jobs non terminés, FileJobsPleine (HTTP 429)
+- Limite de temps par job : transmise au solveur des routes et au planning niveau 3
+  (échéance stricte coopérative) et surveillée ici (statut « expire » au-delà de la limite + JOBS_MARGE_EXPIRATION)
+
+Remplaçant local d'un broker (Celery/RQ) : aucun service externe, état en mémoire du
+processus Flask (les jobs sont perdus au redémarrage).
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+JOBS_NB_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))  # un cœur reste à Flask
+JOBS_MAX_EN_FILE = 16              # jobs non terminés (en attente + en cours)
+JOBS_TIME_LIMIT_DEFAUT = 60.0      # s
+JOBS_TIME_LIMIT_MAX = 300.0        # s
+JOBS_MARGE_EXPIRATION = 10.0       # s laissées au solveur au-delà de sa limite
+JOBS_RETENTION = 600.0             # s de conservation d'un job terminé
+
+STATUTS_ACTIFS = ("en_attente", "en_cours")
+
+
+class FileJobsPleine(Exception):
+    """Levée par soumettre() quand la file est saturée (→ HTTP 429)."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ==================== EXÉCUTION (processus worker) ====================
+
+def _executer_routes(donnees: dict, time_limit: float) -> Tuple[dict, int]:
+    from api.routes_api import optimiser_routes_collecte
+
+    if not donnees.get("depot"):
+        return {"error": "Dépôt requis"}, 400
+    if not donnees.get("points"):
+        return {"error": "Points de collecte requis"}, 400
+    if not donnees.get("camions"):
+        return {"error": "Camions requis"}, 400
+    demande = donnees.get("time_limit_seconds")
+    limite = min(float(demande), time_limit) if demande else time_limit
+    resultat = optimiser_routes_collecte(
+        donnees["depot"],
+        donnees["points"],
+        donnees.get("dechetteries", []),
+        donnees["camions"],
+        use_osrm=donnees.get("use_osrm", False),
+        time_limit_seconds=limite,
+        solution_precedente=donnees.get("solution_precedente"),
+        modifications=donnees.get("modifications"),
+        objectif=donnees.get("objectif", "distance"),
+    )
+    return resultat, 200
+
+
+def _executer_niveau2(donnees: dict, time_limit: float) -> Tuple[dict, int]:
+    from api.niveau1_api import creer_graphe_depuis_points
+    from api.niveau2_api import optimiser_affectation
+
+    camions_data = donnees.get("camions", [])
+    zones_data = donnees.get("zones", [])
+    if not camions_data or not zones_data:
+        return {"error": "Camions et zones requis"}, 400
+    graphe = creer_graphe_depuis_points(
+        donnees.get("points", []), donnees.get("connexions", []), donnees.get("dechetteries", [])
+    )
+    resultat = optimiser_affectation(
+        camions_data, zones_data, donnees.get("zones_incompatibles", []), graphe,
+        methode=donnees.get("methode", "glouton"),
+        temps_max=min(float(donnees.get("temps_max") or time_limit), time_limit),
+    )
+    return resultat, 200  # affectation_id ajouté dans le processus Flask (_apres_niveau2)
+
+
+def _executer_niveau3(donnees: dict, time_limit: float) -> Tuple[dict, int]:
+    from api.niveau3_routes import executer_generer_planning
+    from jeton_annulation import JetonAnnulation
+
+    # Méthode "optimal" et robustesse Monte-Carlo s'arrêtent à la limite du job
+    return executer_generer_planning(donnees, jeton=JetonAnnulation(time_limit))
+
+
+EXECUTEURS = {
+    "routes": _executer_routes,
+    "niveau2": _executer_niveau2,
+    "niveau3": _executer_niveau3,
+}
+
+
+def _apres_niveau2(donnees: dict, corps: dict, code: int) -> None:
+    """Indexe l'affectation dans le cache du processus Flask, lu par /api/niveau3/generer_planning."""
+    from services.planning_service import enregistrer_resultat_niveau2
+
+    if code == 200 and isinstance(corps, dict) and "affectation" in corps:
+        enregistrer_resultat_niveau2(donnees, corps)
+
+
+# Post-traitement dans le processus Flask, à la fin d'un job réussi
+APRES_JOB = {
+    "niveau2": _apres_niveau2,
+}
+
+
+def _executer_job(type_job: str, donnees: dict, time_limit: float) -> dict:
+    """Point d'entrée dans le processus worker (fonction de module : picklable)."""
+    debut = time.time()
+    corps, code = EXECUTEURS[type_job](donnees, time_limit)
+    return {"corps": corps, "code": code, "debut": debut, "fin": time.time()}
+
+
+# ==================== GESTIONNAIRE (processus Flask) ====================
+
+class GestionnaireJobs:
+    """Registre des jobs + pool de processus (créé à la première soumission)."""
+
+    def __init__(self, nb_workers: int = JOBS_NB_WORKERS, max_en_file: int = JOBS_MAX_EN_FILE):
+        self.nb_workers = nb_workers
+        self.max_en_file = max_en_file
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: Dict[str, dict] = {}
+        self._verrou = threading.RLock()  # future.cancel() rappelle _terminer sous verrou
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.nb_workers)
+        return self._executor
+
+    def _nb_non_termines(self) -> int:
+        """Jobs occupant réellement le pool (un job expiré peut encore tourner)."""
+        return sum(1 for j in self._jobs.values() if not j["_future"].done())
+
+    def soumettre(self, type_job: str, donnees: dict, time_limit_seconds: Optional[float] = None) -> dict:
+        """
+        Met un job en file et rend la main immédiatement.
+
+        Raises:
+            ValueError: type de job inconnu.
+            FileJobsPleine: trop de jobs non terminés.
+        """
+        if type_job not in EXECUTEURS:
+            raise ValueError(f"Type de job inconnu : {type_job} (attendu : {', '.join(EXECUTEURS)})")
+        limite = float(time_limit_seconds) if time_limit_seconds else JOBS_TIME_LIMIT_DEFAUT
+        limite = max(1.0, min(limite, JOBS_TIME_LIMIT_MAX))
+
+        with self._verrou:
+            self._purger()
+            if self._nb_non_termines() >= self.max_en_file:
+                raise FileJobsPleine(
+                    f"File de jobs pleine ({self.max_en_file} jobs en cours)",
+                    retry_after=max(1, int(JOBS_TIME_LIMIT_DEFAUT / self.nb_workers)),
+                )
+            try:
+                future = self._pool().submit(_executer_job, type_job, donnees, limite)
+            except BrokenProcessPool:
+                # Un worker a été tué (OOM...) : on repart d'un pool neuf
+                self._executor = None
+                future = self._pool().submit(_executer_job, type_job, donnees, limite)
+            job_id = uuid.uuid4().hex
+            job = {
+                "id": job_id,
+                "type": type_job,
+                "statut": "en_attente",
+                "soumis_a": time.time(),
+                "debut": None,
+                "fin": None,
+                "time_limit_seconds": limite,
+                "code_http": None,
+                "resultat": None,
+                "erreur": None,
+                "_future": future,
+            }
+            self._jobs[job_id] = job
+        future.add_done_callback(lambda f, jid=job_id: self._terminer(jid, f, donnees))
+        return self._vue(job, inclure_resultat=False)
+
+    def _terminer(self, job_id: str, future, donnees: Optional[dict] = None) -> None:
+        """Callback de fin (thread interne de l'executor)."""
+        with self._verrou:
+            job = self._jobs.get(job_id)
+            if job is None or job["statut"] == "expire":
+                return  # résultat arrivé trop tard : la limite du job prime
+            if future.cancelled():
+                job.update(statut="annule", fin=time.time())
+                return
+            exc = future.exception()
+            if exc is not None:
+                job.update(statut="erreur", erreur=str(exc) or exc.__class__.__name__, fin=time.time())
+                return
+            res = future.result()
+            apres = APRES_JOB.get(job["type"])
+            if apres is not None and donnees is not None:
+                apres(donnees, res["corps"], res["code"])
+            job.update(
+                statut="termine",
+                resultat=res["corps"],
+                code_http=res["code"],
+                debut=res["debut"],
+                fin=res["fin"],
+            )
+
+    def _actualiser(self, job: dict) -> None:
+        """Passage en_attente → en_cours et détection du dépassement de limite."""
+        if job["statut"] not in STATUTS_ACTIFS:
+            return
+        maintenant = time.time()
+        if job["statut"] == "en_attente" and job["_future"].running():
+            job["statut"] = "en_cours"
+            job["debut"] = maintenant  # approximatif : corrigé par le worker à la fin
+        if job["debut"] is not None and maintenant - job["debut"] > job["time_limit_seconds"] + JOBS_MARGE_EXPIRATION:
+            job.update(statut="expire", fin=maintenant,
+                       erreur=f"Limite de temps dépassée ({job['time_limit_seconds']:.0f} s)")
+
+    def _purger(self) -> None:
+        """Oublie les jobs terminés depuis plus de JOBS_RETENTION (appelé sous verrou)."""
+        limite = time.time() - JOBS_RETENTION
+        for job_id in [jid for jid, j in self._jobs.items()
+                       if j["fin"] is not None and j["fin"] < limite and j["_future"].done()]:
+            del self._jobs[job_id]
+
+    def _position_file(self, job: dict) -> Optional[int]:
+        if job["statut"] != "en_attente":
+            return None
+        return sum(1 for j in self._jobs.values()
+                   if j["statut"] == "en_attente" and j["soumis_a"] < job["soumis_a"])
+
+    def _vue(self, job: dict, inclure_resultat: bool = True) -> dict:
+        vue = {k: v for k, v in job.items() if not k.startswith("_") and k != "resultat"}
+        vue["position_file"] = self._position_file(job)
+        if job["debut"] is not None:
+            vue["duree_s"] = round((job["fin"] or time.time()) - job["debut"], 3)
+        if inclure_resultat and job["statut"] == "termine":
+            vue["resultat"] = job["resultat"]
+        return vue
+
+    def statut(self, job_id: str) -> Optional[dict]:
+        """Vue publique du job (avec le résultat s'il est terminé), None si inconnu."""
+        with self._verrou:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            self._actualiser(job)
+            return self._vue(job)
+
+    def annuler(self, job_id: str) -> Optional[bool]:
+        """Annule un job encore en file (True), False s'il a déjà démarré, None si inconnu."""
+        with self._verrou:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            self._actualiser(job)
+            if job["statut"] == "en_attente" and job["_future"].cancel():
+                job.update(statut="annule", fin=time.time())
+                return True
+            return job["statut"] == "annule"
+
+    def lister(self) -> List[dict]:
+        with self._verrou:
+            for job in self._jobs.values():
+                self._actualiser(job)
+            return [self._vue(j, inclure_resultat=False) for j in self._jobs.values()]
+
+    def etat(self) -> dict:
+        """Charge de la file (supervision)."""
+        with self._verrou:
+            return {
+                "nb_workers": self.nb_workers,
+                "max_en_file": self.max_en_file,
+                "non_termines": self._nb_non_termines(),
+            }
+
+    def arreter(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+gestionnaire_jobs = GestionnaireJobs()
@@ -2,12 +2,21 @@
 """
 Service Planning Niveau 3 - VillePropre
 Wrapper pour générer le planning hebdomadaire depuis les données web.
+
+Les itérations sur les créneaux et contraintes ne refont ni le graphe N1 ni l'affectation N2 :
+- graphe + affectateur sont gardés en LRU par jeu de données (CONTEXTES_CAPACITE entrées),
+  avec un verrou : l'affectateur (état interne mutable) ne sert qu'à une requête à la fois
+- l'affectation N2 est fournie (dict), retrouvée par son affectation_id (renvoyé par
+  /api/niveau2/optimiser, propre au jeu de données et à la méthode) ou calculée une seule
+  fois par jeu de données ; les appelants en reçoivent une copie
 """
 
 import json
 import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 # Chemins des modules
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
@@ -26,12 +35,111 @@ from dechetterie import Dechetterie
 from creneau_horaire import CreneauHoraire
 from contrainte_temporelle import ContrainteTemporelle
 from planificateur_triparti import PlanificateurTriparti
+from planification_chronologique import duree_parcours_zone
 
 # Import API existantes pour réutiliser la création du graphe
 from api.niveau1_api import creer_graphe_depuis_points
+from services.cache_service import cle_canonique
 
+CONTEXTES_CAPACITE = 8        # (graphe, affectateur) gardés en mémoire
+AFFECTATIONS_CAPACITE = 64    # affectations N2 indexées par affectation_id
+ROBUSTESSE_MAX_SCENARIOS = 100000
+ROBUSTESSE_MAX_PROCESSUS = 8
 
-def _creer_affectateur_et_affectation(
+_contextes: "OrderedDict[str, Tuple]" = OrderedDict()   # (graphe, affectateur, verrou)
+_affectations: "OrderedDict[str, Dict]" = OrderedDict()
+_verrou_contextes = threading.Lock()
+
+
+def _memoriser(registre: OrderedDict, cle: str, valeur, capacite: int) -> None:
+    with _verrou_contextes:
+        registre[cle] = valeur
+        registre.move_to_end(cle)
+        while len(registre) > capacite:
+            registre.popitem(last=False)
+
+
+def _retrouver(registre: OrderedDict, cle: Optional[str]):
+    if not cle:
+        return None
+    with _verrou_contextes:
+        valeur = registre.get(cle)
+        if valeur is not None:
+            registre.move_to_end(cle)
+        return valeur
+
+
+def cle_jeu_donnees(
+    points: List[dict],
+    connexions: List[dict],
+    camions_data: List[dict],
+    zones_data: List[dict],
+    dechetteries_data: List[dict],
+    zones_incompatibles: Optional[List] = None,
+    methode: Optional[str] = None,
+) -> str:
+    """
+    Identifiant du jeu de données N1/N2 ; avec methode, identifiant de l'affectation N2
+    calculée par cette méthode sur ce jeu (affectation_id).
+    """
+    donnees = {
+        "points": points or [],
+        "connexions": connexions or [],
+        "camions": camions_data or [],
+        "zones": zones_data or [],
+        "dechetteries": dechetteries_data or [],
+        "zones_incompatibles": zones_incompatibles or [],
+    }
+    if methode is not None:
+        donnees["methode"] = methode
+    return cle_canonique("jeu_niveau2", donnees)
+
+
+class AffectationInconnue(ValueError):
+    """affectation_id inconnu ou sorti du cache (→ HTTP 404 : relancer le niveau 2)."""
+
+
+def _copie_affectation(affectation: Dict) -> Dict:
+    return {camion_id: list(zones) for camion_id, zones in affectation.items()}
+
+
+def normaliser_affectation(affectation) -> Dict:
+    """
+    {camion_id: [zone_ids]} depuis un dict (clés JSON en texte) ou la liste
+    "affectation" renvoyée par /api/niveau2/optimiser.
+    """
+    def _id(v):
+        return int(v) if isinstance(v, str) and v.lstrip("-").isdigit() else v
+
+    if isinstance(affectation, list):
+        return {_id(a["camion_id"]): [_id(z) for z in a.get("zones_affectees", [])] for a in affectation}
+    if isinstance(affectation, dict):
+        return {_id(k): [_id(z) for z in (v or [])] for k, v in affectation.items()}
+    raise ValueError("affectation : dict {camion_id: [zone_ids]} ou liste du niveau 2 attendue")
+
+
+def enregistrer_resultat_niveau2(data: dict, resultat: dict) -> str:
+    """
+    Indexe le résultat de /api/niveau2/optimiser : ajoute resultat["affectation_id"],
+    réutilisable par /api/niveau3/generer_planning. À appeler dans le processus Flask
+    (le cache est propre au processus : la file de jobs l'appelle à la fin du job).
+    """
+    affectation_id = cle_jeu_donnees(
+        data.get("points", []),
+        data.get("connexions", []),
+        data.get("camions", []),
+        data.get("zones", []),
+        data.get("dechetteries", []),
+        data.get("zones_incompatibles", []),
+        methode=data.get("methode", "glouton"),
+    )
+    _memoriser(_affectations, affectation_id,
+               normaliser_affectation(resultat.get("affectation", [])), AFFECTATIONS_CAPACITE)
+    resultat["affectation_id"] = affectation_id
+    return affectation_id
+
+
+def _creer_affectateur(
     points: List[dict],
     connexions: List[dict],
     camions_data: List[dict],
@@ -43,8 +151,7 @@ def _creer_affectateur_et_affectation(
     Crée le graphe N1 et l'affectateur N2 depuis les données web.
 
     Returns:
-        (graphe, affectateur, affectation_n2_dict)
-        affectation_n2_dict: {camion_id: [zone_ids]}
+        (graphe, affectateur)
     """
     # Réutiliser la création du graphe N1
     graphe = creer_graphe_depuis_points(points, connexions, dechetteries_data)
@@ -85,10 +192,71 @@ def _creer_affectateur_et_affectation(
 
     affectateur = AffectateurBiparti(camions, zones, graphe, dechetteries)
     affectateur.zones_incompatibles = zones_incompatibles or []
-    affectation_eq = affectateur.affectation_gloutonne()
-    affectation_eq = affectateur.equilibrage_charges(affectation_eq)
+    return graphe, affectateur
+
+
+def _creer_affectateur_et_affectation(
+    points: List[dict],
+    connexions: List[dict],
+    camions_data: List[dict],
+    zones_data: List[dict],
+    dechetteries_data: List[dict],
+    zones_incompatibles: Optional[List] = None,
+    affectation: Optional[Dict] = None,
+    affectation_id: Optional[str] = None,
+) -> tuple:
+    """
+    Graphe N1, affectateur N2 et affectation N2, depuis les caches quand c'est possible.
 
-    return graphe, affectateur, affectation_eq
+    Ordre de priorité de l'affectation : fournie > affectation_id > déjà calculée pour
+    ce jeu de données > calcul (glouton + équilibrage), mémorisé pour les appels suivants.
+    Le calcul se fait sous le verrou du contexte ; l'appelant le reprend pour utiliser
+    l'affectateur.
+
+    Returns:
+        (graphe, affectateur, affectation_n2_dict, infos, verrou)
+        affectation_n2_dict: {camion_id: [zone_ids]} (copie)
+        infos: {"affectation_id", "source_affectation", "graphe_en_cache"}
+
+    Raises:
+        AffectationInconnue: affectation_id absent du cache.
+    """
+    cle = cle_jeu_donnees(points, connexions, camions_data, zones_data, dechetteries_data, zones_incompatibles)
+    cle_gloutonne = cle_jeu_donnees(
+        points, connexions, camions_data, zones_data, dechetteries_data, zones_incompatibles, methode="glouton"
+    )
+    contexte = _retrouver(_contextes, cle)
+    graphe_en_cache = contexte is not None
+    if contexte is None:
+        contexte = (*_creer_affectateur(
+            points, connexions, camions_data, zones_data, dechetteries_data, zones_incompatibles
+        ), threading.Lock())
+        _memoriser(_contextes, cle, contexte, CONTEXTES_CAPACITE)
+    graphe, affectateur, verrou = contexte
+
+    if affectation is not None:
+        affectation_eq, source = normaliser_affectation(affectation), "fournie"
+    elif affectation_id:
+        affectation_eq, source = _retrouver(_affectations, affectation_id), "niveau2"
+        if affectation_eq is None:
+            raise AffectationInconnue(
+                f"affectation_id inconnu ou expiré : {affectation_id} (relancez le niveau 2)"
+            )
+    elif _retrouver(_affectations, cle_gloutonne) is not None:
+        affectation_eq, source = _retrouver(_affectations, cle_gloutonne), "cache"
+    else:
+        with verrou:
+            affectation_eq = affectateur.affectation_gloutonne()
+            affectation_eq = affectateur.equilibrage_charges(affectation_eq)
+        _memoriser(_affectations, cle_gloutonne, _copie_affectation(affectation_eq), AFFECTATIONS_CAPACITE)
+        source = "calculee"
+
+    infos = {
+        "affectation_id": affectation_id if source == "niveau2" else cle_gloutonne,
+        "source_affectation": source,
+        "graphe_en_cache": graphe_en_cache,
+    }
+    return graphe, affectateur, _copie_affectation(affectation_eq), infos, verrou
 
 
 def generer_planning(
@@ -102,6 +270,11 @@ def generer_planning(
     zones_incompatibles: Optional[List] = None,
     horizon_jours: int = 7,
     use_osrm: bool = False,
+    affectation: Optional[Dict] = None,
+    affectation_id: Optional[str] = None,
+    methode: str = "glouton",
+    robustesse: Optional[dict] = None,
+    jeton=None,
 ) -> dict:
     """
     Génère le planning hebdomadaire.
@@ -111,18 +284,55 @@ def generer_planning(
         contraintes: fenetres_zone, pauses_obligatoires, zones_interdites_nuit
         camions_data, zones_data, points, connexions, dechetteries_data
         horizon_jours: 7 par défaut
-        use_osrm: non utilisé pour l'instant (réservé)
+        use_osrm: Temps de trajet routiers OSRM entre dépôt et zones et dans chaque zone
+                  (sinon distances à 30 km/h et 10 min de déplacement interne par zone)
+        affectation: Affectation N2 déjà connue ({camion_id: [zone_ids]} ou liste du niveau 2)
+        affectation_id: Identifiant renvoyé par /api/niveau2/optimiser
+        methode: "glouton", "optimal" (réaffectation globale des créneaux par camion)
+                 ou "chronologique" (zones enchaînées à la minute)
+        robustesse: Évaluation Monte-Carlo optionnelle {"nb_scenarios", "routes" (niveau 2),
+                    "nb_processus", "graine", "cv_congestion", "cv_volume_point"}
+        jeton: Échéance (JetonAnnulation) : méthode "optimal" et robustesse s'arrêtent
+               à l'échéance en gardant ce qui est calculé (file de jobs)
 
     Returns:
         {
             "planification_hebdomadaire": {...},
-            "indicateurs": {...}
+            "indicateurs": {...},
+            "niveau2": {"affectation_id", "source_affectation", "graphe_en_cache"},
+            "trajets": {"source": "osrm" | "vitesse_constante", "osrm_cache": {...}},
+            "robustesse": {...}  (si demandée)
         }
+
+    Raises:
+        ValueError: méthode inconnue ou paramètres de robustesse invalides.
+        AffectationInconnue: affectation_id absent du cache.
     """
-    graphe, affectateur, affectation_n2 = _creer_affectateur_et_affectation(
-        points, connexions, camions_data, zones_data, dechetteries_data, zones_incompatibles
+    graphe, affectateur, affectation_n2, infos_n2, verrou = _creer_affectateur_et_affectation(
+        points, connexions, camions_data, zones_data, dechetteries_data, zones_incompatibles,
+        affectation=affectation, affectation_id=affectation_id,
     )
+    with verrou:  # affectateur partagé par les requêtes sur ce jeu de données
+        return _generer_planning_contexte(
+            affectateur, affectation_n2, infos_n2, creneaux, contraintes, points,
+            horizon_jours, use_osrm, methode, robustesse, jeton,
+        )
+
 
+def _generer_planning_contexte(
+    affectateur: AffectateurBiparti,
+    affectation_n2: Dict,
+    infos_n2: dict,
+    creneaux: List[dict],
+    contraintes: dict,
+    points: List[dict],
+    horizon_jours: int,
+    use_osrm: bool,
+    methode: str,
+    robustesse: Optional[dict],
+    jeton,
+) -> dict:
+    """Suite de generer_planning, sous le verrou du contexte (affectateur partagé)."""
     # Créer les créneaux
     creneaux_obj = []
     for i, c in enumerate(creneaux):
@@ -153,11 +363,79 @@ def generer_planning(
 
     planificateur = PlanificateurTriparti(affectateur, ct)
     planificateur.ajouter_creneaux(creneaux_obj)
+    trajets = {"source": "vitesse_constante"}
+    if use_osrm:
+        trajets = _definir_durees_osrm(planificateur, affectateur, points)
 
-    planning = planificateur.generer_plan_optimal(affectation_n2, horizon_jours)
+    planning = planificateur.generer_plan_optimal(affectation_n2, horizon_jours, methode=methode, jeton=jeton)
     indicateurs = planificateur.evaluer_plan(planning)
 
-    return {
+    resultat = {
         "planification_hebdomadaire": planning,
         "indicateurs": indicateurs,
+        "niveau2": infos_n2,
+        "trajets": trajets,
     }
+    if robustesse:
+        resultat["robustesse"] = _evaluer_robustesse(planificateur, planning, robustesse, jeton)
+    return resultat
+
+
+def _definir_durees_osrm(planificateur: PlanificateurTriparti, affectateur, points: List[dict]) -> dict:
+    """
+    Temps de trajet OSRM : dépôt (0, 0) et centres de zones entre eux, plus le parcours
+    des points de chaque zone. Sans réponse OSRM, le planificateur garde la vitesse constante.
+    """
+    from osrm_client import matrice_trajets_osrm
+
+    coordonnees = {p["id"]: (float(p["x"]), float(p["y"])) for p in points}
+    zones = affectateur.zones
+    ids = [("depot", 0)] + [("zone", z.id) for z in zones]
+    xy = [(0.0, 0.0)] + [tuple(map(float, z.centre)) for z in zones]
+    vus = set()
+    for zone in zones:
+        for point_id in zone.points:
+            if point_id in coordonnees and point_id not in vus:
+                vus.add(point_id)
+                ids.append(("point", point_id))
+                xy.append(coordonnees[point_id])
+
+    statistiques = {}
+    matrice = matrice_trajets_osrm(xy, ids, statistiques=statistiques)
+    if matrice is None:
+        return {"source": "vitesse_constante", "erreur": "OSRM injoignable"}
+    trajets_internes = {
+        zone.id: duree_parcours_zone(matrice.sous_matrices(
+            [("point", p) for p in zone.points if p in coordonnees]
+        )[1])
+        for zone in zones
+        if any(p in coordonnees for p in zone.points)
+    }
+    planificateur.definir_durees_trajet(matrice.durees_min[:len(zones) + 1, :len(zones) + 1], trajets_internes)
+    return {"source": "osrm", "osrm_cache": statistiques}
+
+
+def _evaluer_robustesse(planificateur: PlanificateurTriparti, planning: dict, options: dict, jeton=None) -> dict:
+    """Évaluation Monte-Carlo du planning (paramètres bornés)."""
+    if not isinstance(options, dict):
+        options = {}
+    nb_scenarios = int(options.get("nb_scenarios", 10000))
+    if not 1 <= nb_scenarios <= ROBUSTESSE_MAX_SCENARIOS:
+        raise ValueError(f"robustesse.nb_scenarios doit être entre 1 et {ROBUSTESSE_MAX_SCENARIOS}")
+    routes = options.get("routes") or []
+    if isinstance(routes, dict):
+        routes = routes.get("routes", [])
+    parametres = {
+        cle: float(options[cle]) for cle in ("cv_congestion", "cv_volume_point") if options.get(cle) is not None
+    }
+    if any(v < 0 for v in parametres.values()):
+        raise ValueError("robustesse : coefficients de variation positifs attendus")
+    return planificateur.evaluer_robustesse(
+        planning,
+        nb_scenarios,
+        routes=routes,
+        nb_processus=max(1, min(int(options.get("nb_processus", 1)), ROBUSTESSE_MAX_PROCESSUS)),
+        graine=options.get("graine"),
+        jeton=jeton,
+        **parametres,
+    )
@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+"""
+Service Simulation Niveau 3 - VillePropre
+Simulation à événements discrets de la flotte : planning N3 + routes optimisées.
+
+- construire_simulation() rejoue le planning dans une file d'événements (heapq : départ,
+  arrivée sur un point, fin de collecte / vidage, retour au dépôt). Vitesse VITESSE_MOYENNE_KMH
+  divisée par le cout_congestion du créneau ; collecte et vidage allongés d'autant.
+- Chaque camion en tire une trajectoire linéaire par morceaux (instants de passage triés,
+  positions, état) calculée une seule fois.
+- SimulationFlotte.positions(t) : une recherche dichotomique par camion (np.searchsorted sur
+  les trajectoires concaténées, tous les camions en un appel) puis interpolation. Aucun
+  recalcul : l'animation peut interroger à 10 Hz des milliers de camions.
+- Les simulations sont gardées en LRU (SIMULATIONS_CAPACITE) par simulation_id.
+
+Temps : minutes depuis lundi 00:00. Distances : unité des coordonnées x, y (km).
+"""
+
+import heapq
+import math
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+NIVEAU3_SRC = PROJECT_ROOT / "niveau3" / "src"
+if str(NIVEAU3_SRC) not in sys.path:
+    sys.path.insert(0, str(NIVEAU3_SRC))
+
+from contrainte_temporelle import en_minutes
+from occupation_camion import MINUTES_JOUR
+from planification_chronologique import VITESSE_MOYENNE_KMH, minutes_en_heure
+
+from services.cache_service import cle_canonique
+
+JOURS_SEMAINE = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+DUREE_COLLECTE_POINT_MINUTES = 5.0   # comme les tâches du planning (5 min/point)
+DUREE_VIDAGE_MINUTES = 10.0          # arrêt en déchetterie
+SIMULATIONS_CAPACITE = 16
+PLAGE_MAX_VALEURS = 2_000_000        # instants × camions renvoyés par /plage
+
+# État d'un camion sur [instant de passage, instant suivant[
+ETATS = ("au_depot", "en_route", "collecte", "vidage", "attente")
+AU_DEPOT, EN_ROUTE, COLLECTE, VIDAGE, ATTENTE = range(len(ETATS))
+
+# Types d'événements (ordre de traitement à instant égal)
+_DEPART, _ARRIVEE, _FIN_ARRET, _RETOUR = range(4)
+
+_simulations: "OrderedDict[str, SimulationFlotte]" = OrderedDict()
+_verrou_simulations = threading.Lock()
+
+
+class SimulationFlotte:
+    """
+    Trajectoires linéaires par morceaux de tous les camions, concaténées.
+
+    Camion c : instants self._temps[d:f], positions self._x / self._y, état et zone de
+    chaque morceau, avec d, f = self._bornes[c], self._bornes[c + 1]. Une clé
+    c * self._periode + t rend le tableau globalement trié : un seul np.searchsorted
+    localise le morceau courant de chaque camion (O(log n) par camion).
+    """
+
+    def __init__(self, camion_ids: List, trajectoires: List[Tuple[list, list, list, list, list]], resume: dict):
+        self.camion_ids = list(camion_ids)
+        self._index = {str(cid): c for c, cid in enumerate(self.camion_ids)}
+        self.resume = resume
+        tailles = [len(t[0]) for t in trajectoires]
+        self._bornes = np.concatenate([[0], np.cumsum(tailles)]).astype(np.int64)
+        self._temps = np.array([v for t in trajectoires for v in t[0]], dtype=float)
+        self._x = np.array([v for t in trajectoires for v in t[1]], dtype=float)
+        self._y = np.array([v for t in trajectoires for v in t[2]], dtype=float)
+        self._etats = np.array([v for t in trajectoires for v in t[3]], dtype=np.int8)
+        self._zones = [v for t in trajectoires for v in t[4]]
+        self.fin = float(self._temps.max()) if self._temps.size else 0.0
+        self._periode = self.fin + 1.0
+        rangs = np.repeat(np.arange(len(tailles), dtype=float), tailles)
+        self._cles = rangs * self._periode + self._temps
+
+    def __len__(self) -> int:
+        return len(self.camion_ids)
+
+    def indices(self, camion_ids: Optional[Sequence] = None) -> np.ndarray:
+        """Indices des camions demandés (tous par défaut) ; les identifiants inconnus sont ignorés."""
+        if camion_ids is None:
+            return np.arange(len(self.camion_ids))
+        return np.array(
+            [self._index[str(c)] for c in camion_ids if str(c) in self._index], dtype=np.int64
+        )
+
+    def _interpoler(self, instants: np.ndarray, camions: np.ndarray):
+        """Positions (T × C) aux instants donnés : morceau courant + interpolation linéaire."""
+        t = np.clip(np.asarray(instants, dtype=float), 0.0, self.fin)[:, None]
+        debut = self._bornes[camions][None, :]
+        dernier = self._bornes[camions + 1][None, :] - 1
+        j = np.searchsorted(self._cles, camions[None, :] * self._periode + t, side="right") - 1
+        j = np.clip(j, debut, dernier)
+        suivant = np.minimum(j + 1, dernier)
+        t0, t1 = self._temps[j], self._temps[suivant]
+        duree = t1 - t0
+        fraction = np.where(duree > 0, (t - t0) / np.where(duree > 0, duree, 1.0), 0.0)
+        fraction = np.clip(fraction, 0.0, 1.0)
+        x = self._x[j] + fraction * (self._x[suivant] - self._x[j])
+        y = self._y[j] + fraction * (self._y[suivant] - self._y[j])
+        return x, y, self._etats[j], j
+
+    def positions(self, instant: float, camion_ids: Optional[Sequence] = None) -> List[dict]:
+        """Position, état et zone en cours de chaque camion à l'instant donné."""
+        camions = self.indices(camion_ids)
+        x, y, etats, j = self._interpoler(np.array([instant]), camions)
+        return [
+            {
+                "camion_id": self.camion_ids[c],
+                "x": round(float(x[0, n]), 5),
+                "y": round(float(y[0, n]), 5),
+                "etat": ETATS[etats[0, n]],
+                "zone_id": self._zones[j[0, n]],
+            }
+            for n, c in enumerate(camions)
+        ]
+
+    def positions_plage(
+        self, instants: np.ndarray, camion_ids: Optional[Sequence] = None
+    ) -> dict:
+        """Positions de tous les camions demandés à chaque instant (tableaux T × C)."""
+        camions = self.indices(camion_ids)
+        x, y, etats, _ = self._interpoler(instants, camions)
+        return {
+            "timestamps": [round(float(t), 3) for t in instants],
+            "camion_ids": [self.camion_ids[c] for c in camions],
+            "x": np.round(x, 5).tolist(),
+            "y": np.round(y, 5).tolist(),
+            "etats": etats.tolist(),
+            "etats_libelles": list(ETATS),
+        }
+
+
+# ==================== CONSTRUCTION (événements discrets) ====================
+
+def instant_en_jour_heure(instant: float) -> dict:
+    """Minutes depuis lundi 00:00 → {"jour", "heure"}."""
+    jour = min(int(instant // MINUTES_JOUR), len(JOURS_SEMAINE) - 1)
+    return {"jour": JOURS_SEMAINE[jour], "heure": minutes_en_heure(int(instant) - jour * MINUTES_JOUR)}
+
+
+def jour_heure_en_instant(jour: str, heure: str = "00:00") -> Optional[float]:
+    """{"jour", "heure"} → minutes depuis lundi 00:00 (None si jour inconnu)."""
+    if jour not in JOURS_SEMAINE:
+        return None
+    return float(JOURS_SEMAINE.index(jour) * MINUTES_JOUR + en_minutes(heure))
+
+
+def _position(p: dict) -> Tuple[float, float]:
+    return float(p.get("x", 0.0)), float(p.get("y", 0.0))
+
+
+def _etapes_zone(zone: Optional[dict], route: List[dict], points: Dict[str, dict]) -> List[Tuple[float, float, int]]:
+    """
+    Arrêts d'une tournée de zone : ses points dans l'ordre de la route optimisée du camion,
+    avec les déchetteries qui les suivent ; à défaut les points de la zone, puis son centre.
+    """
+    if zone is None:
+        return []
+    ids = {str(p) for p in zone.get("points", [])}
+    etapes: List[Tuple[float, float, int]] = []
+    precedent_dans_zone = False
+    for wp in route:
+        if wp.get("type") == "collecte" and str(wp.get("id")) in ids:
+            etapes.append((*_position(wp), COLLECTE))
+            precedent_dans_zone = True
+        elif wp.get("type") == "dechetterie" and precedent_dans_zone:
+            etapes.append((*_position(wp), VIDAGE))
+        else:
+            precedent_dans_zone = False
+    if etapes:
+        return etapes
+    etapes = [(*_position(points[p]), COLLECTE) for p in map(str, zone.get("points", [])) if p in points]
+    if etapes:
+        return etapes
+    if zone.get("centre"):
+        return [(*_position(zone["centre"]), COLLECTE)]
+    return []
+
+
+def construire_simulation(
+    planning: Dict[str, List[dict]],
+    routes: List[dict],
+    zones_data: List[dict],
+    creneaux: Optional[List[dict]] = None,
+    points: Optional[List[dict]] = None,
+    depot: Optional[dict] = None,
+    vitesse_kmh: float = VITESSE_MOYENNE_KMH,
+) -> SimulationFlotte:
+    """
+    Rejoue le planning hebdomadaire et précalcule les trajectoires des camions.
+
+    Une entrée du planning = une tournée : départ du dépôt (ou de la zone précédente si
+    l'entrée suivante d'une tournée chronologique a ordre > 1), arrêts de la zone, retour.
+    Départ prévu = début de collecte − trajet_minutes ; un camion encore occupé part en
+    retard (retard_minutes) ; une collecte finie après la fin prévue est un dépassement.
+
+    Args:
+        planning: planification_hebdomadaire {jour: [entrées]} de /api/niveau3/generer_planning.
+        routes: Routes de /api/routes/optimiser (camion_id, waypoints).
+        zones_data: Zones (id, points, centre).
+        creneaux: Créneaux (id, congestion / niveau_congestion) pour la congestion.
+        points: Points de collecte (id, x, y) si une zone est absente des routes.
+        depot: Dépôt (x, y) si les routes n'en fournissent pas.
+        vitesse_kmh: Vitesse hors congestion.
+
+    Raises:
+        ValueError: vitesse non positive.
+    """
+    if not vitesse_kmh or vitesse_kmh <= 0:
+        raise ValueError("vitesse_kmh doit être strictement positive")
+
+    zones = {str(z.get("id")): z for z in zones_data or []}
+    points_par_id = {str(p.get("id")): p for p in points or []}
+    routes_par_camion = {str(r.get("camion_id")): r.get("waypoints", []) for r in routes or []}
+    congestions = {
+        str(c.get("id")): max(0.1, float(c.get("congestion", c.get("niveau_congestion", 1.0))))
+        for c in creneaux or []
+    }
+    depot_defaut = _position(depot) if depot else (0.0, 0.0)
+
+    # Tournées par camion, triées par départ prévu
+    tournees: Dict[str, List[dict]] = {}
+    camion_ids: Dict[str, object] = {}
+    ignorees = 0
+    for j, jour in enumerate(JOURS_SEMAINE):
+        for entree in planning.get(jour, []) or []:
+            cid = str(entree.get("camion_id"))
+            creneau = entree.get("creneau", {})
+            etapes = _etapes_zone(
+                zones.get(str(entree.get("zone_id"))), routes_par_camion.get(cid, []), points_par_id
+            )
+            if not etapes or not creneau.get("debut"):
+                ignorees += 1
+                continue
+            camion_ids.setdefault(cid, entree.get("camion_id"))
+            debut = j * MINUTES_JOUR + en_minutes(creneau["debut"])
+            fin = j * MINUTES_JOUR + en_minutes(creneau.get("fin") or creneau["debut"])
+            tournees.setdefault(cid, []).append({
+                "zone_id": entree.get("zone_id"),
+                "jour": j,
+                "ordre": entree.get("ordre"),
+                "depart_prevu": max(0.0, debut - float(entree.get("trajet_minutes", 0) or 0)),
+                "fin_prevue": fin,
+                "congestion": congestions.get(str(entree.get("creneau_id")), 1.0),
+                "etapes": etapes,
+            })
+    cids = list(tournees)
+    for cid in cids:
+        tournees[cid].sort(key=lambda t: t["depart_prevu"])
+
+    def depot_camion(cid: str) -> Tuple[float, float]:
+        route = routes_par_camion.get(cid) or []
+        if route and route[0].get("type") == "depot":
+            return _position(route[0])
+        return depot_defaut
+
+    def enchainee(tournee: dict, suivante: Optional[dict]) -> bool:
+        return (
+            suivante is not None
+            and suivante["jour"] == tournee["jour"]
+            and (suivante.get("ordre") or 0) > 1
+        )
+
+    # Trajectoires : (instants, x, y, états, zones) ; départ au dépôt à t = 0
+    trajectoires = []
+    etats_camions = []
+    for cid in cids:
+        dx, dy = depot_camion(cid)
+        trajectoires.append(([0.0], [dx], [dy], [AU_DEPOT], [None]))
+        etats_camions.append({"depot": (dx, dy), "position": (dx, dy), "tournee": 0, "etape": 0})
+
+    minutes_par_unite = 60.0 / vitesse_kmh
+    retards: List[float] = []
+    depassements: List[float] = []
+    nb_evenements = 0
+    file: List[Tuple[float, int, int, int]] = []
+    sequence = 0
+
+    def planifier(instant: float, type_evt: int, c: int) -> None:
+        nonlocal sequence
+        heapq.heappush(file, (instant, type_evt, sequence, c))
+        sequence += 1
+
+    def marquer(c: int, instant: float, position: Tuple[float, float], etat: int, zone_id) -> None:
+        temps, xs, ys, etats, zones_traj = trajectoires[c]
+        temps.append(instant)
+        xs.append(position[0])
+        ys.append(position[1])
+        etats.append(etat)
+        zones_traj.append(zone_id)
+
+    def trajet(depuis: Tuple[float, float], vers: Tuple[float, float], congestion: float) -> float:
+        return math.hypot(vers[0] - depuis[0], vers[1] - depuis[1]) * minutes_par_unite * congestion
+
+    for c, cid in enumerate(cids):
+        planifier(tournees[cid][0]["depart_prevu"], _DEPART, c)
+
+    while file:
+        instant, type_evt, _, c = heapq.heappop(file)
+        nb_evenements += 1
+        etat = etats_camions[c]
+        liste = tournees[cids[c]]
+        tournee = liste[etat["tournee"]]
+        suivante = liste[etat["tournee"] + 1] if etat["tournee"] + 1 < len(liste) else None
+
+        if type_evt == _DEPART:
+            retards.append(max(0.0, instant - tournee["depart_prevu"]))
+            etat["etape"] = 0
+            marquer(c, instant, etat["position"], EN_ROUTE, tournee["zone_id"])
+            cible = tournee["etapes"][0][:2]
+            planifier(instant + trajet(etat["position"], cible, tournee["congestion"]), _ARRIVEE, c)
+
+        elif type_evt == _ARRIVEE:
+            x, y, nature = tournee["etapes"][etat["etape"]]
+            etat["position"] = (x, y)
+            marquer(c, instant, (x, y), nature, tournee["zone_id"])
+            arret = DUREE_COLLECTE_POINT_MINUTES if nature == COLLECTE else DUREE_VIDAGE_MINUTES
+            planifier(instant + arret * tournee["congestion"], _FIN_ARRET, c)
+
+        elif type_evt == _FIN_ARRET:
+            etat["etape"] += 1
+            if etat["etape"] < len(tournee["etapes"]):
+                marquer(c, instant, etat["position"], EN_ROUTE, tournee["zone_id"])
+                cible = tournee["etapes"][etat["etape"]][:2]
+                planifier(instant + trajet(etat["position"], cible, tournee["congestion"]), _ARRIVEE, c)
+                continue
+            depassements.append(max(0.0, instant - tournee["fin_prevue"]))
+            if enchainee(tournee, suivante):
+                # Tournée chronologique : la zone suivante part d'ici, sans repasser au dépôt
+                etat["tournee"] += 1
+                depart = max(instant, suivante["depart_prevu"])
+                if depart > instant:
+                    marquer(c, instant, etat["position"], ATTENTE, tournee["zone_id"])
+                planifier(depart, _DEPART, c)
+            else:
+                marquer(c, instant, etat["position"], EN_ROUTE, tournee["zone_id"])
+                planifier(instant + trajet(etat["position"], etat["depot"], tournee["congestion"]), _RETOUR, c)
+
+        else:  # _RETOUR
+            etat["position"] = etat["depot"]
+            marquer(c, instant, etat["depot"], AU_DEPOT, None)
+            if suivante is not None:
+                etat["tournee"] += 1
+                planifier(max(instant, suivante["depart_prevu"]), _DEPART, c)
+
+    en_retard = [r for r in retards if r > 1e-9]
+    en_depassement = [d for d in depassements if d > 1e-9]
+    debut = min((t[0]["depart_prevu"] for t in tournees.values()), default=0.0)
+    fin = max((t[0][-1] for t in trajectoires), default=0.0)
+    resume = {
+        "nb_camions": len(cids),
+        "nb_tournees": len(retards),
+        "tournees_ignorees": ignorees,
+        "nb_evenements": nb_evenements,
+        "debut": round(debut, 3),
+        "fin": round(fin, 3),
+        "debut_jour_heure": instant_en_jour_heure(debut),
+        "fin_jour_heure": instant_en_jour_heure(fin),
+        "vitesse_kmh": vitesse_kmh,
+        "retards": {
+            "nb": len(en_retard),
+            "total_minutes": round(sum(en_retard), 1),
+            "max_minutes": round(max(en_retard, default=0.0), 1),
+        },
+        "depassements": {
+            "nb": len(en_depassement),
+            "max_minutes": round(max(en_depassement, default=0.0), 1),
+        },
+    }
+    return SimulationFlotte([camion_ids[c] for c in cids], trajectoires, resume)
+
+
+# ==================== REGISTRE ====================
+
+def creer_simulation(data: dict) -> Tuple[str, SimulationFlotte]:
+    """
+    Construit (ou retrouve) la simulation d'un body POST /api/niveau3/simulation_temps_reel.
+
+    Returns:
+        (simulation_id, simulation) ; le même body redonne le même identifiant.
+    """
+    routes = data.get("routes", [])
+    if isinstance(routes, dict):
+        routes = routes.get("routes", [])
+    planning = data.get("planification_hebdomadaire") or data.get("planning") or {}
+    simulation_id = cle_canonique("simulation_niveau3", {
+        "planning": planning,
+        "routes": routes,
+        "zones": data.get("zones", []),
+        "creneaux": data.get("creneaux", []),
+        "points": data.get("points", []),
+        "depot": data.get("depot"),
+        "vitesse_kmh": data.get("vitesse_kmh"),
+    })[:32]
+    trouvee = trouver_simulation(simulation_id)
+    if trouvee is not None:
+        return trouvee
+    simulation = construire_simulation(
+        planning,
+        routes,
+        data.get("zones", []),
+        creneaux=data.get("creneaux", []),
+        points=data.get("points", []),
+        depot=data.get("depot"),
+        vitesse_kmh=float(data.get("vitesse_kmh") or VITESSE_MOYENNE_KMH),
+    )
+    with _verrou_simulations:
+        _simulations[simulation_id] = simulation
+        _simulations.move_to_end(simulation_id)
+        while len(_simulations) > SIMULATIONS_CAPACITE:
+            _simulations.popitem(last=False)
+    return simulation_id, simulation
+
+
+def trouver_simulation(simulation_id: Optional[str] = None) -> Optional[Tuple[str, SimulationFlotte]]:
+    """(simulation_id, simulation) ; sans identifiant, la plus récente. None si inconnue."""
+    with _verrou_simulations:
+        if not simulation_id:
+            simulation_id = next(reversed(_simulations), None)
+        simulation = _simulations.get(simulation_id) if simulation_id else None
+        if simulation is None:
+            return None
+        _simulations.move_to_end(simulation_id)
+        return simulation_id, simulation
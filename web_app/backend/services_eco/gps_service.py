@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""Ingestion des positions GPS : validation des lots et tampon d'écriture différée.
+
+Les positions reçues sont mises en tampon puis écrites en un INSERT multi-lignes
+(executemany) et un seul commit, avec la mise à jour de gps_last_position (dernière
+position de chaque planning, lue par /api/tracking/live), dès que le tampon atteint GPS_TAMPON_TAILLE positions
+ou au plus tard GPS_TAMPON_DELAI_S secondes après (thread démon). GPS_TAMPON_TAILLE=0
+désactive le tampon : chaque appel écrit immédiatement.
+
+Un lot refusé par la base (IntegrityError / DataError, ex. planning supprimé entre-temps)
+est réécrit ligne à ligne et seules les lignes refusées sont écartées ; si la base est
+indisponible, le lot est remis en tête du tampon.
+"""
+import atexit
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import DataError, IntegrityError
+
+from models_eco import db, GpsPosition, GpsLastPosition
+
+GPS_TAMPON_TAILLE = int(os.environ.get('VILLEPROPRE_GPS_TAMPON', 500))
+GPS_TAMPON_DELAI_S = float(os.environ.get('VILLEPROPRE_GPS_TAMPON_DELAI', 1.0))
+GPS_TAMPON_MAX = 50000      # positions gardées si la base est indisponible (les plus anciennes sont perdues)
+GPS_LOT_MAX = 1000          # positions par requête POST /api/tracking/positions
+GPS_VITESSE_MAX = 9999.99   # gps_positions.vitesse : DECIMAL(6, 2)
+GPS_AVANCE_MAX_S = 300      # avance tolérée d'un timestamp sur l'horloge du serveur (dérive des boîtiers)
+
+
+def _horodatage(valeur):
+    """ISO 8601 (Z ou décalage accepté) → datetime UTC naïf ; None → maintenant."""
+    if valeur in (None, ''):
+        return datetime.utcnow()
+    ts = datetime.fromisoformat(str(valeur).replace('Z', '+00:00'))
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def lignes_positions(planning_id, chauffeur_id, fixes):
+    """
+    Fixes GPS [{lat, lng, vitesse?, timestamp?}] → lignes de gps_positions.
+
+    Raises:
+        ValueError: fix invalide (message avec son indice).
+    """
+    lignes = []
+    limite = datetime.utcnow() + timedelta(seconds=GPS_AVANCE_MAX_S)
+    for i, fix in enumerate(fixes):
+        try:
+            lat, lng = float(fix['lat']), float(fix['lng'])
+            vitesse = fix.get('vitesse')
+            ligne = {
+                'planning_id': planning_id, 'chauffeur_id': chauffeur_id, 'lat': lat, 'lng': lng,
+                'vitesse': float(vitesse) if vitesse is not None else None,
+                'timestamp': _horodatage(fix.get('timestamp')),
+            }
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f'positions[{i}] invalide : lat, lng numériques et timestamp ISO attendus ({e})')
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError(f'positions[{i}] invalide : lat/lng hors limites')
+        if ligne['vitesse'] is not None and not (
+                math.isfinite(ligne['vitesse']) and abs(ligne['vitesse']) <= GPS_VITESSE_MAX):
+            raise ValueError(f'positions[{i}] invalide : vitesse finie, au plus {GPS_VITESSE_MAX} en valeur absolue')
+        if ligne['timestamp'] > limite:
+            # gps_last_position ne garde que la position la plus récente : une date future la figerait
+            raise ValueError(f'positions[{i}] invalide : timestamp dans le futur (plus de {GPS_AVANCE_MAX_S} s)')
+        lignes.append(ligne)
+    return lignes
+
+
+def maj_dernieres_positions(lignes):
+    """
+    Upsert de gps_last_position avec la position la plus récente de chaque planning des
+    lignes, en une requête atomique : une ligne existante n'est remplacée que par une
+    position au moins aussi récente (plusieurs processus peuvent écrire en même temps).
+    INSERT ... ON DUPLICATE KEY UPDATE sous MySQL, ON CONFLICT DO UPDATE sous SQLite.
+    """
+    dernieres = {}
+    for ligne in lignes:
+        actuelle = dernieres.get(ligne['planning_id'])
+        if actuelle is None or ligne['timestamp'] >= actuelle['timestamp']:
+            dernieres[ligne['planning_id']] = ligne
+    if not dernieres:
+        return
+    table = GpsLastPosition.__table__
+    colonnes = ('chauffeur_id', 'lat', 'lng', 'vitesse', 'timestamp')
+    if db.session.get_bind().dialect.name == 'mysql':
+        requete = mysql.insert(table).values(list(dernieres.values()))
+        plus_recente = requete.inserted.timestamp >= table.c.timestamp
+        # affectations évaluées dans l'ordre : timestamp en dernier, les autres lisent l'ancien
+        requete = requete.on_duplicate_key_update([
+            (c, case((plus_recente, requete.inserted[c]), else_=table.c[c])) for c in colonnes
+        ])
+    else:
+        requete = sqlite.insert(table).values(list(dernieres.values()))
+        requete = requete.on_conflict_do_update(
+            index_elements=[table.c.planning_id],
+            set_={c: requete.excluded[c] for c in colonnes},
+            where=requete.excluded.timestamp >= table.c.timestamp,
+        )
+    db.session.execute(requete)
+
+
+def initialiser_dernieres_positions():
+    """Remplit gps_last_position depuis gps_positions si elle est vide (base existante). Retourne le nombre de lignes."""
+    if GpsLastPosition.query.first() is not None:
+        return 0
+    plus_recents = (
+        db.session.query(GpsPosition.planning_id, func.max(GpsPosition.timestamp).label('timestamp'))
+        .group_by(GpsPosition.planning_id)
+        .subquery()
+    )
+    derniers = (   # position la plus récente de chaque planning (plus grand id à égalité)
+        db.session.query(func.max(GpsPosition.id).label('id'))
+        .join(plus_recents, (GpsPosition.planning_id == plus_recents.c.planning_id)
+              & (GpsPosition.timestamp == plus_recents.c.timestamp))
+        .group_by(GpsPosition.planning_id)
+        .subquery()
+    )
+    colonnes = ('planning_id', 'chauffeur_id', 'lat', 'lng', 'vitesse', 'timestamp')
+    selection = db.select(*(getattr(GpsPosition, c) for c in colonnes)).join(derniers, GpsPosition.id == derniers.c.id)
+    resultat = db.session.execute(db.insert(GpsLastPosition).from_select(colonnes, selection))
+    db.session.commit()
+    return resultat.rowcount
+
+
+class TamponGps:
+    """Positions en attente d'écriture, vidées par taille, par délai ou à l'arrêt du processus."""
+
+    def __init__(self, taille=GPS_TAMPON_TAILLE, delai_s=GPS_TAMPON_DELAI_S):
+        self.taille = taille
+        self.delai_s = delai_s
+        self._lignes = []
+        self._verrou = threading.Lock()
+        self._ecriture = threading.Lock()   # un seul vidage à la fois : ordre d'insertion conservé
+        self._app = None
+        self.compteurs = {'recues': 0, 'ecrites': 0, 'vidages': 0, 'echecs': 0, 'perdues': 0, 'rejetees': 0}
+
+    def demarrer(self, app):
+        """Lance le vidage périodique (thread démon) ; appelé à l'enregistrement du blueprint."""
+        if self._app is not None:
+            return
+        self._app = app
+        if self.taille > 0:
+            threading.Thread(target=self._boucle, name='tampon-gps', daemon=True).start()
+            atexit.register(self._vider_avec_contexte)
+
+    def ajouter(self, lignes):
+        """Ajoute des lignes ; écrit tout de suite si le tampon est plein (ou désactivé)."""
+        with self._verrou:
+            self._lignes.extend(lignes)
+            self.compteurs['recues'] += len(lignes)
+            plein = len(self._lignes) >= self.taille
+        if plein:
+            self.vider()
+
+    def en_attente(self):
+        with self._verrou:
+            return len(self._lignes)
+
+    def vider(self):
+        """Écrit les lignes en attente (un INSERT multi-lignes, un commit). Retourne le nombre écrit."""
+        with self._ecriture:
+            with self._verrou:
+                lot, self._lignes = self._lignes, []
+            if not lot:
+                return 0
+            ecrites, rejetees, restantes = lot, 0, []
+            try:
+                db.session.execute(db.insert(GpsPosition), lot)
+                maj_dernieres_positions(lot)
+                db.session.commit()
+            except (IntegrityError, DataError) as e:
+                db.session.rollback()
+                print(f'[GPS] Lot de {len(lot)} positions refusé, écriture ligne à ligne : {e.orig}')
+                ecrites, rejetees, restantes = self._ecrire_ligne_a_ligne(lot)
+            except Exception as e:
+                db.session.rollback()
+                print(f'[GPS] Écriture de {len(lot)} positions échouée : {e}')
+                ecrites, restantes = [], lot
+            with self._verrou:
+                if restantes:
+                    self._lignes[:0] = restantes
+                    perdues = max(0, len(self._lignes) - GPS_TAMPON_MAX)
+                    del self._lignes[:perdues]
+                    self.compteurs['echecs'] += 1
+                    self.compteurs['perdues'] += perdues
+                else:
+                    self.compteurs['vidages'] += 1
+                self.compteurs['ecrites'] += len(ecrites)
+                self.compteurs['rejetees'] += rejetees
+            return len(ecrites)
+
+    @staticmethod
+    def _ecrire_ligne_a_ligne(lot):
+        """
+        Repli après le refus d'un lot : un commit par ligne, les lignes refusées par la
+        base sont écartées. Si la base devient indisponible, la suite du lot est rendue.
+
+        Returns:
+            (lignes écrites, nombre de lignes rejetées, lignes restant à écrire)
+        """
+        ecrites, rejetees, restantes = [], 0, []
+        for k, ligne in enumerate(lot):
+            try:
+                db.session.execute(db.insert(GpsPosition), [ligne])
+                db.session.commit()
+                ecrites.append(ligne)
+            except (IntegrityError, DataError) as e:
+                db.session.rollback()
+                rejetees += 1
+                print(f"[GPS] Position rejetée (planning {ligne['planning_id']}) : {e.orig}")
+            except Exception as e:
+                db.session.rollback()
+                print(f'[GPS] Écriture ligne à ligne interrompue : {e}')
+                restantes = lot[k:]
+                break
+        if ecrites:
+            try:
+                maj_dernieres_positions(ecrites)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f'[GPS] Mise à jour des dernières positions échouée : {e}')
+        return ecrites, rejetees, restantes
+
+    def etat(self):
+        with self._verrou:
+            return {**self.compteurs, 'en_attente': len(self._lignes), 'taille': self.taille, 'delai_s': self.delai_s}
+
+    def _vider_avec_contexte(self):
+        with self._app.app_context():
+            try:
+                self.vider()
+            finally:
+                db.session.remove()
+
+    def _boucle(self):
+        while True:
+            time.sleep(self.delai_s)
+            if self.en_attente():
+                try:
+                    self._vider_avec_contexte()
+                except Exception as e:
+                    print(f'[GPS] Vidage périodique impossible : {e}')
+
+
+tampon_gps = TamponGps()
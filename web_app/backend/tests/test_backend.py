@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Tests Backend - VillePropre
+Endpoints Flask via le client de test (sans serveur lancé) : cache de résultats et
+ETag, enchaînement niveau 2 → niveau 3, file de jobs, ingestion GPS (EcoAgadir sur une
+base SQLite en mémoire).
+"""
+
+import contextlib
+import io
+import json
+import sys
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+
+from flask import Flask
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PROJECT_ROOT = BACKEND_DIR.parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+    from app import app
+
+from api import cache_http, eco_tracking, jobs_api
+from models_eco import GpsLastPosition, GpsPosition, Planning, User, db
+from services import planning_service
+from services.cache_service import CacheResultats
+from services.jobs_service import GestionnaireJobs
+from services_eco.gps_service import TamponGps, initialiser_dernieres_positions, maj_dernieres_positions
+
+
+def charger_jeu_niveau2() -> dict:
+    """Body de /api/niveau2/optimiser depuis les données d'exemple des niveaux 1 et 2."""
+    with open(PROJECT_ROOT / "niveau1" / "data" / "input_niveau1.json", encoding="utf-8") as f:
+        n1 = json.load(f)
+    with open(PROJECT_ROOT / "niveau2" / "data" / "input_niveau2.json", encoding="utf-8") as f:
+        n2 = json.load(f)
+    return {
+        "points": [n1["depot"]] + n1["points_collecte"],
+        "connexions": n1["connexions"],
+        "dechetteries": n1.get("dechetteries", []),
+        "camions": n2["camions"],
+        "zones": n2["zones"],
+        "zones_incompatibles": n2.get("contraintes", {}).get("zones_incompatibles", []),
+    }
+
+
+class CacheIsole(unittest.TestCase):
+    """Cache de résultats neuf (mémoire seule) le temps de chaque test."""
+
+    def setUp(self):
+        self.cache_original = cache_http.cache_resultats
+        cache_http.cache_resultats = CacheResultats()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        cache_http.cache_resultats = self.cache_original
+
+    def post(self, url, body, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.client.post(url, json=body, **kwargs)
+
+
+class TestCacheResultats(CacheIsole):
+    """Cache adressé par le contenu et revalidation HTTP (ETag / If-None-Match)."""
+
+    BODY = {"depot": {"id": 0, "x": 0, "y": 0},
+            "points": [{"id": i, "x": i % 3, "y": i // 3, "volume": 100} for i in range(1, 7)],
+            "camions": [{"id": 1, "capacite": 5000, "cout_fixe": 0}],
+            "time_limit_seconds": 2}
+
+    def test_etag_304(self):
+        """MISS puis HIT avec le même ETag ; If-None-Match correspondant → 304 sans corps."""
+        premiere = self.post("/api/routes/optimiser", self.BODY)
+        self.assertEqual(premiere.status_code, 200)
+        self.assertEqual(premiere.headers["X-Cache"], "MISS")
+        etag = premiere.headers["ETag"]
+
+        seconde = self.post("/api/routes/optimiser", dict(self.BODY))
+        self.assertEqual((seconde.status_code, seconde.headers["X-Cache"]), (200, "HIT"))
+        self.assertEqual(seconde.headers["ETag"], etag)
+        self.assertEqual(seconde.get_data(), premiere.get_data())
+
+        revalidee = self.post("/api/routes/optimiser", self.BODY, headers={"If-None-Match": etag})
+        self.assertEqual(revalidee.status_code, 304)
+        self.assertEqual(revalidee.get_data(), b"")
+        self.assertEqual(revalidee.headers["ETag"], etag)
+
+        autre = self.post("/api/routes/optimiser", self.BODY, headers={"If-None-Match": '"autre"'})
+        self.assertEqual(autre.status_code, 200)
+
+
+class TestCacheNiveau2(CacheIsole):
+    """Un HIT du cache niveau 2 rend l'affectation_id utilisable par le niveau 3."""
+
+    def test_hit_puis_generer_planning(self):
+        """affectation_id servi par le cache après oubli du registre (redémarrage, éviction)."""
+        body = charger_jeu_niveau2()
+        premiere = self.post("/api/niveau2/optimiser", body)
+        self.assertEqual(premiere.status_code, 200)
+        self.assertEqual(premiere.headers["X-Cache"], "MISS")
+
+        with planning_service._verrou_contextes:
+            planning_service._affectations.clear()
+        seconde = self.post("/api/niveau2/optimiser", body)
+        self.assertEqual(seconde.headers["X-Cache"], "HIT")
+        affectation_id = seconde.get_json()["affectation_id"]
+        self.assertEqual(affectation_id, premiere.get_json()["affectation_id"])
+
+        with open(PROJECT_ROOT / "niveau3" / "data" / "input_niveau3.json", encoding="utf-8") as f:
+            creneaux = json.load(f)["creneaux"]
+        planning = self.post("/api/niveau3/generer_planning",
+                             dict(body, creneaux=creneaux, affectation_id=affectation_id, cache=False))
+        self.assertEqual(planning.status_code, 200, planning.get_json())
+
+
+class TestFileJobs(unittest.TestCase):
+    """Contre-pression de la file de jobs (worker occupé, file pleine → 429)."""
+
+    def setUp(self):
+        self.gestionnaire_original = jobs_api.gestionnaire_jobs
+        self.gestionnaire = jobs_api.gestionnaire_jobs = GestionnaireJobs(nb_workers=1, max_en_file=1)
+        # Worker unique occupé jusqu'à la fin du test : les jobs soumis restent en file
+        self.gestionnaire._executor = ThreadPoolExecutor(max_workers=1)
+        self.liberer = threading.Event()
+        self.gestionnaire._executor.submit(self.liberer.wait)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.liberer.set()
+        self.gestionnaire.arreter()
+        jobs_api.gestionnaire_jobs = self.gestionnaire_original
+
+    def test_file_pleine_429(self):
+        """Au-delà de max_en_file jobs non terminés : 429 + Retry-After ; place libérée par annulation."""
+        body = {"depot": {"id": 0, "x": 0, "y": 0}, "points": [{"id": 1, "x": 1, "y": 1}],
+                "camions": [{"id": 1, "capacite": 1000, "cout_fixe": 0}]}
+        premier = self.client.post("/api/jobs/routes", json=body)
+        self.assertEqual(premier.status_code, 202)
+        self.assertEqual(premier.get_json()["statut"], "en_attente")
+
+        refuse = self.client.post("/api/jobs/routes", json=body)
+        self.assertEqual(refuse.status_code, 429)
+        self.assertGreaterEqual(int(refuse.headers["Retry-After"]), 1)
+        self.assertEqual(refuse.get_json()["retry_after"], int(refuse.headers["Retry-After"]))
+
+        job_id = premier.get_json()["job_id"]
+        self.assertEqual(self.client.delete(f"/api/jobs/{job_id}").status_code, 200)
+        self.assertEqual(self.client.get(f"/api/jobs/{job_id}").get_json()["statut"], "annule")
+        accepte = self.client.post("/api/jobs/routes", json=body)
+        self.assertEqual(accepte.status_code, 202)
+        self.client.delete(f"/api/jobs/{accepte.get_json()['job_id']}")
+
+
+class BaseEcoAgadir(unittest.TestCase):
+    """Blueprint tracking sur SQLite en mémoire ; tampon GPS propre au test, vidé à la main."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = Flask(__name__)
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(cls.app)
+        cls.app.register_blueprint(eco_tracking.tracking_bp)
+
+    def setUp(self):
+        self.tampon_original = eco_tracking.tampon_gps
+        self.tampon = eco_tracking.tampon_gps = TamponGps(taille=1000)
+        self.contexte = self.app.app_context()
+        self.contexte.push()
+        db.create_all()
+        db.session.add(User(id="admin", role="admin", nom="Admin", email="admin@test", password_hash="x"))
+        db.session.add(User(id="u1", role="chauffeur", nom="Chauffeur", email="u1@test", password_hash="x"))
+        for planning_id, status in (("p1", "en_cours"), ("p2", "en_cours"), ("p3", "termine")):
+            db.session.add(Planning(id=planning_id, chauffeur_id="u1", camion_id="c" + planning_id,
+                                    depot_id="d", date_planning=date(2026, 1, 1), shift="matin", status=status))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.contexte.pop()
+        eco_tracking.tampon_gps = self.tampon_original
+
+    def poster_positions(self, planning_id, positions):
+        return self.client.post("/api/tracking/positions", headers={"Authorization": "Bearer u1:x"},
+                                json={"planning_id": planning_id, "positions": positions})
+
+    def vider(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.tampon.vider()
+
+
+class TestIngestionGps(BaseEcoAgadir):
+    """POST /api/tracking/positions : validation, tampon, écriture en lot."""
+
+    def test_lot_avec_ligne_rejetee(self):
+        """Une ligne refusée par la base est écartée, les autres sont écrites."""
+        reponse = self.poster_positions("p1", [
+            {"lat": 33.5, "lng": -7.5, "vitesse": 0, "timestamp": "2026-01-01T08:00:00Z"},
+            {"lat": 33.6, "lng": -7.5, "timestamp": "2026-01-01T08:01:00Z"},
+        ])
+        self.assertEqual(reponse.get_json(), {"ok": True, "recues": 2})
+        mauvaise = dict(eco_tracking.lignes_positions("p2", "u1", [{"lat": 33.7, "lng": -7.5}])[0], lat=None)
+        self.tampon.ajouter([mauvaise] + eco_tracking.lignes_positions("p2", "u1", [{"lat": 33.8, "lng": -7.5}]))
+        self.assertEqual(self.tampon.en_attente(), 4)
+
+        self.assertEqual(self.vider(), 3)
+        etat = self.tampon.etat()
+        self.assertEqual((etat["ecrites"], etat["rejetees"], etat["en_attente"], etat["echecs"]), (3, 1, 0, 0))
+        self.assertEqual(GpsPosition.query.count(), 3)
+        premiere = GpsPosition.query.filter_by(planning_id="p1").order_by(GpsPosition.timestamp).first()
+        self.assertEqual(premiere.to_dict()["vitesse"], 0.0)
+
+    def test_lot_invalide_400(self):
+        """Vitesse non finie ou hors DECIMAL(6, 2), date future, planning d'un autre : rien n'est mis en tampon."""
+        for fix in ({"lat": 33.5, "lng": -7.5, "vitesse": "nan"},
+                    {"lat": 33.5, "lng": -7.5, "vitesse": 1e7},
+                    {"lat": 33.5, "lng": -7.5, "timestamp": "2999-01-01T00:00:00Z"},
+                    {"lat": 91, "lng": -7.5}):
+            self.assertEqual(self.poster_positions("p1", [{"lat": 33.5, "lng": -7.5}, fix]).status_code, 400, fix)
+        self.assertEqual(self.poster_positions("inconnu", [{"lat": 33.5, "lng": -7.5}]).status_code, 403)
+        self.assertEqual(self.tampon.en_attente(), 0)
+
+
+class TestPositionsLive(BaseEcoAgadir):
+    """gps_last_position : upsert gardé par timestamp, lecture par /api/tracking/live, rattrapage."""
+
+    @staticmethod
+    def ligne(planning_id, heure, lat):
+        return {"planning_id": planning_id, "chauffeur_id": "u1", "lat": lat, "lng": -7.5,
+                "vitesse": None, "timestamp": datetime(2026, 1, 1, heure)}
+
+    def dernieres(self):
+        return {p.planning_id: (float(p.lat), p.timestamp.hour) for p in GpsLastPosition.query}
+
+    def test_live_lit_gps_last_position(self):
+        """Dernière position par timestamp (pas par ordre d'arrivée), plannings en cours seulement."""
+        self.poster_positions("p1", [
+            {"lat": 33.52, "lng": -7.5, "vitesse": 0, "timestamp": "2026-01-01T09:00:00Z"},
+            {"lat": 33.51, "lng": -7.5, "timestamp": "2026-01-01T08:00:00Z"},
+        ])
+        self.poster_positions("p3", [{"lat": 33.6, "lng": -7.5, "timestamp": "2026-01-01T09:00:00Z"}])
+        self.vider()
+        self.poster_positions("p1", [{"lat": 33.5, "lng": -7.5, "timestamp": "2026-01-01T07:00:00Z"}])
+        self.vider()  # position plus ancienne : ne remplace pas la dernière
+
+        reponse = self.client.get("/api/tracking/live", headers={"Authorization": "Bearer admin:x"})
+        self.assertEqual(reponse.status_code, 200)
+        live = {p["planning_id"]: p for p in reponse.get_json()}
+        self.assertEqual(set(live), {"p1", "p2"})
+        self.assertEqual(live["p1"]["last_position"],
+                         {"lat": 33.52, "lng": -7.5, "vitesse": 0.0, "timestamp": "2026-01-01T09:00:00"})
+        self.assertEqual(live["p1"]["camion_id"], "cp1")
+        self.assertIsNone(live["p2"]["last_position"])
+        self.assertEqual(self.client.get("/api/tracking/live", headers={"Authorization": "Bearer u1:x"}).status_code, 403)
+
+    def test_upsert_garde_le_plus_recent(self):
+        """Upsert en une requête : insertion, remplacement par plus récent, plus ancien ignoré."""
+        maj_dernieres_positions([self.ligne("p1", 9, 1.0), self.ligne("p2", 8, 2.0), self.ligne("p2", 7, 9.0)])
+        db.session.commit()
+        self.assertEqual(self.dernieres(), {"p1": (1.0, 9), "p2": (2.0, 8)})
+        maj_dernieres_positions([self.ligne("p1", 7, 3.0), self.ligne("p2", 10, 4.0)])
+        db.session.commit()
+        self.assertEqual(self.dernieres(), {"p1": (1.0, 9), "p2": (4.0, 10)})
+
+    def test_rattrapage_par_timestamp(self):
+        """initialiser_dernieres_positions : plus grand timestamp (plus grand id à égalité), une seule fois."""
+        db.session.execute(db.insert(GpsPosition), [
+            self.ligne("p1", 9, 1.0), self.ligne("p1", 7, 3.0),   # id croissant, timestamp décroissant
+            self.ligne("p2", 8, 2.0), self.ligne("p2", 8, 5.0),   # égalité de timestamp
+        ])
+        db.session.commit()
+        self.assertEqual(initialiser_dernieres_positions(), 2)
+        self.assertEqual(self.dernieres(), {"p1": (1.0, 9), "p2": (5.0, 8)})
+        self.assertEqual(initialiser_dernieres_positions(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
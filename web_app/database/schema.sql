@@ -6,6 +6,7 @@ SET NAMES utf8mb4;
 SET FOREIGN_KEY_CHECKS = 0;
 
 DROP TABLE IF EXISTS `gps_points_completes`;
+DROP TABLE IF EXISTS `gps_last_position`;
 DROP TABLE IF EXISTS `gps_positions`;
 DROP TABLE IF EXISTS `planning_points`;
 DROP TABLE IF EXISTS `plannings`;
@@ -104,7 +105,8 @@ CREATE TABLE `plannings` (
   `collecte_reelle` int DEFAULT 0,
   `created_at` datetime DEFAULT CURRENT_TIMESTAMP,
   `updated_at` datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  KEY `ix_plannings_status` (`status`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 CREATE TABLE `planning_points` (
@@ -125,7 +127,19 @@ CREATE TABLE `gps_positions` (
   `lng` decimal(10,6) NOT NULL,
   `vitesse` decimal(6,2) DEFAULT NULL,
   `timestamp` datetime NOT NULL,
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  KEY `ix_gps_positions_planning_timestamp` (`planning_id`,`timestamp`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Dernière position connue de chaque planning (tenue à jour à l'ingestion GPS)
+CREATE TABLE `gps_last_position` (
+  `planning_id` varchar(36) NOT NULL,
+  `chauffeur_id` varchar(36) NOT NULL,
+  `lat` decimal(10,6) NOT NULL,
+  `lng` decimal(10,6) NOT NULL,
+  `vitesse` decimal(6,2) DEFAULT NULL,
+  `timestamp` datetime NOT NULL,
+  PRIMARY KEY (`planning_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 CREATE TABLE `gps_points_completes` (